@@ -1,7 +1,9 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import requests
+from requests.adapters import HTTPAdapter
 import boto3
 from botocore.config import Config
 
@@ -21,9 +23,16 @@ TOKENS_SERVERS_ALLOW_LIST = [
     s.strip() for s in os.environ["TOKENS_SERVERS_ALLOW_LIST"].split(",")
 ]
 TOKENS_POST_URL_OVERRIDE = os.getenv("TOKENS_POST_URL_OVERRIDE")
+TOKENS_POST_WORKERS = int(os.getenv("TOKENS_POST_WORKERS", "8"))
+TOKENS_POST_TIMEOUT = 20  # seconds, so one slow server can't use up the run
 
 BOTO_CONFIG = Config(region_name="us-east-2")
 
+# Shared by the posting workers, with a keep-alive connection per worker
+tokens_session = requests.Session()
+tokens_session.mount("https://", HTTPAdapter(pool_maxsize=TOKENS_POST_WORKERS))
+tokens_session.mount("http://", HTTPAdapter(pool_maxsize=TOKENS_POST_WORKERS))
+
 
 def lambda_handler(_event, _context):
     try:
@@ -42,9 +51,9 @@ def lambda_handler(_event, _context):
 
     for ticket_id in ignorable_ids:
         print(f"Ignoring follow-up ticket: {ticket_id}")
-        ticket_manager.set_ticket_as_solved(
-            ticket_id, comment="Ignored by AWS key checker."
-        )
+    ticket_manager.set_tickets_as_solved(
+        ignorable_ids, comment="Ignored by AWS key checker."
+    )
 
     if failed_ids:
         text = f"The key checker could not parse the following Zendesk ticket IDs: {failed_ids} \n See wiki for guidance: {WIKI_REFERENCE}"
@@ -68,20 +77,46 @@ def process_data(data: "list[ExposedKeyData]", ticket_manager: "ZendeskTicketMan
 
     print(f"Processing {len(items_to_process)} unprocessed items: {items_to_process}.")
 
-    for item in items_to_process:
-        try:
-            send_to_tokens_server(item)
-        except Exception as e:
-            text = f"The key checker could not post the exposed event to the tokens server for the following item: {item}\nThe exception was: {e}.\n\nThis post will be retried automatically on the next run of the lambda. This only needs to be investigated if the failures continue: {WIKI_REFERENCE}."
-            support_ticketer.create_ticket(
-                "Exposed AWS Key Checker could not post to tokens server",
-                text,
-                "exposed-aws-key-checker-post-error",
-            )
-        else:
-            ticket_manager.set_ticket_as_solved(
-                item.ticket.id, comment="Resolved by AWS key checker."
-            )
+    # Tickets are solved in batches as their keys are posted, so a run that
+    # times out doesn't leave posted tickets open to be posted again.
+    solved_ids = []
+    try:
+        with ThreadPoolExecutor(max_workers=TOKENS_POST_WORKERS) as executor:
+            futures = {
+                executor.submit(_try_send_to_tokens_server, item): item
+                for item in items_to_process
+            }
+            for future in as_completed(futures):
+                item, e = futures[future], future.result()
+                if e is None:
+                    solved_ids.append(item.ticket.id)
+                    if (
+                        len(solved_ids)
+                        == ZendeskTicketManager.ZENDESK_UPDATE_MANY_LIMIT
+                    ):
+                        ticket_manager.set_tickets_as_solved(
+                            solved_ids, comment="Resolved by AWS key checker."
+                        )
+                        solved_ids = []
+                    continue
+                text = f"The key checker could not post the exposed event to the tokens server for the following item: {item}\nThe exception was: {e}.\n\nThis post will be retried automatically on the next run of the lambda. This only needs to be investigated if the failures continue: {WIKI_REFERENCE}."
+                support_ticketer.create_ticket(
+                    "Exposed AWS Key Checker could not post to tokens server",
+                    text,
+                    "exposed-aws-key-checker-post-error",
+                )
+    finally:
+        ticket_manager.set_tickets_as_solved(
+            solved_ids, comment="Resolved by AWS key checker."
+        )
+
+
+def _try_send_to_tokens_server(item: "ExposedKeyData") -> "Exception | None":
+    try:
+        send_to_tokens_server(item)
+    except Exception as e:
+        return e
+    return None
 
 
 def gather_data(
@@ -127,7 +162,7 @@ def send_to_tokens_server(data: "ExposedKeyData"):
         "public_location": data.public_location,
     }
 
-    res = requests.post(post_url, data=post_data)
+    res = tokens_session.post(post_url, data=post_data, timeout=TOKENS_POST_TIMEOUT)
     res.raise_for_status()
 
 
@@ -16,10 +16,14 @@ class ZendeskTicketManager:
     ZENDESK_SEARCH_LAST_PAGE = (
         10  # the search endpoint has a maximum number of pages that it allows
     )
+    ZENDESK_UPDATE_MANY_LIMIT = 100  # the most ids update_many accepts at once
 
     def __init__(self, api_token: str, user: str, api_base_url: str):
         self._auth = (user, api_token)
         self._api_base_url = api_base_url
+        # Reuse one keep-alive connection for every call to the API
+        self._session = requests.Session()
+        self._session.auth = self._auth
 
     def read_all_tickets_in_batches(self) -> "Generator[list[TicketData], None, None]":
         next_url = f"{self._api_base_url}/api/v2/search.json"
@@ -34,9 +38,8 @@ class ZendeskTicketManager:
         self,
         url: str,
     ) -> "tuple[list[TicketData], str | None]":
-        r = requests.get(
+        r = self._session.get(
             url or f"{self._api_base_url}/api/v2/search.json",
-            auth=self._auth,
             data={
                 "query": f'tags:"{ZENDESK_EXPOSED_TICKET_TAG}" OR tags:"{ZENDESK_IRREGULAR_ACTIVITY_TICKET_TAG}"',
                 "sort_by": "created_at",
@@ -50,31 +53,32 @@ class ZendeskTicketManager:
         tickets = [TicketData.from_dict(t) for t in res["results"]]
         return tickets, res["next_page"]
 
-    def set_ticket_as_solved(self, ticket_id: "TicketData", comment: str):
-        print(f"Ticket to set to solved: {ticket_id}")
-
-        url = f"{self._api_base_url}/api/v2/tickets/update_many.json?ids={ticket_id}"
-
-        headers = {"Content-Type": "application/json"}
-
-        payload = {
-            "ticket": {
-                "status": "solved",
-                "assignee_id": ZENDESK_ASSIGNEE,
-                "comment": {
-                    "body": comment,
-                    "public": True,
-                },
-                "additional_tags": ["closed-by-aws-exposed-key-checker"],
+    def set_tickets_as_solved(self, ticket_ids: "list[int]", comment: str):
+        for start in range(0, len(ticket_ids), self.ZENDESK_UPDATE_MANY_LIMIT):
+            batch = ticket_ids[start : start + self.ZENDESK_UPDATE_MANY_LIMIT]  # noqa: E203
+            print(f"Tickets to set to solved: {batch}")
+
+            ids = ",".join(str(ticket_id) for ticket_id in batch)
+            url = f"{self._api_base_url}/api/v2/tickets/update_many.json?ids={ids}"
+
+            payload = {
+                "ticket": {
+                    "status": "solved",
+                    "assignee_id": ZENDESK_ASSIGNEE,
+                    "comment": {
+                        "body": comment,
+                        "public": True,
+                    },
+                    "additional_tags": ["closed-by-aws-exposed-key-checker"],
+                }
             }
-        }
-
-        response = requests.put(url, headers=headers, json=payload, auth=self._auth)
-        if response.status_code == 200:
-            print("Ticket successfully updated to solved and tag added.")
-        else:
-            print(f"Failed to update ticket. Status code: {response.status_code}")
-            print(f"Response: {response.text}")
+
+            response = self._session.put(url, json=payload)
+            if response.status_code == 200:
+                print("Tickets successfully updated to solved and tag added.")
+            else:
+                print(f"Failed to update tickets. Status code: {response.status_code}")
+                print(f"Response: {response.text}")
 
 
 @dataclass
@@ -1,21 +1,31 @@
+import dataclasses
 import datetime
 import os
 import pytest
 import json
 from pathlib import Path
+from unittest import mock
 
 import sys
 
 sys.path.insert(0, "lambda_source")
 os.environ["ZENDESK_EXPOSED_TICKET_TAG"] = "test_tag"
+os.environ["ZENDESK_IRREGULAR_ACTIVITY_TICKET_TAG"] = "test_irregular_tag"
+os.environ["ZENDESK_AUTH_SECRET_ID"] = "test_secret"
+os.environ["WIKI_REFERENCE"] = "https://wiki.example.com"
 os.environ["ZENDESK_CLOSED_TICKET_TAG"] = "test_close_tag"
 os.environ["ZENDESK_ASSIGNEE"] = "0000"
 os.environ["TOKENS_SERVERS_ALLOW_LIST"] = (
     "example.com,example.net,example-test.org,example2.com,example2.net,example-test-domain.org"
 )
 
-from exposed_key_checker.ticket_manager import TicketData  # noqa: E402
+from exposed_key_checker import lambda_handler  # noqa: E402
+from exposed_key_checker.ticket_manager import (  # noqa: E402
+    TicketData,
+    ZendeskTicketManager,
+)
 from exposed_key_checker.exposed_keys import (  # noqa: E402
+    ExposedKeyData,
     parse_tickets,
     get_recent_open_tickets,
 )
@@ -182,6 +192,97 @@ def test_url_parsing(all_tickets: list[TicketData]):
     assert tickets_without_tlds == set()
 
 
+def test_set_tickets_as_solved_in_batches():
+    """
+    Tickets should be solved with as few update_many calls as Zendesk allows
+    """
+    ticket_manager = ZendeskTicketManager("token", "user", "https://zendesk.example")
+    ticket_manager._session = mock.Mock()
+    ticket_manager._session.put.return_value.status_code = 200
+
+    ticket_manager.set_tickets_as_solved(list(range(250)), comment="Solved")
+    ticket_manager.set_tickets_as_solved([], comment="Solved")
+
+    urls = [c.args[0] for c in ticket_manager._session.put.call_args_list]
+    assert [len(url.split("ids=")[1].split(",")) for url in urls] == [100, 100, 50]
+    assert urls[2].endswith("ids=" + ",".join(str(i) for i in range(200, 250)))
+
+
+def test_process_data_solves_posted_tickets(valid_tickets: list[TicketData]):
+    """
+    Tickets should only be solved once their keys were posted to the tokens server
+    """
+    data = _exposed_key_data(valid_tickets)
+    failing = data[1]
+
+    ticket_manager = mock.Mock()
+    with (
+        _tokens_server_failing_for(failing),
+        mock.patch.object(
+            lambda_handler.support_ticketer, "create_ticket"
+        ) as create_ticket,
+    ):
+        lambda_handler.process_data(data, ticket_manager)
+
+    create_ticket.assert_called_once()
+    ticket_manager.set_tickets_as_solved.assert_called_once_with(
+        mock.ANY, comment="Resolved by AWS key checker."
+    )
+    solved_ids = ticket_manager.set_tickets_as_solved.call_args.args[0]
+    assert sorted(solved_ids) == sorted(
+        item.ticket.id for item in data if item is not failing
+    )
+
+
+def test_process_data_solves_tickets_as_they_are_posted(
+    valid_tickets: list[TicketData],
+):
+    """
+    Tickets should be solved in batches while keys are still being posted, so
+    a run that times out doesn't leave the posted ones open
+    """
+    ticket = valid_tickets[0]
+    data = _exposed_key_data(
+        [dataclasses.replace(ticket, id=ticket_id) for ticket_id in range(250)]
+    )
+    failing = data[-1]
+
+    ticket_manager = mock.Mock()
+    with (
+        _tokens_server_failing_for(failing),
+        mock.patch.object(lambda_handler.support_ticketer, "create_ticket"),
+    ):
+        lambda_handler.process_data(data, ticket_manager)
+
+    batches = [c.args[0] for c in ticket_manager.set_tickets_as_solved.call_args_list]
+    assert [len(batch) for batch in batches] == [100, 100, 49]
+    assert sorted(sum(batches, [])) == list(range(249))
+
+
+def test_process_data_solves_posted_tickets_on_error(valid_tickets: list[TicketData]):
+    """
+    Tickets whose keys were posted should be solved even if the run fails
+    """
+    data = _exposed_key_data(valid_tickets)
+    failing = data[1]
+
+    ticket_manager = mock.Mock()
+    with (
+        _tokens_server_failing_for(failing),
+        mock.patch.object(
+            lambda_handler.support_ticketer,
+            "create_ticket",
+            side_effect=RuntimeError("Zendesk is down"),
+        ),
+        pytest.raises(RuntimeError),
+    ):
+        lambda_handler.process_data(data, ticket_manager)
+
+    ticket_manager.set_tickets_as_solved.assert_called_once()
+    solved_ids = ticket_manager.set_tickets_as_solved.call_args.args[0]
+    assert failing.ticket.id not in solved_ids
+
+
 @pytest.fixture()
 def valid_tickets() -> list[TicketData]:
     path = Path.cwd() / "tests" / "test_data_to_parse.json"
@@ -212,3 +313,28 @@ def all_tickets(
 def _has_tld(location: str) -> bool:
     tld_list = [".com", ".net", ".org"]
     return any(tld in location for tld in tld_list)
+
+
+def _exposed_key_data(tickets: list[TicketData]) -> list[ExposedKeyData]:
+    return [
+        ExposedKeyData(
+            ticket=ticket,
+            iam_user=f"example.com@@token{ticket.id}",
+            access_key="aka1b2c3d4e5f6g7h8i1",
+            public_location="https://github.com/testorg/test-project",
+            case_no="111111111111111",
+        )
+        for ticket in tickets
+    ]
+
+
+def _tokens_server_failing_for(failing: ExposedKeyData):
+    """Patches posting keys to the tokens server to fail for `failing` only."""
+
+    def send_to_tokens_server(item):
+        if item is failing:
+            raise ValueError("Server error")
+
+    return mock.patch.object(
+        lambda_handler, "send_to_tokens_server", side_effect=send_to_tokens_server
+    )
@@ -2,6 +2,8 @@ import functools
 import fnmatch
 import ipaddress
 import re
+import threading
+import time
 
 try:
     import netifaces
@@ -43,19 +45,45 @@ def determine_local_addresses():
     return ips
 
 
+# Seconds a snapshot of the local addresses is used for. An address added to
+# an interface at runtime is blocked once the snapshot it's not in expires.
+LOCAL_ADDRESSES_TTL = 10.0
+
+_local_addresses_lock = threading.Lock()
+# (expiry, addresses)
+_local_addresses_snapshot = (0.0, ())
+
+
+def get_local_addresses():
+    """Get all IPs that refer to this machine, enumerating the interfaces at
+    most once every `LOCAL_ADDRESSES_TTL` seconds"""
+    global _local_addresses_snapshot
+    expiry, addresses = _local_addresses_snapshot
+    if time.monotonic() < expiry:
+        return addresses
+    with _local_addresses_lock:
+        expiry, addresses = _local_addresses_snapshot
+        if time.monotonic() < expiry:
+            # Another thread refreshed it while we waited for the lock.
+            return addresses
+        addresses = tuple(determine_local_addresses())
+        _local_addresses_snapshot = (time.monotonic() + LOCAL_ADDRESSES_TTL, addresses)
+    return addresses
+
+
 def add_local_address_arg(func):
     """Add the "_local_addresses" kwarg if it's missing
 
-    IMO this information shouldn't be cached between calls (what if one of the
-    adapters got a new IP at runtime?,) and we don't want each function to
-    recalculate it. Just recalculate it if the caller didn't provide it for us.
+    Enumerating the interfaces for every check is expensive, so a snapshot of
+    the local addresses is shared between calls for up to
+    `LOCAL_ADDRESSES_TTL` seconds (see `get_local_addresses`.)
     """
 
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
         if "_local_addresses" not in kwargs:
             if self.autodetect_local_addresses:
-                kwargs["_local_addresses"] = determine_local_addresses()
+                kwargs["_local_addresses"] = get_local_addresses()
             else:
                 kwargs["_local_addresses"] = []
         return func(self, *args, **kwargs)
@@ -63,6 +91,12 @@ def add_local_address_arg(func):
     return wrapper
 
 
+@functools.lru_cache(maxsize=1024)
+def _compile_hostname_glob(pattern):
+    # convert the glob to a punycode glob, then a regex
+    return re.compile(fnmatch.translate(canonicalize_hostname(pattern)))
+
+
 class AddrValidator:
     _6TO4_RELAY_NET = ipaddress.ip_network("192.88.99.0/24")
     # Just the well known prefix, DNS64 servers can set their own
@@ -92,9 +126,8 @@ class AddrValidator:
         self.ip_whitelist = ip_whitelist or set()
         self.port_blacklist = port_blacklist or set()
         self.port_whitelist = port_whitelist or set()
-        # TODO: ATM this can contain either regexes or globs that are converted
-        # to regexes upon every check. Create a collection that automagically
-        # converts them to regexes on insert?
+        # This can contain either regexes or globs, which are converted to
+        # regexes the first time they're checked (see `_compile_hostname_glob`.)
         self.hostname_blacklist = hostname_blacklist or set()
         self.allow_ipv6 = allow_ipv6
         self.allow_teredo = allow_teredo
@@ -194,8 +227,7 @@ class AddrValidator:
         # This has the added benefit of letting us sanely handle globbed
         # IDNs by default.
         if isinstance(pattern, str):
-            # convert the glob to a punycode glob, then a regex
-            pattern = fnmatch.translate(canonicalize_hostname(pattern))
+            pattern = _compile_hostname_glob(pattern)
 
         hostname = canonicalize_hostname(hostname)
         # Down the line the hostname may get treated as a null-terminated string
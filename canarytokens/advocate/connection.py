@@ -86,7 +86,7 @@ def validating_create_connection(
     addrinfo = advocate_getaddrinfo(host, port, get_canonname=need_canonname)
     if addrinfo:
         if validator.autodetect_local_addresses:
-            local_addresses = addrvalidator.determine_local_addresses()
+            local_addresses = addrvalidator.get_local_addresses()
         else:
             local_addresses = []
         for res in addrinfo:
@@ -0,0 +1,255 @@
+"""
+Durable queue of alerts waiting to be sent on output channels.
+
+When the switchboard has an `AlertOutbox`, `Switchboard.dispatch` adds one
+entry per requested output channel to a Redis stream instead of sending the
+alerts itself. A pool of delivery worker threads reads the stream through a
+consumer group and only acknowledges an entry once its alert has been sent,
+so alerts survive a restart mid-send (at-least-once delivery).
+
+An entry whose delivery raises is left pending and retried with exponential
+backoff: it's reclaimed once it has been idle for
+`retry_delay * 2 ** (deliveries - 1)` seconds. The same mechanism picks up
+entries held by workers that died. Entries that have been delivered
+`max_attempts` times without success are moved to a dead-letter stream.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+from typing import TYPE_CHECKING, Optional, Union
+
+import redis
+from pydantic import parse_obj_as
+from twisted.internet import reactor
+from twisted.logger import Logger
+
+from canarytokens import queries
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.exceptions import NoCanarydropFound
+from canarytokens.models import AnyTokenExposedHit, AnyTokenHit, TokenExposedHit
+from canarytokens.redismanager import (
+    DB,
+    KEY_ALERT_OUTBOX,
+    KEY_ALERT_OUTBOX_DEAD,
+)
+from canarytokens.tokens import Canarytoken
+
+if TYPE_CHECKING:
+    from canarytokens.switchboard import Switchboard
+
+log = Logger()
+
+CONSUMER_GROUP = "alert-workers"
+# Upper bound on the delay between two delivery attempts, in seconds.
+MAX_RETRY_DELAY = 60 * 60
+MAX_DEAD_LETTERS = 10000
+# Pending entries looked at per pass, see `AlertOutbox._retry_pending`.
+PENDING_PAGE_SIZE = 100
+
+
+class AlertOutbox:
+    def __init__(
+        self,
+        switchboard: Switchboard,
+        workers: int,
+        max_attempts: int,
+        retry_delay: float,
+    ) -> None:
+        self.switchboard = switchboard
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+        # Where each worker's next look through the pending entries starts.
+        self._pending_cursors: dict[str, str] = {}
+
+    def enqueue(
+        self,
+        canarydrop: Canarydrop,
+        token_hit: Union[AnyTokenHit, AnyTokenExposedHit],
+        output_channel: str,
+    ) -> str:
+        """Adds an alert for `token_hit` on `output_channel` to the outbox.
+
+        Returns:
+            str: ID of the outbox entry.
+        """
+        return DB.get_db().xadd(
+            KEY_ALERT_OUTBOX,
+            {
+                "canarytoken": canarydrop.canarytoken.value(),
+                "output_channel": output_channel,
+                "exposed": int(isinstance(token_hit, TokenExposedHit)),
+                "token_hit": token_hit.json(),
+            },
+        )
+
+    def start(self) -> None:
+        """Starts the delivery workers and stops them on shutdown."""
+        self.create_consumer_group()
+        consumer_prefix = f"{socket.gethostname()}-{os.getpid()}"
+        for n in range(self.workers):
+            thread = threading.Thread(
+                target=self._run,
+                args=(f"{consumer_prefix}-{n}",),
+                name=f"alert-worker-{n}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        reactor.addSystemEventTrigger("during", "shutdown", self.stop)
+        log.info(f"Started {self.workers} alert delivery workers")
+
+    def stop(self) -> None:
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    @staticmethod
+    def create_consumer_group() -> None:
+        try:
+            DB.get_db().xgroup_create(
+                KEY_ALERT_OUTBOX, CONSUMER_GROUP, id="0", mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _run(self, consumer: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.process(consumer, block=1000)
+            except Exception as e:
+                # Most likely redis is unavailable, back off before trying again.
+                log.error(f"Alert worker {consumer} failed: {e}")
+                self._stopping.wait(timeout=1)
+
+    def process(self, consumer: str, block: Optional[int] = None) -> int:
+        """Retries due entries and delivers new ones.
+
+        Args:
+            consumer (str): Name of this worker in the consumer group.
+            block (Optional[int]): Milliseconds to wait for a new entry.
+
+        Returns:
+            int: number of entries delivered or dead-lettered.
+        """
+        handled = self._retry_pending(consumer)
+        new_entries = DB.get_db().xreadgroup(
+            CONSUMER_GROUP, consumer, {KEY_ALERT_OUTBOX: ">"}, count=1, block=block
+        )
+        for _, entries in new_entries or []:
+            for entry_id, fields in entries:
+                self._deliver(entry_id, fields)
+                handled += 1
+        return handled
+
+    def get_retry_delay(self, deliveries: int) -> float:
+        return min(self.retry_delay * 2 ** (deliveries - 1), MAX_RETRY_DELAY)
+
+    def _retry_pending(self, consumer: str) -> int:
+        """Retries the pending entries that are due, a page at a time.
+
+        Each call looks at the page after the one the previous call looked
+        at, wrapping back to the oldest entry, so every pending entry is
+        looked at regardless of how many entries are waiting out a longer
+        backoff ahead of it.
+        """
+        db = DB.get_db()
+        handled = 0
+        page = db.xpending_range(
+            KEY_ALERT_OUTBOX,
+            CONSUMER_GROUP,
+            min=self._pending_cursors.get(consumer, "-"),
+            max="+",
+            count=PENDING_PAGE_SIZE,
+        )
+        if len(page) < PENDING_PAGE_SIZE:
+            self._pending_cursors.pop(consumer, None)
+        else:
+            self._pending_cursors[consumer] = f"({page[-1]['message_id']}"
+        for pending in page:
+            entry_id = pending["message_id"]
+            deliveries = pending["times_delivered"]
+            min_idle_time = int(self.get_retry_delay(deliveries) * 1000)
+            if pending["time_since_delivered"] < min_idle_time:
+                continue
+            # Another worker may have claimed it in the meantime, in which
+            # case nothing is returned.
+            claimed = db.xclaim(
+                KEY_ALERT_OUTBOX,
+                CONSUMER_GROUP,
+                consumer,
+                min_idle_time=min_idle_time,
+                message_ids=[entry_id],
+            )
+            for claimed_id, fields in claimed:
+                if not fields:
+                    # Deleted while pending, nothing left to deliver.
+                    self._ack(claimed_id)
+                elif deliveries >= self.max_attempts:
+                    self._dead_letter(claimed_id, fields, deliveries)
+                else:
+                    self._deliver(claimed_id, fields, retry=True)
+                handled += 1
+        return handled
+
+    def _deliver(self, entry_id: str, fields: dict, retry: bool = False) -> None:
+        token = fields.get("canarytoken")
+        try:
+            output_channel = self.switchboard.output_channels[fields["output_channel"]]
+            canarydrop = queries.get_canarydrop_header(Canarytoken(value=token))
+            if int(fields["exposed"]):
+                token_hit = parse_obj_as(
+                    AnyTokenExposedHit, json.loads(fields["token_hit"])
+                )
+            else:
+                token_hit = parse_obj_as(AnyTokenHit, json.loads(fields["token_hit"]))
+            output_channel.send_alert(
+                input_channel=self.switchboard.input_channels[token_hit.input_channel],
+                canarydrop=canarydrop,
+                token_hit=token_hit,
+                retry=retry,
+            )
+        except NoCanarydropFound:
+            # The drop was deleted since, there's no one left to alert.
+            log.info(
+                f"Dropping alert {entry_id} for {token}, its canarydrop no longer exists."
+            )
+            self._ack(entry_id)
+            return
+        except Exception as e:
+            # Left pending, `_retry_pending` will pick it up again.
+            log.warn(
+                f"Failed to deliver alert {entry_id} for {token} on {fields.get('output_channel')}. Error: {e}"
+            )
+            return
+        self._ack(entry_id)
+        log.info(f"Delivered alert {entry_id} for {token} on {output_channel.name}")
+
+    def _ack(self, entry_id: str) -> None:
+        pipe = DB.get_db().pipeline()
+        pipe.xack(KEY_ALERT_OUTBOX, CONSUMER_GROUP, entry_id)
+        pipe.xdel(KEY_ALERT_OUTBOX, entry_id)
+        pipe.execute()
+
+    def _dead_letter(self, entry_id: str, fields: dict, deliveries: int) -> None:
+        log.error(
+            f"Giving up on alert {entry_id} for {fields.get('canarytoken')} on {fields.get('output_channel')} after {deliveries} attempts."
+        )
+        pipe = DB.get_db().pipeline()
+        pipe.xadd(
+            KEY_ALERT_OUTBOX_DEAD,
+            {**fields, "entry_id": entry_id, "deliveries": deliveries},
+            maxlen=MAX_DEAD_LETTERS,
+            approximate=True,
+        )
+        pipe.xack(KEY_ALERT_OUTBOX, CONSUMER_GROUP, entry_id)
+        pipe.xdel(KEY_ALERT_OUTBOX, entry_id)
+        pipe.execute()
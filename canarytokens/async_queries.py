@@ -0,0 +1,136 @@
+"""
+Deferred-returning counterparts of the `queries` that input channels use on
+the reactor thread.
+
+`queries` talks to Redis through the blocking `redis.StrictRedis` client. The
+functions here run those same calls on a bounded threadpool so a slow Redis
+round trip never stalls the reactor (and with it every other listener in the
+switchboard). Until `start_threadpool` is called, e.g. in unit tests or tools
+that never run a reactor, queries run inline and return already fired
+Deferreds.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Container, Optional
+
+from twisted.internet import defer, reactor, threads
+from twisted.logger import Logger
+from twisted.python.threadpool import ThreadPool
+
+from canarytokens import geoip, metrics, queries, tokens
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.models import AnyTokenExposedHit, AnyTokenHit, TokenTypes
+
+log = Logger()
+
+_threadpool: Optional[ThreadPool] = None
+
+
+def start_threadpool(size: int) -> ThreadPool:
+    """Starts the pool Redis queries are deferred to and stops it on shutdown.
+
+    Args:
+        size (int): Maximum number of concurrent Redis queries.
+    """
+    global _threadpool
+    if _threadpool is not None:
+        return _threadpool
+
+    _threadpool = ThreadPool(minthreads=1, maxthreads=size, name="redis-queries")
+    _threadpool.start()
+    reactor.addSystemEventTrigger("during", "shutdown", stop_threadpool)
+    log.info(f"Started redis query threadpool with {size} threads")
+    return _threadpool
+
+
+def stop_threadpool() -> None:
+    global _threadpool
+    if _threadpool is None:
+        return
+    _threadpool.stop()
+    _threadpool = None
+
+
+def run_query(f: Callable[..., Any], *args: Any, **kwargs: Any) -> defer.Deferred:
+    """Runs a blocking query off the reactor thread.
+
+    Returns:
+        Deferred: fires with the result of `f(*args, **kwargs)`.
+    """
+    if _threadpool is None:
+        return defer.maybeDeferred(_timed_query, f, *args, **kwargs)
+    return threads.deferToThreadPool(
+        reactor, _threadpool, _timed_query, f, *args, **kwargs
+    )
+
+
+def _timed_query(f: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    with metrics.REDIS_QUERY_SECONDS.time(query=f.__name__):
+        return f(*args, **kwargs)
+
+
+def get_canarydrop(canarytoken: tokens.Canarytoken) -> defer.Deferred:
+    return run_query(queries.get_canarydrop, canarytoken)
+
+
+def get_canarydrop_header(
+    canarytoken: tokens.Canarytoken,
+    history_for: Container[TokenTypes] = (),
+) -> defer.Deferred:
+    """Fetches a drop without its history, unless it's of a type in
+    `history_for`. Either way the history isn't loaded on the reactor thread."""
+
+    def _get_canarydrop_header() -> Canarydrop:
+        canarydrop = queries.get_canarydrop_header(canarytoken)
+        if canarydrop.type in history_for:
+            canarydrop.load_history()
+        return canarydrop
+
+    return run_query(_get_canarydrop_header)
+
+
+def save_canarydrop(canarydrop: Canarydrop) -> defer.Deferred:
+    return run_query(queries.save_canarydrop, canarydrop)
+
+
+def add_canarydrop_hit(
+    canarydrop: Canarydrop, token_hit: AnyTokenHit
+) -> defer.Deferred:
+    return run_query(canarydrop.add_canarydrop_hit, token_hit=token_hit)
+
+
+def add_key_exposed_hit(
+    canarydrop: Canarydrop, token_exposed_hit: AnyTokenExposedHit
+) -> defer.Deferred:
+    return run_query(canarydrop.add_key_exposed_hit, token_exposed_hit)
+
+
+def add_additional_info_to_hit(
+    canarytoken: tokens.Canarytoken, hit_time: float, additional_info: dict
+) -> defer.Deferred:
+    return run_query(
+        queries.add_additional_info_to_hit,
+        canarytoken=canarytoken,
+        hit_time=hit_time,
+        additional_info=additional_info,
+    )
+
+
+def update_hit_geo_info(
+    canarytoken: tokens.Canarytoken, hit_time: float, geo_info
+) -> defer.Deferred:
+    return run_query(
+        queries.update_hit_geo_info,
+        canarytoken=canarytoken,
+        hit_time=hit_time,
+        geo_info=geo_info,
+    )
+
+
+def get_return_for_token() -> defer.Deferred:
+    return run_query(queries.get_return_for_token)
+
+
+def get_geoinfo(ip: str) -> defer.Deferred:
+    return run_query(geoip.get_geoinfo, ip=ip)
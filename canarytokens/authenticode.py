@@ -1,12 +1,238 @@
-import tempfile
-from os import unlink
+"""
+Signing of uploaded binaries for Custom Binary (authenticode) tokens.
 
-from canarytokens.sign_file import authenticode_sign_binary
+Signing takes an RSA key for the signing certificate, a CA to issue it, and
+hashing and signing the binary. `SigningPool` generates keys and CAs ahead
+of time and signs in a bounded pool of processes, so the frontend's
+workers aren't held up by the CPU work. Until a pool is started, e.g. in
+tests, binaries are signed inline with freshly generated keys.
+"""
 
+from __future__ import annotations
 
-def make_canary_authenticode_binary(
-    nxdomain_token_url: str, filebody: bytes
-) -> bytes:  # pragma: no cover
+import multiprocessing
+import queue
+import random
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from twisted.logger import Logger
+
+from canarytokens.exceptions import SigningPoolBusy
+from canarytokens.sign_file import authenticode_sign, make_ca, make_signing_certificate
+
+log = Logger()
+
+
+def generate_private_key() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def _generate_private_key_pem() -> bytes:
+    return generate_private_key().private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+def _generate_ca_pem() -> tuple[bytes, bytes]:
+    """Returns a new CA's key and certificate as PEM."""
+    ca_key = generate_private_key()
+    ca_cert = make_ca(ca_key)
+    return (
+        ca_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ),
+        ca_cert.public_bytes(serialization.Encoding.PEM),
+    )
+
+
+def _sign(
+    nxdomain_token_url: str,
+    filebody: bytes,
+    key_pem: bytes,
+    ca_key_pem: bytes,
+    ca_cert_pem: bytes,
+) -> bytes:
+    """Signs `filebody` with a certificate for `key_pem` issued by the CA.
+    Keys are passed as PEM so this can run in another process. They were
+    generated here, so aren't checked again when loaded."""
+    key = serialization.load_pem_private_key(
+        key_pem, password=None, unsafe_skip_rsa_key_validation=True
+    )
+    ca_key = serialization.load_pem_private_key(
+        ca_key_pem, password=None, unsafe_skip_rsa_key_validation=True
+    )
+    ca_cert = x509.load_pem_x509_certificate(ca_cert_pem)
+    cert = make_signing_certificate(nxdomain_token_url, key, ca_key, ca_cert)
+    return authenticode_sign(filebody, key, cert)
+
+
+class SigningPool:
+    """
+    Signs binaries in a pool of `processes` processes. The processes also
+    top up a queue of `key_pool_size` signing keys, and generate
+    `ca_pool_size` CAs on start that signing certificates are issued by.
+    Those CAs are shared by every binary the pool signs until it's stopped.
+
+    At most `max_pending` binaries are signed or waiting to be signed at
+    once, further requests wait up to `wait_timeout` seconds for a slot.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        max_pending: int,
+        key_pool_size: int,
+        ca_pool_size: int = 4,
+        wait_timeout: float = 10,
+    ):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.key_pool_size = key_pool_size
+        self.ca_pool_size = ca_pool_size
+        self.wait_timeout = wait_timeout
+        self.signed = 0
+        self.rejected = 0
+        self.key_misses = 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._keys: queue.Queue[bytes] = queue.Queue()
+        self._keys_requested = 0
+        self._keys_lock = threading.Lock()
+        self._cas: list[tuple[bytes, bytes]] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        # Not forked: the frontend has threads running.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        for _ in range(self.ca_pool_size):
+            self._executor.submit(_generate_ca_pem).add_done_callback(self._add_ca)
+        self._refill_keys()
+
+    def stop(self) -> None:
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def _add_ca(self, future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self._cas.append(future.result())
+
+    def _add_key(self, future: Future) -> None:
+        with self._keys_lock:
+            self._keys_requested -= 1
+        if not future.cancelled() and future.exception() is None:
+            self._keys.put(future.result())
+
+    def _refill_keys(self) -> None:
+        """Asks the processes for enough keys to fill the pool."""
+        executor = self._executor
+        if executor is None:
+            return
+        with self._keys_lock:
+            missing = self.key_pool_size - self._keys.qsize() - self._keys_requested
+            self._keys_requested += max(missing, 0)
+        for _ in range(missing):
+            executor.submit(_generate_private_key_pem).add_done_callback(self._add_key)
+
+    def _take_key(self) -> bytes:
+        try:
+            key_pem = self._keys.get_nowait()
+        except queue.Empty:
+            self.key_misses += 1
+            log.warn("Authenticode key pool is empty, generating a key inline")
+            key_pem = _generate_private_key_pem()
+        self._refill_keys()
+        return key_pem
+
+    def _take_ca(self) -> tuple[bytes, bytes]:
+        if self._cas:
+            return random.choice(self._cas)
+        return _generate_ca_pem()
+
+    def sign(self, nxdomain_token_url: str, filebody: bytes) -> bytes:
+        """Returns `filebody` signed with a certificate pointing at
+        `nxdomain_token_url`.
+
+        Raises:
+            SigningPoolBusy: if no slot frees up within `wait_timeout` seconds.
+            InvalidPEFile: if `filebody` isn't a PE file.
+        """
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            self.rejected += 1
+            raise SigningPoolBusy(
+                f"{self.max_pending} binaries are already being signed"
+            )
+        try:
+            ca_key_pem, ca_cert_pem = self._take_ca()
+            args = (
+                nxdomain_token_url,
+                filebody,
+                self._take_key(),
+                ca_key_pem,
+                ca_cert_pem,
+            )
+            executor = self._executor
+            if executor is None:
+                signed = _sign(*args)
+            else:
+                signed = executor.submit(_sign, *args).result()
+        finally:
+            self._slots.release()
+        self.signed += 1
+        return signed
+
+    def stats(self) -> dict[str, int]:
+        """Returns how many binaries were signed and turned away, how many
+        keys are ready, and how often the key pool was found empty."""
+        return {
+            "signed": self.signed,
+            "rejected": self.rejected,
+            "keys": self._keys.qsize(),
+            "key_misses": self.key_misses,
+        }
+
+
+_signing_pool: Optional[SigningPool] = None
+
+
+def start_signing_pool(
+    processes: int, max_pending: int, key_pool_size: int
+) -> SigningPool:
+    """Starts the pool `make_canary_authenticode_binary` signs binaries in."""
+    global _signing_pool
+    if _signing_pool is None:
+        _signing_pool = SigningPool(
+            processes=processes,
+            max_pending=max_pending,
+            key_pool_size=key_pool_size,
+        )
+        _signing_pool.start()
+    return _signing_pool
+
+
+def stop_signing_pool() -> None:
+    global _signing_pool
+    if _signing_pool is None:
+        return
+    _signing_pool.stop()
+    _signing_pool = None
+
+
+def make_canary_authenticode_binary(nxdomain_token_url: str, filebody: bytes) -> bytes:
     """Takes in a nxdomain url (eg: http://{token}.nxdomain.tools) and bytes string (some binary to sign)
     and returns bytes (the signed binary).
 
@@ -15,27 +241,20 @@ def make_canary_authenticode_binary(
         filebody (bytes): Raw bytes of the binary to sign.
 
     Raises:
-        Exception: Raises an exception if signing fails.
+        InvalidPEFile: if the binary isn't a PE file.
+        SigningPoolBusy: if too many binaries are being signed already.
 
     Returns:
         bytes: Signed binary as bytes.
     """
-    with tempfile.NamedTemporaryFile(mode="wb", delete=False) as unsigned_file:
-        unsigned_file.write(filebody)
-
-    tempdir = tempfile.TemporaryDirectory()
-    signed_file_name = "{dir}/signed_file".format(dir=tempdir.name)
+    if _signing_pool is not None:
+        return _signing_pool.sign(nxdomain_token_url, filebody)
 
-    authenticode_sign_binary(
-        nxdomain_token_url=nxdomain_token_url,
-        inputfile=unsigned_file.name,
-        outputfile=signed_file_name,
+    ca_key_pem, ca_cert_pem = _generate_ca_pem()
+    return _sign(
+        nxdomain_token_url,
+        filebody,
+        _generate_private_key_pem(),
+        ca_key_pem,
+        ca_cert_pem,
     )
-    with open(signed_file_name, "rb") as fp:
-        contents = fp.read()
-
-    unlink(unsigned_file.name)
-
-    if len(contents) == 0:
-        raise Exception("Could not sign this file.")
-    return contents
@@ -7,6 +7,7 @@ from canarytokens.aws_infra.state_management import (
     mark_ingesting,
     in_state,
     cleanup_inactive_aws_infra_canarydrops,
+    AWSInfraCleanupTask,
 )
 from canarytokens.aws_infra.operations import (
     get_canarydrop_from_handle,
@@ -55,4 +56,5 @@ __all__ = [
     "setup_new_plan",
     "name_generation_limit_usage",
     "cleanup_inactive_aws_infra_canarydrops",
+    "AWSInfraCleanupTask",
 ]
@@ -9,12 +9,12 @@ from botocore.exceptions import ClientError
 from canarytokens.aws_infra.terraform_generation import generate_tf_variables
 from canarytokens.aws_infra.utils import AWS_INFRA_ENABLED
 from canarytokens.canarydrop import Canarydrop
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
 # Get the project root directory
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 AWS_INFRA_SHARED_SECRET = None
-settings = FrontendSettings()
+settings = get_frontend_settings()
 MANAGEMENT_REQUEST_URL = settings.AWS_INFRA_MANAGEMENT_REQUEST_SQS_URL
 log = logging.getLogger()
 
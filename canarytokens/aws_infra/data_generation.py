@@ -24,13 +24,13 @@ from canarytokens.aws_infra.utils import (
 )
 from canarytokens.canarydrop import Canarydrop
 from canarytokens.models import AWSInfraAssetType
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
 
 log = logging.getLogger("DataGenerator")
 log.setLevel(logging.INFO)
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 
 _GEMINI_CONFIG = {
     "temperature": settings.GEMINI_TEMPERATURE,
@@ -4,10 +4,10 @@ from datetime import timedelta
 
 import json
 
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 INVENTORY_EXPIRY = timedelta(hours=3).seconds  # 3 hours
 
 
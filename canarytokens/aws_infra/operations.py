@@ -27,7 +27,7 @@ from canarytokens.models import (
     AWSInfraSetupIngestionReceivedResponse,
     AWSInfraTeardownReceivedResponse,
 )
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 from canarytokens.tokens import Canarytoken
 
 from canarytokens.aws_infra.db_queries import (
@@ -36,7 +36,7 @@ from canarytokens.aws_infra.db_queries import (
     save_current_assets,
 )
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 
 AWS_INFRA_AWS_ACCOUNT = settings.AWS_INFRA_AWS_ACCOUNT
 HANDLE_RESPONSE_TIMEOUT = 300  # seconds
@@ -25,9 +25,9 @@ from canarytokens.aws_infra.utils import (
 from canarytokens.canarydrop import Canarydrop
 from canarytokens.exceptions import AWSInfraDataGenerationLimitReached
 from canarytokens.models import AWSInfraAssetField, AWSInfraAssetType
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 
 FIELD_VALIDATORS = {
     "bucket_name": validate_s3_name,
@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta, timezone
 import logging
+import time
+from typing import Callable, Optional
 
 from canarytokens import queries
 from canarytokens.aws_infra.aws_management import get_current_ingestion_bus
@@ -15,9 +17,9 @@ from canarytokens.exceptions import (
     CanarytokenTypeNotEnabled,
 )
 from canarytokens.models import AWSInfraState, TokenTypes
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 OVERLAY_STATES = AWSInfraState.INGESTING
 
 
@@ -216,6 +218,29 @@ def is_aws_infra_canarydrop_active(canarydrop: Canarydrop) -> bool:
     return is_ingesting(canarydrop)
 
 
+def _cleanup_inactive_aws_infra_canarydrop(
+    canarydrop: Canarydrop, now: datetime
+) -> bool:
+    """
+    Delete the canarydrop if it's an inactive AWS infra canarydrop older than
+    `AWS_INFRA_CLEANUP_MAX_AGE`, returning True if it was deleted.
+    """
+    if now - canarydrop.created_at < timedelta(
+        seconds=settings.AWS_INFRA_CLEANUP_MAX_AGE
+    ):
+        return False
+
+    if is_aws_infra_canarydrop_active(canarydrop):
+        return False
+
+    queries.delete_canarydrop(canarydrop)
+    logging.warning(
+        "Deleted inactive AWS infra canarydrop for token %s.",
+        canarydrop.canarytoken.value(),
+    )
+    return True
+
+
 def cleanup_inactive_aws_infra_canarydrops() -> int:
     """
     Delete inactive AWS infra canarydrops from Redis and return count deleted.
@@ -225,16 +250,69 @@ def cleanup_inactive_aws_infra_canarydrops() -> int:
     now = datetime.now(timezone.utc)
 
     for canarydrop in canarydrops:
-        if now - canarydrop.created_at < timedelta(
-            seconds=settings.AWS_INFRA_CLEANUP_MAX_AGE
-        ):
-            continue
+        if _cleanup_inactive_aws_infra_canarydrop(canarydrop, now):
+            deleted_count += 1
 
-        if is_aws_infra_canarydrop_active(canarydrop):
-            continue
+    return deleted_count
 
-        queries.delete_canarydrop(canarydrop)
-        deleted_count += 1
-        logging.warning("Deleted inactive AWS infra canarydrop for token %s.", canarydrop.canarytoken.value())
 
-    return deleted_count
+class AWSInfraCleanupTask:
+    """
+    Deletes inactive AWS infra canarydrops incrementally. Each call to
+    `tick` handles batches of drops until `time_budget` seconds have passed
+    and remembers where it stopped, so a sweep is spread over many short
+    ticks. A new sweep starts every `interval` seconds.
+
+    `tick` blocks on redis, the switchboard runs it in a thread.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        batch_size: int = 50,
+        time_budget: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.clock = clock
+        self.deleted_count = 0
+        self._cursor: Optional[tuple[float, str]] = None
+        self._sweeping = False
+        self._next_sweep_at = clock()
+
+    def tick(self) -> None:
+        """
+        Continue the current sweep, or start one if it's due.
+        """
+        start = self.clock()
+        if not self._sweeping:
+            if start < self._next_sweep_at:
+                return
+            self._sweeping = True
+            self._cursor = None
+            self.deleted_count = 0
+            self._next_sweep_at = start + self.interval
+
+        now = datetime.now(timezone.utc)
+        while self.clock() - start < self.time_budget:
+            try:
+                self._cursor, canarydrops = queries.scan_canarydrops_by_type(
+                    TokenTypes.AWS_INFRA, cursor=self._cursor, count=self.batch_size
+                )
+                for canarydrop in canarydrops:
+                    if _cleanup_inactive_aws_infra_canarydrop(canarydrop, now):
+                        self.deleted_count += 1
+            except Exception:
+                # Give up on this sweep, the next one starts after `interval`.
+                logging.exception("AWS infra cleanup failed.")
+                self._sweeping = False
+                return
+            if self._cursor is None:
+                self._sweeping = False
+                logging.info(
+                    "AWS infra cleanup deleted %d inactive canarydrops.",
+                    self.deleted_count,
+                )
+                return
@@ -8,9 +8,9 @@ else:
 from canarytokens.aws_infra.utils import generate_content
 from canarytokens.canarydrop import Canarydrop
 from canarytokens.models import AWSInfraAssetField, AWSInfraAssetType
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 
 
 class Variable(StrEnum):
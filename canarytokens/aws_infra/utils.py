@@ -8,9 +8,9 @@ import httpx
 from attr import dataclass
 from typing import Optional
 
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 
 log = logging.getLogger()
 
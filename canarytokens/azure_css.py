@@ -1,5 +1,5 @@
 from azure.identity import ClientSecretCredential
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 from requests import Response, get, put, delete, post
 from time import sleep
 from cssutils.css import CSSStyleRule
@@ -13,7 +13,7 @@ if sys.version_info >= (3, 11):
 else:
     from backports.strenum import StrEnum  # Python < 3.11
 
-frontend_settings = FrontendSettings()
+frontend_settings = get_frontend_settings()
 
 BearerToken = str
 
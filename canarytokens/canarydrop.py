@@ -19,17 +19,18 @@ from base64 import b64encode
 from datetime import datetime, timedelta
 from hashlib import md5
 from pathlib import Path
-from urllib.parse import quote
+from urllib.parse import quote, urlparse
 from typing import Literal, Optional, Union
 from canarytokens.models.aws_infra import AWSAccountNumber, AWSRegion
 from canarytokens.models.mcp import McpAlertOn
-from canarytokens.settings import SwitchboardSettings
+from canarytokens.settings import get_switchboard_settings
 from canarytokens.webdav import FsType
 
 from pydantic import (
     AnyHttpUrl,
     BaseModel,
     Field,
+    PrivateAttr,
     parse_obj_as,
     root_validator,
 )
@@ -63,8 +64,6 @@ from canarytokens.models import (
 
 logger = logging.getLogger(__name__)
 
-switchboard_settings = SwitchboardSettings()
-
 
 def make_auth_token():
     """Generates an auth token that is associated 1 to 1 with a token."""
@@ -90,7 +89,8 @@ class Canarydrop(BaseModel):
 
     generate: Optional[bool] = None  # V2 stores this attribute in redis.
     canarytoken: tokens.Canarytoken
-    triggered_details: AnyTokenHistory
+    # None for drops loaded without their history, see `load_history`.
+    triggered_details: Optional[AnyTokenHistory]
     memo: str = ""
     # Make created_at v2 compatible - add timestamp as alias.
     created_at: datetime = Field(default_factory=datetime.utcnow, alias="timestamp")
@@ -222,22 +222,28 @@ class Canarydrop(BaseModel):
     mcp_alert_on: Optional[McpAlertOn] = None
     mcpjson: Optional[str] = None
 
+    # Hits added to a drop loaded without its history.
+    _added_hits: list[AnyTokenHit] = PrivateAttr(default_factory=list)
+
     @root_validator(pre=True)
     def _validate_triggered_details(cls, values):
         """
         Ensure canarydrop `type` and `triggered_details` `token_type` match.
         """
-        if values.get("triggered_details", None) is None:
+        if "triggered_details" not in values:
             values["triggered_details"] = parse_obj_as(
                 AnyTokenHistory, {"token_type": values["type"], "hits": []}
             )
-        else:
+        elif values["triggered_details"] is not None:
             values["triggered_details"] = parse_obj_as(
                 AnyTokenHistory, values["triggered_details"]
             )
 
         # Check that the triggered_details 'token_type' matches the 'type' of the canarydrop.
-        if getattr(values["triggered_details"], "token_type") != values["type"]:
+        if (
+            values["triggered_details"] is not None
+            and getattr(values["triggered_details"], "token_type") != values["type"]
+        ):
             raise ValueError(
                 f"""triggered_details type must match drop type. Got:
             {getattr(values["triggered_details"], "token_type")} != {values["type"]}
@@ -277,28 +283,58 @@ class Canarydrop(BaseModel):
             datetime: lambda v: v.strftime("%s.%f"),
         }
 
+    def load_history(self) -> AnyTokenHistory:
+        """Returns `triggered_details`, reading the drop's hits if it was
+        loaded without them."""
+        if self.triggered_details is None:
+            self.triggered_details, _ = queries.get_canarydrop_hits(
+                self.canarytoken,
+                self.type,
+                limit=get_switchboard_settings().MAX_HISTORY,
+            )
+        return self.triggered_details
+
+    @property
+    def history_loaded(self) -> bool:
+        return self.triggered_details is not None
+
+    def get_latest_hit(self) -> Optional[AnyTokenHit]:
+        """Returns the most recent hit. Doesn't load the history when the hit
+        was added since the drop was loaded."""
+        if not self.history_loaded and self._added_hits:
+            return self._added_hits[-1]
+        hits = self.load_history().hits
+        return hits[-1] if hits else None
+
     def add_canarydrop_hit(self, *, token_hit: AnyTokenHit):
-        """Adds a hit to the drops history `.triggered_details`.
+        """Adds a hit to the drops history `.triggered_details` and appends
+        it to the hits stored for the drop.
 
         Args:
             token_hit (AnyTokenHit): Hit to add.
         """
-        if self.triggered_details.token_type != token_hit.token_type:
+        # `type` always matches `triggered_details.token_type`, see `_validate_triggered_details`.
+        if self.type != token_hit.token_type:
             # Design: This might not hold in the future but for now this is true.
             raise ValueError(
-                f"All hits must be of a single type. Given {token_hit.token_type}; existing {self.triggered_details.token_type}"
+                f"All hits must be of a single type. Given {token_hit.token_type}; existing {self.type}"
             )
 
         if self.should_ignore_ip(token_hit.src_ip):
             token_hit.alert_status = AlertStatus.IGNORED_IP
 
-        self.triggered_details.hits.append(token_hit)
-        max_hits = min(
-            len(self.triggered_details.hits), switchboard_settings.MAX_HISTORY
-        )
-        self.triggered_details.hits = self.triggered_details.hits[-max_hits:]
+        if self.history_loaded:
+            self.triggered_details.hits.append(token_hit)
+            max_hits = min(
+                len(self.triggered_details.hits),
+                get_switchboard_settings().MAX_HISTORY,
+            )
+            self.triggered_details.hits = self.triggered_details.hits[-max_hits:]
+        else:
+            # Loading the history later picks this hit up from redis.
+            self._added_hits.append(token_hit)
 
-        queries.save_canarydrop(self)
+        queries.add_canarydrop_hit(self, token_hit)
 
     def add_key_exposed_hit(self, token_exposed_hit: AnyTokenExposedHit):
         if self.key_exposed_details is not None:
@@ -563,6 +599,15 @@ class Canarydrop(BaseModel):
             channels.append(OUTPUT_CHANNEL_TWILIO_SMS)
         return channels
 
+    def get_alert_destination(self, output_channel: str) -> Optional[str]:
+        """Return where alerts on `output_channel` go, shared by all drops
+        alerting there: the email recipient or the webhook host."""
+        if output_channel == OUTPUT_CHANNEL_EMAIL:
+            return f"email:{self.alert_email_recipient.lower()}"
+        if output_channel == OUTPUT_CHANNEL_WEBHOOK:
+            return f"webhook:{urlparse(self.alert_webhook_url).netloc.lower()}"
+        return None
+
     def serialize(
         self,
     ):
@@ -595,8 +640,6 @@ class Canarydrop(BaseModel):
         if serialized["user"]:
             serialized["user"] = serialized["user"]["name"]
 
-        if details := self.triggered_details.serialize_for_v2():
-            serialized["triggered_list"] = json.dumps(details)
         # V2 stores `aws_output` as `output`
         if "aws_output" in serialized:
             serialized["output"] = serialized.pop("aws_output")
@@ -627,14 +670,6 @@ class Canarydrop(BaseModel):
         else:
             return True
 
-    def alertable(
-        self,
-        alert_limit: int,
-    ):
-        return queries.can_send_alert(
-            canarydrop=self, alert_limit=alert_limit
-        )  # and self.can_notify_again()
-
     def alerting(self) -> None:
         self.user.do_accounting(canarydrop=self)
 
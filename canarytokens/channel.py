@@ -11,6 +11,7 @@ import twisted.internet.reactor
 from twisted.internet import threads
 from twisted.logger import Logger
 
+from canarytokens import metrics
 from canarytokens import switchboard as sb
 from canarytokens.canarydrop import Canarydrop
 
@@ -22,6 +23,7 @@ from canarytokens.models import (
     Memo,
     TokenAlertDetails,
 )
+from canarytokens.settings import SwitchboardSettings
 
 log = Logger()
 
@@ -78,8 +80,11 @@ class InputChannel(Channel):
         canarydrop: Canarydrop,
         protocol: str,
         host: str,  # DESIGN: Shift this to settings. Do we need to have this logic here?
+        token_hit: Optional[AnyTokenHit] = None,
     ) -> TokenAlertDetails:
-        hit = canarydrop.triggered_details.latest_hit()
+        # Alerts delivered from the outbox may be sent after newer hits
+        # have been recorded, so prefer the hit being alerted on.
+        hit = token_hit or canarydrop.triggered_details.latest_hit()
         additional_data = hit.get_additional_data_for_notification()
         if canarydrop.cmd_process:
             additional_data["cmd_process"] = canarydrop.cmd_process
@@ -113,13 +118,20 @@ class InputChannel(Channel):
         Spins off a `switchboard.dispatch` which notifies on all necessary channels.
         """
         log.info(f"reactor is running?: {twisted.internet.reactor.running}")
-
         if token_hit.alert_status == AlertStatus.IGNORED_IP:
             log.info(
                 f"Not dispatching alert for ignored IP {token_hit.src_ip} on {canarydrop.canarytoken.value()}"
             )
             return
 
+        metrics.HITS.inc(input_channel=self.name, token_type=canarydrop.type)
+
+        if self.switchboard.dispatch_queue is not None:
+            self.switchboard.dispatch_queue.put(
+                input_channel=self, canarydrop=canarydrop, token_hit=token_hit
+            )
+            return
+
         d = threads.deferToThread(
             self.switchboard.dispatch,
             canarydrop=canarydrop,
@@ -137,6 +149,9 @@ class InputChannel(Channel):
 
 class OutputChannel(Channel):
     CHANNEL = "OutputChannel"
+    # Seconds the switchboard waits for an alert to be sent on this channel.
+    # Defaults to `SwitchboardSettings.ALERT_TIMEOUT`.
+    ALERT_TIMEOUT: Optional[float] = None
 
     def __init__(
         self,
@@ -158,16 +173,25 @@ class OutputChannel(Channel):
     ):
         self.switchboard.add_output_channel(name=self.name, channel=self)
 
+    def settings_reloaded(self, switchboard_settings: SwitchboardSettings) -> None:
+        """Called with the new settings when the switchboard reloads its
+        settings. Channels that keep settings of their own override this."""
+        pass
+
     def send_alert(
         self,
         input_channel: InputChannel,
         canarydrop: Canarydrop,
         token_hit: Union[AnyTokenHit, AnyTokenExposedHit],
+        retry: bool = False,
     ) -> None:
+        """Sends an alert for `token_hit`. `retry` is set when the alert outbox
+        retries an alert, whose failure was counted on its first attempt."""
         self.do_send_alert(
             input_channel=input_channel,
             canarydrop=canarydrop,
             token_hit=token_hit,
+            retry=retry,
         )
 
     def do_send_alert(
@@ -175,6 +199,7 @@ class OutputChannel(Channel):
         input_channel: InputChannel,
         canarydrop: Canarydrop,
         token_hit: Union[AnyTokenHit, AnyTokenExposedHit],
+        retry: bool = False,
     ) -> Coroutine[Any, Any, None]:
         #  Design: Make this a typing.protocol and drop this.
         raise NotImplementedError("Generic Output channel cannot `do_send_alert`")
@@ -4,15 +4,16 @@ from typing import Dict, Optional, Tuple
 
 from twisted.internet import defer
 from twisted.logger import Logger
+from twisted.python.failure import Failure
 from twisted.names import dns, error, server
 from twisted.names.dns import Name, Query
 
-from canarytokens import queries
+from canarytokens import async_queries
 from canarytokens.canarydrop import Canarydrop
 from canarytokens.channel import InputChannel
 from canarytokens.constants import INPUT_CHANNEL_DNS
 from canarytokens.exceptions import NoCanarytokenFound, NoCanarydropFound
-from canarytokens.models import TokenTypes
+from canarytokens.models import AnyTokenHit, TokenTypes
 from canarytokens.settings import FrontendSettings
 from canarytokens.switchboard import Switchboard
 from canarytokens.tokens import Canarytoken
@@ -20,23 +21,35 @@ from canarytokens.tokens import Canarytoken
 # TODO: logging is still very much WIP.
 log = Logger()
 
+# Hits on these are checked against the drop's earlier hits before they're recorded.
+DEDUPLICATED_TOKEN_TYPES = [TokenTypes.CMD, TokenTypes.WINDOWS_FAKE_FS]
 
-def handle_query_name(query_name: Name) -> Tuple[Canarydrop, Dict[str, str]]:
-    """ """
+
+def handle_query_name(query_name: Name) -> defer.Deferred:
+    """
+    Looks up the drop for the token in `query_name`.
+
+    Returns:
+        Deferred: fires with `(canarydrop, src_data)`.
+    """
     query_name_decoded: str = query_name.name.decode()
 
     token = Canarytoken(value=query_name_decoded)
 
-    canarydrop = queries.get_canarydrop(canarytoken=token)
-    # DESIGN: If lookups are unique per type we should use that for this lookup.
-    #         V2
-    src_data = Canarytoken.look_for_source_data(query_name=query_name_decoded)
-    log.info(
-        f"Recovered: {list(src_data.items())} for {query_name_decoded}".replace(
-            "{", "{{"
-        ).replace("}", "}}")
-    )
-    return canarydrop, src_data
+    def _look_for_source_data(canarydrop: Canarydrop) -> Tuple[Canarydrop, Dict]:
+        # DESIGN: If lookups are unique per type we should use that for this lookup.
+        #         V2
+        src_data = Canarytoken.look_for_source_data(query_name=query_name_decoded)
+        log.info(
+            f"Recovered: {list(src_data.items())} for {query_name_decoded}".replace(
+                "{", "{{"
+            ).replace("}", "}}")
+        )
+        return canarydrop, src_data
+
+    return async_queries.get_canarydrop_header(
+        canarytoken=token, history_for=DEDUPLICATED_TOKEN_TYPES
+    ).addCallback(_look_for_source_data)
 
 
 class DNSServerFactory(server.DNSServerFactory):
@@ -218,17 +231,35 @@ class ChannelDNS(InputChannel):
         if query.type != dns.A:
             return defer.succeed(self._do_no_response(query=query))
         log.info(f"handling query:  {query.name}")
-        try:
-            canarydrop, src_data = handle_query_name(query_name=query.name)
-        except NoCanarytokenFound:
+        d = defer.maybeDeferred(handle_query_name, query_name=query.name)
+        d.addCallbacks(
+            self._handle_token_query,
+            self._handle_lookup_failure,
+            callbackArgs=(query, src_ip, IS_NX_DOMAIN),
+            errbackArgs=(query,),
+        )
+        return d
+
+    def _handle_lookup_failure(self, failure: Failure, query: Query):
+        """
+        Queries that don't resolve to a drop get a plain A record.
+        """
+        if failure.check(NoCanarytokenFound):
             log.info(f"Query: {query.name} does not match a token.")
-            return defer.succeed(self._do_dynamic_response(name=query.name.name))
-        except NoCanarydropFound as e:
-            log.info(f"Query: {query.name} Error: {e}")
-            return defer.succeed(self._do_dynamic_response(name=query.name.name))
-        except Exception as e:
-            log.error(f"Query: {query.name} failed to handle. Error: {e}")
-            return defer.succeed(self._do_dynamic_response(name=query.name.name))
+        elif failure.check(NoCanarydropFound):
+            log.info(f"Query: {query.name} Error: {failure.value}")
+        else:
+            log.error(f"Query: {query.name} failed to handle. Error: {failure.value}")
+        return self._do_dynamic_response(name=query.name.name)
+
+    def _handle_token_query(
+        self,
+        lookup: Tuple[Canarydrop, Dict],
+        query: Query,
+        src_ip: str,
+        is_nx_domain: bool,
+    ):
+        canarydrop, src_data = lookup
         # TODO: What was the deal with this my_sql special case!
         # Ignoring for now but needs a look see.
         # if canarydrop._drop['type'] == 'my_sql':
@@ -243,7 +274,7 @@ class ChannelDNS(InputChannel):
             ]
             and src_data == {}
         ):
-            return defer.succeed(self._do_dynamic_response(name=query.name.name))
+            return self._do_dynamic_response(name=query.name.name)
 
         if canarydrop.type == TokenTypes.CMD:
             invocation_id = src_data["src_data"].get("cmd_invocation_id")
@@ -254,7 +285,7 @@ class ChannelDNS(InputChannel):
                 log.info(
                     f"Ignoring hit on token {canarydrop.canarytoken.value()}; {invocation_id=} already seen."
                 )
-                return defer.succeed(self._do_dynamic_response(name=query.name.name))
+                return self._do_dynamic_response(name=query.name.name)
 
         if canarydrop.type == TokenTypes.WINDOWS_FAKE_FS:
             invocation_id = src_data["src_data"].get("windows_fake_fs_invocation_id")
@@ -265,34 +296,49 @@ class ChannelDNS(InputChannel):
                 log.info(
                     f"Ignoring hit on token {canarydrop.canarytoken.value()}; {invocation_id=} already seen."
                 )
-                return defer.succeed(self._do_dynamic_response(name=query.name.name))
+                return self._do_dynamic_response(name=query.name.name)
 
-        token_hit = Canarytoken.create_token_hit(
+        # Building the hit does GeoIP and Tor lookups so it's done off the reactor thread.
+        d = async_queries.run_query(
+            Canarytoken.create_token_hit,
             token_type=canarydrop.type,
             input_channel=self.CHANNEL,
             src_ip=src_ip,
             hit_info=src_data,
         )
-        # DESIGN: add all details to redis here.
-        try:
-            canarydrop.add_canarydrop_hit(token_hit=token_hit)
-        except Exception as e:
+        d.addCallback(self._record_hit, canarydrop, query, is_nx_domain)
+        return d
+
+    def _record_hit(
+        self,
+        token_hit: AnyTokenHit,
+        canarydrop: Canarydrop,
+        query: Query,
+        is_nx_domain: bool,
+    ):
+        def _hit_failed(failure: Failure) -> Failure:
             log.error(
                 f"Failed to add hit to token {canarydrop.canarytoken.value()}: {token_hit}"
             )
-            raise e
+            return failure
 
-        self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
+        def _hit_added(_) -> tuple[list, list, list]:
+            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
 
-        if IS_NX_DOMAIN:  # pragma: no cover
-            if canarydrop.type not in [TokenTypes.ADOBE_PDF, TokenTypes.SIGNED_EXE]:
-                log.info(
-                    "Token {token} hit the NX domain and is not a pdf. TokenType: {token_type}",
-                    token=canarydrop.canarytoken.value(),
-                    token_type=canarydrop.type,
-                )
-            return defer.fail(error.DomainError())
-        return defer.succeed(self._do_dynamic_response(name=query.name.name))
+            if is_nx_domain:  # pragma: no cover
+                if canarydrop.type not in [TokenTypes.ADOBE_PDF, TokenTypes.SIGNED_EXE]:
+                    log.info(
+                        "Token {token} hit the NX domain and is not a pdf. TokenType: {token_type}",
+                        token=canarydrop.canarytoken.value(),
+                        token_type=canarydrop.type,
+                    )
+                raise error.DomainError()
+            return self._do_dynamic_response(name=query.name.name)
+
+        # DESIGN: add all details to redis here.
+        d = async_queries.add_canarydrop_hit(canarydrop, token_hit)
+        d.addCallbacks(_hit_added, _hit_failed)
+        return d
 
     def lookupCAA(self, name, timeout):  # pragma: no cover
         """Respond with NXdomain to a -t CAA lookup."""
@@ -1,8 +1,9 @@
 import json
-from typing import Optional
+from typing import Any, Callable, Optional, Union
 
 from pydantic import ValidationError, parse_obj_as
 from twisted.application import internet
+from twisted.internet import defer
 from twisted.logger import Logger
 from twisted.python.failure import Failure
 
@@ -11,7 +12,8 @@ from twisted.web import resource, server
 from twisted.web.resource import EncodingResourceWrapper, Resource
 from twisted.web.server import GzipEncoderFactory, Request
 
-from canarytokens import queries
+from canarytokens import async_queries, geoip
+from canarytokens.canarydrop import Canarydrop
 from canarytokens.channel import InputChannel
 from canarytokens.constants import INPUT_CHANNEL_HTTP
 from canarytokens.exceptions import NoCanarytokenFound, NoCanarydropFound
@@ -29,6 +31,43 @@ from canarytokens.utils import coerce_to_float
 
 log = Logger()
 
+# Token types whose response depends on the `fortune` or `gif` setting in
+# redis, see `queries.get_return_for_token`.
+RETURN_FOR_TOKEN_TYPES = frozenset(
+    [TokenTypes.WEB, TokenTypes.WEB_IMAGE, TokenTypes.LEGACY, TokenTypes.IDP_APP]
+)
+
+
+def _render_deferred(request: Request, d: defer.Deferred) -> Union[bytes, int]:
+    """
+    Renders the body `d` fires with. If `d` has already fired (queries ran
+    inline) the body is returned directly, otherwise it's written once `d`
+    fires and `NOT_DONE_YET` is returned.
+    """
+    outcome: list = []
+    d.addBoth(outcome.append)
+    if outcome:
+        if isinstance(outcome[0], Failure):
+            outcome[0].raiseException()
+        return outcome[0]
+
+    finished: list = []
+    request.notifyFinish().addBoth(finished.append)
+
+    def _write(_):
+        if finished:
+            # The client went away while we were busy.
+            return
+        if isinstance(outcome[0], Failure):
+            request.processingFailed(outcome[0])
+            return
+        if outcome[0]:
+            request.write(outcome[0])
+        request.finish()
+
+    d.addCallback(_write)
+    return server.NOT_DONE_YET
+
 
 class CanarytokenPage(InputChannel, resource.Resource):
     CHANNEL = INPUT_CHANNEL_HTTP
@@ -48,7 +87,6 @@ class CanarytokenPage(InputChannel, resource.Resource):
         unique_channel: bool = False,
     ) -> None:
         name = name or self.CHANNEL
-        self.switchboard_settings = switchboard.switchboard_settings
         super().__init__(
             switchboard,
             switchboard_scheme,
@@ -62,7 +100,10 @@ class CanarytokenPage(InputChannel, resource.Resource):
             return self
         return Resource.getChild(self, name, request)
 
-    def render_GET(self, request: Request):  # noqa: C901
+    def render_GET(self, request: Request):
+        return _render_deferred(request, self._handle_GET(request))
+
+    def _handle_GET(self, request: Request) -> defer.Deferred:
         # A GET request to a token URL can trigger one of a few responses:
         # 1. Check if link has been clicked on (rather than loaded from an
         #    <img>) by looking at the Accept header, then:
@@ -90,14 +131,24 @@ class CanarytokenPage(InputChannel, resource.Resource):
                 f"HTTP {request.method} on path {request.path} did not correspond to a token. Error: {e}"
             )
             request.setHeader("Content-Type", "image/gif")
-            return GIF
-        try:
-            canarydrop = get_canarydrop(canarytoken)
-        except NoCanarydropFound as e:
-            log.info(f"Error: {e}")
-            request.setHeader("Content-Type", "image/gif")
-            return GIF
+            return defer.succeed(GIF)
 
+        d = async_queries.get_canarydrop_header(canarytoken)
+        d.addCallbacks(
+            self._render_GET_for_drop,
+            self._render_missing_drop,
+            callbackArgs=(request,),
+            errbackArgs=(request,),
+        )
+        return d
+
+    def _render_missing_drop(self, failure: Failure, request: Request) -> bytes:
+        failure.trap(NoCanarydropFound)
+        log.info(f"Error: {failure.value}")
+        request.setHeader("Content-Type", "image/gif")
+        return GIF
+
+    def _render_GET_for_drop(self, canarydrop: Canarydrop, request: Request):  # noqa: C901
         if canarydrop.type == TokenTypes.PWA:
             template_env = get_template_env()
             template_env.autoescape = True
@@ -123,24 +174,39 @@ class CanarytokenPage(InputChannel, resource.Resource):
                 return template.render(**params).encode()
 
         if canarydrop.type == TokenTypes.AWS_KEYS:
-            token_hit = Canarytoken._parse_aws_key_trigger(request)
-            canarydrop.add_canarydrop_hit(token_hit=token_hit)
-            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-            return b"success"
+            return self._parse_and_record_hit(
+                canarydrop, Canarytoken._parse_aws_key_trigger, request
+            ).addCallback(lambda _: b"success")
 
         try:
             handler = getattr(Canarytoken, f"_get_info_for_{canarydrop.type}")
         except AttributeError:
             log.debug(
-                f"Received a request for token '{canarytoken.value()}' of type '{canarydrop.type}' which does not support alerting via HTTP."
+                f"Received a request for token '{canarydrop.canarytoken.value()}' of type '{canarydrop.type}' which does not support alerting via HTTP."
             )
             request.setHeader("Content-Type", "image/gif")
             return GIF
-        http_general_info, src_data = handler(request)
 
-        # TODO we should fail gracefully when third party dependency fails
-        geo_info = queries.get_geoinfo(ip=http_general_info["src_ip"])
+        def _record_hit(info: tuple[dict, dict]):
+            http_general_info, src_data = info
+            return self._record_http_hit(
+                canarydrop, request, http_general_info, src_data
+            )
+
+        # The handlers look up Tor relays so are run off the reactor thread too.
+        return async_queries.run_query(handler, request).addCallback(_record_hit)
 
+    def _record_http_hit(
+        self,
+        canarydrop: Canarydrop,
+        request: Request,
+        http_general_info: dict,
+        src_data: dict,
+    ):
+        # Only the in-process cache and offline database are consulted before
+        # responding. Anything else is looked up once the attacker has their
+        # response, see `_enrich_and_dispatch`.
+        geo_info = geoip.get_local_geoinfo(http_general_info["src_ip"])
         hit_info = {
             "token_type": canarydrop.type,
             "input_channel": self.CHANNEL,
@@ -160,26 +226,94 @@ class CanarytokenPage(InputChannel, resource.Resource):
             )
             return
 
-        canarydrop.add_canarydrop_hit(token_hit=token_hit)
-        self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-        # TODO: fix this. Making it type dispatched?
-        resp = getattr(Canarytoken, f"_get_response_for_{canarydrop.type}")(
-            canarydrop, request
+        def _respond(_):
+            # TODO: fix this. Making it type dispatched?
+            get_response = getattr(Canarytoken, f"_get_response_for_{canarydrop.type}")
+            request.setHeader("Server", "Apache")
+            if canarydrop.type not in RETURN_FOR_TOKEN_TYPES:
+                return get_response(canarydrop, request)
+            return async_queries.get_return_for_token().addCallback(
+                lambda return_for_token: get_response(
+                    canarydrop, request, return_for_token
+                )
+            )
+
+        if geo_info is not None:
+            return self._add_hit_and_dispatch(canarydrop, token_hit).addCallback(
+                _respond
+            )
+
+        def _enrich(_):
+            # Not waited on, the response doesn't depend on it.
+            self._enrich_and_dispatch(canarydrop, token_hit)
+
+        # The hit is saved before responding as browser scanner POSTs
+        # reference it by `time_of_hit`.
+        d = async_queries.add_canarydrop_hit(canarydrop, token_hit)
+        d.addCallback(_enrich)
+        return d.addCallback(_respond)
+
+    def _enrich_and_dispatch(
+        self, canarydrop: Canarydrop, token_hit: AnyTokenHit
+    ) -> defer.Deferred:
+        """
+        Looks up geo info for a hit that was saved without it, updates the
+        saved hit and then dispatches it. The hit is dispatched without geo
+        info if the lookup fails.
+        """
+
+        def _update_hit(geo_info):
+            token_hit.set_geo_info(geo_info)
+            return async_queries.update_hit_geo_info(
+                canarydrop.canarytoken, token_hit.time_of_hit, geo_info
+            )
+
+        d = async_queries.get_geoinfo(ip=token_hit.src_ip)
+        d.addCallback(_update_hit)
+        d.addErrback(lambda failure: log.failure("GeoIP enrichment failed", failure))
+        d.addCallback(
+            lambda _: self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
+        )
+        return d
+
+    def _parse_and_record_hit(
+        self,
+        canarydrop: Canarydrop,
+        parse_hit: Callable[..., AnyTokenHit],
+        *args: Any,
+    ) -> defer.Deferred:
+        """
+        Builds a hit with `parse_hit(*args)`, which does GeoIP and Tor lookups,
+        off the reactor thread and then persists and dispatches it.
+        """
+        d = async_queries.run_query(parse_hit, *args)
+        d.addCallback(
+            lambda token_hit: self._add_hit_and_dispatch(canarydrop, token_hit)
+        )
+        return d
+
+    def _add_hit_and_dispatch(
+        self, canarydrop: Canarydrop, token_hit: AnyTokenHit
+    ) -> defer.Deferred:
+        """Persists `token_hit` off the reactor thread and then dispatches it."""
+        d = async_queries.add_canarydrop_hit(canarydrop, token_hit)
+        d.addCallback(
+            lambda _: self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
         )
-        request.setHeader("Server", "Apache")
-        return resp
+        return d
 
     def render_OPTIONS(self, request: Request):
         """
         Alert as if it is a normal GET request, but return the expected content and headers.
         """
-        _ = self.render_GET(request)
+        d = self._handle_GET(request)
+        d.addErrback(lambda failure: log.failure("OPTIONS alert failed", failure))
         request.setHeader("Allow", "OPTIONS, GET, POST")
         request.setResponseCode(200)
         request.responseHeaders.removeHeader("Content-Type")
         return b""
 
-    def render_POST(self, request: Request):  # noqa: C901
+    def render_POST(self, request: Request):
         if request.path == b"/a/cr":
             return self.credential_report_trigger(request)
 
@@ -189,49 +323,64 @@ class CanarytokenPage(InputChannel, resource.Resource):
             log.info(f"No token found in {request.path=}.")
             return b"failed"
 
-        try:
-            canarydrop = get_canarydrop(token)
-        except NoCanarydropFound as e:
-            log.info(f"Canarydrop not found for token {token.value()}. Error: {e}")
+        def _missing_drop(failure: Failure) -> bytes:
+            failure.trap(NoCanarydropFound)
+            log.info(
+                f"Canarydrop not found for token {token.value()}. Error: {failure.value}"
+            )
             return b"failed"
+
+        d = async_queries.get_canarydrop(token)
+        d.addCallbacks(
+            self._render_POST_for_drop,
+            _missing_drop,
+            callbackArgs=(request, token),
+        )
+        return _render_deferred(request, d)
+
+    def _render_POST_for_drop(  # noqa: C901
+        self, canarydrop: Canarydrop, request: Request, token: Canarytoken
+    ):
         # if key and token args are present, we are either:
         #    -posting browser info
         #    -getting an aws trigger (key == aws_s3)
         # otherwise, slack api token data perhaps
         # store the info and don't re-render
         if canarydrop.type == TokenTypes.AWS_KEYS:
-            token_hit = Canarytoken._parse_aws_key_trigger(request)
-            if isinstance(token_hit, AWSKeyTokenHit):
-                canarydrop.add_canarydrop_hit(token_hit=token_hit)
-            else:
-                canarydrop.add_key_exposed_hit(token_hit)
-            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-            return b"success"
+
+            def _record_aws_key_hit(token_hit) -> defer.Deferred:
+                if isinstance(token_hit, AWSKeyTokenHit):
+                    d = async_queries.add_canarydrop_hit(canarydrop, token_hit)
+                else:
+                    d = async_queries.add_key_exposed_hit(canarydrop, token_hit)
+                d.addCallback(
+                    lambda _: self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
+                )
+                return d
+
+            d = async_queries.run_query(Canarytoken._parse_aws_key_trigger, request)
+            d.addCallback(_record_aws_key_hit)
+            return d.addCallback(lambda _: b"success")
         elif canarydrop.type == TokenTypes.AZURE_ID:
-            token_hit = Canarytoken._parse_azure_id_trigger(request)
-            canarydrop.add_canarydrop_hit(token_hit=token_hit)
-            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-            return b"success"
+            return self._parse_and_record_hit(
+                canarydrop, Canarytoken._parse_azure_id_trigger, request
+            ).addCallback(lambda _: b"success")
         elif canarydrop.type == TokenTypes.CROWDSTRIKE_CC:
-            token_hit = Canarytoken._parse_crowdstrike_cc_trigger(request)
-            canarydrop.add_canarydrop_hit(token_hit=token_hit)
-            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-            return b"success"
+            return self._parse_and_record_hit(
+                canarydrop, Canarytoken._parse_crowdstrike_cc_trigger, request
+            ).addCallback(lambda _: b"success")
         elif canarydrop.type == TokenTypes.SLACK_API:
-            token_hit = Canarytoken._parse_slack_api_trigger(request)
-            canarydrop.add_canarydrop_hit(token_hit=token_hit)
-            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-            return b"success"
+            return self._parse_and_record_hit(
+                canarydrop, Canarytoken._parse_slack_api_trigger, request
+            ).addCallback(lambda _: b"success")
         elif canarydrop.type == TokenTypes.CREDIT_CARD_V2:
-            token_hit = Canarytoken._parse_credit_card_v2_trigger(request)
-            canarydrop.add_canarydrop_hit(token_hit=token_hit)
-            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-            return b"success"
+            return self._parse_and_record_hit(
+                canarydrop, Canarytoken._parse_credit_card_v2_trigger, request
+            ).addCallback(lambda _: b"success")
         elif canarydrop.type == TokenTypes.WEBDAV:
-            token_hit = Canarytoken._get_info_for_webdav(request)
-            canarydrop.add_canarydrop_hit(token_hit=token_hit)
-            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-            return b"success"
+            return self._parse_and_record_hit(
+                canarydrop, Canarytoken._get_info_for_webdav, request
+            ).addCallback(lambda _: b"success")
         elif canarydrop.type in [
             TokenTypes.SLOW_REDIRECT,
             TokenTypes.WEB_IMAGE,
@@ -242,7 +391,7 @@ class CanarytokenPage(InputChannel, resource.Resource):
             # if key is present then do special handling arguments,
             # otherwise just use render_GET()
             if not key:
-                return self.render_GET(request)
+                return self._handle_GET(request)
 
             if (key := coerce_to_float(key)) and token:
                 additional_info = {
@@ -250,18 +399,20 @@ class CanarytokenPage(InputChannel, resource.Resource):
                     for k, v in request.args.items()
                     if k.decode() not in ["key", "canarytoken", "name"]
                 }
-                queries.add_additional_info_to_hit(
+                d = async_queries.add_additional_info_to_hit(
                     canarytoken=canarydrop.canarytoken,
                     hit_time=key,
                     additional_info={
                         request.args[b"name"][0].decode(): additional_info
                     },
                 )
-                self.dispatch(
-                    canarydrop=canarydrop,
-                    token_hit=canarydrop.triggered_details.hits[-1],
+                d.addCallback(
+                    lambda _: self.dispatch(
+                        canarydrop=canarydrop,
+                        token_hit=canarydrop.triggered_details.hits[-1],
+                    )
                 )
-                return b"success"
+                return d.addCallback(lambda _: b"success")
             else:
                 log.info(
                     f"Either {key=} or {token=} were falsy. Dropping this request."
@@ -270,7 +421,7 @@ class CanarytokenPage(InputChannel, resource.Resource):
                 return b"failed"
         elif canarydrop.type == TokenTypes.IDP_APP:
             if SAML_POST_ARG in request.args:
-                return self.render_GET(request)
+                return self._handle_GET(request)
             key = request.args.get(b"key", [None])[0]
             if (key := coerce_to_float(key)) and token:
                 additional_info = {
@@ -278,18 +429,20 @@ class CanarytokenPage(InputChannel, resource.Resource):
                     for k, v in request.args.items()
                     if k.decode() not in ["key", "canarytoken", "name"]
                 }
-                queries.add_additional_info_to_hit(
+                d = async_queries.add_additional_info_to_hit(
                     canarytoken=canarydrop.canarytoken,
                     hit_time=key,
                     additional_info={
                         request.args[b"name"][0].decode(): additional_info
                     },
                 )
-                self.dispatch(
-                    canarydrop=canarydrop,
-                    token_hit=canarydrop.triggered_details.hits[-1],
+                d.addCallback(
+                    lambda _: self.dispatch(
+                        canarydrop=canarydrop,
+                        token_hit=canarydrop.triggered_details.hits[-1],
+                    )
                 )
-                return b"success"
+                return d.addCallback(lambda _: b"success")
             else:
                 log.info(
                     f"Either {key=} or {token=} were falsy. Dropping this request."
@@ -298,11 +451,10 @@ class CanarytokenPage(InputChannel, resource.Resource):
                 return b"failed"
         elif canarydrop.type == TokenTypes.AWS_INFRA:
             content = json.load(request.content)
-            token_hit = Canarytoken._parse_aws_infra_trigger(content)
-            canarydrop.add_canarydrop_hit(token_hit=token_hit)
-            self.dispatch(canarydrop=canarydrop, token_hit=token_hit)
-            return b"success"
-        return self.render_GET(request)
+            return self._parse_and_record_hit(
+                canarydrop, Canarytoken._parse_aws_infra_trigger, content
+            ).addCallback(lambda _: b"success")
+        return self._handle_GET(request)
 
     def credential_report_trigger(self, request: Request):
         """
@@ -310,7 +462,7 @@ class CanarytokenPage(InputChannel, resource.Resource):
         render_POST flow because we are checking for very specific arguments from our AWS API Key Canarytoken
         Infrastructure.
         """
-        lambda_auth = self.switchboard_settings.LAMBDA_AWS_CRED_REPORT_AUTH
+        lambda_auth = self.switchboard.switchboard_settings.LAMBDA_AWS_CRED_REPORT_AUTH
         if lambda_auth is None:
             return GIF
         data: dict[str, list[str]] = {
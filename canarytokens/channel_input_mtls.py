@@ -2,7 +2,7 @@ import json
 import random
 from datetime import datetime, timedelta, timezone
 from ipaddress import IPv4Address
-from typing import TypedDict
+from typing import Optional, TypedDict
 
 from cryptography import x509
 from cryptography.hazmat.primitives import hashes, serialization
@@ -142,7 +142,11 @@ class mTLS(basic.LineReceiver):
 
     @staticmethod
     def generate_new_certificate(
-        ca_redis_key, username, ip=None, is_server_cert=False
+        ca_redis_key,
+        username,
+        ip=None,
+        is_server_cert=False,
+        client_key: Optional[rsa.RSAPrivateKey] = None,
     ) -> KubeCerts:
         ca = get_certificate(ca_redis_key)
         if not ca:
@@ -152,11 +156,12 @@ class mTLS(basic.LineReceiver):
         ca_key = serialization.load_pem_private_key(ca.get("k"), password=None)
         cert_authority = x509.load_pem_x509_certificate(ca.get("c"))
 
-        # Generate new RSA key
-        client_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=4096,
-        )
+        # Generate new RSA key, unless one was generated ahead of time
+        if client_key is None:
+            client_key = rsa.generate_private_key(
+                public_exponent=65537,
+                key_size=4096,
+            )
 
         # Build subject name
         subject = x509.Name(
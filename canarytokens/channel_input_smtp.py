@@ -1,5 +1,7 @@
 from __future__ import absolute_import, print_function
 
+import binascii
+import hashlib
 import re
 from datetime import datetime
 from typing import Dict, List, Optional, Pattern, Tuple, TypedDict
@@ -54,62 +56,161 @@ def patched_lookupMethod(self, command):
 smtp.ESMTP.lookupMethod = patched_lookupMethod
 
 
+# Per message limits on what's kept of an email. Each recipient gets its
+# own message, so these bound the memory of a connection per recipient.
+MAX_HEADER_BYTES = 64 * 2**10
+MAX_LINKS = 100
+MAX_ATTACHMENTS = 32
+MAX_ATTACHMENT_HEADER_BYTES = 8 * 2**10
+# Attachment bodies are decoded and hashed in chunks of about this size.
+BODY_CHUNK_BYTES = 64 * 2**10
+
+
+class MimePart:
+    """
+    A MIME part of an email. Its headers are kept, its body is only
+    hashed and counted as it streams past. Base64 bodies are decoded
+    first, so the summary describes the attached file.
+    """
+
+    def __init__(self):
+        self.headers: list[bytes] = []
+        self.header_bytes = 0
+        self.base64 = False
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.body_started = False
+        self._base64_remainder = b""
+        self._pending: list[bytes] = []
+        self._pending_bytes = 0
+
+    def header_received(self, line: bytes):
+        if self.header_bytes + len(line) > MAX_ATTACHMENT_HEADER_BYTES:
+            return
+        self.headers.append(line)
+        self.header_bytes += len(line)
+        lowered = line.lower()
+        if lowered.startswith(b"content-transfer-encoding:") and b"base64" in lowered:
+            self.base64 = True
+
+    def body_received(self, line: bytes):
+        self._pending.append(line)
+        self._pending_bytes += len(line)
+        if self._pending_bytes >= BODY_CHUNK_BYTES:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        data = b"\r\n".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        if self.base64:
+            data = self._base64_remainder + data.translate(None, b" \t\r\n")
+            usable = len(data) - len(data) % 4
+            self._base64_remainder = data[usable:]
+            try:
+                chunk = binascii.a2b_base64(data[:usable])
+            except binascii.Error:
+                # Not really base64, summarise the rest as sent.
+                self.base64 = False
+                chunk = data
+        else:
+            # The line break before the next boundary belongs to the boundary.
+            chunk = b"\r\n" + data if self.body_started else data
+        self.body_started = True
+        self.size += len(chunk)
+        self.sha256.update(chunk)
+
+    def summary(self) -> bytes:
+        """Returns the part's headers, followed by its size and SHA-256 if it
+        has a body."""
+        self._flush()
+        lines = list(self.headers)
+        if self.body_started:
+            lines.append(f"Size: {self.size} bytes".encode())
+            lines.append(f"SHA-256: {self.sha256.hexdigest()}".encode())
+        return b"\n".join(lines)
+
+
 @implementer(smtp.IMessage)
 class CanaryMessage:
+    """
+    Parses an email as its lines arrive, keeping its headers, the links in
+    its body and a summary of each MIME part. Nothing else of the email is
+    kept, and the limits above cap what is.
+    """
+
     def __init__(self, esmtp=None):
         self.esmtp = esmtp
         self.headers = []
+        self.header_bytes = 0
         self.headers_finished = False
-        self.attachments = []
+        self.attachments: list[MimePart] = []
         self.links = []
         self.links_re: Pattern[bytes] = re.compile(rb"(http[s]?://[^\s'\"]+)", re.I)
         self.mime_boundary = None
         self.mime_boundary_re = re.compile(rb'.*boundary[ ]*=[" ]?([^" ]+)')
         self.in_mime_header = True
-        self.lines = []
-        self.stored_byte_count = 0
+        self.part: Optional[MimePart] = None
 
     def lineReceived(self, line: bytes):
         """
-        Reads each line of the SMTP message and parses it into,
-        lines, attachments, headers etc.
+        Reads each line of the SMTP message and parses it into
+        headers, links and attachment summaries.
         """
         if line == b"" and not self.headers_finished:
             self.headers_finished = True
 
         if not self.headers_finished:
-            self.headers.append(line)
-            m = self.mime_boundary_re.match(line)
-            if m:
-                self.mime_boundary = m.group(1)
-        else:
-            if self.mime_boundary:
-                if self.in_mime_header:
-                    if line == b"":
-                        self.in_mime_header = False
-                    else:
-                        self.attachments[-1].append(line)
+            self._header_received(line)
+            return
 
-                if self.mime_boundary in line:
-                    self.in_mime_header = True
-                    self.attachments.append([])
+        if self.mime_boundary:
+            self._mime_line_received(line)
+        self._find_links(line)
 
-            if self.stored_byte_count < 5 * 2**20:  # 5MB limit
-                self.lines.append(line)
-                self.stored_byte_count = self.stored_byte_count + len(line)
+    def _header_received(self, line: bytes):
+        if self.header_bytes + len(line) <= MAX_HEADER_BYTES:
+            self.headers.append(line)
+            self.header_bytes += len(line)
+        m = self.mime_boundary_re.match(line)
+        if m:
+            self.mime_boundary = m.group(1)
+
+    def _mime_line_received(self, line: bytes):
+        if self.mime_boundary in line:
+            self.in_mime_header = True
+            self.part = None
+            if len(self.attachments) < MAX_ATTACHMENTS:
+                self.part = MimePart()
+                self.attachments.append(self.part)
+        elif self.in_mime_header:
+            if line == b"":
+                self.in_mime_header = False
+            elif self.part:
+                self.part.header_received(line)
+        elif self.part:
+            self.part.body_received(line)
+
+    def _find_links(self, line: bytes):
+        # Links can't contain whitespace, so never span lines.
+        if len(self.links) < MAX_LINKS:
+            links = self.links_re.findall(line)
+            self.links.extend(links[: MAX_LINKS - len(self.links)])
 
     def eomReceived(self):
         """
         End of Message(eom) received. Create token hit and persist it to redis.
         """
         self.esmtp.mail["headers"] = self.headers
-        self.esmtp.mail["links"] = self.links_re.findall(b"\r\n".join(self.lines))
-        self.esmtp.mail["attachments"] = [b"\n".join(x) for x in self.attachments]
+        self.esmtp.mail["links"] = self.links
+        self.esmtp.mail["attachments"] = [o.summary() for o in self.attachments]
 
         log.info(
-            f"New message received: {self.headers=}, {self.links=}, {self.attachments=}"
+            f"New message received: {self.headers=}, {self.links=}, "
+            f"attachments={self.esmtp.mail['attachments']}"
         )
-        self.lines = None
 
         self.token_hit = SMTPTokenHit(
             time_of_hit=datetime.utcnow().strftime("%s.%f"),
@@ -137,8 +238,9 @@ class CanaryMessage:
         return d
 
     def connectionLost(self):
-        # There was an error, throw away the stored lines
-        self.lines = None
+        # There was an error, throw away what was parsed
+        self.attachments = []
+        self.part = None
 
 
 class Mail(TypedDict):
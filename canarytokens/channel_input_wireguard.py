@@ -2,17 +2,18 @@ import base64
 import random
 import struct
 import time
-from hashlib import blake2s
 from typing import Optional, Tuple
 
 import nacl.bindings
 import nacl.encoding
 import nacl.public
 from twisted.application import internet
+from twisted.internet import reactor, threads
 from twisted.internet.protocol import DatagramProtocol
 from twisted.logger import Logger
+from twisted.python.threadpool import ThreadPool
 
-from canarytokens import queries
+from canarytokens import metrics, queries
 from canarytokens.canarydrop import Canarydrop
 from canarytokens.channel import InputChannel
 from canarytokens.constants import INPUT_CHANNEL_WIREGUARD
@@ -23,13 +24,18 @@ from canarytokens.tokens import Canarytoken
 from canarytokens.exceptions import NoCanarydropFound
 from canarytokens.wireguard import (
     AEAD,
+    BLAKE2S_128_SIZE,
     KDF2,
     MSG_INITIATION_FMT,
     MSG_INITIATION_LEN,
     MSG_INITIATION_MAX_TIME_DIFF,
     MSG_INITIATION_PREFIX,
+    NOISE_CONSTRUCTION,
     TAI64N_BASE,
+    WG_IDENTIFIER,
+    ZERO_NONCE,
     Device,
+    DeviceResolver,
     getDevices,
     hash,
     mixhash,
@@ -39,11 +45,7 @@ from canarytokens.wireguard import (
 
 log = Logger()
 
-NOISE_CONSTRUCTION = "Noise_IKpsk2_25519_ChaChaPoly_BLAKE2s".encode("utf-8")
-WG_IDENTIFIER = "WireGuard v1 zx2c4 Jason@zx2c4.com".encode("utf-8")
 WG_LABEL_COOKIE = "cookie--".encode("utf-8")
-ZERO_NONCE = b"\x00" * 12
-BLAKE2S_128_SIZE = 16
 
 
 class WireGuardProtocol(DatagramProtocol):
@@ -58,15 +60,35 @@ class WireGuardProtocol(DatagramProtocol):
             wg_private_key_seed=switchboard_settings.WG_PRIVATE_KEY_SEED,
             wg_private_key_n=switchboard_settings.WG_PRIVATE_KEY_N,
         )
+        self.device_resolver = DeviceResolver(self.devices)
+        # Handshakes are handled on a threadpool once the protocol is started,
+        # and dropped while `max_pending_handshakes` are waiting for it.
+        self.handshake_threads = switchboard_settings.WG_HANDSHAKE_THREADS
+        self.max_pending_handshakes = switchboard_settings.WG_MAX_PENDING_HANDSHAKES
+        self.threadpool: Optional[ThreadPool] = None
+        self.pending_handshakes = 0
+        self.dropped_handshakes = 0
         # Random test key
         device: Device = random.choice(self.devices)
         log.info(
             f"Console public key: {device.privateKey.public_key.encode(encoder=nacl.encoding.Base64Encoder)!r}"
         )
 
-    def datagramReceived(  # noqa: C901
-        self, data: bytes, src: Tuple[str, int]
-    ) -> None:  # pragma: no cover
+    def startProtocol(self) -> None:
+        if self.handshake_threads > 0:
+            self.threadpool = ThreadPool(
+                minthreads=1,
+                maxthreads=self.handshake_threads,
+                name="wireguard-handshakes",
+            )
+            self.threadpool.start()
+
+    def stopProtocol(self) -> None:
+        if self.threadpool is not None:
+            self.threadpool.stop()
+            self.threadpool = None
+
+    def datagramReceived(self, data: bytes, src: Tuple[str, int]) -> None:
         log.debug(
             f"received data: {data!r} from src: {src}".replace("{", "{{").replace(
                 "}", "}}"
@@ -81,32 +103,59 @@ class WireGuardProtocol(DatagramProtocol):
         ):
             return
 
+        if self.threadpool is None:
+            self._dispatch(self.handle_initiation(data, src))
+            return
+
+        if self.pending_handshakes >= self.max_pending_handshakes:
+            self.dropped_handshakes += 1
+            metrics.WIREGUARD_DROPPED_HANDSHAKES.inc()
+            if self.dropped_handshakes % 1000 == 1:
+                log.warn(
+                    "WireGuard handshakes are coming in faster than they're handled, dropped {dropped} so far",
+                    dropped=self.dropped_handshakes,
+                )
+            return
+
+        self.pending_handshakes += 1
+        d = threads.deferToThreadPool(
+            reactor, self.threadpool, self.handle_initiation, data, src
+        )
+        d.addBoth(self._handshake_done)
+        d.addCallback(self._dispatch)
+        d.addErrback(
+            lambda failure: log.failure(
+                "Failed to handle WireGuard handshake", failure=failure
+            )
+        )
+
+    def _handshake_done(self, result):
+        self.pending_handshakes -= 1
+        return result
+
+    def _dispatch(self, hit: Optional[Tuple[Canarydrop, WireguardTokenHit]]) -> None:
+        if hit is not None:
+            canarydrop, token_hit = hit
+            self.channel.dispatch(canarydrop=canarydrop, token_hit=token_hit)
+
+    def open_initiation(
+        self, data: bytes, src_host: str
+    ) -> Optional[Tuple[Device, int, bytes]]:
+        """
+        Checks an initiation message was sent to one of our devices by a peer
+        holding the static key in it, and recently. Returns the device, the
+        peer's session index and its public key, or None.
+        """
         # MAC offsets at the end of message
         smac2 = len(data) - BLAKE2S_128_SIZE
         smac1 = smac2 - BLAKE2S_128_SIZE
 
-        data_smac1 = data[:smac1]
-        search_mac = data[smac1:smac2]
-
-        try:
-            device = next(
-                filter(
-                    lambda candidateDevice: (
-                        search_mac
-                        == blake2s(
-                            data_smac1,
-                            digest_size=BLAKE2S_128_SIZE,
-                            key=candidateDevice.mac1_key,
-                        ).digest()
-                    ),
-                    self.devices,
-                )
-            )
-        except StopIteration:
+        device = self.device_resolver.resolve(data[:smac1], data[smac1:smac2], src_host)
+        if device is None:
             log.info(
-                f"Could not find matching public key for message from {src}: {data!r}"
+                f"Could not find matching public key for message from {src_host}: {data!r}"
             )
-            return
+            return None
 
         mtype, sessionIndex, ephemeral, static, timestamp, mac1, mac2 = struct.unpack(
             MSG_INITIATION_FMT, data
@@ -126,14 +175,28 @@ class WireGuardProtocol(DatagramProtocol):
         tai64nTimestamp = AEAD(key1, ZERO_NONCE, timestamp, hash2)
         if not tai64nTimestamp:
             log.debug("Timestamp not valid; Handshake not provably sent by peer key")
-            return
+            return None
 
         unix_seconds, nano = struct.unpack("!QI", tai64nTimestamp)
         unix_seconds -= TAI64N_BASE
         time_diff = abs(int(time.time()) - unix_seconds)
         if time_diff > MSG_INITIATION_MAX_TIME_DIFF:
             log.debug("Handshake timestamp too new or too old")
-            return
+            return None
+
+        return device, sessionIndex, peerPK
+
+    def handle_initiation(
+        self, data: bytes, src: Tuple[str, int]
+    ) -> Optional[Tuple[Canarydrop, WireguardTokenHit]]:
+        """
+        Records a hit for the token whose key sent the initiation message,
+        returning the drop and hit to dispatch, if any.
+        """
+        initiation = self.open_initiation(data, src[0])
+        if initiation is None:
+            return None
+        device, sessionIndex, peerPK = initiation
 
         public_key = base64.b64encode(peerPK)
         token_value = queries.wireguard_keymap_get(public_key)
@@ -141,7 +204,7 @@ class WireGuardProtocol(DatagramProtocol):
             log.info(
                 f"No token found for public_key {public_key.decode()} from {src}. It either does not correspond to a token, or the token was deleted."
             )
-            return
+            return None
 
         canarytoken = Canarytoken(value=token_value)
 
@@ -152,7 +215,7 @@ class WireGuardProtocol(DatagramProtocol):
                 f"No canarydrop found for public key {public_key.decode()}. Expected when the Canarytoken was deleted but not removed from the map, so it is being removed now."
             )
             queries.wireguard_keymap_del(public_key)
-            return
+            return None
 
         src_host = src[0]
         src_data = {
@@ -173,7 +236,7 @@ class WireGuardProtocol(DatagramProtocol):
         canarydrop.add_canarydrop_hit(token_hit=token_hit)
         log.debug(f"wireguard token hit: {token_hit}")
 
-        self.channel.dispatch(canarydrop=canarydrop, token_hit=token_hit)
+        return canarydrop, token_hit
 
 
 class ChannelWireGuard(InputChannel):
@@ -5,6 +5,7 @@ Output channel that sends emails. Relies on Sendgrid to actually send mails.
 from pathlib import Path
 from textwrap import dedent
 import textwrap
+import threading
 from typing import Optional, Union
 import sys
 
@@ -26,10 +27,11 @@ from python_http_client.exceptions import HTTPError
 from sendgrid.helpers.mail import Content, From, Mail, MailSettings, SandBoxMode, To
 from twisted.logger import Logger
 
-from canarytokens import queries
+from canarytokens import metrics, queries
 from canarytokens.canarydrop import Canarydrop
 from canarytokens.channel import InputChannel, OutputChannel
 from canarytokens.constants import OUTPUT_CHANNEL_EMAIL, MAILGUN_IGNORE_ERRORS
+from canarytokens.exceptions import AlertDeliveryError
 from canarytokens.models import (
     AnyTokenHit,
     AnyTokenExposedHit,
@@ -69,6 +71,37 @@ class EmailTemplates(StrEnum):
     NOTIFICATION_TXT = "emails/notification.txt"
 
 
+_templates: dict[tuple[Path, bool], tuple[int, Template]] = {}
+_templates_lock = threading.Lock()
+
+
+def get_email_template(template_path: Path, trim_blocks: bool = False) -> Template:
+    """
+    Returns the compiled template at `template_path`. Templates are compiled
+    once per process and again only when the file's mtime changes.
+
+    HTML templates are minified before they're compiled, so what they render
+    doesn't need minifying. Closing tags are kept as the minifier can only
+    leave them out when it knows what comes next, which it doesn't here.
+    """
+    mtime = template_path.stat().st_mtime_ns
+    key = (template_path, trim_blocks)
+    with _templates_lock:
+        cached = _templates.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    source = template_path.read_text()
+    if template_path.suffix == ".html":
+        source = minify_html.minify(
+            source, keep_closing_tags=True, preserve_brace_template_syntax=True
+        )
+    template = Template(source, trim_blocks=trim_blocks)
+    with _templates_lock:
+        _templates[key] = (mtime, template)
+    return template
+
+
 class EmailResponse(object):
     def __init__(
         self,
@@ -77,12 +110,14 @@ class EmailResponse(object):
         message_id: str,
         alert_details: Union[TokenAlertDetails, TokenExposedDetails],
         max_alert_failures: int,
+        retry: bool = False,
     ):
         self.status = status
         self.canarydrop = canarydrop
         self.message_id = message_id
         self.alert_details = alert_details
         self.max_alert_failures = max_alert_failures
+        self.retry = retry
 
     def handle(self):
         method_name = f"handle_{self.status.value}"
@@ -112,6 +147,10 @@ class EmailResponse(object):
         self.canarydrop.clear_alert_failures()
 
     def handle_error(self):
+        # An alert's failure is only counted once, however often it's retried.
+        if self.retry:
+            log.error(f"Failed to resend email for token {self.alert_details.token}.")
+            return
         self.canarydrop.record_alert_failure()
         if self.canarydrop.alert_failure_count > self.max_alert_failures:
             log.info(
@@ -272,47 +311,66 @@ def send_email(
     from_email: EmailStr,
     from_display: str,
 ) -> tuple[Optional[EmailResponseStatuses], Optional[str]]:
-    if switchboard_settings.MAILGUN_API_KEY:
-        email_response_status, message_id = mailgun_send(
-            email_address=email_recipient,
-            email_subject=email_subject,
-            email_content_html=email_content_html,
-            email_content_text=email_content_text,
-            from_email=EmailStr(from_email),
-            from_display=from_display,
-            api_key=switchboard_settings.MAILGUN_API_KEY,
-            base_url=switchboard_settings.MAILGUN_BASE_URL,
-            mailgun_domain=switchboard_settings.MAILGUN_DOMAIN_NAME,
-        )
-    elif switchboard_settings.SENDGRID_API_KEY:
-        email_response_status, message_id = sendgrid_send(
-            api_key=switchboard_settings.SENDGRID_API_KEY,
-            email_address=email_recipient,
-            email_content_html=email_content_html,
-            from_email=EmailStr(from_email),
-            email_subject=email_subject,
-            from_display=from_display,
-            sandbox_mode=False,
-        )
-    elif switchboard_settings.SMTP_SERVER:
-        email_response_status, message_id = smtp_send(
-            email_address=email_recipient,
-            email_content_html=email_content_html,
-            email_content_text=email_content_text,
-            email_subject=email_subject,
-            from_email=EmailStr(from_email),
-            from_display=from_display,
-            smtp_password=switchboard_settings.SMTP_PASSWORD,
-            smtp_username=switchboard_settings.SMTP_USERNAME,
-            smtp_server=switchboard_settings.SMTP_SERVER,
-            smtp_port=switchboard_settings.SMTP_PORT,
-        )
-    else:
+    provider = get_email_provider(switchboard_settings)
+    if provider is None:
         log.error("No email settings found")
-        email_response_status, message_id = None, None
+        return None, None
+
+    with metrics.time_alert_send(OUTPUT_CHANNEL_EMAIL, provider):
+        if provider == "mailgun":
+            email_response_status, message_id = mailgun_send(
+                email_address=email_recipient,
+                email_subject=email_subject,
+                email_content_html=email_content_html,
+                email_content_text=email_content_text,
+                from_email=EmailStr(from_email),
+                from_display=from_display,
+                api_key=switchboard_settings.MAILGUN_API_KEY,
+                base_url=switchboard_settings.MAILGUN_BASE_URL,
+                mailgun_domain=switchboard_settings.MAILGUN_DOMAIN_NAME,
+            )
+        elif provider == "sendgrid":
+            email_response_status, message_id = sendgrid_send(
+                api_key=switchboard_settings.SENDGRID_API_KEY,
+                email_address=email_recipient,
+                email_content_html=email_content_html,
+                from_email=EmailStr(from_email),
+                email_subject=email_subject,
+                from_display=from_display,
+                sandbox_mode=False,
+            )
+        else:
+            email_response_status, message_id = smtp_send(
+                email_address=email_recipient,
+                email_content_html=email_content_html,
+                email_content_text=email_content_text,
+                email_subject=email_subject,
+                from_email=EmailStr(from_email),
+                from_display=from_display,
+                smtp_password=switchboard_settings.SMTP_PASSWORD,
+                smtp_username=switchboard_settings.SMTP_USERNAME,
+                smtp_server=switchboard_settings.SMTP_SERVER,
+                smtp_port=switchboard_settings.SMTP_PORT,
+            )
+    if email_response_status == EmailResponseStatuses.ERROR:
+        metrics.ALERT_SEND_FAILURES.inc(
+            output_channel=OUTPUT_CHANNEL_EMAIL, provider=provider
+        )
     return email_response_status, message_id
 
 
+def get_email_provider(switchboard_settings: SwitchboardSettings) -> Optional[str]:
+    """Returns the provider `send_email` sends with, or None if no provider
+    is configured."""
+    if switchboard_settings.MAILGUN_API_KEY:
+        return "mailgun"
+    if switchboard_settings.SENDGRID_API_KEY:
+        return "sendgrid"
+    if switchboard_settings.SMTP_SERVER:
+        return "smtp"
+    return None
+
+
 class EmailOutputChannel(OutputChannel):
     CHANNEL = OUTPUT_CHANNEL_EMAIL
 
@@ -326,10 +384,7 @@ class EmailOutputChannel(OutputChannel):
         switchboard_settings: SwitchboardSettings,
         name: Optional[str] = None,
     ):
-        self.switchboard_settings = switchboard_settings
-        self.from_email = switchboard_settings.ALERT_EMAIL_FROM_ADDRESS
-        self.from_display = switchboard_settings.ALERT_EMAIL_FROM_DISPLAY
-        self.email_subject = switchboard_settings.ALERT_EMAIL_SUBJECT
+        self.settings_reloaded(switchboard_settings)
         super().__init__(
             switchboard,
             switchboard_scheme=switchboard_settings.SWITCHBOARD_SCHEME,
@@ -337,6 +392,12 @@ class EmailOutputChannel(OutputChannel):
             name=name,
         )
 
+    def settings_reloaded(self, switchboard_settings: SwitchboardSettings) -> None:
+        self.switchboard_settings = switchboard_settings
+        self.from_email = switchboard_settings.ALERT_EMAIL_FROM_ADDRESS
+        self.from_display = switchboard_settings.ALERT_EMAIL_FROM_DISPLAY
+        self.email_subject = switchboard_settings.ALERT_EMAIL_SUBJECT
+
     @staticmethod
     def format_token_exposed_html(
         details: TokenExposedDetails,
@@ -353,12 +414,11 @@ class EmailOutputChannel(OutputChannel):
         BasicDetails["time_ymd"] = details.time_ymd
         BasicDetails["time_hm"] = details.time_hm
 
-        rendered_html = Template(template_path.read_text()).render(
+        return get_email_template(template_path).render(
             BasicDetails=BasicDetails,
             ManageLink=details.manage_url,
             HistoryLink=details.history_url,
         )
-        return minify_html.minify(rendered_html)
 
     @staticmethod
     def extract_basic_details(details: TokenAlertDetails) -> dict:
@@ -425,16 +485,13 @@ class EmailOutputChannel(OutputChannel):
         """
 
         BasicDetails = EmailOutputChannel.extract_basic_details(details)
-        rendered_text = Template(template_path.open().read(), trim_blocks=True).render(
+        return get_email_template(template_path, trim_blocks=True).render(
             Title=EmailOutputChannel.DESCRIPTION,
             Intro=EmailOutputChannel.format_report_intro(details),
             BasicDetails=BasicDetails,
             ManageLink=details.manage_url,
             HistoryLink=details.history_url,
         )
-        if template_path.suffix == ".html":
-            return minify_html.minify(rendered_text)
-        return rendered_text
 
     @staticmethod
     def format_token_exposed_text(details: TokenExposedDetails):
@@ -508,6 +565,7 @@ class EmailOutputChannel(OutputChannel):
         input_channel: InputChannel,
         canarydrop: Canarydrop,
         token_hit: Union[AnyTokenHit, AnyTokenExposedHit],
+        retry: bool = False,
     ):
         if isinstance(token_hit, TokenExposedHit):
             details = TokenExposedDetails(
@@ -527,6 +585,7 @@ class EmailOutputChannel(OutputChannel):
                 canarydrop=canarydrop,
                 host=self.switchboard_settings.PUBLIC_DOMAIN,
                 protocol=self.switchboard_scheme,
+                token_hit=token_hit,
             )
 
         queries.add_mail_to_send_status(
@@ -578,8 +637,18 @@ class EmailOutputChannel(OutputChannel):
                 message_id=message_id,
                 alert_details=details,
                 max_alert_failures=self.switchboard_settings.MAX_ALERT_FAILURES,
+                retry=retry,
             )
         )
+        if (
+            email_response_status == EmailResponseStatuses.ERROR
+            and canarydrop.alert_email_enabled
+            and self.switchboard.alert_outbox is not None
+        ):
+            # Have the outbox retry it later.
+            raise AlertDeliveryError(
+                f"Failed sending alert for {canarydrop.canarytoken.value()} to email"
+            )
         return details
 
     def handle_email_response(self, email_response: EmailResponse):
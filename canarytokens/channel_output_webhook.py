@@ -2,16 +2,21 @@
 Output channel that sends to webhooks.
 """
 
-from typing import Dict, Union
-
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Iterator, Optional, Union
+from urllib.parse import urlparse
 
 import requests
 from pydantic import HttpUrl
 from twisted.logger import Logger
-from canarytokens import advocate
+from canarytokens import advocate, metrics
 from canarytokens import canarydrop
 from canarytokens.channel import InputChannel, OutputChannel
 from canarytokens.constants import OUTPUT_CHANNEL_WEBHOOK
+from canarytokens.exceptions import AlertDeliveryError
 from canarytokens.models import (
     AnyTokenHit,
     AnyTokenExposedHit,
@@ -28,16 +33,91 @@ log = Logger()
 # private/reserved IP ranges.  Tests import this directly so that any
 # accidental relaxation of the config is immediately caught.
 WEBHOOK_ADDR_VALIDATOR = advocate.AddrValidator(port_whitelist=set(range(0, 65535)))
+# Seconds to wait for one of a host's connections to free up.
+WEBHOOK_HOST_WAIT = 10
+
+
+class WebhookSessions:
+    """
+    Keep-alive advocate sessions, one per webhook destination, so alerts to
+    popular hosts reuse connections instead of resolving, validating and
+    handshaking every time. Addresses are still validated (with
+    `WEBHOOK_ADDR_VALIDATOR` by default) whenever a new connection is opened.
+
+    At most `max_per_host` requests are made to a host at once and sessions
+    for the least recently used hosts are dropped beyond `max_hosts`.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int,
+        max_hosts: int = 256,
+        validator: advocate.AddrValidator = WEBHOOK_ADDR_VALIDATOR,
+    ) -> None:
+        self.max_per_host = max_per_host
+        self.max_hosts = max_hosts
+        self.validator = validator
+        self._sessions: OrderedDict[
+            str, tuple[advocate.Session, threading.BoundedSemaphore]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, url: str) -> tuple[advocate.Session, threading.BoundedSemaphore]:
+        parsed = urlparse(url)
+        key = f"{parsed.scheme}://{parsed.netloc}".lower()
+        with self._lock:
+            if key in self._sessions:
+                self._sessions.move_to_end(key)
+                return self._sessions[key]
+            session = advocate.Session(
+                validator=self.validator,
+                _adapter_kwargs={
+                    "pool_connections": 1,
+                    "pool_maxsize": self.max_per_host,
+                },
+            )
+            # Sessions are shared by every drop alerting this host, don't
+            # let one webhook's cookies leak into another's requests.
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            self._sessions[key] = (
+                session,
+                threading.BoundedSemaphore(self.max_per_host),
+            )
+            while len(self._sessions) > self.max_hosts:
+                # Its connections are closed once it is garbage collected.
+                self._sessions.popitem(last=False)
+            return self._sessions[key]
+
+    @contextmanager
+    def session_for(self, url: str) -> Iterator[Optional[advocate.Session]]:
+        """Yields the session for `url`'s host once one of its
+        `max_per_host` slots is free, or `None` if none freed up in time."""
+        session, slots = self._get(url)
+        if not slots.acquire(timeout=WEBHOOK_HOST_WAIT):
+            yield None
+            return
+        try:
+            yield session
+        finally:
+            slots.release()
 
 
 class WebhookOutputChannel(OutputChannel):
     CHANNEL = OUTPUT_CHANNEL_WEBHOOK
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        settings = self.switchboard.switchboard_settings
+        self.webhook_sessions = WebhookSessions(
+            max_per_host=settings.WEBHOOK_MAX_CONNECTIONS_PER_HOST if settings else 10
+        )
+
     def do_send_alert(
         self,
         input_channel: InputChannel,
         canarydrop: canarydrop.Canarydrop,
         token_hit: Union[AnyTokenHit, AnyTokenExposedHit],
+        retry: bool = False,
     ) -> None:
         # TODO we should format using the hit directly,
         #      we use the drop to get the latest when we already have it
@@ -67,21 +147,38 @@ class WebhookOutputChannel(OutputChannel):
                 canarydrop=canarydrop,
                 protocol=self.switchboard_scheme,
                 host=self.hostname,
+                token_hit=token_hit,
             )
 
         webhook_type = get_webhook_type(url)
         payload = format_details_for_webhook(webhook_type, details)
 
-        success = self.generic_webhook_send(
-            payload=payload.json_safe_dict(),
-            alert_webhook_url=canarydrop.alert_webhook_url,
-        )
+        try:
+            with metrics.time_alert_send(OUTPUT_CHANNEL_WEBHOOK, webhook_type):
+                success = self.generic_webhook_send(
+                    payload=payload.json_safe_dict(),
+                    alert_webhook_url=canarydrop.alert_webhook_url,
+                )
+        except AlertDeliveryError as e:
+            if self.switchboard.alert_outbox is not None:
+                # Have the outbox retry it later.
+                raise
+            # Nothing retries it without the outbox, it's counted as a failed
+            # send by `time_alert_send`.
+            log.error(f"Dropped alert for token {canarydrop.canarytoken.value()}: {e}")
+            return
         if success:
             canarydrop.clear_alert_failures()
         else:
-            canarydrop.record_alert_failure()
+            metrics.ALERT_SEND_FAILURES.inc(
+                output_channel=OUTPUT_CHANNEL_WEBHOOK, provider=webhook_type
+            )
+            # An alert's failure is only counted once, however often it's retried.
+            if not retry:
+                canarydrop.record_alert_failure()
             if (
-                canarydrop.alert_failure_count
+                not retry
+                and canarydrop.alert_failure_count
                 > self.switchboard.switchboard_settings.MAX_ALERT_FAILURES
             ):
                 log.info(
@@ -89,20 +186,31 @@ class WebhookOutputChannel(OutputChannel):
                 )
                 canarydrop.disable_alert_webhook()
                 canarydrop.clear_alert_failures()
+            elif self.switchboard.alert_outbox is not None:
+                # Have the outbox retry it later.
+                raise AlertDeliveryError(
+                    f"Failed sending alert for {canarydrop.canarytoken.value()} to webhook"
+                )
 
     def generic_webhook_send(
         self,
         payload: Dict[str, str],
         alert_webhook_url: HttpUrl,
     ) -> bool:
-        # Design: wrap in a retry?
+        # Failed sends are retried by the alert outbox, see `do_send_alert`.
         try:
-            response = advocate.post(
-                url=str(alert_webhook_url),
-                json=payload,
-                timeout=(2, 2),
-                validator=WEBHOOK_ADDR_VALIDATOR,
-            )
+            with self.webhook_sessions.session_for(str(alert_webhook_url)) as session:
+                if session is None:
+                    # Busy on our end, this isn't the webhook failing so it
+                    # mustn't count towards disabling it.
+                    raise AlertDeliveryError(
+                        f"Too many requests in flight to webhook {alert_webhook_url}."
+                    )
+                response = session.post(
+                    url=str(alert_webhook_url),
+                    json=payload,
+                    timeout=(2, 2),
+                )
             response.raise_for_status()
             log.info(f"Successfully sent to {alert_webhook_url}")
             return True
@@ -3,7 +3,7 @@ import botocore
 import socket
 import json
 
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 from canarytokens.models import Canarytoken
 from dataclasses import dataclass
 from typing import Optional, Tuple, Literal, Union
@@ -16,7 +16,7 @@ else:
 from pydantic import BaseModel
 
 
-frontend_settings = FrontendSettings()
+frontend_settings = get_frontend_settings()
 
 
 _CACHED_LAMBDA_CLIENT = None
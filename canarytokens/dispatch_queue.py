@@ -0,0 +1,220 @@
+"""
+Bounded queue of hits waiting for `Switchboard.dispatch`.
+
+Input channels record hits on the reactor thread and hand them to the
+switchboard to alert on. When the switchboard has a `DispatchQueue`, hits are
+queued here and dispatched by a fixed pool of worker threads rather than each
+getting a thread from the reactor's unbounded threadpool, so a flood of hits
+can't grow the backlog (and the wait for every other token's alerts) without
+limit.
+
+Hits are already saved by the time they're queued, only their alerts are shed:
+- While a hit for a token is queued, further hits for it are coalesced into
+  that entry, which alerts for the first of them.
+- Hits for a token dispatched less than `duplicate_window` seconds ago are
+  dropped.
+- When the queue is full, either the oldest queued hit or the new hit is
+  dropped, depending on the `shed_policy`.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Literal, Optional, Union
+
+from twisted.internet import reactor
+from twisted.logger import Logger
+
+from canarytokens import metrics
+from canarytokens.models import AnyTokenExposedHit, AnyTokenHit
+
+if TYPE_CHECKING:
+    from canarytokens.canarydrop import Canarydrop
+    from canarytokens.channel import InputChannel
+    from canarytokens.switchboard import Switchboard
+
+log = Logger()
+
+ShedPolicy = Literal["drop-oldest", "drop-newest"]
+
+
+class _QueuedHit:
+    __slots__ = ("input_channel", "canarydrop", "token_hit", "queued_at", "coalesced")
+
+    def __init__(
+        self,
+        input_channel: InputChannel,
+        canarydrop: Canarydrop,
+        token_hit: Union[AnyTokenHit, AnyTokenExposedHit],
+    ) -> None:
+        self.input_channel = input_channel
+        self.canarydrop = canarydrop
+        self.token_hit = token_hit
+        self.queued_at = time.monotonic()
+        self.coalesced = 0
+
+
+class DispatchQueue:
+    def __init__(
+        self,
+        switchboard: Switchboard,
+        workers: int,
+        max_size: int,
+        shed_policy: ShedPolicy = "drop-oldest",
+        coalesce: bool = True,
+        duplicate_window: float = 0,
+    ) -> None:
+        self.switchboard = switchboard
+        self.workers = workers
+        self.max_size = max_size
+        self.shed_policy = shed_policy
+        self.coalesce = coalesce
+        self.duplicate_window = duplicate_window
+        self._queue: deque[_QueuedHit] = deque()
+        # Queued entry and time of the last dispatch, by token
+        self._queued: dict[str, _QueuedHit] = {}
+        self._last_dispatched: dict[str, float] = {}
+        self._lock = threading.Condition()
+        self._stopping = False
+        self._threads: list[threading.Thread] = []
+        self.dispatched = 0
+        self.coalesced = 0
+        self.shed_full = 0
+        self.shed_duplicate = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def put(
+        self,
+        input_channel: InputChannel,
+        canarydrop: Canarydrop,
+        token_hit: Union[AnyTokenHit, AnyTokenExposedHit],
+    ) -> bool:
+        """Queues `token_hit` to be dispatched.
+
+        Returns:
+            bool: False if the hit was shed instead.
+        """
+        token = canarydrop.canarytoken.value()
+        with self._lock:
+            if self.coalesce and token in self._queued:
+                self._queued[token].coalesced += 1
+                self.coalesced += 1
+                return True
+
+            last_dispatched = self._last_dispatched.get(token)
+            if (
+                last_dispatched is not None
+                and time.monotonic() - last_dispatched < self.duplicate_window
+            ):
+                self.shed_duplicate += 1
+                metrics.DISPATCH_QUEUE_SHED.inc(reason="duplicate")
+                return False
+
+            if len(self._queue) >= self.max_size:
+                self.shed_full += 1
+                metrics.DISPATCH_QUEUE_SHED.inc(reason="full")
+                if self.shed_full % 1000 == 1:
+                    log.warn(
+                        "Dispatch queue is full, shed {shed} hits so far",
+                        shed=self.shed_full,
+                    )
+                if self.shed_policy == "drop-newest":
+                    return False
+                self._forget(self._queue.popleft())
+
+            entry = _QueuedHit(input_channel, canarydrop, token_hit)
+            self._queue.append(entry)
+            if self.coalesce:
+                self._queued[token] = entry
+            self._lock.notify()
+        return True
+
+    def _forget(self, entry: _QueuedHit) -> None:
+        token = entry.canarydrop.canarytoken.value()
+        if self._queued.get(token) is entry:
+            del self._queued[token]
+
+    def get(self, timeout: Optional[float] = None) -> Optional[_QueuedHit]:
+        """Takes the oldest queued hit, waiting up to `timeout` seconds for
+        one. Returns None if there's none or the queue is stopping."""
+        with self._lock:
+            if not self._queue and not self._stopping:
+                self._lock.wait(timeout)
+            if not self._queue or self._stopping:
+                return None
+            entry = self._queue.popleft()
+            self._forget(entry)
+            now = time.monotonic()
+            wait_time = now - entry.queued_at
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+            metrics.DISPATCH_QUEUE_WAIT_SECONDS.observe(wait_time)
+            self.dispatched += 1
+            if self.duplicate_window > 0:
+                self._set_last_dispatched(entry.canarydrop.canarytoken.value(), now)
+        return entry
+
+    def _set_last_dispatched(self, token: str, now: float) -> None:
+        # Kept in dispatch order, so expired tokens are at the start.
+        self._last_dispatched.pop(token, None)
+        self._last_dispatched[token] = now
+        while self._last_dispatched:
+            oldest = next(iter(self._last_dispatched))
+            if now - self._last_dispatched[oldest] < self.duplicate_window:
+                break
+            del self._last_dispatched[oldest]
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        with self._lock:
+            return {
+                "depth": len(self._queue),
+                "dispatched": self.dispatched,
+                "coalesced": self.coalesced,
+                "shed_full": self.shed_full,
+                "shed_duplicate": self.shed_duplicate,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max,
+            }
+
+    def start(self) -> None:
+        """Starts the dispatch workers and stops them on shutdown."""
+        for n in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, name=f"dispatch-worker-{n}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        reactor.addSystemEventTrigger("during", "shutdown", self.stop)
+        metrics.REGISTRY.add_collector(self._collect_metrics)
+        log.info(f"Started {self.workers} dispatch workers")
+
+    def stop(self) -> None:
+        metrics.REGISTRY.remove_collector(self._collect_metrics)
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _collect_metrics(self) -> None:
+        metrics.DISPATCH_QUEUE_DEPTH.set(len(self._queue))
+
+    def _run(self) -> None:
+        while not self._stopping:
+            entry = self.get(timeout=1)
+            if entry is not None:
+                self.dispatch(entry)
+
+    def dispatch(self, entry: _QueuedHit) -> None:
+        try:
+            info = self.switchboard.dispatch(
+                canarydrop=entry.canarydrop, token_hit=entry.token_hit
+            )
+        except Exception as e:
+            entry.input_channel.dispatch_errored(e)
+        else:
+            entry.input_channel.dispatch_success(info)
@@ -59,3 +59,28 @@ class CanarytokenTypeNotEnabled(Exception):
     """
 
     pass
+
+
+class AlertDeliveryError(Exception):
+    """
+    Exception raised when an output channel fails to send an alert that
+    should be retried.
+    """
+
+    pass
+
+
+class InvalidPEFile(Exception):
+    """
+    Exception raised when a binary to sign isn't a PE file (exe, dll).
+    """
+
+    pass
+
+
+class SigningPoolBusy(Exception):
+    """
+    Exception raised when too many binaries are waiting to be signed.
+    """
+
+    pass
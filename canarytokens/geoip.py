@@ -0,0 +1,184 @@
+"""
+GeoIP enrichment for token hits.
+
+`queries.get_geoinfo` looks IPs up in the `geo_ip_cache:` Redis keys and falls
+back to ipinfo.io, which is a blocking network call. This module puts an
+in-process LRU in front of that and, when `GEOIP_MMDB_PATH` points at a MaxMind
+City database, answers lookups from the local database so hits never have to
+wait on the network.
+
+`get_local_geoinfo` only consults memory and the local database and is cheap
+enough to call on the reactor thread. `get_geoinfo` does the full lookup and
+must be run off it (see `async_queries.get_geoinfo`).
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from twisted.logger import Logger
+
+from canarytokens import metrics, queries
+
+try:
+    import maxminddb
+
+    HAVE_MAXMINDDB = True
+except ImportError:
+    maxminddb = None
+    HAVE_MAXMINDDB = False
+
+log = Logger()
+
+# Entries are kept for at most this long so we don't hold on to geo info
+# much longer than the Redis cache (1 day) does.
+CACHE_TTL = 60 * 60
+
+
+class GeoIPCache:
+    """A thread safe LRU of IP -> geo info with a per entry TTL."""
+
+    def __init__(self, max_size: int, ttl: float = CACHE_TTL) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, ip: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(ip)
+            if entry is None:
+                return None
+            expires_at, geo_info = entry
+            if expires_at < time.monotonic():
+                del self._entries[ip]
+                return None
+            self._entries.move_to_end(ip)
+            return geo_info
+
+    def set(self, ip: str, geo_info: dict) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[ip] = (time.monotonic() + self.ttl, geo_info)
+            self._entries.move_to_end(ip)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = GeoIPCache(max_size=10000)
+_mmdb_reader: Optional[Any] = None
+
+
+def configure(cache_size: int, mmdb_path: Optional[str] = None) -> None:
+    """Sizes the in-process cache and opens the offline database, if any.
+
+    Args:
+        cache_size (int): Maximum number of IPs to keep in memory.
+        mmdb_path (Optional[str]): Path to a MaxMind City `.mmdb` database.
+    """
+    global _cache, _mmdb_reader
+    _cache = GeoIPCache(max_size=cache_size)
+    if _mmdb_reader is not None:
+        _mmdb_reader.close()
+        _mmdb_reader = None
+    if not mmdb_path:
+        return
+    if not HAVE_MAXMINDDB:
+        log.error(
+            f"GeoIP database {mmdb_path} configured but the maxminddb module is not importable"
+        )
+        return
+    _mmdb_reader = maxminddb.open_database(mmdb_path)
+    log.info(f"Using GeoIP database {mmdb_path}")
+
+
+def clear_cache() -> None:
+    _cache.clear()
+
+
+def geoinfo_from_mmdb_record(ip: str, record: dict) -> Optional[dict]:
+    """Converts a MaxMind City record to the ipinfo.io shape `GeoIPInfo`
+    expects. Returns `None` if the record has no location.
+    """
+    location = record.get("location") or {}
+    if "latitude" not in location or "longitude" not in location:
+        return None
+    geo_info = {
+        "ip": ip,
+        "loc": f"{location['latitude']},{location['longitude']}",
+        "timezone": location.get("time_zone"),
+        "city": record.get("city", {}).get("names", {}).get("en"),
+        "country": record.get("country", {}).get("iso_code"),
+        "postal": record.get("postal", {}).get("code"),
+    }
+    subdivisions = record.get("subdivisions") or []
+    if subdivisions:
+        geo_info["region"] = subdivisions[0].get("names", {}).get("en")
+    return {k: v for k, v in geo_info.items() if v is not None}
+
+
+def _lookup_mmdb(ip: str) -> Optional[dict]:
+    if _mmdb_reader is None:
+        return None
+    try:
+        record = _mmdb_reader.get(ip)
+    except ValueError:
+        return None
+    if not record:
+        return None
+    return geoinfo_from_mmdb_record(ip, record)
+
+
+def get_local_geoinfo(ip: str) -> Optional[dict]:
+    """
+    Returns geo info for `ip` from the in-process cache or the offline
+    database, or `None` if neither knows about it. Never touches the network.
+    """
+    geo_info = _cache.get(ip)
+    if geo_info is not None:
+        metrics.GEOIP_LOOKUPS.inc(source="cache")
+        return geo_info
+    geo_info = _lookup_mmdb(ip)
+    if geo_info is not None:
+        metrics.GEOIP_LOOKUPS.inc(source="mmdb")
+        _cache.set(ip, geo_info)
+    return geo_info
+
+
+def get_geoinfo(ip: str):
+    """
+    Same as `queries.get_geoinfo` but checks the in-process cache and the
+    offline database first. This may block on Redis and ipinfo.io.
+    """
+    try:
+        ipaddress.ip_address(ip)
+    except ValueError:
+        return queries.get_geoinfo(ip)
+
+    geo_info = get_local_geoinfo(ip)
+    if geo_info is not None:
+        return geo_info
+    metrics.GEOIP_LOOKUPS.inc(source="remote")
+    geo_info = queries.get_geoinfo(ip)
+    if isinstance(geo_info, dict):
+        _cache.set(ip, geo_info)
+    return geo_info
+
+
+def _collect_metrics() -> None:
+    metrics.GEOIP_CACHE_ENTRIES.set(len(_cache))
+
+
+metrics.REGISTRY.add_collector(_collect_metrics)
@@ -2,13 +2,19 @@ import base64
 import copy
 import random
 import textwrap
+import threading
+import time
 import uuid
 from collections import OrderedDict
-from typing import Tuple
+from typing import Optional, Tuple
 
 import yaml
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from twisted.internet import defer
 from twisted.logger import Logger
 
+from canarytokens import async_queries, metrics, queries
 from canarytokens.channel_input_mtls import mTLS
 from canarytokens.queries import get_certificate, get_kc_endpoint
 
@@ -47,6 +53,148 @@ ServerCert = "kubeconfig_server_cert"
 log = Logger()
 
 
+def generate_private_key() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=4096)
+
+
+class KeyPool:
+    """
+    Pool of client certificate keys generated ahead of time, so issuing a
+    kubeconfig only needs a signature. Generating a 4096 bit RSA key takes
+    anything up to seconds.
+
+    The keys are kept in Redis, shared by all frontend workers. A background
+    thread tops the pool up to `size` keys whenever it drops below
+    `low_water` keys.
+    """
+
+    def __init__(self, size: int, low_water: int, check_interval: float = 60):
+        self.size = size
+        self.low_water = low_water
+        self.check_interval = check_interval
+        self.keys_generated = 0
+        self.generating_seconds = 0.0
+        self.misses = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def take(self) -> rsa.RSAPrivateKey:
+        """Returns a key from the pool, or a new one if the pool is empty."""
+        key_pem = queries.pop_kubeconfig_key()
+        self._wakeup.set()
+        if key_pem is None:
+            self.misses += 1
+            log.warn("Kubeconfig key pool is empty, generating a key inline")
+            return generate_private_key()
+        return serialization.load_pem_private_key(key_pem, password=None)
+
+    def refill(self) -> int:
+        """Tops the pool up to `size` keys if it's below its low water mark.
+
+        Returns:
+            int: the number of keys added.
+        """
+        depth = queries.get_kubeconfig_key_pool_depth()
+        if depth >= self.low_water:
+            return 0
+
+        added = 0
+        while depth < self.size and not self._stopping.is_set():
+            start = time.monotonic()
+            key = generate_private_key()
+            self.generating_seconds += time.monotonic() - start
+            depth = queries.add_kubeconfig_key(
+                key.private_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PrivateFormat.TraditionalOpenSSL,
+                    encryption_algorithm=serialization.NoEncryption(),
+                )
+            )
+            added += 1
+        self.keys_generated += added
+        return added
+
+    def stats(self) -> dict[str, float]:
+        """Returns the pool's depth, how many keys this process has generated
+        for it and at what rate, and how often it was found empty."""
+        return {
+            "depth": queries.get_kubeconfig_key_pool_depth(),
+            "keys_generated": self.keys_generated,
+            "refill_rate": (
+                self.keys_generated / self.generating_seconds
+                if self.generating_seconds
+                else 0.0
+            ),
+            "misses": self.misses,
+        }
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="kubeconfig-key-pool", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                if self.refill():
+                    stats = self.stats()
+                    log.info(
+                        "Refilled kubeconfig key pool: {depth} keys, {keys_generated} generated at {refill_rate:.2f} keys/s, empty {misses} times",
+                        **stats,
+                    )
+            except Exception:
+                log.failure("Failed to refill the kubeconfig key pool")
+            self._wakeup.wait(self.check_interval)
+            self._wakeup.clear()
+
+
+_key_pool: Optional[KeyPool] = None
+
+
+def start_key_pool(size: int, low_water: int) -> KeyPool:
+    """Starts the pool that `get_kubeconfig` takes client keys from. Until
+    it's started keys are generated as kubeconfigs are issued."""
+    global _key_pool
+    if _key_pool is None:
+        _key_pool = KeyPool(size=size, low_water=low_water)
+        _key_pool.start()
+    return _key_pool
+
+
+def stop_key_pool() -> None:
+    global _key_pool
+    if _key_pool is None:
+        return
+    _key_pool.stop()
+    _key_pool = None
+
+
+def update_key_pool_depth_metric() -> defer.Deferred:
+    """Sets the key pool's depth gauge. The frontend fills the pool but only
+    the switchboard serves metrics, so the switchboard reads it from Redis.
+    `KeyPool.stats()` counts for a single frontend worker, they're logged."""
+    d = async_queries.run_query(queries.get_kubeconfig_key_pool_depth)
+    d.addCallback(metrics.KUBECONFIG_KEY_POOL_DEPTH.set)
+    d.addErrback(
+        lambda failure: log.failure(
+            "Failed to read the kubeconfig key pool depth", failure
+        )
+    )
+    return d
+
+
 class KubeConfig:
     def __init__(
         self,
@@ -111,6 +259,7 @@ class KubeConfig:
             ca_redis_key=self.client_ca_redis_key,
             username=username,
             ip=self.server_endpoint_ip,
+            client_key=_key_pool.take() if _key_pool is not None else None,
         )
         server_ca = get_certificate(self.server_ca_redis_key)
         ca_data = server_ca.get("c")
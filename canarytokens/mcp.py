@@ -6,9 +6,9 @@ from os import urandom
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 from canarytokens.models.mcp import McpAlertOn
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 
 
 def _base64url(data: bytes) -> str:
@@ -0,0 +1,318 @@
+"""
+Switchboard metrics in the Prometheus text exposition format.
+
+Metrics are updated from the reactor and from worker threads, so every
+update takes the metric's lock. `MetricsResource` renders the registry when
+`/metrics` is scraped; values that are cheaper to read than to keep up to
+date (e.g. queue depths) are set by collectors registered with
+`add_collector`, which run just before rendering.
+
+`switchboard.tac` serves the resource on `METRICS_PORT`.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypeVar
+
+from twisted.logger import Logger
+from twisted.web import resource
+
+log = Logger()
+
+# Seconds, spanning a cached Redis hit to a slow email provider.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    TYPE = ""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, values: tuple[str, ...], **extra: str):
+        return tuple(zip(self.labelnames, values)) + tuple(extra.items())
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: count per bucket (the last is +Inf), and the sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes how long the `with` block took, even if it raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(self._label_values(labels))
+            return sum(entry[0]) if entry else 0
+
+    def _render_samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), total[0]))
+                for key, (counts, total) in self._values.items()
+            )
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self._labels(key, le=_format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self._labels(key))
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_M = TypeVar("_M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: _M) -> _M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Calls `collector` before every render, to set gauges from state
+        that's cheaper to read when scraped than to track."""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]) -> None:
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception:
+                log.failure("Metrics collector failed")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: tuple[str, ...] = (),
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+HITS = counter(
+    "canarytokens_hits_total",
+    "Token hits dispatched by the input channels.",
+    ("input_channel", "token_type"),
+)
+REDIS_QUERY_SECONDS = histogram(
+    "canarytokens_redis_query_seconds",
+    "Time taken by the Redis queries the input channels run, per query.",
+    ("query",),
+)
+GEOIP_LOOKUPS = counter(
+    "canarytokens_geoip_lookups_total",
+    "GeoIP lookups by where they were answered: the in-process cache, the "
+    "offline database, or Redis and ipinfo.io.",
+    ("source",),
+)
+GEOIP_CACHE_ENTRIES = gauge(
+    "canarytokens_geoip_cache_entries",
+    "IPs in the in-process GeoIP cache.",
+)
+DISPATCH_QUEUE_WAIT_SECONDS = histogram(
+    "canarytokens_dispatch_queue_wait_seconds",
+    "Time hits wait in the dispatch queue before a worker dispatches them.",
+)
+DISPATCH_QUEUE_DEPTH = gauge(
+    "canarytokens_dispatch_queue_depth",
+    "Hits waiting in the dispatch queue.",
+)
+DISPATCH_QUEUE_SHED = counter(
+    "canarytokens_dispatch_queue_shed_total",
+    "Hits whose alerts were shed by the dispatch queue, by reason.",
+    ("reason",),
+)
+ALERT_SEND_SECONDS = histogram(
+    "canarytokens_alert_send_seconds",
+    "Time taken to send an alert, per output channel and provider.",
+    ("output_channel", "provider"),
+)
+ALERT_SEND_FAILURES = counter(
+    "canarytokens_alert_send_failures_total",
+    "Alerts that failed to send, per output channel and provider.",
+    ("output_channel", "provider"),
+)
+KUBECONFIG_KEY_POOL_DEPTH = gauge(
+    "canarytokens_kubeconfig_key_pool_depth",
+    "Client keys left in the kubeconfig key pool that the frontend fills.",
+)
+WIREGUARD_DROPPED_HANDSHAKES = counter(
+    "canarytokens_wireguard_dropped_handshakes_total",
+    "WireGuard handshakes dropped because too many were waiting to be checked.",
+)
+
+
+@contextmanager
+def time_alert_send(output_channel: str, provider: str) -> Iterator[None]:
+    """Times sending an alert, counting it as failed if the block raises."""
+    try:
+        with ALERT_SEND_SECONDS.time(output_channel=output_channel, provider=provider):
+            yield
+    except Exception:
+        ALERT_SEND_FAILURES.inc(output_channel=output_channel, provider=provider)
+        raise
+
+
+class MetricsResource(resource.Resource):
+    isLeaf = True
+
+    def __init__(self, registry: Optional[Registry] = None) -> None:
+        super().__init__()
+        self.registry = registry or REGISTRY
+
+    def render_GET(self, request) -> bytes:
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4; charset=utf-8")
+        return self.registry.render().encode()
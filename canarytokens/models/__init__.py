@@ -131,6 +131,7 @@ from .common import (
     TokenAlertDetails,
     TokenExposedDetails,
     TokenExposedHit,
+    TokenHistory,
     TokenRequest,
     TokenTypes,
     User,
@@ -507,6 +508,7 @@ AnyTokenHistory = Annotated[
 class HistoryResponse(BaseModel):
     canarydrop: Dict
     history: AnyTokenHistory
+    total_hits: Optional[int] = None
     google_api_key: Optional[str] = None
 
 
@@ -472,6 +472,16 @@ class TokenHit(BaseModel):
             return None
         return value
 
+    def set_geo_info(self, geo_info: Any) -> None:
+        """Validates and sets `geo_info` on a hit that was recorded before
+        its source IP was looked up."""
+        value, errors = self.__fields__["geo_info"].validate(
+            geo_info, {}, loc="geo_info", cls=type(self)
+        )
+        if errors:
+            raise ValidationError([errors], type(self))
+        self.geo_info = value
+
     def get_additional_data_for_notification(self) -> Dict[str, Any]:
         additional_data = json_safe_dict(
             self,
@@ -540,39 +550,45 @@ class TokenHistory(GenericModel, Generic[TH]):
         """
         data = {}
         for hit in self.hits:
-            if hit.token_type in {
-                TokenTypes.AWS_KEYS,
-                TokenTypes.AWS_INFRA,
-                TokenTypes.SLACK_API,
-                TokenTypes.CREDIT_CARD_V2,
-                TokenTypes.CROWDSTRIKE_CC,
-            }:
-                hit_data = hit.serialize_for_v2()
-            else:
-                hit_data = json_safe_dict(hit, exclude=("token_type", "time_of_hit"))
-                if "additional_info" in hit_data:
-                    hit_data["additional_info"] = hit.additional_info.serialize_for_v2()
-
-            if not hit_data.get(
-                "additional_info", True
-            ):  # V2 does not store empty {} additional data.
-                hit_data.pop("additional_info")
-            if hit_data.get("geo_info", None) is None:
-                hit_data["geo_info"] = ""
-            if not hit_data.get("src_ip", None):
-                hit_data.pop("geo_info", None)
-            if not hit_data.get("src_ip", None):
-                hit_data.pop("is_tor_relay", None)
-            if readable_time_format:
-                data[
-                    datetime.fromtimestamp(hit.time_of_hit).strftime(
-                        "%Y-%m-%d %H:%M:%S.%f"
-                    )
-                ] = hit_data
-            else:
-                data[f"{hit.time_of_hit:.6f}"] = hit_data
+            data.update(self.serialize_hit_for_v2(hit, readable_time_format))
         return data
 
+    @staticmethod
+    def serialize_hit_for_v2(hit: TH, readable_time_format: bool = False) -> dict:
+        """Serialize a single hit into its `triggered_list` entry as
+        used by v2, keyed on the time of the hit.
+        """
+        if hit.token_type in {
+            TokenTypes.AWS_KEYS,
+            TokenTypes.AWS_INFRA,
+            TokenTypes.SLACK_API,
+            TokenTypes.CREDIT_CARD_V2,
+            TokenTypes.CROWDSTRIKE_CC,
+        }:
+            hit_data = hit.serialize_for_v2()
+        else:
+            hit_data = json_safe_dict(hit, exclude=("token_type", "time_of_hit"))
+            if "additional_info" in hit_data:
+                hit_data["additional_info"] = hit.additional_info.serialize_for_v2()
+
+        if not hit_data.get(
+            "additional_info", True
+        ):  # V2 does not store empty {} additional data.
+            hit_data.pop("additional_info")
+        if hit_data.get("geo_info", None) is None:
+            hit_data["geo_info"] = ""
+        if not hit_data.get("src_ip", None):
+            hit_data.pop("geo_info", None)
+        if not hit_data.get("src_ip", None):
+            hit_data.pop("is_tor_relay", None)
+        if readable_time_format:
+            return {
+                datetime.fromtimestamp(hit.time_of_hit).strftime(
+                    "%Y-%m-%d %H:%M:%S.%f"
+                ): hit_data
+            }
+        return {f"{hit.time_of_hit:.6f}": hit_data}
+
     def latest_hit(self) -> Optional[TH]:
         if len(self.hits) == 0:
             return None
@@ -661,9 +677,6 @@ class User(BaseModel):
     name: UserName
     email: Optional[EmailStr] = None
 
-    def can_send_alert(self, canarydrop):
-        return True
-
     def do_accounting(self, canarydrop):
         return
 
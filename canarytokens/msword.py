@@ -3,15 +3,15 @@ from __future__ import absolute_import
 import datetime
 import random
 from html import escape
-from io import BytesIO
 from pathlib import Path
 from typing import Optional
-from zipfile import ZipFile
 
 from canarytokens.ziplib import (
-    MODE_DIRECTORY,
+    OFFICE_CREATED_PLACEHOLDER,
+    OFFICE_MODIFIED_PLACEHOLDER,
+    OFFICE_URL_PLACEHOLDER,
     format_time_for_doc,
-    zipinfo_contents_replace,
+    get_office_template,
 )
 
 
@@ -39,10 +39,6 @@ def make_canary_msword(
     template: Path,
     text_snippet: Optional[str] = None,
 ) -> bytes:
-    with open(template, "rb") as f:
-        input_buf = BytesIO(f.read())
-    output_buf = BytesIO()
-    output_zip = ZipFile(output_buf, "w")
     now = datetime.datetime.now()
     now_ts = format_time_for_doc(now)
     created_ts = format_time_for_doc(
@@ -53,21 +49,19 @@ def make_canary_msword(
             seconds=random.randint(1, 60),
         )
     )
-    with ZipFile(input_buf, "r") as doc:
-        for entry in doc.filelist:
-            if entry.external_attr & MODE_DIRECTORY:
-                continue
-
-            contents = zipinfo_contents_replace(
-                zipfile=doc, zipinfo=entry, search="HONEYDROP_TOKEN_URL", replace=url
-            )
-            contents = contents.replace("aaaaaaaaaaaaaaaaaaaa", created_ts)
-            contents = contents.replace("bbbbbbbbbbbbbbbbbbbb", now_ts)
-            if entry.filename == "word/document.xml" and text_snippet:
-                contents = _add_plaintext_snippet(contents, text_snippet)
-            output_zip.writestr(entry, contents)
-    output_zip.close()
-    return output_buf.getvalue()
+    edits = {}
+    if text_snippet:
+        edits["word/document.xml"] = lambda xml: _add_plaintext_snippet(
+            xml, text_snippet
+        )
+    return get_office_template(template).render(
+        {
+            OFFICE_URL_PLACEHOLDER: url,
+            OFFICE_CREATED_PLACEHOLDER: created_ts,
+            OFFICE_MODIFIED_PLACEHOLDER: now_ts,
+        },
+        edits,
+    )
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -1,10 +1,9 @@
 import gzip
 import random
-import shutil
-import tempfile
+import threading
 from io import BytesIO
 from pathlib import Path
-from zipfile import ZipFile, ZipInfo
+from zipfile import ZipFile
 
 from canarytokens.ziplib import MODE_DIRECTORY
 
@@ -30,59 +29,69 @@ DUMP_HEADER = f"""-- MySQL dump 10.13  Distrib 8.0.26, for Linux (x86_64)
 """.encode()
 
 
-def zipinfo_contents(zipfile: ZipFile, zipinfo: ZipInfo) -> bytes:
-    """Given an entry in a zip file, extract the file and perform a search
-    and replace on the contents. Returns the contents as a string."""
-    dirname = tempfile.mkdtemp()
-    fname = zipfile.extract(zipinfo, dirname)
-    with open(fname, "r") as fd:
-        contents = fd.read().encode()
-    shutil.rmtree(dirname)
-    return contents
-
-
-def make_canary_mysql_dump(mysql_usage: str, template: Path) -> bytes:
-    sql_statement = mysql_usage.encode()
-
-    with open(template, "rb") as f:
-        template_buf = BytesIO(f.read())
-    output_buf = BytesIO()
-    output_zip = gzip.GzipFile(fileobj=output_buf, mode="wb")
-    file_build_start = True
-    table_counter = 0
-    with ZipFile(template_buf, "r") as doc:
-        doc_list = doc.filelist
-        table_list = [
-            f.filename
-            for f in filter(
-                lambda f: f.filename.startswith("dw_") and f.filename.endswith(".sql"),
-                doc_list,
-            )
-        ]
+DUMP_FOOTER = b"-- Dump completed on 2021-08-11 18:47:51"
+
+
+class MySQLDumpTemplate:
+    """
+    The tables of a MySQL dump template held in memory, each compressed once
+    as a gzip member. A gzip file may be a concatenation of members, so a
+    dump is built by joining the members of the chosen tables around a
+    freshly compressed member holding the token's statement.
+    """
+
+    def __init__(self, template: bytes):
+        self.header = gzip.compress(DUMP_HEADER)
+        self.footer = gzip.compress(DUMP_FOOTER)
+        self.tables: dict[str, bytes] = {}
+        with ZipFile(BytesIO(template), "r") as doc:
+            for entry in doc.filelist:
+                if (
+                    entry.external_attr & MODE_DIRECTORY
+                    or not entry.filename.startswith("dw_")
+                    or not entry.filename.endswith(".sql")
+                ):
+                    continue
+                self.tables[entry.filename] = gzip.compress(doc.read(entry))
+
+    def render(self, sql_statement: bytes) -> bytes:
+        """Returns a gzipped dump of a random selection of at least half the
+        tables, in random order, with `sql_statement` among them."""
+        table_list = list(self.tables)
         min_table_count = len(table_list) // 2
         table_count = random.choice(list(range(min_table_count, len(table_list) + 1)))
         tables = random.sample(table_list, table_count)
-        random.shuffle(doc_list)
-        for entry in doc_list:
-            if entry.external_attr & MODE_DIRECTORY or entry.filename not in tables:
-                continue
-
-            if file_build_start:
-                output_zip.write(DUMP_HEADER)
-                file_build_start = False
-
+        members = [self.header]
+        for table_counter, table in enumerate(tables):
             # insert the token somewhere in the middle
             if table_counter == min_table_count // 2:
-                output_zip.write(sql_statement)
+                members.append(gzip.compress(sql_statement))
+            members.append(self.tables[table])
+        members.append(self.footer)
+        return b"".join(members)
 
-            contents = zipinfo_contents(zipfile=doc, zipinfo=entry)
-            output_zip.write(contents)
 
-            table_counter += 1
+_mysql_dump_templates: dict[Path, MySQLDumpTemplate] = {}
+_mysql_dump_templates_lock = threading.Lock()
 
-    output_zip.write(b"-- Dump completed on 2021-08-11 18:47:51")
-    output_zip.close()
-    return output_buf.getvalue()
+
+def get_mysql_dump_template(template_path: Path) -> MySQLDumpTemplate:
+    """Returns the MySQL dump template at `template_path`, which is loaded
+    and compressed once per process."""
+    template_path = Path(template_path)
+    with _mysql_dump_templates_lock:
+        mysql_dump_template = _mysql_dump_templates.get(template_path)
+    if mysql_dump_template is not None:
+        return mysql_dump_template
+
+    mysql_dump_template = MySQLDumpTemplate(template_path.read_bytes())
+    with _mysql_dump_templates_lock:
+        _mysql_dump_templates[template_path] = mysql_dump_template
+    return mysql_dump_template
+
+
+def make_canary_mysql_dump(mysql_usage: str, template: Path) -> bytes:
+    return get_mysql_dump_template(template).render(mysql_usage.encode())
 
 
 if __name__ == "__main__":
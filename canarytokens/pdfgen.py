@@ -1,5 +1,5 @@
-import random
 import re
+import struct
 import zlib
 from io import BytesIO
 from pathlib import Path
@@ -12,44 +12,41 @@ from canarytokens.constants import CANARY_PDF_TEMPLATE_OFFSET as STREAM_OFFSET
 # CANARY_PDF_TEMPLATE_OFFSET=793
 
 
+def _compress_to_length(data: bytes, length: int) -> bytes:
+    """
+    Returns `data` zlib compressed to exactly `length` bytes. The compressed
+    data is flushed to a byte boundary and then padded with spaces in a
+    final stored (uncompressed) block, which PDF readers skip as whitespace
+    after the stream's contents.
+    """
+    compressor = zlib.compressobj(9)
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    # A stored block's header is 5 bytes and the adler32 trailer 4 bytes.
+    padding = length - len(compressed) - 5 - 4
+    if not 0 <= padding <= 0xFFFF:
+        raise ValueError(
+            f"Compressed PDF stream of {len(compressed) + 9} bytes doesn't fit in {length} bytes"
+        )
+    padded_data = data + b" " * padding
+    return (
+        compressed
+        + struct.pack("<BHH", 1, padding, padding ^ 0xFFFF)
+        + b" " * padding
+        + struct.pack(">I", zlib.adler32(padded_data))
+    )
+
+
 def _substitute_stream(
     header,
     stream: bytes,
     replace: bytes,
     search: bytes = b"abcdefghijklmnopqrstuvwxyz.zyxwvutsrqponmlkjihgfedcba.aceegikmoqsuwy.bdfhjlnprtvxz",
 ):
-    # Ohhhh, this is nasty. Instead of trying to get the xref positions right,
-    # we're going to brute-force a URL that's the right size after compression.
-    # Give up after 100 attempts.
-
-    MAX_ATTEMPTS = 100
-
-    old_len = len(stream)
-    attempts = 0
-    while attempts < MAX_ATTEMPTS:
-        candidate_stream = zlib.compress(
-            zlib.decompress(stream).replace(search, replace)
-        )
-        count = 1
-        while len(candidate_stream) < old_len and count < 10000:
-            padding = "".join(
-                [chr(random.randrange(65, 90)) for x in range(0, count)]
-            ).encode()
-            candidate_stream = zlib.compress(
-                zlib.decompress(stream).replace(search, replace + b"/" + padding)
-            )
-            count += 1
-        if old_len == len(candidate_stream):
-            break
-        attempts += 1
-
-    if attempts == MAX_ATTEMPTS:
-        raise Exception(
-            "Dammit, new PDF is too big after {attempts} attempts, ({new_len} > {old_len})".format(
-                attempts=attempts, new_len=len(candidate_stream), old_len=old_len
-            )
-        )
-
+    # The new stream is made exactly as long as the old one, so the /Length
+    # and the xref offsets of everything after it stay right.
+    candidate_stream = _compress_to_length(
+        zlib.decompress(stream).replace(search, replace), len(stream)
+    )
     return (header, candidate_stream)
 
 
@@ -3,19 +3,22 @@ from __future__ import annotations
 
 import base64
 import datetime
+import functools
 import ipaddress
 import json
 import re
 import secrets
+import threading
 from ipaddress import IPv4Address, ip_address
 import textwrap
-from typing import Literal, Optional, Union
+from typing import Callable, Literal, Optional, Sequence, Union
 
 from canarytokens import advocate
 from canarytokens.channel_output_webhook import WEBHOOK_ADDR_VALIDATOR
 import httpx
 import requests
-from redis.client import Pipeline
+from redis.client import Pipeline, PubSubWorkerThread
+from redis.commands.core import Script
 from pydantic import EmailStr, HttpUrl, ValidationError, parse_obj_as
 from twisted.logger import Logger
 from twisted.internet.defer import inlineCallbacks
@@ -35,6 +38,7 @@ from canarytokens.exceptions import (
     NoCanarytokenFound,
 )
 from canarytokens.redismanager import (  # KEY_BITCOIN_ACCOUNT,; KEY_BITCOIN_ACCOUNTS,; KEY_CANARY_NXDOMAINS,; KEY_CANARYTOKEN_ALERT_COUNT,; KEY_CLONEDSITE_TOKEN,; KEY_CLONEDSITE_TOKENS,; KEY_IMGUR_TOKEN,; KEY_IMGUR_TOKENS,; KEY_KUBECONFIG_CERTS,; KEY_KUBECONFIG_HITS,; KEY_KUBECONFIG_SERVEREP,; KEY_LINKEDIN_ACCOUNT,; KEY_LINKEDIN_ACCOUNTS,; KEY_USER_ACCOUNT,
+    CHANNEL_CANARY_URL_COMPONENTS,
     DB,
     KEY_AUTH_IDX,
     KEY_AWS_MANAGEMENT_LAMBDA_HANDLE,
@@ -46,13 +50,18 @@ from canarytokens.redismanager import (  # KEY_BITCOIN_ACCOUNT,; KEY_BITCOIN_ACC
     KEY_CANARY_IMAGE_PAGES,
     KEY_CANARY_PATH_ELEMENTS,
     KEY_CANARY_RETURN_TOKEN,
+    KEY_CANARY_URL_COMPONENTS_VERSION,
     KEY_CANARYDROP,
+    KEY_CANARYDROP_HITS,
+    KEY_CANARYDROPS_BY_TYPE,
     KEY_CANARYDROPS_TIMELINE,
     KEY_CANARYTOKEN_ALERT_COUNT,
+    KEY_DESTINATION_ALERT_COUNT,
     KEY_DOMAIN_BLOCK_LIST,
     KEY_EMAIL_BLOCK_LIST,
     KEY_EMAIL_IDX,
     KEY_KUBECONFIG_CERTS,
+    KEY_KUBECONFIG_KEY_POOL,
     KEY_KUBECONFIG_SERVEREP,
     KEY_MAIL_TO_SEND,
     KEY_SENT_MAIL_QUEUE,
@@ -60,31 +69,104 @@ from canarytokens.redismanager import (  # KEY_BITCOIN_ACCOUNT,; KEY_BITCOIN_ACC
     KEY_WEBHOOK_IDX,
     KEY_WIREGUARD_KEYMAP,
 )
-from canarytokens.settings import SwitchboardSettings
+from canarytokens.settings import get_frontend_settings, get_switchboard_settings
 from canarytokens.webhook_formatting import (
     generate_webhook_test_payload,
     get_webhook_type,
 )
 
 log = Logger()
-switchboard_settings = SwitchboardSettings()
 
 
 def get_canarydrop(canarytoken: tokens.Canarytoken) -> cand.Canarydrop:
-    canarydrop: dict = DB.get_db().hgetall(KEY_CANARYDROP + canarytoken.value())
+    with DB.get_db().pipeline(transaction=False) as pipe:
+        pipe.hgetall(KEY_CANARYDROP + canarytoken.value())
+        pipe.lrange(
+            KEY_CANARYDROP_HITS + canarytoken.value(),
+            -get_switchboard_settings().MAX_HISTORY,
+            -1,
+        )
+        canarydrop, hits = pipe.execute()
+    has_triggered_list = "triggered_list" in canarydrop
+    drop = _load_canarydrop(canarytoken, canarydrop, hits)
+    if has_triggered_list:
+        # The drop was read along with its v2 hits, store them in its hit list.
+        migrate_triggered_list(canarytoken)
+    return drop
+
+
+# The fields of a drop's hash read by the DNS and HTTP channels, as they
+# respond to and alert on a hit. Fields with a default other than None are
+# all here, so saving a drop loaded with these doesn't overwrite the others.
+CANARYDROP_HEADER_FIELDS = (
+    "type",
+    "timestamp",
+    "auth",
+    "user",
+    "memo",
+    "generated_url",
+    # Alert settings.
+    "alert_email_enabled",
+    "alert_email_recipient",
+    "alert_sms_enabled",
+    "alert_sms_recipient",
+    "alert_webhook_enabled",
+    "alert_webhook_url",
+    "alert_failure_count",
+    "alert_ip_ignore_enabled",
+    "alert_ignored_ips",
+    # Responses to HTTP hits.
+    "web_image_enabled",
+    "web_image_path",
+    "redirect_url",
+    "browser_scanner_enabled",
+    "pwa_icon",
+    "pwa_app_name",
+    # Alert details of some token types.
+    "aws_access_key_id",
+    "cmd_process",
+    "windows_fake_fs_root",
+    "windows_fake_fs_file_structure",
+)
+
+
+def get_canarydrop_header(canarytoken: tokens.Canarytoken) -> cand.Canarydrop:
+    """
+    Fetches a drop with only its `CANARYDROP_HEADER_FIELDS` and without its
+    hits, its `triggered_details` are None until `load_history` is called.
+    Meant for the channels' hot paths.
+    """
+    return _get_canarydrop_fields(canarytoken, CANARYDROP_HEADER_FIELDS)
+
+
+def _get_canarydrop_fields(
+    canarytoken: tokens.Canarytoken, fields: Sequence[str]
+) -> cand.Canarydrop:
+    """Fetches a drop with only `fields` and without its hits."""
+    values = DB.get_db().hmget(KEY_CANARYDROP + canarytoken.value(), fields)
+    return _load_canarydrop(canarytoken, _fields_from_values(fields, values), hits=None)
+
+
+@functools.cache
+def _canarydrop_fields() -> list[str]:
+    """The fields of a drop's hash that are read without its history. Leaves
+    out the v2 `triggered_list`, which holds the hits of older drops."""
+    return [field.alias for field in cand.Canarydrop.__fields__.values()]
+
 
+def _fields_from_values(fields: Sequence[str], values: list[Optional[str]]) -> dict:
+    return {field: value for field, value in zip(fields, values) if value is not None}
+
+
+def _load_canarydrop(
+    canarytoken: tokens.Canarytoken, canarydrop: dict, hits: Optional[list[str]]
+) -> cand.Canarydrop:
+    """Builds a drop from its redis hash and hit list. The drop's history is
+    left out if `hits` is None, see `Canarydrop.load_history`."""
     if len(canarydrop) == 0:
         raise NoCanarydropFound(f"Failed to find drop for: {canarytoken.value()}")
 
-    if "triggered_details" in canarydrop:
-        canarydrop["triggered_details"] = json.loads(
-            canarydrop["triggered_details"],
-        )
-    if "triggered_list" in canarydrop:
-        canarydrop["triggered_details"] = json.loads(
-            canarydrop.pop("triggered_list"),
-        )
-        canarydrop["triggered_details"]["token_type"] = canarydrop["type"]
+    _load_triggered_details(canarydrop, hits)
     if "user" in canarydrop.keys():
         # Make user in redis fully supported.
         canarydrop["user"] = models.User(name=canarydrop["user"])
@@ -108,10 +190,36 @@ def get_canarydrop(canarytoken: tokens.Canarytoken) -> cand.Canarydrop:
         raise e
 
 
-def get_canarydrop_and_authenticate(*, token: str, auth: str) -> cand.Canarydrop:
-    """Fetches a drop given a `token` and it's associated `auth`."""
+def _load_triggered_details(canarydrop: dict, hits: Optional[list[str]]) -> None:
+    """Replaces the history stored in a drop's hash, together with `hits`,
+    by the drop's `triggered_details`. Without `hits` the history is left
+    out, unless the hash holds it."""
+    if "triggered_details" in canarydrop:
+        canarydrop["triggered_details"] = json.loads(
+            canarydrop["triggered_details"],
+        )
+    if hits is None:
+        canarydrop.pop("triggered_list", None)
+        canarydrop.setdefault("triggered_details", None)
+    elif "triggered_list" in canarydrop or hits:
+        canarydrop["triggered_details"] = _merge_triggered_list(
+            canarydrop.pop("triggered_list", None), hits
+        )
+        canarydrop["triggered_details"]["token_type"] = canarydrop["type"]
+
+
+def get_canarydrop_and_authenticate(
+    *, token: str, auth: str, with_history: bool = True
+) -> cand.Canarydrop:
+    """Fetches a drop given a `token` and it's associated `auth`. Without
+    `with_history` the drop's hits are only read once they're used."""
     try:
-        canarydrop = get_canarydrop(tokens.Canarytoken(token))
+        if with_history:
+            canarydrop = get_canarydrop(tokens.Canarytoken(token))
+        else:
+            canarydrop = _get_canarydrop_fields(
+                tokens.Canarytoken(token), _canarydrop_fields()
+            )
     except NoCanarydropFound:
         raise CanarydropAuthFailure("Canarydrop associated with token is missing.")
     except NoCanarytokenFound:
@@ -132,59 +240,210 @@ def get_canarydrops_by_type(token_type: models.TokenTypes) -> list[cand.Canarydr
     Return all canarydrops of a given token type.
     """
     canarydrops: list[cand.Canarydrop] = []
-    token_ids = DB.get_db().zrange(KEY_CANARYDROPS_TIMELINE, 0, -1)
+    cursor: Optional[tuple[float, str]] = None
+    while True:
+        cursor, batch = scan_canarydrops_by_type(token_type, cursor=cursor)
+        canarydrops.extend(batch)
+        if cursor is None:
+            return canarydrops
+
+
+def scan_canarydrops_by_type(
+    token_type: models.TokenTypes,
+    cursor: Optional[tuple[float, str]] = None,
+    count: int = 100,
+) -> tuple[Optional[tuple[float, str]], list[cand.Canarydrop]]:
+    """
+    Return up to `count` canarydrops of a given token type, oldest first,
+    starting after `cursor`, and the cursor to pass to fetch the next batch.
+    The returned cursor is None once there are no more drops.
 
-    for token_id in token_ids:
-        key = KEY_CANARYDROP + token_id
-        drop_type = DB.get_db().hget(key, "type")
-        if drop_type is None:
-            continue
+    The cursor is the creation time and token of the last drop returned, so
+    drops deleted between calls don't shift the batches and drops created at
+    the same time aren't skipped.
+    """
+    key = KEY_CANARYDROPS_BY_TYPE + token_type.value
+    skip = 0
+    while True:
+        entries = DB.get_db().zrangebyscore(
+            key,
+            "-inf" if cursor is None else repr(cursor[0]),
+            "+inf",
+            start=skip,
+            num=count,
+            withscores=True,
+        )
+        # Drops with the same creation time are ordered by token, leave out
+        # the ones up to the cursor's.
+        new_entries = [
+            (token_id, score)
+            for token_id, score in entries
+            if cursor is None or (score, token_id) > cursor
+        ]
+        if new_entries or len(entries) < count:
+            break
+        # A whole batch of drops created at the cursor's time, all scanned.
+        skip += count
+    if not new_entries:
+        return None, []
+
+    fields = _canarydrop_fields()
+    with DB.get_db().pipeline(transaction=False) as pipe:
+        for token_id, _ in new_entries:
+            pipe.hmget(KEY_CANARYDROP + token_id, fields)
+        drops = [_fields_from_values(fields, values) for values in pipe.execute()]
 
+    canarydrops: list[cand.Canarydrop] = []
+    for (token_id, _), canarydrop in zip(new_entries, drops):
         try:
-            if models.TokenTypes(drop_type) != token_type:
-                continue
-            canarydrops.append(get_canarydrop(tokens.Canarytoken(token_id)))
-        except (ValueError, NoCanarydropFound):
+            # Few callers need the drops' hits, see `Canarydrop.load_history`.
+            canarydrop = _load_canarydrop(
+                tokens.Canarytoken(token_id), canarydrop, hits=None
+            )
+        except (ValueError, NoCanarydropFound, NoCanarytokenFound):
             continue
+        # The index may lag behind a drop whose type was just changed.
+        if canarydrop.type == token_type:
+            canarydrops.append(canarydrop)
 
-    return canarydrops
+    last_token_id, last_score = entries[-1]
+    next_cursor = (last_score, last_token_id) if len(entries) == count else None
+    return next_cursor, canarydrops
 
 
 def get_all_canary_sites():
     return [f"http://{str(o)}" for o in get_all_canary_domains()]
 
 
+URL_COMPONENT_KEYS = (
+    KEY_CANARY_PATH_ELEMENTS,
+    KEY_CANARY_PAGES,
+    KEY_CANARY_IMAGE_PAGES,
+    KEY_CANARY_DOMAINS,
+    KEY_CANARY_NXDOMAINS,
+)
+# The sets URLs and hostnames are built from, and their version, cached while
+# `_url_components_listener` is subscribed to their changes.
+_url_components: Optional[tuple[Optional[str], dict[str, list[str]]]] = None
+_url_components_lock = threading.Lock()
+_url_components_listener: Optional[PubSubWorkerThread] = None
+
+
+def _get_url_components(key: str) -> list[str]:
+    if _url_components_listener is None:
+        return list(DB.get_db().smembers(key))
+    components = _url_components
+    if components is None:
+        components = _load_url_components()
+    return list(components[1][key])
+
+
+def _load_url_components() -> tuple[Optional[str], dict[str, list[str]]]:
+    global _url_components
+    with _url_components_lock:
+        if _url_components is None:
+            with DB.get_db().pipeline() as pipe:
+                pipe.get(KEY_CANARY_URL_COMPONENTS_VERSION)
+                for key in URL_COMPONENT_KEYS:
+                    pipe.smembers(key)
+                version, *members = pipe.execute()
+            _url_components = (version, dict(zip(URL_COMPONENT_KEYS, members)))
+        return _url_components
+
+
+def _invalidate_url_components(version: Optional[str] = None) -> None:
+    """Drops the cached URL components, unless they're already at `version`."""
+    global _url_components
+    with _url_components_lock:
+        if _url_components is None or version != _url_components[0]:
+            _url_components = None
+
+
+def _on_url_components_message(message: dict) -> None:
+    _invalidate_url_components(message["data"])
+
+
+def _on_url_components_listener_error(
+    error: Exception, pubsub, thread: PubSubWorkerThread
+) -> None:
+    # Changes published while disconnected are missed, so start afresh.
+    log.warn("URL components listener error: {error}", error=error)
+    _invalidate_url_components()
+
+
+def start_url_components_cache() -> None:
+    """
+    Caches the sets URLs and hostnames are built from in this process, and
+    subscribes to their changes to drop the cache when they're updated.
+    """
+    global _url_components_listener
+    if _url_components_listener is not None:
+        return
+    pubsub = DB.get_db().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{CHANNEL_CANARY_URL_COMPONENTS: _on_url_components_message})
+    _invalidate_url_components()
+    _url_components_listener = pubsub.run_in_thread(
+        sleep_time=1,
+        daemon=True,
+        exception_handler=_on_url_components_listener_error,
+    )
+
+
+def stop_url_components_cache() -> None:
+    global _url_components_listener
+    if _url_components_listener is None:
+        return
+    _url_components_listener.stop()
+    _url_components_listener = None
+    _invalidate_url_components()
+
+
+def _update_url_components(update: Callable[[Pipeline], None]) -> int:
+    """
+    Runs `update` on the URL components, bumping their version and
+    publishing it so processes caching them drop their cache.
+    """
+    with DB.get_db().pipeline() as pipe:
+        update(pipe)
+        pipe.incr(KEY_CANARY_URL_COMPONENTS_VERSION)
+        result, version = pipe.execute()
+    DB.get_db().publish(CHANNEL_CANARY_URL_COMPONENTS, version)
+    return result
+
+
 def get_all_canary_path_elements() -> list[str]:
-    return list(DB.get_db().smembers(KEY_CANARY_PATH_ELEMENTS))
+    return _get_url_components(KEY_CANARY_PATH_ELEMENTS)
 
 
 def add_canary_path_element(path_element: str) -> int:
-    return DB.get_db().sadd(KEY_CANARY_PATH_ELEMENTS, path_element)
+    return _update_url_components(
+        lambda pipe: pipe.sadd(KEY_CANARY_PATH_ELEMENTS, path_element)
+    )
 
 
 def get_all_canary_pages() -> list[str]:
-    return list(DB.get_db().smembers(KEY_CANARY_PAGES))
+    return _get_url_components(KEY_CANARY_PAGES)
 
 
 def get_all_canary_image_pages() -> list[str]:
-    return list(DB.get_db().smembers(KEY_CANARY_IMAGE_PAGES))
+    return _get_url_components(KEY_CANARY_IMAGE_PAGES)
 
 
 def add_canary_image_page(page: str) -> int:
-    return DB.get_db().sadd(KEY_CANARY_IMAGE_PAGES, page)
+    return _update_url_components(lambda pipe: pipe.sadd(KEY_CANARY_IMAGE_PAGES, page))
 
 
 def add_canary_page(page: str) -> int:
-    return DB.get_db().sadd(KEY_CANARY_PAGES, page)
+    return _update_url_components(lambda pipe: pipe.sadd(KEY_CANARY_PAGES, page))
 
 
 def get_all_canary_domains():
     # TODO: leave as a set?
-    return [o for o in DB.get_db().smembers(KEY_CANARY_DOMAINS)]
+    return _get_url_components(KEY_CANARY_DOMAINS)
 
 
 def get_all_canary_nxdomains():
-    return list(DB.get_db().smembers(KEY_CANARY_NXDOMAINS))
+    return _get_url_components(KEY_CANARY_NXDOMAINS)
 
 
 def get_canary_google_api_key():
@@ -192,23 +451,26 @@ def get_canary_google_api_key():
 
 
 def add_canary_domain(domain: str) -> int:
-    return DB.get_db().sadd(KEY_CANARY_DOMAINS, domain)
+    return _update_url_components(lambda pipe: pipe.sadd(KEY_CANARY_DOMAINS, domain))
 
 
 def remove_canary_domain():
-    return DB.get_db().delete(KEY_CANARY_DOMAINS)
+    return _update_url_components(lambda pipe: pipe.delete(KEY_CANARY_DOMAINS))
 
 
 def remove_canary_nxdomain():
-    return DB.get_db().delete(KEY_CANARY_NXDOMAINS)
+    return _update_url_components(lambda pipe: pipe.delete(KEY_CANARY_NXDOMAINS))
 
 
 def add_canary_nxdomain(domain: str) -> int:
-    return DB.get_db().sadd(KEY_CANARY_NXDOMAINS, domain)
+    return _update_url_components(lambda pipe: pipe.sadd(KEY_CANARY_NXDOMAINS, domain))
 
 
-def add_email_token_idx(email: str, canarytoken: str) -> int:
-    return DB.get_db().sadd(KEY_EMAIL_IDX + email.lower(), canarytoken)
+def add_email_token_idx(
+    email: str, canarytoken: str, pipe: Optional[Pipeline] = None
+) -> int:
+    db = pipe or DB.get_db()
+    return db.sadd(KEY_EMAIL_IDX + email.lower(), canarytoken)
 
 
 def remove_email_token_idx(
@@ -218,8 +480,11 @@ def remove_email_token_idx(
     db.srem(f"{KEY_EMAIL_IDX}{email.lower()}", canarytoken)
 
 
-def add_webhook_token_idx(webhook: HttpUrl, canarytoken: str) -> int:
-    return DB.get_db().sadd(KEY_WEBHOOK_IDX + webhook, canarytoken)
+def add_webhook_token_idx(
+    webhook: HttpUrl, canarytoken: str, pipe: Optional[Pipeline] = None
+) -> int:
+    db = pipe or DB.get_db()
+    return db.sadd(KEY_WEBHOOK_IDX + webhook, canarytoken)
 
 
 def remove_webhook_token_idx(
@@ -229,8 +494,9 @@ def remove_webhook_token_idx(
     db.srem(f"{KEY_WEBHOOK_IDX}{webhook}", canarytoken)
 
 
-def add_auth_token_idx(auth: str, token: str) -> int:
-    return DB.get_db().sadd(KEY_AUTH_IDX + auth, token)
+def add_auth_token_idx(auth: str, token: str, pipe: Optional[Pipeline] = None) -> int:
+    db = pipe or DB.get_db()
+    return db.sadd(KEY_AUTH_IDX + auth, token)
 
 
 def remove_auth_token_idx(
@@ -268,33 +534,108 @@ def list_webhook_tokens(webhook) -> set[str]:
     return DB.get_db().smembers(KEY_WEBHOOK_IDX + webhook)
 
 
+# Saves a drop, see `save_canarydrop`. Returns the drop's stored type, without
+# writing anything, if its type changed and the by-type index of the stored
+# type wasn't declared.
+# KEYS: the drop's hash, its hit list, the timeline, the by-type index of its
+#       type, the by-type index of the stored type if it's declared, then the
+#       email, webhook and auth indexes it's added to.
+# ARGV: the token, the time it's saved at, its type, the stored type whose
+#       by-type index is declared or "", the number of hash fields and values
+#       that follow, the fields and values, then its hits.
+_SAVE_CANARYDROP_SCRIPT = """
+local token, now, token_type, declared_type = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local stored_type = redis.call("HGET", KEYS[1], "type")
+local type_changed = stored_type and stored_type ~= token_type
+if type_changed and stored_type ~= declared_type then
+    return stored_type
+end
+local last_field = 5 + tonumber(ARGV[5])
+redis.call("HSET", KEYS[1], unpack(ARGV, 6, last_field))
+if #ARGV > last_field and redis.call("EXISTS", KEYS[2]) == 0 then
+    -- The drop's history already includes any v2 `triggered_list`.
+    redis.call("HDEL", KEYS[1], "triggered_list")
+    for first = last_field + 1, #ARGV, 1000 do
+        redis.call("RPUSH", KEYS[2], unpack(ARGV, first, math.min(first + 999, #ARGV)))
+    end
+end
+redis.call("ZADD", KEYS[3], "NX", now, token)
+local first_index = 5
+if declared_type ~= "" then
+    first_index = 6
+end
+if type_changed then
+    -- The drop's type changed, e.g. a legacy token first used as SMTP.
+    redis.call("ZREM", KEYS[5], token)
+end
+redis.call("ZADD", KEYS[4], "NX", now, token)
+for i = first_index, #KEYS do
+    redis.call("SADD", KEYS[i], token)
+end
+return false
+"""
+
+
+@functools.cache
+def _save_canarydrop_script() -> Script:
+    return DB.get_db().register_script(_SAVE_CANARYDROP_SCRIPT)
+
+
 def save_canarydrop(canarydrop: cand.Canarydrop):
     """
     Persist a Canarydrop into the Redis instance.
+
+    The drop, its timeline entry and its indexes are written by a single
+    script, in one round trip. A drop whose type changed takes a second one,
+    to move it to the by-type index of its new type.
     Args:
         canarydrop (cand.Canarydrop): canarydrop to persist.
     """
-
     canarytoken = canarydrop.canarytoken
-    DB.get_db().hset(
-        KEY_CANARYDROP + canarytoken.value(),
-        mapping=canarydrop.serialize(),
-    )
-
-    log.info(f"Saved canarydrop for token: {canarydrop.canarytoken.value()}")
-
-    # if the canarydrop is new, save to the timeline
-    if DB.get_db().zscore(KEY_CANARYDROPS_TIMELINE, canarytoken.value()) is None:
-        current_time = datetime.datetime.utcnow().strftime("%s.%f")
-        DB.get_db().zadd(KEY_CANARYDROPS_TIMELINE, {canarytoken.value(): current_time})
-
+    hits = canarydrop.triggered_details.hits if canarydrop.history_loaded else []
+    index_keys = []
     if canarydrop.alert_email_recipient:
-        add_email_token_idx(canarydrop.alert_email_recipient, canarytoken.value())
-
+        index_keys.append(KEY_EMAIL_IDX + canarydrop.alert_email_recipient.lower())
     if canarydrop.alert_webhook_url:
-        add_webhook_token_idx(canarydrop.alert_webhook_url, canarytoken.value())
+        index_keys.append(KEY_WEBHOOK_IDX + canarydrop.alert_webhook_url)
+    index_keys.append(KEY_AUTH_IDX + canarydrop.auth)
+
+    fields = [item for field in canarydrop.serialize().items() for item in field]
+    # Hits are appended by `add_canarydrop_hit`, they're only written here
+    # when none are stored yet, e.g. for a drop that's being restored.
+    serialized_hits = [
+        json.dumps(canarydrop.triggered_details.serialize_hit_for_v2(hit))
+        for hit in hits
+    ]
+    # if the canarydrop is new, save to the timeline
+    current_time = datetime.datetime.utcnow().strftime("%s.%f")
+    stored_type = ""
+    while True:
+        keys = [
+            KEY_CANARYDROP + canarytoken.value(),
+            KEY_CANARYDROP_HITS + canarytoken.value(),
+            KEY_CANARYDROPS_TIMELINE,
+            KEY_CANARYDROPS_BY_TYPE + canarydrop.type.value,
+        ]
+        if stored_type:
+            keys.append(KEY_CANARYDROPS_BY_TYPE + stored_type)
+        stored_type = _save_canarydrop_script()(
+            keys=[*keys, *index_keys],
+            args=[
+                canarytoken.value(),
+                current_time,
+                canarydrop.type.value,
+                stored_type,
+                len(fields),
+                *fields,
+                *serialized_hits,
+            ],
+            client=DB.get_db(),
+        )
+        if stored_type is None:
+            break
 
-    add_auth_token_idx(canarydrop.auth, canarydrop.canarytoken.value())
+    log.info(f"Saved canarydrop for token: {canarydrop.canarytoken.value()}")
 
 
 def delete_canarydrop(canarydrop: cand.Canarydrop) -> None:
@@ -319,16 +660,16 @@ def delete_canarydrop(canarydrop: cand.Canarydrop) -> None:
 
         remove_auth_token_idx(canarydrop.auth, token, pipe=pipe)
         pipe.zrem(KEY_CANARYDROPS_TIMELINE, token)
+        pipe.zrem(KEY_CANARYDROPS_BY_TYPE + canarydrop.type.value, token)
         pipe.delete(KEY_CANARYDROP + token)
+        pipe.unlink(KEY_CANARYDROP_HITS + token)
         pipe.execute()
 
     if canarydrop.type == models.TokenTypes.WIREGUARD:
         wireguard.deleteCanarytokenPrivateKey(canarydrop.wg_key)
 
     if canarydrop.type == models.TokenTypes.AWS_KEYS:
-        from canarytokens.settings import FrontendSettings
-
-        settings = FrontendSettings()
+        settings = get_frontend_settings()
         if (
             canarydrop.aws_username
             and settings.AWSID_GUID
@@ -350,9 +691,8 @@ def delete_canarydrop(canarydrop: cand.Canarydrop) -> None:
 
     if canarydrop.type == models.TokenTypes.CROWDSTRIKE_CC:
         from canarytokens.crowdstrikekeys import delete_crowdstrike_key
-        from canarytokens.settings import FrontendSettings
 
-        settings = FrontendSettings()
+        settings = get_frontend_settings()
         if settings.CROWDSTRIKE_CC_DELETE_URL and canarydrop.crowdstrike_token_id:
             delete_crowdstrike_key(
                 token_id=canarydrop.crowdstrike_token_id,
@@ -360,21 +700,40 @@ def delete_canarydrop(canarydrop: cand.Canarydrop) -> None:
             )
 
 
-def _v2_compatibility_loading_triggered_details(key: str) -> str:
-    """Reads the `triggered_list` stored in v2 shape
-    and returns `triggered_details` in v3 shape.
+def _merge_triggered_list(
+    triggered_list: Optional[str], hits: list[str]
+) -> dict[str, dict]:
+    """Merges hits still stored in v2's `triggered_list` field with those in
+    the drop's hit list, both in the v2 shape keyed on the time of the hit."""
+    triggered_details = json.loads(triggered_list) if triggered_list else {}
+    triggered_details = {
+        time_of_hit: triggered_details[time_of_hit]
+        for time_of_hit in sorted(triggered_details, key=float)
+    }
+    for hit in hits:
+        triggered_details.update(json.loads(hit))
+    return triggered_details
+
+
+def _v2_compatibility_loading_triggered_details(
+    canarytoken: tokens.Canarytoken,
+) -> str:
+    """Reads the `triggered_list` stored in v2 shape, along with the
+    hits stored since, and returns `triggered_details` in v3 shape.
 
     Args:
-        key (str): `canarydrop:__token__` to get triggered_details for.
+        canarytoken (tokens.Canarytoken): Token to get triggered_details for.
 
     Returns:
         str: triggered_details in the v3 shape.
     """
-    triggered_details_str = DB.get_db().hget(key, "triggered_list")
-    if triggered_details_str is None:
-        triggered_details_str = "{}"
-    token_type = models.TokenTypes(DB.get_db().hget(key, "type"))
-    triggered_details = json.loads(triggered_details_str)
+    key = KEY_CANARYDROP + canarytoken.value()
+    with DB.get_db().pipeline(transaction=False) as pipe:
+        pipe.hmget(key, "triggered_list", "type")
+        pipe.lrange(KEY_CANARYDROP_HITS + canarytoken.value(), 0, -1)
+        (triggered_details_str, token_type), hits = pipe.execute()
+    token_type = models.TokenTypes(token_type)
+    triggered_details = _merge_triggered_list(triggered_details_str, hits)
 
     return json.dumps({"token_type": token_type, **triggered_details})
 
@@ -385,8 +744,7 @@ def get_canarydrop_triggered_details(
     """
     Returns the triggered list for a Canarydrop, or {} if it does not exist
     """
-    key = KEY_CANARYDROP + canarytoken.value()
-    triggered_details = _v2_compatibility_loading_triggered_details(key=key)
+    triggered_details = _v2_compatibility_loading_triggered_details(canarytoken)
 
     if not triggered_details:
         triggered_details = {}
@@ -400,13 +758,132 @@ def get_canarydrop_triggered_details(
             in sorted(
                 triggered_details.keys(),
             )[
-                -(switchboard_settings.MAX_HISTORY) :  # noqa: E203
+                -(get_switchboard_settings().MAX_HISTORY) :  # noqa: E203
             ]
         }
         triggered_details["token_type"] = token_type
     return parse_obj_as(models.AnyTokenHistory, triggered_details)
 
 
+def get_canarydrop_hits(
+    canarytoken: tokens.Canarytoken,
+    token_type: models.TokenTypes,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> tuple[models.AnyTokenHistory, int]:
+    """Returns a page of a drop's hits, oldest first, skipping the `offset`
+    most recent ones.
+
+    Returns:
+        tuple[models.AnyTokenHistory, int]: The page of hits and the total
+        number of hits stored.
+    """
+    end = -(offset + 1)
+    start = 0 if limit is None else end - limit + 1
+    with DB.get_db().pipeline(transaction=False) as pipe:
+        pipe.lrange(KEY_CANARYDROP_HITS + canarytoken.value(), start, end)
+        pipe.llen(KEY_CANARYDROP_HITS + canarytoken.value())
+        pipe.hexists(KEY_CANARYDROP + canarytoken.value(), "triggered_list")
+        hits, total, has_triggered_list = pipe.execute()
+    if has_triggered_list and migrate_triggered_list(canarytoken):
+        return get_canarydrop_hits(canarytoken, token_type, offset, limit)
+    triggered_details = _merge_triggered_list(None, hits)
+    history = parse_obj_as(
+        models.AnyTokenHistory, {"token_type": token_type, **triggered_details}
+    )
+    return history, total
+
+
+def migrate_triggered_list(canarytoken: tokens.Canarytoken) -> bool:
+    """Moves hits stored in the drop's v2 `triggered_list` field to its hit
+    list, where `add_canarydrop_hit` appends them. Drops are migrated when
+    they're loaded with their hits, and by migrate_hit_history.py.
+
+    Returns:
+        bool: True if there was a `triggered_list` to migrate.
+    """
+    key = KEY_CANARYDROP + canarytoken.value()
+    hits_key = KEY_CANARYDROP_HITS + canarytoken.value()
+    if not DB.get_db().hexists(key, "triggered_list"):
+        return False
+
+    def migrate(pipe: Pipeline) -> bool:
+        triggered_list = pipe.hget(key, "triggered_list")
+        if triggered_list is None:
+            return False
+        triggered_details = json.loads(triggered_list)
+        hits = [
+            json.dumps({time_of_hit: triggered_details[time_of_hit]})
+            for time_of_hit in sorted(triggered_details, key=float)
+        ]
+        pipe.multi()
+        if hits:
+            # Hits in `triggered_list` predate any in the hit list.
+            pipe.lpush(hits_key, *reversed(hits))
+            pipe.ltrim(hits_key, -get_switchboard_settings().MAX_HISTORY, -1)
+        pipe.hdel(key, "triggered_list")
+        return True
+
+    migrated = DB.get_db().transaction(migrate, key, value_from_callable=True)
+    if migrated:
+        log.info(f"Migrated triggered_list for token: {canarytoken.value()}")
+    return migrated
+
+
+def add_canarydrop_hit(canarydrop: cand.Canarydrop, token_hit: models.AnyTokenHit):
+    """Appends `token_hit` to the drop's hit list, keeping the
+    `MAX_HISTORY` most recent hits."""
+    canarytoken = canarydrop.canarytoken
+    hit = models.TokenHistory.serialize_hit_for_v2(token_hit)
+    with DB.get_db().pipeline() as pipe:
+        pipe.rpush(KEY_CANARYDROP_HITS + canarytoken.value(), json.dumps(hit))
+        pipe.ltrim(
+            KEY_CANARYDROP_HITS + canarytoken.value(),
+            -get_switchboard_settings().MAX_HISTORY,
+            -1,
+        )
+        pipe.execute()
+
+
+def _update_canarydrop_hit(
+    canarytoken: tokens.Canarytoken,
+    token_type: models.TokenTypes,
+    hit_time: float,
+    update: Callable[[models.AnyTokenHit], None],
+) -> bool:
+    """Applies `update` to the stored hit at `hit_time`.
+
+    Returns:
+        bool: False if there's no such hit.
+    """
+    hits_key = KEY_CANARYDROP_HITS + canarytoken.value()
+
+    def update_hit(pipe: Pipeline) -> bool:
+        for index, hit in enumerate(pipe.lrange(hits_key, 0, -1)):
+            [(time_of_hit, hit_data)] = json.loads(hit).items()
+            if float(time_of_hit) != hit_time:
+                continue
+            history = parse_obj_as(
+                models.AnyTokenHistory,
+                {"token_type": token_type, time_of_hit: hit_data},
+            )
+            token_hit = history.hits[0]
+            update(token_hit)
+            pipe.multi()
+            pipe.lset(
+                hits_key, index, json.dumps(history.serialize_hit_for_v2(token_hit))
+            )
+            return True
+        return False
+
+    if DB.get_db().transaction(update_hit, hits_key, value_from_callable=True):
+        return True
+    # The hit may still be in the drop's v2 `triggered_list`.
+    return migrate_triggered_list(canarytoken) and DB.get_db().transaction(
+        update_hit, hits_key, value_from_callable=True
+    )
+
+
 def add_key_exposed_hit(
     token_exposed_hit: models.AnyTokenExposedHit, canarytoken: tokens.Canarytoken
 ):
@@ -418,8 +895,32 @@ def add_key_exposed_hit(
 
 
 def add_additional_info_to_hit(canarytoken, hit_time, additional_info):
-    triggered_details = get_canarydrop_triggered_details(canarytoken)
-    if not any(hit_time == o.time_of_hit for o in triggered_details.hits):
+    canarydrop = get_canarydrop(canarytoken)
+
+    def add_info(enriched_hit):
+        if isinstance(
+            enriched_hit,
+            (
+                models.SlowRedirectTokenHit,
+                models.CustomImageTokenHit,
+                models.WebBugTokenHit,
+                models.IdPAppTokenHit,
+                models.LegacyTokenHit,
+            ),
+        ):
+            info = enriched_hit.additional_info.dict(
+                exclude_unset=True, exclude_none=None
+            )
+            combined_info = info | additional_info
+            enriched_hit.additional_info = models.AdditionalInfo(**combined_info)
+        else:
+            raise NotImplementedError(
+                f"Additional info not supported for hit type: {type(enriched_hit)}"
+            )
+        if canarydrop.should_ignore_ip(enriched_hit.src_ip):
+            enriched_hit.alert_status = models.AlertStatus.IGNORED_IP
+
+    if not _update_canarydrop_hit(canarytoken, canarydrop.type, hit_time, add_info):
         raise ValueError(
             textwrap.dedent(
                 """
@@ -428,48 +929,26 @@ def add_additional_info_to_hit(canarytoken, hit_time, additional_info):
                 """
             )
         )
-    enriched_hit = next(
-        filter(lambda o: o.time_of_hit == hit_time, triggered_details.hits)
+
+
+def update_hit_geo_info(
+    canarytoken: tokens.Canarytoken, hit_time: float, geo_info
+) -> None:
+    """Sets `geo_info` on a hit that was recorded before its source IP was
+    looked up."""
+    token_type = models.TokenTypes(
+        DB.get_db().hget(KEY_CANARYDROP + canarytoken.value(), "type")
     )
-    triggered_details.hits.remove(enriched_hit)
-    if isinstance(
-        enriched_hit,
-        (
-            models.SlowRedirectTokenHit,
-            models.CustomImageTokenHit,
-            models.WebBugTokenHit,
-            models.IdPAppTokenHit,
-            models.LegacyTokenHit,
-        ),
+    if not _update_canarydrop_hit(
+        canarytoken,
+        token_type,
+        hit_time,
+        lambda hit: hit.set_geo_info(geo_info),
     ):
-        info = enriched_hit.additional_info.dict(exclude_unset=True, exclude_none=None)
-        combined_info = info | additional_info
-        enriched_hit.additional_info = models.AdditionalInfo(**combined_info)
-    else:
-        raise NotImplementedError(
-            f"Additional info not supported for hit type: {type(enriched_hit)}"
+        # The hit has since been pushed out of the history.
+        log.info(
+            f"Got geo info for a hit that does not exist. Token: {canarytoken.value()}"
         )
-    canarydrop = get_canarydrop(canarytoken)
-    if canarydrop.should_ignore_ip(enriched_hit.src_ip):
-        enriched_hit.alert_status = models.AlertStatus.IGNORED_IP
-    triggered_details.hits.append(enriched_hit)
-
-    # if "additional_info" not in triggered_details[hit_time]:
-    #     triggered_details[hit_time]["additional_info"] = {}
-    # for k, v in additional_info.items():
-    #     if k in list(triggered_details[hit_time]["additional_info"].keys()):
-    #         triggered_details[hit_time]["additional_info"][k].update(v)
-    #     else:
-    #         reveal_type(triggered_details[hit_time]["additional_info"][k])
-    #         triggered_details[hit_time]["additional_info"][k] = v
-
-    DB.get_db().hset(
-        KEY_CANARYDROP + canarytoken.value(),
-        "triggered_list",
-        json.dumps(triggered_details.serialize_for_v2()),
-    )
-    data = DB.get_db().hgetall(KEY_CANARYDROP + canarytoken.value())
-    print(data)
 
 
 async def validate_turnstile(
@@ -586,30 +1065,45 @@ def lookup_canarytoken_alert_count(canarytoken: tokens.Canarytoken) -> int:
         return int(alert_count)
 
 
-def save_canarytoken_alert_count(
-    canarytoken: tokens.Canarytoken, count: int, expiry: int
-):
-    key = KEY_CANARYTOKEN_ALERT_COUNT + canarytoken.value()
-    DB.get_db().setex(key, expiry, count)
+def _count_alert(key: str, expiry: int) -> int:
+    """Atomically increments the alert count at `key`. The count expires
+    `expiry` seconds after its first alert, which makes it a fixed window.
+
+    Returns:
+        int: the count, including this alert.
+    """
+    # Creating the count with its expiry, then incrementing it, rather than
+    # EXPIRE's NX option which needs redis 7.
+    with DB.get_db().pipeline() as pipe:
+        pipe.set(key, 0, ex=expiry, nx=True)
+        pipe.incr(key)
+        _, alert_count = pipe.execute()
+    return alert_count
 
 
-def do_accounting(canarydrop: cand.Canarydrop, alert_expiry: int):
-    """Increments the alert_count for a canarydrop and sets
-    it's expiry to `alert_expiry`
+def do_accounting(canarydrop: cand.Canarydrop, alert_expiry: int) -> int:
+    """Increments the alert_count for a canarydrop, which expires
+    `alert_expiry` seconds after its first alert.
 
     Args:
         canarydrop (cand.Canarydrop): Canarydrop for which alert count is altered.
+
+    Returns:
+        int: the drop's alert count, including this alert.
     """
-    alert_count = lookup_canarytoken_alert_count(canarydrop.canarytoken)
-    alert_count_incremented = alert_count + 1
-    save_canarytoken_alert_count(
-        canarydrop.canarytoken, alert_count_incremented, alert_expiry
+    return _count_alert(
+        KEY_CANARYTOKEN_ALERT_COUNT + canarydrop.canarytoken.value(), alert_expiry
     )
 
 
-def can_send_alert(canarydrop: cand.Canarydrop, alert_limit: int):
-    alert_count = lookup_canarytoken_alert_count(canarydrop.canarytoken)
-    return alert_count < alert_limit
+def do_destination_accounting(destination: str, alert_expiry: int) -> int:
+    """Increments the alert count for an alert destination, such as an email
+    recipient, across all drops. See `Canarydrop.get_alert_destination`.
+
+    Returns:
+        int: the destination's alert count, including this alert.
+    """
+    return _count_alert(KEY_DESTINATION_ALERT_COUNT + destination, alert_expiry)
 
 
 def add_mail_to_send_status(
@@ -843,6 +1337,27 @@ def save_certificate(key, cert_obj: models.KubeCerts):
     )
 
 
+def add_kubeconfig_key(key_pem: bytes) -> int:
+    """Adds a private key to the kubeconfig key pool.
+
+    Returns:
+        int: the number of keys in the pool.
+    """
+    return DB.get_db().rpush(KEY_KUBECONFIG_KEY_POOL, base64.b64encode(key_pem))
+
+
+def pop_kubeconfig_key() -> Optional[bytes]:
+    """Takes a private key out of the kubeconfig key pool, if it has any."""
+    key_pem = DB.get_db().lpop(KEY_KUBECONFIG_KEY_POOL)
+    if key_pem is None:
+        return None
+    return base64.b64decode(key_pem)
+
+
+def get_kubeconfig_key_pool_depth() -> int:
+    return DB.get_db().llen(KEY_KUBECONFIG_KEY_POOL)
+
+
 def save_kc_endpoint(ip: IPv4Address, port: models.Port):
     """Save IPv4Address and port for kubeconfig service"""
     DB.get_db().set(KEY_KUBECONFIG_SERVEREP, f"{ip}:{port}")
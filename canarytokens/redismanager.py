@@ -48,15 +48,21 @@ class DB:
 # db.DEFAULT_EXPIRY = 120
 
 KEY_CANARYDROP = "canarydrop:"
+KEY_CANARYDROP_HITS = "canarydrop_hits:"
 KEY_CANARYDROPS_TIMELINE = "canarydrops_timeline:"
+KEY_CANARYDROPS_BY_TYPE = "canarydrops_by_type:"
 KEY_CANARY_DOMAINS = "canary_domains"
 KEY_CANARY_NXDOMAINS = "canary_nxdomains"
 KEY_CANARY_GOOGLE_API_KEY = "canary_google_api_key"
 KEY_CANARY_PATH_ELEMENTS = "canary_path_elements"
 KEY_CANARY_PAGES = "canary_pages"
 KEY_CANARY_IMAGE_PAGES = "canary_image_pages"
+KEY_CANARY_URL_COMPONENTS_VERSION = "canary_url_components_version"
+# Pub/sub channel the URL components' version is published on when it changes
+CHANNEL_CANARY_URL_COMPONENTS = "canary_url_components"
 KEY_USER_ACCOUNT = "account:"
 KEY_CANARYTOKEN_ALERT_COUNT = "canarytoken_alert_count:"
+KEY_DESTINATION_ALERT_COUNT = "destination_alert_count:"
 KEY_IMGUR_TOKEN = "imgur_token:"
 KEY_IMGUR_TOKENS = "imgur_tokens"
 KEY_LINKEDIN_ACCOUNTS = "linkedin_accounts"
@@ -76,7 +82,10 @@ KEY_WIREGUARD_KEYMAP = "wireguard-keymap"
 KEY_KUBECONFIG_SERVEREP = "kubeconfig_server_endpoint"
 KEY_KUBECONFIG_CERTS = "certificate:"
 KEY_KUBECONFIG_HITS = "kchit:"
+KEY_KUBECONFIG_KEY_POOL = "kubeconfig_key_pool"
 KEY_SENT_MAIL_QUEUE = "sent_mail_queue"
 KEY_MAIL_TO_SEND = "mail_to_send"
 KEY_CANARY_RETURN_TOKEN = "return_for_token"
 KEY_AWS_MANAGEMENT_LAMBDA_HANDLE = "aws_management_lambda_handle:"
+KEY_ALERT_OUTBOX = "alert_outbox"
+KEY_ALERT_OUTBOX_DEAD = "alert_outbox_dead"
@@ -1,4 +1,5 @@
 import os
+import threading
 from typing import Any, Literal, Optional
 
 from canarytokens.utils import strtobool
@@ -22,11 +23,20 @@ class SwitchboardSettings(BaseSettings):
     REDIS_HOST: str = "localhost" if strtobool(os.getenv("CI", "False")) else "redis"
     REDIS_PORT: Port = Port(6379)
     REDIS_DB: str = "0"
+    # Maximum number of Redis queries the input channels run concurrently
+    REDIS_QUERY_THREADS: int = 10
+    # Port /metrics is served on for Prometheus to scrape, unset to disable
+    METRICS_PORT: Optional[Port] = None
+    METRICS_IP: str = "127.0.0.1"
 
     REAL_IP_HEADER: str = "x-real-ip"
 
     WG_PRIVATE_KEY_SEED: str
     WG_PRIVATE_KEY_N: str = "1000"
+    # Threads WireGuard handshakes are checked on, 0 checks them on the reactor
+    WG_HANDSHAKE_THREADS: int = 2
+    # Handshakes are dropped while this many are waiting to be checked
+    WG_MAX_PENDING_HANDSHAKES: int = 256
 
     FRONTEND_SETTINGS_PATH: str = "../frontend/frontend.env"
     USING_NGINX: bool = True
@@ -37,10 +47,46 @@ class SwitchboardSettings(BaseSettings):
     ALERT_EMAIL_SUBJECT: str = "Canarytokens Alert"
     MAX_HISTORY: int = 50
     MAX_ALERTS_PER_MINUTE: int = 1
+    # Maximum number of alerts per minute to an email recipient, across all
+    # their tokens. 0 (no limit) by default, as with webhook hosts below.
+    MAX_ALERTS_PER_MINUTE_PER_RECIPIENT: int = 0
+    # Maximum number of alerts per minute to a webhook host, across all
+    # tokens. Many users share hosts like hooks.slack.com, so 0 (no limit)
+    # by default.
+    MAX_ALERTS_PER_MINUTE_PER_WEBHOOK_HOST: int = 0
     # Maximum number of alert failures before a mechanism is disabled
     MAX_ALERT_FAILURES: int = 5
+    # Maximum number of alerts sent on output channels concurrently
+    ALERT_THREADS: int = 10
+    # Seconds to wait for an output channel to send an alert
+    ALERT_TIMEOUT: float = 30
+    # Number of workers delivering alerts from the Redis outbox. With 0 alerts
+    # are sent by the input channels directly and lost on restart.
+    ALERT_OUTBOX_WORKERS: int = 4
+    # Delivery attempts before an alert is moved to the dead-letter stream
+    ALERT_OUTBOX_MAX_ATTEMPTS: int = 8
+    # Seconds before the first retry, doubled after every failed attempt
+    ALERT_OUTBOX_RETRY_DELAY: float = 30
+    # Number of workers dispatching hits to the switchboard. With 0 every hit
+    # is dispatched on a thread of the reactor's threadpool.
+    DISPATCH_WORKERS: int = 10
+    # Maximum number of hits waiting to be dispatched
+    DISPATCH_QUEUE_SIZE: int = 1000
+    # Which hit is shed when the dispatch queue is full
+    DISPATCH_SHED_POLICY: Literal["drop-oldest", "drop-newest"] = "drop-oldest"
+    # Coalesce hits for a token that's already waiting to be dispatched
+    DISPATCH_COALESCE: bool = True
+    # Seconds after a token's hit is dispatched during which its hits are shed
+    DISPATCH_DUPLICATE_WINDOW: float = 0
+    # Maximum number of concurrent requests (and kept-alive connections) to
+    # a single webhook host
+    WEBHOOK_MAX_CONNECTIONS_PER_HOST: int = 10
 
     IPINFO_API_KEY: Optional[SecretStr] = None
+    # Number of IPs whose geo info is kept in memory
+    GEOIP_CACHE_SIZE: int = 10000
+    # MaxMind City database used instead of ipinfo.io (requires maxminddb)
+    GEOIP_MMDB_PATH: Optional[str] = None
     # Mailgun Required Settings
     MAILGUN_API_KEY: Optional[SecretStr] = None
     MAILGUN_BASE_URL: Optional[HttpUrl] = HttpUrl(
@@ -152,6 +198,22 @@ class FrontendSettings(BaseSettings):
     AWS_INFRA_NAME_GENERATION_LIMIT: Optional[int] = 50
     AWS_INFRA_CLEANUP_INTERVAL_SECONDS: int = 6 * 60 * 60
     AWS_INFRA_CLEANUP_MAX_AGE: int = 7 * 24 * 60 * 60
+    # The cleanup checks this many drops at a time, for at most this many
+    # seconds per reactor tick.
+    AWS_INFRA_CLEANUP_BATCH_SIZE: int = 50
+    AWS_INFRA_CLEANUP_TIME_BUDGET: float = 0.05
+    # Number of kubeconfig client keys generated ahead of time. 0 generates
+    # them while tokens are created.
+    KUBECONFIG_KEY_POOL_SIZE: int = 20
+    # The key pool is refilled when it has fewer keys than this
+    KUBECONFIG_KEY_POOL_LOW_WATER: int = 10
+    # Processes Custom Binary tokens' binaries are signed in. 0 signs them in
+    # the request with keys generated as it's handled.
+    AUTHENTICODE_SIGNING_PROCESSES: int = 2
+    # Maximum number of binaries being signed or waiting to be signed
+    AUTHENTICODE_MAX_PENDING_SIGNINGS: int = 8
+    # Number of signing keys generated ahead of time
+    AUTHENTICODE_KEY_POOL_SIZE: int = 16
     GEMINI_API_KEY: Optional[str]
     GEMINI_MODEL: Optional[str] = "gemini-2.5-flash"
     GEMINI_PROMPT_TEMPLATE: Optional[str]
@@ -177,3 +239,44 @@ class FrontendSettings(BaseSettings):
             if field_name == "DEFAULT_GUARDRAIL_TRIGGERS":
                 return [x.strip() for x in raw_val.split(",") if x.strip()]
             return cls.json_loads(raw_val)
+
+
+# Settings are read from the environment and .env files once per process, see
+# `get_switchboard_settings` and `get_frontend_settings`.
+_settings_lock = threading.Lock()
+_switchboard_settings: Optional[SwitchboardSettings] = None
+_frontend_settings: Optional[FrontendSettings] = None
+
+
+def get_switchboard_settings() -> SwitchboardSettings:
+    """Returns this process's `SwitchboardSettings`, loading them on first use."""
+    global _switchboard_settings
+    if _switchboard_settings is None:
+        with _settings_lock:
+            if _switchboard_settings is None:
+                _switchboard_settings = SwitchboardSettings()
+    return _switchboard_settings
+
+
+def get_frontend_settings() -> FrontendSettings:
+    """Returns this process's `FrontendSettings`, loading them on first use."""
+    global _frontend_settings
+    if _frontend_settings is None:
+        with _settings_lock:
+            if _frontend_settings is None:
+                _frontend_settings = FrontendSettings()
+    return _frontend_settings
+
+
+def reload_settings() -> None:
+    """
+    Re-reads the switchboard settings, if they've been loaded. Invalid
+    settings raise and leave the current ones in place.
+
+    Frontend settings are never reloaded: several modules keep them in
+    globals from import, which a reload wouldn't reach.
+    """
+    global _switchboard_settings
+    with _settings_lock:
+        if _switchboard_settings is not None:
+            _switchboard_settings = SwitchboardSettings()
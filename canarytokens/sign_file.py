@@ -1,87 +1,382 @@
-import shlex
-import shutil
-import subprocess
-import tempfile
-from pathlib import Path
-
-
-def authenticode_sign_binary(
-    nxdomain_token_url: str, inputfile: Path, outputfile: Path
-):  # pragma: no cover
-    try:
-        tmpdir = tempfile.mkdtemp()
-
-        cmd = "cp root-ca.conf {tmpdir}/root-ca.conf".format(tmpdir=tmpdir)
-        proc = subprocess.Popen(
-            shlex.split(cmd),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+"""
+Authenticode signing of PE files (exe, dll) in process, with `cryptography`.
+
+A signed binary carries a certificate whose Authority Information Access
+and CRL Distribution Points point at the token's NXDOMAIN URL, so Windows
+looks the token up when it checks the signature. The certificate is issued
+by a throwaway CA, as `openssl ca` did with `frontend/root-ca.conf`.
+
+The PKCS #7 SignedData wrapping an Authenticode `SpcIndirectDataContent`
+can't be built with `cryptography`'s PKCS #7 builder, which only signs
+`data` content, so its DER is encoded here.
+"""
+
+from __future__ import annotations
+
+import array
+import datetime
+import hashlib
+import struct
+import sys
+from typing import Iterable
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+from canarytokens.exceptions import InvalidPEFile
+
+CA_NAME = x509.Name(
+    [
+        x509.NameAttribute(NameOID.COUNTRY_NAME, "ZA"),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, "Thinkst Applied Research"),
+        x509.NameAttribute(
+            NameOID.ORGANIZATIONAL_UNIT_NAME, "Thinkst Applied Research CA"
+        ),
+        x509.NameAttribute(NameOID.COMMON_NAME, "Thinkst Root CA"),
+    ]
+)
+SIGNER_NAME = x509.Name(
+    [
+        x509.NameAttribute(NameOID.COUNTRY_NAME, "US"),
+        x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, "Washington"),
+        x509.NameAttribute(NameOID.LOCALITY_NAME, "Redmond"),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, "Microsoft Corporation"),
+        x509.NameAttribute(NameOID.COMMON_NAME, "Microsoft Windows"),
+    ]
+)
+
+OID_SHA256 = "2.16.840.1.101.3.4.2.1"
+OID_RSA_ENCRYPTION = "1.2.840.113549.1.1.1"
+OID_SIGNED_DATA = "1.2.840.113549.1.7.2"
+OID_CONTENT_TYPE = "1.2.840.113549.1.9.3"
+OID_MESSAGE_DIGEST = "1.2.840.113549.1.9.4"
+OID_SPC_INDIRECT_DATA = "1.3.6.1.4.1.311.2.1.4"
+OID_SPC_STATEMENT_TYPE = "1.3.6.1.4.1.311.2.1.11"
+OID_SPC_SP_OPUS_INFO = "1.3.6.1.4.1.311.2.1.12"
+OID_SPC_PE_IMAGE_DATA = "1.3.6.1.4.1.311.2.1.15"
+OID_SPC_INDIVIDUAL_SP_KEY_PURPOSE = "1.3.6.1.4.1.311.2.1.21"
+
+PE32_MAGIC = 0x10B
+PE32_PLUS_MAGIC = 0x20B
+# Index of the certificate table in the optional header's data directories
+IMAGE_DIRECTORY_ENTRY_SECURITY = 4
+WIN_CERT_REVISION_2_0 = 0x0200
+WIN_CERT_TYPE_PKCS_SIGNED_DATA = 0x0002
+
+
+def make_ca(key: rsa.RSAPrivateKey) -> x509.Certificate:
+    """Returns a self-signed CA certificate for `key`."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(CA_NAME)
+        .issuer_name(CA_NAME)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=False,
+                content_commitment=False,
+                key_encipherment=False,
+                data_encipherment=False,
+                key_agreement=False,
+                key_cert_sign=True,
+                crl_sign=True,
+                encipher_only=False,
+                decipher_only=False,
+            ),
+            critical=True,
         )
-        proc.communicate()
-
-        with open("{tmpdir}/root-ca.conf".format(tmpdir=tmpdir), "r") as fp:
-            filedata = fp.read()
-            newdata = filedata.replace("_TOKEN_", nxdomain_token_url)
-            newdata = newdata.replace("TMPDIR", tmpdir)
-
-        with open("{tmpdir}/root-ca.conf".format(tmpdir=tmpdir), "w") as fp:
-            fp.write(newdata)
-
-        cmd = 'echo "00" > {tmpdir}/ser'.format(tmpdir=tmpdir)
-        proc = subprocess.Popen(
-            cmd,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(key.public_key()),
+            critical=False,
         )
-        proc.communicate()
+        .sign(key, hashes.SHA256())
+    )
 
-        cmd = "touch {tmpdir}/db  {tmpdir}/db.attr".format(tmpdir=tmpdir)
-        proc = subprocess.Popen(
-            shlex.split(cmd),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        proc.communicate()
 
-        cmd = "openssl req -x509 -new -keyout {tmpdir}/rootCA.key -out {tmpdir}/rootCA.crt -config {tmpdir}/root-ca.conf -days 365 -nodes".format(
-            tmpdir=tmpdir
+def make_signing_certificate(
+    nxdomain_token_url: str,
+    key: rsa.RSAPrivateKey,
+    ca_key: rsa.RSAPrivateKey,
+    ca_cert: x509.Certificate,
+) -> x509.Certificate:
+    """Returns a code signing certificate for `key`, issued by `ca_cert`, that
+    sends Windows to `nxdomain_token_url` for its issuer, OCSP and CRL."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(SIGNER_NAME)
+        .issuer_name(ca_cert.subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=3652))
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=True,
+                content_commitment=False,
+                key_encipherment=True,
+                data_encipherment=True,
+                key_agreement=True,
+                key_cert_sign=False,
+                crl_sign=False,
+                encipher_only=False,
+                decipher_only=False,
+            ),
+            critical=True,
         )
-        proc = subprocess.Popen(
-            shlex.split(cmd),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+        .add_extension(
+            x509.BasicConstraints(ca=False, path_length=None), critical=False
         )
-        proc.communicate()
-
-        cmd = 'openssl req -new -keyout {tmpdir}/cert.key -out {tmpdir}/cert.csr -nodes -subj "/C=US/ST=Washington/L=Redmond/O=Microsoft Corporation/CN=Microsoft Windows"'.format(
-            tmpdir=tmpdir
+        .add_extension(
+            x509.ExtendedKeyUsage(
+                [
+                    ExtendedKeyUsageOID.SERVER_AUTH,
+                    ExtendedKeyUsageOID.CLIENT_AUTH,
+                    ExtendedKeyUsageOID.CODE_SIGNING,
+                ]
+            ),
+            critical=False,
         )
-        proc = subprocess.Popen(
-            shlex.split(cmd),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+        .add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(key.public_key()),
+            critical=False,
         )
-        proc.communicate()
-
-        cmd = "openssl ca -batch -config {tmpdir}/root-ca.conf -cert {tmpdir}/rootCA.crt -keyfile {tmpdir}/rootCA.key -in {tmpdir}/cert.csr -out {tmpdir}/cert.crt".format(
-            tmpdir=tmpdir,
+        .add_extension(
+            x509.AuthorityInformationAccess(
+                [
+                    x509.AccessDescription(
+                        x509.AuthorityInformationAccessOID.OCSP,
+                        x509.UniformResourceIdentifier(
+                            f"{nxdomain_token_url}/any_path.oscp?any=params"
+                        ),
+                    ),
+                    x509.AccessDescription(
+                        x509.AuthorityInformationAccessOID.CA_ISSUERS,
+                        x509.UniformResourceIdentifier(
+                            f"{nxdomain_token_url}/any_path.cer?any=params"
+                        ),
+                    ),
+                ]
+            ),
+            critical=False,
         )
-        proc = subprocess.Popen(
-            shlex.split(cmd),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+        .add_extension(
+            x509.CRLDistributionPoints(
+                [
+                    x509.DistributionPoint(
+                        full_name=[
+                            x509.UniformResourceIdentifier(
+                                f"{nxdomain_token_url}/any_path.crl?any=params"
+                            )
+                        ],
+                        relative_name=None,
+                        reasons=None,
+                        crl_issuer=None,
+                    )
+                ]
+            ),
+            critical=False,
         )
-        proc.communicate()
+        .sign(ca_key, hashes.SHA256())
+    )
 
-        cmd = "osslsigncode sign -certs {tmpdir}/cert.crt -key {tmpdir}/cert.key -in {inputfile} -out {outputfile}".format(
-            tmpdir=tmpdir, inputfile=inputfile, outputfile=outputfile
-        )
-        proc = subprocess.Popen(
-            shlex.split(cmd),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+
+def _der(tag: int, content: bytes) -> bytes:
+    length = len(content)
+    if length < 0x80:
+        return bytes([tag, length]) + content
+    length_bytes = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([tag, 0x80 | len(length_bytes)]) + length_bytes + content
+
+
+def _sequence(*items: bytes) -> bytes:
+    return _der(0x30, b"".join(items))
+
+
+def _set(items: Iterable[bytes], tag: int = 0x31) -> bytes:
+    # DER orders the elements of a SET OF by their encoding.
+    return _der(tag, b"".join(sorted(items)))
+
+
+def _integer(value: int) -> bytes:
+    return _der(0x02, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+
+def _octet_string(value: bytes) -> bytes:
+    return _der(0x04, value)
+
+
+def _oid(dotted: str) -> bytes:
+    arcs = [int(arc) for arc in dotted.split(".")]
+    encoded = bytearray([40 * arcs[0] + arcs[1]])
+    for arc in arcs[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        encoded.extend(reversed(chunk))
+    return _der(0x06, bytes(encoded))
+
+
+def _algorithm(oid: str) -> bytes:
+    return _sequence(_oid(oid), b"\x05\x00")
+
+
+def _attribute(oid: str, value: bytes) -> bytes:
+    return _sequence(_oid(oid), _set([value]))
+
+
+def _spc_indirect_data_content(pe_digest: bytes) -> bytes:
+    # SpcPeImageData with no flags and the customary "<<<Obsolete>>>" file link
+    obsolete = "<<<Obsolete>>>".encode("utf-16-be")
+    pe_image_data = _sequence(
+        _der(0x03, b"\x00"),
+        _der(0xA0, _der(0xA2, _der(0x80, obsolete))),
+    )
+    return _sequence(
+        _sequence(_oid(OID_SPC_PE_IMAGE_DATA), pe_image_data),
+        _sequence(_algorithm(OID_SHA256), _octet_string(pe_digest)),
+    )
+
+
+def _signed_data(
+    pe_digest: bytes,
+    key: rsa.RSAPrivateKey,
+    cert: x509.Certificate,
+    chain: Iterable[x509.Certificate],
+) -> bytes:
+    """Returns the PKCS #7 ContentInfo holding the Authenticode signature of
+    a PE file whose Authenticode hash is `pe_digest`."""
+    content = _spc_indirect_data_content(pe_digest)
+    # The message digest covers the content's value, without its header.
+    _, content_value = _split_der(content)
+    attributes = [
+        _attribute(OID_CONTENT_TYPE, _oid(OID_SPC_INDIRECT_DATA)),
+        _attribute(OID_SPC_SP_OPUS_INFO, _sequence()),
+        _attribute(
+            OID_SPC_STATEMENT_TYPE, _sequence(_oid(OID_SPC_INDIVIDUAL_SP_KEY_PURPOSE))
+        ),
+        _attribute(
+            OID_MESSAGE_DIGEST, _octet_string(hashlib.sha256(content_value).digest())
+        ),
+    ]
+    # The attributes are signed as a SET but sent as [0] IMPLICIT.
+    signature = key.sign(_set(attributes), padding.PKCS1v15(), hashes.SHA256())
+    signer_info = _sequence(
+        _integer(1),
+        _sequence(cert.issuer.public_bytes(), _integer(cert.serial_number)),
+        _algorithm(OID_SHA256),
+        _set(attributes, tag=0xA0),
+        _algorithm(OID_RSA_ENCRYPTION),
+        _octet_string(signature),
+    )
+    certificates = b"".join(c.public_bytes(Encoding.DER) for c in [cert, *chain])
+    signed_data = _sequence(
+        _integer(1),
+        _set([_algorithm(OID_SHA256)]),
+        _sequence(_oid(OID_SPC_INDIRECT_DATA), _der(0xA0, content)),
+        _der(0xA0, certificates),
+        _set([signer_info]),
+    )
+    return _sequence(_oid(OID_SIGNED_DATA), _der(0xA0, signed_data))
+
+
+def _split_der(encoded: bytes) -> tuple[bytes, bytes]:
+    """Splits a DER element into its header and its value."""
+    if encoded[1] & 0x80:
+        header_length = 2 + (encoded[1] & 0x7F)
+    else:
+        header_length = 2
+    return encoded[:header_length], encoded[header_length:]
+
+
+def _pe_layout(pe: bytes) -> tuple[int, int]:
+    """Returns the offsets of the checksum and of the certificate table's
+    entry in the data directories of `pe`."""
+    if len(pe) < 0x40 or pe[:2] != b"MZ":
+        raise InvalidPEFile("Not a PE file: missing the MZ header")
+    (pe_offset,) = struct.unpack_from("<I", pe, 0x3C)
+    if pe[pe_offset : pe_offset + 4] != b"PE\x00\x00":  # noqa: E203
+        raise InvalidPEFile("Not a PE file: missing the PE signature")
+    optional_header = pe_offset + 24
+    if len(pe) < optional_header + 2:
+        raise InvalidPEFile("Truncated PE file")
+    (magic,) = struct.unpack_from("<H", pe, optional_header)
+    if magic == PE32_MAGIC:
+        data_directories = optional_header + 96
+    elif magic == PE32_PLUS_MAGIC:
+        data_directories = optional_header + 112
+    else:
+        raise InvalidPEFile(f"Unknown optional header magic {magic:#x}")
+    if len(pe) < data_directories:
+        raise InvalidPEFile("Truncated PE file")
+    (directory_count,) = struct.unpack_from("<I", pe, data_directories - 4)
+    security_entry = data_directories + 8 * IMAGE_DIRECTORY_ENTRY_SECURITY
+    if directory_count <= IMAGE_DIRECTORY_ENTRY_SECURITY or len(pe) < (
+        security_entry + 8
+    ):
+        raise InvalidPEFile("PE file has no certificate table entry")
+    return optional_header + 64, security_entry
+
+
+def _pe_checksum(pe: bytes, checksum_offset: int) -> int:
+    """Returns the PE checksum of `pe`, skipping its checksum field."""
+    words = array.array("H")
+    words.frombytes(pe[:checksum_offset] + b"\x00" * 4 + pe[checksum_offset + 4 :])  # noqa: E203
+    if sys.byteorder == "big":
+        words.byteswap()
+    checksum = sum(words)
+    while checksum > 0xFFFF:
+        checksum = (checksum & 0xFFFF) + (checksum >> 16)
+    return checksum + len(pe)
+
+
+def authenticode_sign(
+    pe: bytes,
+    key: rsa.RSAPrivateKey,
+    cert: x509.Certificate,
+    chain: Iterable[x509.Certificate] = (),
+) -> bytes:
+    """Returns the PE file `pe` signed by `key` with `cert`, replacing any
+    signature it already has.
+
+    Raises:
+        InvalidPEFile: if `pe` isn't a PE file.
+    """
+    checksum_offset, security_entry = _pe_layout(pe)
+    cert_table_offset, _ = struct.unpack_from("<II", pe, security_entry)
+    if cert_table_offset:
+        # The certificate table is always at the end of the file.
+        pe = pe[:cert_table_offset]
+    # The certificate table is 8 byte aligned, the padding is hashed too.
+    pe = bytearray(pe + b"\x00" * (-len(pe) % 8))
+
+    pe_digest = hashlib.sha256()
+    pe_digest.update(pe[:checksum_offset])
+    pe_digest.update(pe[checksum_offset + 4 : security_entry])  # noqa: E203
+    pe_digest.update(pe[security_entry + 8 :])  # noqa: E203
+    signature = _signed_data(pe_digest.digest(), key, cert, chain)
+    signature += b"\x00" * (-len(signature) % 8)
+
+    cert_table = (
+        struct.pack(
+            "<IHH",
+            8 + len(signature),
+            WIN_CERT_REVISION_2_0,
+            WIN_CERT_TYPE_PKCS_SIGNED_DATA,
         )
-        proc.communicate()
-    finally:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        + signature
+    )
+    struct.pack_into("<II", pe, security_entry, len(pe), len(cert_table))
+    pe += cert_table
+    struct.pack_into("<I", pe, checksum_offset, _pe_checksum(pe, checksum_offset))
+    return bytes(pe)
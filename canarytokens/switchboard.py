@@ -4,16 +4,23 @@ Class that receives alerts, and dispatches them to the registered endpoint.
 
 from __future__ import annotations
 
-from typing import Dict, Optional, Union
+import time
+from concurrent import futures
+from typing import TYPE_CHECKING, Dict, Optional, Union
 
 from twisted.logger import Logger
 
 from canarytokens import channel, queries
 from canarytokens.canarydrop import Canarydrop
+from canarytokens.constants import OUTPUT_CHANNEL_EMAIL, OUTPUT_CHANNEL_WEBHOOK
 from canarytokens.exceptions import DuplicateChannel, InvalidChannel
 from canarytokens.models import AnyTokenHit, AnyTokenExposedHit
 from canarytokens.settings import SwitchboardSettings
 
+if TYPE_CHECKING:
+    from canarytokens.alert_outbox import AlertOutbox
+    from canarytokens.dispatch_queue import DispatchQueue
+
 log = Logger()
 
 
@@ -30,6 +37,17 @@ class Switchboard:
             self.switchboard_settings = None
         self.input_channels = {}
         self.output_channels: Dict[str, channel.OutputChannel] = {}
+        # Alerts are sent on all of a canarydrop's output channels at once.
+        self.alert_executor = futures.ThreadPoolExecutor(
+            max_workers=(
+                switchboard_settings.ALERT_THREADS if switchboard_settings else 10
+            ),
+            thread_name_prefix="output-channels",
+        )
+        # When set, alerts are queued for its workers instead of sent here.
+        self.alert_outbox: Optional[AlertOutbox] = None
+        # When set, input channels queue hits for its workers to dispatch.
+        self.dispatch_queue: Optional[DispatchQueue] = None
         log.info("Canarytokens switchboard started")
 
     def add_input_channel(self, name=None, channel=None):
@@ -55,6 +73,13 @@ class Switchboard:
 
         self.output_channels[name] = channel
 
+    def reload_settings(self, switchboard_settings: SwitchboardSettings) -> None:
+        """Switches the switchboard and its output channels to
+        `switchboard_settings`."""
+        self.switchboard_settings = switchboard_settings
+        for output_channel in self.output_channels.values():
+            output_channel.settings_reloaded(switchboard_settings)
+
     def dispatch(
         self, canarydrop: Canarydrop, token_hit: Union[AnyTokenHit, AnyTokenExposedHit]
     ) -> str:
@@ -66,13 +91,14 @@ class Switchboard:
                 f"{token_hit.input_channel} not in input channels: {self.input_channels}"
             )
 
-        if not canarydrop.alertable(
-            alert_limit=(
-                self.switchboard_settings.MAX_ALERTS_PER_MINUTE
-                if self.switchboard_settings
-                else 1000
-            )
-        ):
+        alert_limit = (
+            self.switchboard_settings.MAX_ALERTS_PER_MINUTE
+            if self.switchboard_settings
+            else 1000
+        )
+        # Counting and checking in one step, concurrent dispatches can't
+        # both slip under the limit.
+        if queries.do_accounting(canarydrop=canarydrop, alert_expiry=60) > alert_limit:
             log.warn(
                 "Token {token} is not alertable at this stage.".format(
                     token=canarydrop.canarytoken.value(),
@@ -80,8 +106,53 @@ class Switchboard:
             )
             return
 
-        # TODO: update accounting info
-        queries.do_accounting(canarydrop=canarydrop, alert_expiry=60)
+        output_channels = self._get_output_channels(canarydrop)
+        if self.alert_outbox is not None:
+            return self._queue_alerts(canarydrop, token_hit, output_channels)
+
+        sends: Dict[futures.Future, channel.OutputChannel] = {}
+        for output_channel in output_channels:
+            future = self.alert_executor.submit(
+                output_channel.send_alert,
+                input_channel=self.input_channels[token_hit.input_channel],
+                canarydrop=canarydrop,
+                token_hit=token_hit,
+            )
+            sends[future] = output_channel
+
+        statuses = self._wait_for_alerts(canarydrop, sends)
+        summary = ", ".join(f"{name}: {status}" for name, status in statuses.items())
+        return f"Dispatched to output channel for: {canarydrop.canarytoken.value()} ({summary})"
+
+    def _queue_alerts(
+        self,
+        canarydrop: Canarydrop,
+        token_hit: Union[AnyTokenHit, AnyTokenExposedHit],
+        output_channels: list[channel.OutputChannel],
+    ) -> str:
+        for output_channel in output_channels:
+            self.alert_outbox.enqueue(canarydrop, token_hit, output_channel.name)
+        queued = ", ".join(output_channel.name for output_channel in output_channels)
+        return f"Queued alerts for: {canarydrop.canarytoken.value()} ({queued})"
+
+    def _get_destination_limit(self, output_channel: str) -> int:
+        if self.switchboard_settings is None:
+            return 0
+        if output_channel == OUTPUT_CHANNEL_EMAIL:
+            return self.switchboard_settings.MAX_ALERTS_PER_MINUTE_PER_RECIPIENT
+        if output_channel == OUTPUT_CHANNEL_WEBHOOK:
+            return self.switchboard_settings.MAX_ALERTS_PER_MINUTE_PER_WEBHOOK_HOST
+        return 0
+
+    def _get_output_channels(
+        self, canarydrop: Canarydrop
+    ) -> list[channel.OutputChannel]:
+        """
+        Returns the output channels to alert on for `canarydrop`, leaving out
+        those that aren't available or whose destination (e.g. the email
+        recipient) has had too many alerts in the last minute.
+        """
+        output_channels = []
         for requested_output_channel in canarydrop.get_requested_output_channels():
             output_channel = self.output_channels.get(requested_output_channel, None)
             if output_channel is None:
@@ -89,10 +160,57 @@ class Switchboard:
                     f"Output channel: {requested_output_channel} is not available. Dropping the notification for: {canarydrop.canarytoken.value()} on this channel."
                 )
                 continue
-            # TODO: we can fire all these off in 'parallel'
-            output_channel.send_alert(
-                input_channel=self.input_channels[token_hit.input_channel],
-                canarydrop=canarydrop,
-                token_hit=token_hit,
-            )
-        return f"Dispatched to output channel for: {canarydrop.canarytoken.value()}"
+            limit = self._get_destination_limit(requested_output_channel)
+            destination = canarydrop.get_alert_destination(requested_output_channel)
+            if (
+                limit
+                and destination
+                and queries.do_destination_accounting(destination, alert_expiry=60)
+                > limit
+            ):
+                log.warn(
+                    f"Too many alerts to {destination}. Dropping the notification for: {canarydrop.canarytoken.value()} on {requested_output_channel}."
+                )
+                continue
+            output_channels.append(output_channel)
+        return output_channels
+
+    def _get_alert_timeout(self, output_channel: channel.OutputChannel) -> float:
+        if output_channel.ALERT_TIMEOUT is not None:
+            return output_channel.ALERT_TIMEOUT
+        return (
+            self.switchboard_settings.ALERT_TIMEOUT if self.switchboard_settings else 30
+        )
+
+    def _wait_for_alerts(
+        self,
+        canarydrop: Canarydrop,
+        sends: Dict[futures.Future, channel.OutputChannel],
+    ) -> Dict[str, str]:
+        """
+        Waits for each output channel to send its alert or for its timeout to
+        expire, and logs the outcome per channel. A channel that times out is
+        left to finish in the background.
+
+        Returns:
+            Dict[str, str]: output channel name -> "sent", "failed" or "timed out".
+        """
+        started = time.monotonic()
+        statuses: Dict[str, str] = {}
+        for future, output_channel in sends.items():
+            timeout = self._get_alert_timeout(output_channel)
+            try:
+                future.result(timeout=max(0, started + timeout - time.monotonic()))
+            except futures.TimeoutError:
+                statuses[output_channel.name] = "timed out"
+                log.error(
+                    f"Output channel: {output_channel.name} did not send the alert for: {canarydrop.canarytoken.value()} within {timeout}s."
+                )
+            except Exception as e:
+                statuses[output_channel.name] = "failed"
+                log.error(
+                    f"Output channel: {output_channel.name} failed to send the alert for: {canarydrop.canarytoken.value()}. Error: {e}"
+                )
+            else:
+                statuses[output_channel.name] = "sent"
+        return statuses
@@ -16,7 +16,7 @@ from twisted.web.http import Request
 from twisted.web.util import redirectTo
 
 from canarytokens.saml import extract_identity, prepare_request
-from canarytokens.settings import SwitchboardSettings
+from canarytokens.settings import get_switchboard_settings
 
 from canarytokens import canarydrop, msreg, queries
 from canarytokens.constants import (
@@ -312,9 +312,8 @@ class Canarytoken(object):
     def _grab_http_general_info(request: Request):
         """"""
         useragent = request.getHeader("User-Agent") or "(no user-agent specified)"
-        switchboard_settings = SwitchboardSettings()
         src_ip = (
-            request.getHeader(switchboard_settings.REAL_IP_HEADER)
+            request.getHeader(get_switchboard_settings().REAL_IP_HEADER)
             or request.client.host
         )
         # DESIGN/TODO: this makes a call to third party ensure we happy with fails here
@@ -786,9 +785,13 @@ class Canarytoken(object):
         return http_general_info, {"src_data": src_data}
 
     @staticmethod
-    def _get_response_for_idp_app(canarydrop: canarydrop.Canarydrop, request: Request):
+    def _get_response_for_idp_app(
+        canarydrop: canarydrop.Canarydrop, request: Request, return_for_token: str
+    ):
         if not canarydrop.redirect_url:
-            return Canarytoken._get_response_for_web(canarydrop, request)
+            return Canarytoken._get_response_for_web(
+                canarydrop, request, return_for_token
+            )
         if not canarydrop.browser_scanner_enabled:
             return Canarytoken._get_response_for_fast_redirect(canarydrop, request)
         return Canarytoken._get_response_for_slow_redirect(canarydrop, request)
@@ -830,7 +833,7 @@ class Canarytoken(object):
         ):
             redirect_url = "http://" + redirect_url
         template_params = {
-            "key": canarydrop.triggered_details.hits[-1].time_of_hit,
+            "key": canarydrop.get_latest_hit().time_of_hit,
             "canarytoken": canarydrop.canarytoken.value(),
             "redirect_url": redirect_url,
             "include_browser_scanner": True,
@@ -845,12 +848,12 @@ class Canarytoken(object):
 
     @staticmethod
     def _get_response_for_web(
-        canarydrop: canarydrop.Canarydrop, request: Request
+        canarydrop: canarydrop.Canarydrop, request: Request, return_for_token: str
     ) -> bytes:
         if request.getHeader("Accept") and "text/html" in request.getHeader("Accept"):
             request.setHeader("Content-Type", "text/html")
             if canarydrop.browser_scanner_enabled:
-                latest_hit_time = canarydrop.triggered_details.hits[-1].time_of_hit
+                latest_hit_time = canarydrop.get_latest_hit().time_of_hit
                 template_params = {
                     "key": latest_hit_time,
                     "canarytoken": canarydrop.canarytoken.value(),
@@ -860,7 +863,7 @@ class Canarytoken(object):
                 }
                 template = get_template_env().get_template("fortune.html")
                 return template.render(**template_params).encode()
-            elif queries.get_return_for_token() == "fortune":
+            elif return_for_token == "fortune":
                 template_params = {
                     "include_pale_blue_dot": True,
                 }
@@ -921,7 +924,7 @@ class Canarytoken(object):
 
     @staticmethod
     def _get_response_for_web_image(
-        canarydrop: canarydrop.Canarydrop, request: Request
+        canarydrop: canarydrop.Canarydrop, request: Request, return_for_token: str
     ):
         html_accepted = request.getHeader(
             "Accept"
@@ -933,7 +936,7 @@ class Canarytoken(object):
         if html_accepted and not image_accepted:
             if canarydrop.browser_scanner_enabled:
                 request.setHeader("Content-Type", "text/html")
-                latest_hit_time = canarydrop.triggered_details.hits[-1].time_of_hit
+                latest_hit_time = canarydrop.get_latest_hit().time_of_hit
                 template_params = {
                     "key": latest_hit_time,
                     "canarytoken": canarydrop.canarytoken.value(),
@@ -943,7 +946,7 @@ class Canarytoken(object):
                 }
                 template = get_template_env().get_template("fortune.html")
                 return template.render(**template_params).encode()
-            elif queries.get_return_for_token() == "fortune":
+            elif return_for_token == "fortune":
                 request.setHeader("Content-Type", "text/html")
                 template_params = {
                     "request": request,
@@ -1090,7 +1093,9 @@ class Canarytoken(object):
         return http_general_info, src_data
 
     @staticmethod
-    def _get_response_for_legacy(canarydrop: canarydrop.Canarydrop, request: Request):
+    def _get_response_for_legacy(
+        canarydrop: canarydrop.Canarydrop, request: Request, return_for_token: str
+    ):
         """
         Since we don't know what type legacy tokens are, we need to derive the correct response here.
         The token types that we could be responding for are:
@@ -1101,7 +1106,7 @@ class Canarytoken(object):
         if request.getHeader("Accept") and "text/html" in request.getHeader("Accept"):
             request.setHeader("Content-Type", "text/html")
             if canarydrop.browser_scanner_enabled:
-                latest_hit_time = canarydrop.triggered_details.hits[-1].time_of_hit
+                latest_hit_time = canarydrop.get_latest_hit().time_of_hit
                 template_params = {
                     "key": latest_hit_time,
                     "canarytoken": canarydrop.canarytoken.value(),
@@ -1111,7 +1116,7 @@ class Canarytoken(object):
                 }
                 template = get_template_env().get_template("fortune.html")
                 return template.render(**template_params).encode()
-            elif queries.get_return_for_token() == "fortune":
+            elif return_for_token == "fortune":
                 request.setHeader("Content-Type", "text/html")
                 template_params = {
                     "request": request,
@@ -9,9 +9,9 @@ else:
     from backports.strenum import StrEnum  # Python < 3.11
 from hashlib import sha1
 
-from canarytokens.settings import FrontendSettings
+from canarytokens.settings import get_frontend_settings
 
-settings = FrontendSettings()
+settings = get_frontend_settings()
 
 ACCOUNT_ID = settings.CLOUDFLARE_ACCOUNT_ID
 NAMESPACE_ID = settings.CLOUDFLARE_NAMESPACE
@@ -3,10 +3,13 @@ import hmac
 import random
 import struct
 import textwrap
+import threading
+import time
+from collections import OrderedDict
 from enum import Enum
 from functools import cache
 from hashlib import blake2s
-from typing import MutableSequence, NamedTuple, Sequence, Tuple
+from typing import MutableSequence, NamedTuple, Optional, Sequence, Tuple
 
 import nacl.bindings
 import nacl.encoding
@@ -21,6 +24,7 @@ log = Logger()
 
 DEFAULT_PORT = 51820
 WG_LABEL_MAC1 = "mac1----".encode("utf-8")
+BLAKE2S_128_SIZE = 16
 BLAKE2S_256_SIZE = 32
 WG_KEY_LEN = 32
 
@@ -39,6 +43,10 @@ MSG_INITIATION_MAX_TIME_DIFF = 5
 
 TAI64N_BASE = 0x400000000000000A
 
+NOISE_CONSTRUCTION = "Noise_IKpsk2_25519_ChaChaPoly_BLAKE2s".encode("utf-8")
+WG_IDENTIFIER = "WireGuard v1 zx2c4 Jason@zx2c4.com".encode("utf-8")
+ZERO_NONCE = b"\x00" * 12
+
 
 class Device(NamedTuple):
     privateKey: nacl.public.PrivateKey
@@ -119,6 +127,88 @@ def getDevices(
     return devices
 
 
+class DeviceResolver:
+    """
+    Finds the device an initiation message was sent to from its MAC1, which
+    is keyed with a hash of the device's public key. A peer keeps sending to
+    the same device, so the device last matched for a source address is tried
+    before every other device is.
+    """
+
+    def __init__(self, devices: Sequence[Device], cache_size: int = 4096) -> None:
+        self.devices = devices
+        self.cache_size = cache_size
+        # Keyed once, checking a MAC1 then only hashes the message.
+        self._mac1_hashes = [
+            blake2s(digest_size=BLAKE2S_128_SIZE, key=device.mac1_key)
+            for device in devices
+        ]
+        self._last_matched: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _mac1_matches(self, device_idx: int, data: bytes, mac1: bytes) -> bool:
+        mac = self._mac1_hashes[device_idx].copy()
+        mac.update(data)
+        return mac.digest() == mac1
+
+    def resolve(self, data: bytes, mac1: bytes, src_host: str) -> Optional[Device]:
+        """
+        Returns the device `mac1` was computed over `data` for, or None.
+        """
+        with self._lock:
+            last_matched = self._last_matched.get(src_host)
+        if last_matched is not None and self._mac1_matches(last_matched, data, mac1):
+            return self.devices[last_matched]
+
+        for device_idx in range(len(self.devices)):
+            if self._mac1_matches(device_idx, data, mac1):
+                with self._lock:
+                    self._last_matched[src_host] = device_idx
+                    self._last_matched.move_to_end(src_host)
+                    if len(self._last_matched) > self.cache_size:
+                        self._last_matched.popitem(last=False)
+                return self.devices[device_idx]
+        return None
+
+
+def initiationMessage(
+    device: Device,
+    peerPrivateKey: nacl.public.PrivateKey,
+    sessionIndex: int = 0,
+    timestamp: Optional[float] = None,
+) -> bytes:
+    """Builds the handshake initiation message a peer with `peerPrivateKey`
+    sends to `device`, e.g. to test the WireGuard channel without a peer."""
+    devicePublicKey = device.privateKey.public_key.encode()
+    ephemeral = nacl.public.PrivateKey.generate()
+    ephemeralPublicKey = ephemeral.public_key.encode()
+
+    chainKey = hash(NOISE_CONSTRUCTION)
+    hash0 = mixhash(mixhash(chainKey, WG_IDENTIFIER), devicePublicKey)
+    hash1 = mixhash(hash0, ephemeralPublicKey)
+    chainKey = mixKey(chainKey, ephemeralPublicKey)
+    chainKey, key0 = KDF2(chainKey, sharedSecret(ephemeral.encode(), devicePublicKey))
+    static = ChaCha20Poly1305(key0).encrypt(
+        ZERO_NONCE, peerPrivateKey.public_key.encode(), hash1
+    )
+    hash2 = mixhash(hash1, static)
+    _, key1 = KDF2(chainKey, sharedSecret(peerPrivateKey.encode(), devicePublicKey))
+    seconds = int(time.time() if timestamp is None else timestamp)
+    tai64n = struct.pack("!QI", seconds + TAI64N_BASE, 0)
+    encryptedTimestamp = ChaCha20Poly1305(key1).encrypt(ZERO_NONCE, tai64n, hash2)
+
+    message = struct.pack(
+        "<II32s48s28s",
+        MessageType.Initiation.value,
+        sessionIndex,
+        ephemeralPublicKey,
+        static,
+        encryptedTimestamp,
+    )
+    mac1 = blake2s(message, digest_size=BLAKE2S_128_SIZE, key=device.mac1_key)
+    return message + mac1.digest() + b"\x00" * BLAKE2S_128_SIZE
+
+
 def generateCanarytokenPrivateKey(
     canarytoken: str, wg_private_key_seed: str, wg_private_key_n: str
 ) -> str:
@@ -1,10 +1,17 @@
 from __future__ import absolute_import, print_function
 
+import copy
 import datetime
-import shutil
+import re
+import struct
 import tempfile
+import threading
+import zlib
+from io import BytesIO
 from os import close, unlink
-from zipfile import ZipFile, ZipInfo
+from pathlib import Path
+from typing import Callable, Optional
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
 
 MODE_READONLY = 0x01
 MODE_HIDDEN = 0x02
@@ -13,6 +20,11 @@ MODE_DIRECTORY = 0x10
 MODE_ARCHIVE = 0x20
 MODE_FILE = 0x80
 
+# Placeholders in the Office document templates
+OFFICE_URL_PLACEHOLDER = "HONEYDROP_TOKEN_URL"
+OFFICE_CREATED_PLACEHOLDER = "aaaaaaaaaaaaaaaaaaaa"
+OFFICE_MODIFIED_PLACEHOLDER = "bbbbbbbbbbbbbbbbbbbb"
+
 
 def make_canary_desktop_ini(hostname: str, dummyfile: str = "resource.dll") -> bytes:
     return (
@@ -124,17 +136,217 @@ def make_canary_zip(hostname: str) -> bytes:
     return contents
 
 
-def zipinfo_contents_replace(
-    zipfile: ZipFile, zipinfo: ZipInfo, search: str, replace: str
-):
-    """Given an entry in a zip file, extract the file and perform a search
-    and replace on the contents. Returns the contents as a string."""
-    dirname = tempfile.mkdtemp()
-    fname = zipfile.extract(zipinfo, dirname)
-    with open(fname, "r") as fd:
-        contents = fd.read().replace(search, replace)
-    shutil.rmtree(dirname)
-    return contents
+# ZIP local file header, central directory header and end of central
+# directory record (APPNOTE.TXT 4.3.7, 4.3.12 and 4.3.16)
+_ZIP_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_ZIP_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_ZIP_END_RECORD = struct.Struct("<4s4H2LH")
+_ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+_ZIP_FLAG_UTF8 = 0x800
+
+
+class _ZipMember:
+    """
+    A member's compressed data with the fields of its headers, so it can be
+    written to an archive as is, without compressing it again.
+    """
+
+    def __init__(self, entry: ZipInfo, data: bytes, crc: int, file_size: int):
+        self.entry = entry
+        self.data = data
+        self.crc = crc
+        self.file_size = file_size
+        try:
+            self.filename = entry.filename.encode("ascii")
+            self.flag_bits = entry.flag_bits & ~_ZIP_FLAG_UTF8
+        except UnicodeEncodeError:
+            self.filename = entry.filename.encode("utf-8")
+            self.flag_bits = entry.flag_bits | _ZIP_FLAG_UTF8
+        # Sizes and CRC are in the local header, not after the data.
+        self.flag_bits &= ~_ZIP_FLAG_DATA_DESCRIPTOR
+        year, month, day, hour, minute, second = entry.date_time
+        self.dos_date = (year - 1980) << 9 | month << 5 | day
+        self.dos_time = hour << 11 | minute << 5 | second // 2
+        self.local_record = (
+            _ZIP_LOCAL_HEADER.pack(
+                b"PK\x03\x04",
+                entry.extract_version,
+                0,
+                self.flag_bits,
+                entry.compress_type,
+                self.dos_time,
+                self.dos_date,
+                self.crc,
+                len(self.data),
+                self.file_size,
+                len(self.filename),
+                0,
+            )
+            + self.filename
+            + self.data
+        )
+
+    @classmethod
+    def deflate(cls, entry: ZipInfo, contents: bytes) -> "_ZipMember":
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS
+        )
+        data = compressor.compress(contents) + compressor.flush()
+        entry = copy.copy(entry)
+        entry.compress_type = ZIP_DEFLATED
+        entry.extract_version = max(entry.extract_version, 20)
+        return cls(entry, data, zlib.crc32(contents), len(contents))
+
+    @classmethod
+    def read_raw(cls, archive: bytes, entry: ZipInfo) -> "_ZipMember":
+        """Returns `entry` of `archive` with its data as stored there."""
+        local_header = _ZIP_LOCAL_HEADER.unpack_from(archive, entry.header_offset)
+        filename_length, extra_length = local_header[-2:]
+        start = (
+            entry.header_offset
+            + _ZIP_LOCAL_HEADER.size
+            + filename_length
+            + extra_length
+        )
+        data = archive[start : start + entry.compress_size]  # noqa: E203
+        return cls(entry, data, entry.CRC, entry.file_size)
+
+    def central_record(self, offset: int) -> bytes:
+        return (
+            _ZIP_CENTRAL_HEADER.pack(
+                b"PK\x01\x02",
+                self.entry.create_version,
+                self.entry.create_system,
+                self.entry.extract_version,
+                0,
+                self.flag_bits,
+                self.entry.compress_type,
+                self.dos_time,
+                self.dos_date,
+                self.crc,
+                len(self.data),
+                self.file_size,
+                len(self.filename),
+                0,
+                0,
+                0,
+                self.entry.internal_attr,
+                self.entry.external_attr,
+                offset,
+            )
+            + self.filename
+        )
+
+
+def _write_zip(members: list[_ZipMember]) -> bytes:
+    """Returns an archive of `members`, whose data is written as is."""
+    records = []
+    central_records = []
+    offset = 0
+    for member in members:
+        records.append(member.local_record)
+        central_records.append(member.central_record(offset))
+        offset += len(member.local_record)
+    central_directory = b"".join(central_records)
+    records.append(central_directory)
+    records.append(
+        _ZIP_END_RECORD.pack(
+            b"PK\x05\x06",
+            0,
+            0,
+            len(members),
+            len(members),
+            len(central_directory),
+            offset,
+            0,
+        )
+    )
+    return b"".join(records)
+
+
+class OfficeTemplate:
+    """
+    An Office document (docx, xlsx) template held in memory. Each member is
+    split on its placeholders once, so a document is rendered by joining
+    bytes, with no extraction to disk or searching. Members without
+    placeholders are copied to the document still compressed, only the
+    members that change are compressed again.
+    """
+
+    PLACEHOLDERS = (
+        OFFICE_URL_PLACEHOLDER,
+        OFFICE_CREATED_PLACEHOLDER,
+        OFFICE_MODIFIED_PLACEHOLDER,
+    )
+
+    def __init__(self, template: bytes):
+        placeholder_re = re.compile(
+            b"(" + b"|".join(re.escape(p.encode()) for p in self.PLACEHOLDERS) + b")"
+        )
+        # Members are split into bytes with placeholders at the odd indexes,
+        # and kept compressed as in the template. They're searched as bytes
+        # as some, like images, aren't text.
+        self.members: list[tuple[ZipInfo, list[bytes], _ZipMember]] = []
+        with ZipFile(BytesIO(template), "r") as doc:
+            for entry in doc.filelist:
+                if entry.external_attr & MODE_DIRECTORY:
+                    continue
+                self.members.append(
+                    (
+                        entry,
+                        placeholder_re.split(doc.read(entry)),
+                        _ZipMember.read_raw(template, entry),
+                    )
+                )
+
+    def render(
+        self,
+        replacements: dict[str, str],
+        edits: Optional[dict[str, Callable[[str], str]]] = None,
+    ) -> bytes:
+        """
+        Returns the document with each placeholder replaced by its value in
+        `replacements`, and each member named in `edits` passed through its
+        edit once its placeholders are replaced. Only edited members are
+        decoded, as UTF-8.
+        """
+        edits = edits or {}
+        encoded_replacements = {
+            placeholder.encode(): value.encode()
+            for placeholder, value in replacements.items()
+        }
+        members = []
+        for entry, parts, raw_member in self.members:
+            if len(parts) == 1 and entry.filename not in edits:
+                members.append(raw_member)
+                continue
+            contents = b"".join(
+                encoded_replacements[part] if index % 2 else part
+                for index, part in enumerate(parts)
+            )
+            if entry.filename in edits:
+                contents = edits[entry.filename](contents.decode()).encode()
+            members.append(_ZipMember.deflate(entry, contents))
+        return _write_zip(members)
+
+
+_office_templates: dict[Path, OfficeTemplate] = {}
+_office_templates_lock = threading.Lock()
+
+
+def get_office_template(template_path: Path) -> OfficeTemplate:
+    """Returns the Office template at `template_path`, which is loaded once
+    per process."""
+    template_path = Path(template_path)
+    with _office_templates_lock:
+        office_template = _office_templates.get(template_path)
+    if office_template is not None:
+        return office_template
+
+    office_template = OfficeTemplate(template_path.read_bytes())
+    with _office_templates_lock:
+        _office_templates[template_path] = office_template
+    return office_template
 
 
 def format_time_for_doc(time):
@@ -33,6 +33,7 @@ from fastapi import (
     Depends,
     FastAPI,
     HTTPException,
+    Query,
     Request,
     Response,
     Security,
@@ -45,6 +46,7 @@ from fastapi.responses import (
     PlainTextResponse,
     RedirectResponse,
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import APIKeyQuery
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -58,6 +60,7 @@ from canarytokens.channel_output_email import EmailResponseStatuses, send_email
 import canarytokens.credit_card_v2 as credit_card_infra
 from canarytokens import extendtoken, kubeconfig, msreg, queries
 from canarytokens import wireguard as wg
+from canarytokens import authenticode
 from canarytokens.authenticode import make_canary_authenticode_binary
 from canarytokens import aws_infra
 from canarytokens.awskeys import get_aws_key
@@ -68,8 +71,10 @@ from canarytokens.exceptions import (
     AWSInfraDataGenerationLimitReached,
     CanarydropAuthFailure,
     CanarytokenTypeNotEnabled,
+    InvalidPEFile,
     NoCanarydropFound,
     AWSInfraOperationNotAllowed,
+    SigningPoolBusy,
 )
 from canarytokens.models import (
     PWA_APP_TITLES,
@@ -217,7 +222,7 @@ from canarytokens.models import (
 )
 from canarytokens.msexcel import make_canary_msexcel
 from canarytokens.msword import make_canary_msword
-from canarytokens.mysql import make_canary_mysql_dump
+from canarytokens.mysql import get_mysql_dump_template, make_canary_mysql_dump
 from canarytokens.mcp import make_canary_mcp_json
 from canarytokens.azure_css import (
     install_azure_css,
@@ -240,20 +245,26 @@ from canarytokens.queries import (
     remove_canary_domain,
     remove_canary_nxdomain,
     save_canarydrop,
+    start_url_components_cache,
+    stop_url_components_cache,
     validate_webhook,
     WebhookTooLongError,
 )
 from canarytokens.redismanager import DB
-from canarytokens.settings import FrontendSettings, SwitchboardSettings
+from canarytokens.settings import (
+    FrontendSettings,
+    get_frontend_settings,
+    get_switchboard_settings,
+)
 from canarytokens.tokens import Canarytoken, get_template_env, set_template_env
 from canarytokens.utils import get_deployed_commit_sha
 from canarytokens.windows_fake_fs import windows_fake_fs
-from canarytokens.ziplib import make_canary_zip
+from canarytokens.ziplib import get_office_template, make_canary_zip
 
 log = logging.getLogger("uvicorn")
 
-frontend_settings = FrontendSettings()
-switchboard_settings = SwitchboardSettings()
+frontend_settings = get_frontend_settings()
+switchboard_settings = get_switchboard_settings()
 set_template_env(Path(switchboard_settings.TEMPLATES_PATH))
 protocol = "https" if switchboard_settings.FORCE_HTTPS else "http"
 if switchboard_settings.USING_NGINX:
@@ -432,9 +443,13 @@ async def authorise_token_access(request: Request):
     get_canarydrop_and_authenticate(token=data["token"], auth=data["auth"])
 
 
-def get_canarydrop_and_authenticate(token: str, auth: str = Security(auth_key)):
+def get_canarydrop_and_authenticate(
+    token: str, auth: str = Security(auth_key), with_history: bool = True
+):
     try:
-        canarydrop = queries.get_canarydrop_and_authenticate(token=token, auth=auth)
+        canarydrop = queries.get_canarydrop_and_authenticate(
+            token=token, auth=auth, with_history=with_history
+        )
     except CanarydropAuthFailure:
         raise HTTPException(
             status_code=403, detail="Token not found. Invalid `auth` and `token` pair."
@@ -486,6 +501,35 @@ def startup_event():
     add_canary_path_element(path_element="stuff")
     add_canary_page("payments.js")
     add_canary_image_page("photo1.jpg")
+    start_url_components_cache()
+
+    # Parse the Office and MySQL dump templates now rather than on the first
+    # download.
+    for office_template in ["template.docx", "template.xlsx"]:
+        get_office_template(Path(frontend_settings.TEMPLATES_PATH) / office_template)
+    get_mysql_dump_template(Path(frontend_settings.TEMPLATES_PATH) / "mysql_tables.zip")
+
+    # Not the module's `frontend_settings`: tests replace the settings after
+    # importing the app.
+    settings = get_frontend_settings()
+    if settings.KUBECONFIG_KEY_POOL_SIZE > 0:
+        kubeconfig.start_key_pool(
+            size=settings.KUBECONFIG_KEY_POOL_SIZE,
+            low_water=settings.KUBECONFIG_KEY_POOL_LOW_WATER,
+        )
+    if settings.AUTHENTICODE_SIGNING_PROCESSES > 0:
+        authenticode.start_signing_pool(
+            processes=settings.AUTHENTICODE_SIGNING_PROCESSES,
+            max_pending=settings.AUTHENTICODE_MAX_PENDING_SIGNINGS,
+            key_pool_size=settings.AUTHENTICODE_KEY_POOL_SIZE,
+        )
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    kubeconfig.stop_key_pool()
+    authenticode.stop_signing_pool()
+    stop_url_components_cache()
 
 
 def _get_src_ip(request):
@@ -643,7 +687,9 @@ async def api_generate(  # noqa: C901  # gen is large
     # TODO: refactor this. KUBECONFIG token creates it's own token
     # value and cannot follow same path as before.
     if token_request_details.token_type == TokenTypes.KUBECONFIG:
-        token_value, kube_config = kubeconfig.get_kubeconfig()
+        # Signing (or generating a key if the pool is empty) would block the
+        # event loop.
+        token_value, kube_config = await run_in_threadpool(kubeconfig.get_kubeconfig)
         canarytoken = Canarytoken(value=token_value)
     else:
         kube_config = None
@@ -737,6 +783,12 @@ async def api_generate(  # noqa: C901  # gen is large
     if token_request_details.token_type != TokenTypes.CREDIT_CARD_V2:
         save_canarydrop(canarydrop)
 
+    if token_request_details.token_type == TokenTypes.SIGNED_EXE:
+        # Signing would block the event loop, as would waiting for a free
+        # slot in the signing pool.
+        return await run_in_threadpool(
+            create_response, token_request_details, canarydrop
+        )
     return create_response(token_request_details, canarydrop)
 
 
@@ -782,11 +834,25 @@ async def api_manage_canarytoken(token: str, auth: str) -> ManageResponse:
     tags=["Canarytokens History"],
     response_model=HistoryResponse,
 )
-async def api_history(token: str, auth: str) -> HistoryResponse:
-    canarydrop = get_canarydrop_and_authenticate(token=token, auth=auth)
+async def api_history(
+    token: str,
+    auth: str,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[Optional[int], Query(ge=1)] = None,
+) -> HistoryResponse:
+    """Returns the drop's hits, oldest first. `offset` and `limit` page
+    through them starting from the most recent hit."""
+    canarydrop = get_canarydrop_and_authenticate(
+        token=token, auth=auth, with_history=False
+    )
+    history, total_hits = queries.get_canarydrop_hits(
+        canarydrop.canarytoken, canarydrop.type, offset=offset, limit=limit
+    )
     response = {
-        "canarydrop": canarydrop,
-        "history": canarydrop.triggered_details,
+        # The hits are in `history`, only the page that was asked for.
+        "canarydrop": canarydrop.dict(exclude={"triggered_details"}),
+        "history": history,
+        "total_hits": total_hits,
         "google_api_key": queries.get_canary_google_api_key(),
     }
     return HistoryResponse(**response)
@@ -2268,10 +2334,20 @@ def _(
                 size_given=len(filebody) / (1024 * 1024),
             ),
         )
-    signed_contents = make_canary_authenticode_binary(
-        nxdomain_token_url=canarydrop.get_hostname(nxdomain=True, as_url=True),
-        filebody=filebody,
-    )
+    try:
+        signed_contents = make_canary_authenticode_binary(
+            nxdomain_token_url=canarydrop.get_hostname(nxdomain=True, as_url=True),
+            filebody=filebody,
+        )
+    except InvalidPEFile:
+        raise HTTPException(
+            status_code=400,
+            detail="Uploaded authenticode file is not a valid exe or dll",
+        )
+    except SigningPoolBusy:
+        raise HTTPException(
+            status_code=503, detail="Too many files are being signed, try again shortly"
+        )
     encoded_signed_contents = "data:octet/stream;base64,{base64_file}".format(
         base64_file=base64.b64encode(signed_contents).decode()
     )
@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+import argparse
+
+from canarytokens.redismanager import (
+    DB,
+    KEY_CANARYDROP,
+    KEY_CANARYDROPS_BY_TYPE,
+    KEY_CANARYDROPS_TIMELINE,
+)
+from canarytokens.settings import SwitchboardSettings
+
+switchboard_settings = SwitchboardSettings()
+
+parser = argparse.ArgumentParser(
+    description="Add drops on the timeline to the index of drops by token type. "
+    "Drops are also indexed as they're saved, this indexes the rest."
+)
+parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=1000,
+    help="number of drops to index at a time",
+)
+args = parser.parse_args()
+
+DB.set_db_details(
+    hostname=switchboard_settings.REDIS_HOST, port=switchboard_settings.REDIS_PORT
+)
+db = DB.get_db()
+
+
+def index_batch(entries: list[tuple[str, float]]) -> tuple[int, int]:
+    with db.pipeline(transaction=False) as pipe:
+        for token, _ in entries:
+            pipe.hget(KEY_CANARYDROP + token, "type")
+        token_types = pipe.execute()
+
+    missing = 0
+    with db.pipeline(transaction=False) as pipe:
+        for (token, created), token_type in zip(entries, token_types):
+            if token_type is None:
+                missing += 1
+                continue
+            pipe.zadd(KEY_CANARYDROPS_BY_TYPE + token_type, {token: created}, nx=True)
+        indexed = sum(pipe.execute())
+    return indexed, missing
+
+
+indexed = missing = 0
+batch: list[tuple[str, float]] = []
+for entry in db.zscan_iter(KEY_CANARYDROPS_TIMELINE, count=args.batch_size):
+    batch.append(entry)
+    if len(batch) == args.batch_size:
+        batch_indexed, batch_missing = index_batch(batch)
+        indexed += batch_indexed
+        missing += batch_missing
+        batch = []
+if batch:
+    batch_indexed, batch_missing = index_batch(batch)
+    indexed += batch_indexed
+    missing += batch_missing
+
+print(
+    "\n[;] done, indexed {} drops, {} on the timeline without a drop".format(
+        indexed, missing
+    )
+)
@@ -0,0 +1,37 @@
+#! /usr/bin/env python
+import argparse
+
+from canarytokens.queries import migrate_triggered_list
+from canarytokens.redismanager import DB, KEY_CANARYDROP
+from canarytokens.settings import SwitchboardSettings
+from canarytokens.tokens import Canarytoken
+
+switchboard_settings = SwitchboardSettings()
+
+parser = argparse.ArgumentParser(
+    description="Move hits stored in drops' `triggered_list` to their hit lists. "
+    "Drops are also migrated as their hits are loaded, this migrates the rest."
+)
+parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=1000,
+    help="number of keys to scan at a time",
+)
+args = parser.parse_args()
+
+DB.set_db_details(
+    hostname=switchboard_settings.REDIS_HOST, port=switchboard_settings.REDIS_PORT
+)
+
+migrated = failed = 0
+for key in DB.get_db().scan_iter(f"{KEY_CANARYDROP}*", count=args.batch_size):
+    token = key[len(KEY_CANARYDROP) :]  # noqa: E203
+    try:
+        if migrate_triggered_list(Canarytoken(value=token)):
+            migrated += 1
+    except Exception as e:
+        print('[x]     failed to migrate "{}": {}'.format(token, e))
+        failed += 1
+
+print("\n[;] done, migrated {} drops, {} failed".format(migrated, failed))
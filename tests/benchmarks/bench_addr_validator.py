@@ -0,0 +1,72 @@
+"""
+Benchmarks `AddrValidator` checks per second, enumerating the local
+interfaces and translating the hostname blacklist globs on every check (how
+the validator used to) and with the cached local address snapshot and
+compiled globs it uses now.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_addr_validator --checks 20000
+"""
+
+import argparse
+import fnmatch
+import socket
+import time
+from unittest import mock
+
+from canarytokens import advocate
+from canarytokens.advocate import addrvalidator
+
+ADDRINFO = (
+    socket.AF_INET,
+    socket.SOCK_STREAM,
+    socket.IPPROTO_TCP,
+    "hooks.slack.com",
+    ("34.226.36.50", 443),
+)
+HOSTNAME_BLACKLIST = {"*.internal", "*.local", "metadata.google.internal"}
+
+
+def _uncached_compile_hostname_glob(pattern):
+    return fnmatch.translate(addrvalidator.canonicalize_hostname(pattern))
+
+
+def run(validator: advocate.AddrValidator, n_checks: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n_checks):
+        assert validator.is_addrinfo_allowed(ADDRINFO)
+    return n_checks / (time.perf_counter() - start)
+
+
+def main(args):
+    print(f"{args.checks} addrinfo checks")
+    for name, validator in [
+        ("no blacklist", advocate.AddrValidator()),
+        (
+            "hostname blacklist",
+            advocate.AddrValidator(hostname_blacklist=HOSTNAME_BLACKLIST),
+        ),
+    ]:
+        with (
+            mock.patch.object(
+                addrvalidator,
+                "get_local_addresses",
+                addrvalidator.determine_local_addresses,
+            ),
+            mock.patch.object(
+                addrvalidator,
+                "_compile_hostname_glob",
+                _uncached_compile_hostname_glob,
+            ),
+        ):
+            uncached = run(validator, args.checks)
+        cached = run(validator, args.checks)
+        print(
+            f"{name:<20} uncached {uncached:10.1f} checks/s, cached {cached:10.1f} checks/s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--checks", type=int, default=20000)
+    main(parser.parse_args())
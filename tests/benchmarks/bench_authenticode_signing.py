@@ -0,0 +1,106 @@
+"""
+Benchmarks Custom Binary signing, generating a CA and a signing key for every
+binary in the calling thread (as `make_canary_authenticode_binary` does
+without a pool) and signing in a `SigningPool` that keeps keys and CAs ready.
+
+Requests arrive in bursts of `--burst`, the pool's keys are topped up
+between bursts.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_authenticode_signing --bursts 5 --burst 8
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from canarytokens import authenticode
+from canarytokens.authenticode import SigningPool
+
+TOKEN_URL = "http://xyz123.nxdomain.tools"
+
+
+def _wait_for_keys(pool: SigningPool, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while pool.stats()["keys"] < pool.key_pool_size or len(pool._cas) < 1:
+        if time.monotonic() > deadline:
+            raise TimeoutError("Key pool didn't fill up")
+        time.sleep(0.05)
+
+
+def run(sign, filebody: bytes, bursts: int, burst: int, between=None):
+    latencies = []
+
+    def _timed_sign(_):
+        start = time.perf_counter()
+        sign(TOKEN_URL, filebody)
+        latencies.append(time.perf_counter() - start)
+
+    elapsed = 0.0
+    with ThreadPoolExecutor(max_workers=burst) as threads:
+        for _ in range(bursts):
+            if between:
+                between()
+            start = time.perf_counter()
+            list(threads.map(_timed_sign, range(burst)))
+            elapsed += time.perf_counter() - start
+    latencies.sort()
+    return (
+        bursts * burst / elapsed,
+        statistics.median(latencies),
+        latencies[int(len(latencies) * 0.95) - 1],
+    )
+
+
+def main(args):
+    filebody = Path(args.binary).read_bytes()
+    print(f"{args.bursts} bursts of {args.burst} binaries")
+    results = [
+        (
+            "inline",
+            run(
+                authenticode.make_canary_authenticode_binary,
+                filebody,
+                args.bursts,
+                args.burst,
+            ),
+        )
+    ]
+    pool = SigningPool(
+        processes=args.processes,
+        max_pending=args.burst,
+        key_pool_size=args.burst,
+        wait_timeout=60,
+    )
+    pool.start()
+    try:
+        results.append(
+            (
+                "pooled",
+                run(
+                    pool.sign,
+                    filebody,
+                    args.bursts,
+                    args.burst,
+                    between=lambda: _wait_for_keys(pool),
+                ),
+            )
+        )
+    finally:
+        pool.stop()
+    for name, (rate, p50, p95) in results:
+        print(
+            f"{name:<7} {rate:7.1f} signings/s"
+            f"  p50 {p50 * 1000:7.1f}ms  p95 {p95 * 1000:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--burst", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--binary", default="data/helloWorld.exe")
+    main(parser.parse_args())
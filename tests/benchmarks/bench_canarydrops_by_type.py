@@ -0,0 +1,80 @@
+"""
+Benchmarks `get_canarydrops_by_type`, walking the whole drop timeline and
+reading each drop's type (how it used to) and reading the per-type index it
+uses now, with a few drops of the wanted type among many others.
+
+Needs the redis configured in the switchboard settings.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_canarydrops_by_type --drops 5000 --matching 50
+"""
+
+import argparse
+import time
+
+from canarytokens import queries
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.exceptions import NoCanarydropFound
+from canarytokens.models import TokenTypes
+from canarytokens.redismanager import DB, KEY_CANARYDROP, KEY_CANARYDROPS_TIMELINE
+from canarytokens.settings import get_switchboard_settings
+from canarytokens.tokens import Canarytoken
+
+
+def _timeline_get_canarydrops_by_type(token_type: TokenTypes) -> list[Canarydrop]:
+    canarydrops = []
+    for token_id in DB.get_db().zrange(KEY_CANARYDROPS_TIMELINE, 0, -1):
+        drop_type = DB.get_db().hget(KEY_CANARYDROP + token_id, "type")
+        if drop_type is None:
+            continue
+        try:
+            if TokenTypes(drop_type) != token_type:
+                continue
+            canarydrops.append(queries.get_canarydrop(Canarytoken(token_id)))
+        except (ValueError, NoCanarydropFound):
+            continue
+    return canarydrops
+
+
+def make_drop(token_type: TokenTypes) -> Canarydrop:
+    canarydrop = Canarydrop(
+        generate=True,
+        type=token_type,
+        canarytoken=Canarytoken(),
+        memo="benchmark",
+        alert_email_enabled=False,
+        alert_webhook_enabled=False,
+        browser_scanner_enabled=False,
+    )
+    queries.save_canarydrop(canarydrop)
+    return canarydrop
+
+
+def main(args):
+    switchboard_settings = get_switchboard_settings()
+    DB.set_db_details(
+        hostname=switchboard_settings.REDIS_HOST, port=switchboard_settings.REDIS_PORT
+    )
+    canarydrops = [make_drop(TokenTypes.DNS) for _ in range(args.drops)]
+    canarydrops += [make_drop(TokenTypes.WEB) for _ in range(args.matching)]
+
+    print(f"{args.matching} matching drops out of {len(canarydrops)}")
+    try:
+        for name, get_canarydrops_by_type in [
+            ("timeline", _timeline_get_canarydrops_by_type),
+            ("index", queries.get_canarydrops_by_type),
+        ]:
+            start = time.perf_counter()
+            found = get_canarydrops_by_type(TokenTypes.WEB)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<10} {elapsed * 1e3:10.1f}ms, {len(found)} found")
+    finally:
+        for canarydrop in canarydrops:
+            queries.delete_canarydrop(canarydrop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drops", type=int, default=5000)
+    parser.add_argument("--matching", type=int, default=50)
+    main(parser.parse_args())
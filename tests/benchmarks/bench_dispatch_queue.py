@@ -0,0 +1,109 @@
+"""
+Benchmarks a storm of hits on a few tokens followed by a single hit on
+another token, dispatching each hit on a thread of an unbounded threadpool
+(how `InputChannel.dispatch` used to) and through a `DispatchQueue`, as the
+switchboard does now. Reports the peak backlog, the hits dispatched and shed,
+and how long the lone token waited for its alert.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_dispatch_queue --hits 5000 --tokens 10
+"""
+
+import argparse
+import threading
+import time
+from unittest import mock
+
+from twisted.python.threadpool import ThreadPool
+
+from canarytokens.dispatch_queue import DispatchQueue
+
+
+class SlowSwitchboard:
+    def __init__(self, dispatch_time: float) -> None:
+        self.dispatch_time = dispatch_time
+        self.dispatched = 0
+        self.lone_token_dispatched = threading.Event()
+        self._lock = threading.Lock()
+
+    def dispatch(self, canarydrop, token_hit):
+        time.sleep(self.dispatch_time)
+        with self._lock:
+            self.dispatched += 1
+        if canarydrop.canarytoken.value() == "lone":
+            self.lone_token_dispatched.set()
+
+
+def make_canarydrop(token: str):
+    canarydrop = mock.Mock()
+    canarydrop.canarytoken.value.return_value = token
+    return canarydrop
+
+
+def run_threadpool(switchboard, canarydrops, lone, workers):
+    pool = ThreadPool(minthreads=workers, maxthreads=workers)
+    pool.start()
+    peak = 0
+    for canarydrop in canarydrops:
+        pool.callInThread(switchboard.dispatch, canarydrop, None)
+        peak = max(peak, pool._queue.qsize())
+    start = time.perf_counter()
+    pool.callInThread(switchboard.dispatch, lone, None)
+    switchboard.lone_token_dispatched.wait()
+    waited = time.perf_counter() - start
+    pool.stop()
+    return peak, 0, waited
+
+
+def run_dispatch_queue(switchboard, canarydrops, lone, workers, queue_size):
+    queue = DispatchQueue(switchboard, workers=workers, max_size=queue_size)
+    with mock.patch("canarytokens.dispatch_queue.reactor"):
+        queue.start()
+    input_channel = mock.Mock()
+    peak = 0
+    for canarydrop in canarydrops:
+        queue.put(input_channel, canarydrop, None)
+        peak = max(peak, queue.stats()["depth"])
+    start = time.perf_counter()
+    queue.put(input_channel, lone, None)
+    switchboard.lone_token_dispatched.wait()
+    waited = time.perf_counter() - start
+    queue.stop()
+    stats = queue.stats()
+    return peak, stats["shed_full"] + stats["coalesced"], waited
+
+
+def main(args):
+    canarydrops = [
+        make_canarydrop(f"storm-{n % args.tokens}") for n in range(args.hits)
+    ]
+    lone = make_canarydrop("lone")
+    print(
+        f"{args.hits} hits on {args.tokens} tokens, {args.workers} workers, "
+        f"{args.dispatch_time * 1e3:.1f}ms per dispatch"
+    )
+    for name, run in [
+        ("threadpool", lambda s: run_threadpool(s, canarydrops, lone, args.workers)),
+        (
+            "queue",
+            lambda s: run_dispatch_queue(
+                s, canarydrops, lone, args.workers, args.queue_size
+            ),
+        ),
+    ]:
+        switchboard = SlowSwitchboard(args.dispatch_time)
+        peak, shed, waited = run(switchboard)
+        print(
+            f"{name:<12} peak backlog {peak:6d}, {shed:6d} shed, "
+            f"lone token alerted after {waited * 1e3:8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hits", type=int, default=5000)
+    parser.add_argument("--tokens", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--dispatch-time", type=float, default=0.005)
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Benchmarks DNS token queries per second through `ChannelDNS` with latency
+injected into every Redis command, with queries run inline on the reactor
+and on the `async_queries` threadpool.
+
+Also reports the longest the reactor went without running a timer, which is
+how long every other listener would have been stalled.
+
+Usage (from `tests/`, with redis running):
+    uv run python -m benchmarks.bench_dns_redis_latency --latency-ms 2 --queries 500
+"""
+
+import argparse
+import os
+import time
+
+from redis import StrictRedis
+from twisted.internet import defer, task
+from twisted.names import dns
+
+from canarytokens import async_queries, canarydrop, queries
+from canarytokens.channel_dns import ChannelDNS
+from canarytokens.models import GeoIPBogonInfo, TokenTypes
+from canarytokens.redismanager import DB
+from canarytokens.settings import FrontendSettings
+from canarytokens.switchboard import Switchboard
+from canarytokens.tokens import Canarytoken
+from canarytokens.utils import strtobool
+
+SRC_IP = "127.0.0.1"
+
+
+def inject_redis_latency(latency: float) -> None:
+    execute_command = StrictRedis.execute_command
+
+    def slow_execute_command(self, *args, **options):
+        time.sleep(latency)
+        return execute_command(self, *args, **options)
+
+    StrictRedis.execute_command = slow_execute_command
+
+
+def make_query(frontend_settings: FrontendSettings) -> dns.Query:
+    cd = canarydrop.Canarydrop(
+        type=TokenTypes.DNS,
+        canarytoken=Canarytoken(),
+        memo="DNS benchmark",
+    )
+    queries.save_canarydrop(cd)
+    m = dns.Message()
+    m.addQuery(cd.get_hostname().encode(), type=dns.A)
+    return m.queries[0]
+
+
+@defer.inlineCallbacks
+def run(reactor, resolver: ChannelDNS, query: dns.Query, n_queries: int):
+    stalls = [0.0]
+    last_tick = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        stalls[0] = max(stalls[0], now - last_tick[0])
+        last_tick[0] = now
+
+    ticker = task.LoopingCall(tick)
+    ticker.start(0.005)
+    start = time.perf_counter()
+    yield defer.DeferredList(
+        [resolver.query(query=query, src_ip=SRC_IP) for _ in range(n_queries)],
+        consumeErrors=True,
+    )
+    elapsed = time.perf_counter() - start
+    tick()
+    ticker.stop()
+    return n_queries / elapsed, stalls[0]
+
+
+@defer.inlineCallbacks
+def main(reactor, args):
+    redis_hostname = "localhost" if strtobool(os.getenv("CI", "False")) else "redis"
+    DB.set_db_details(hostname=redis_hostname, port=6379)
+    frontend_settings = FrontendSettings()
+    for domain in frontend_settings.DOMAINS:
+        queries.add_canary_domain(domain)
+    resolver = ChannelDNS(
+        switchboard=Switchboard(),
+        switchboard_scheme="http",
+        switchboard_hostname=frontend_settings.DOMAINS[0],
+        frontend_settings=frontend_settings,
+    )
+    query = make_query(frontend_settings)
+    # Keep ipinfo.io out of the measurement.
+    queries.add_ip_to_cache(SRC_IP, GeoIPBogonInfo(ip=SRC_IP, bogon=True).dict())
+    inject_redis_latency(args.latency_ms / 1000)
+
+    print(f"{args.queries} queries, {args.latency_ms}ms injected redis latency")
+    qps, stall = yield run(reactor, resolver, query, args.queries)
+    print(f"inline:          {qps:8.1f} queries/s, max reactor stall {stall:.3f}s")
+
+    async_queries.start_threadpool(args.threads)
+    qps, stall = yield run(reactor, resolver, query, args.queries)
+    print(
+        f"threadpool({args.threads:>2}): {qps:8.1f} queries/s, max reactor stall {stall:.3f}s"
+    )
+    async_queries.stop_threadpool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=10)
+    task.react(main, [parser.parse_args()])
@@ -0,0 +1,73 @@
+"""
+Benchmarks loading a drop with a full hit history the way the DNS and HTTP
+channels used to (`get_canarydrop`), and without its history
+(`get_canarydrop_header`), as they do now for most token types.
+
+Needs the redis configured in the switchboard settings.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_drop_loading --loads 500
+"""
+
+import argparse
+import time
+
+from canarytokens import queries
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.models import DNSTokenHit, GeoIPBogonInfo, TokenTypes
+from canarytokens.redismanager import DB
+from canarytokens.settings import get_switchboard_settings
+from canarytokens.tokens import Canarytoken
+
+
+def run(get_drop, canarytoken: Canarytoken, n_loads: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n_loads):
+        canarydrop = get_drop(canarytoken)
+        assert canarydrop.alert_email_enabled is False
+    return time.perf_counter() - start
+
+
+def main(args):
+    settings = get_switchboard_settings()
+    DB.set_db_details(hostname=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    canarydrop = Canarydrop(
+        generate=True,
+        type=TokenTypes.DNS,
+        canarytoken=Canarytoken(),
+        memo="benchmark",
+        browser_scanner_enabled=False,
+    )
+    queries.save_canarydrop(canarydrop)
+    for n in range(args.hits):
+        canarydrop.add_canarydrop_hit(
+            token_hit=DNSTokenHit(
+                time_of_hit=float(n),
+                src_ip="127.0.0.1",
+                geo_info=GeoIPBogonInfo(ip="127.0.0.1", bogon=True),
+                is_tor_relay=False,
+                input_channel="dns",
+            )
+        )
+
+    print(f"{args.loads} loads of a drop with {args.hits} hits")
+    try:
+        for name, get_drop in [
+            ("get_canarydrop", queries.get_canarydrop),
+            ("header", queries.get_canarydrop_header),
+        ]:
+            elapsed = run(get_drop, canarydrop.canarytoken, args.loads)
+            print(
+                f"{name:<15} {elapsed:6.2f}s, {elapsed / args.loads * 1e6:8.1f}us per load"
+            )
+    finally:
+        queries.delete_canarydrop(canarydrop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--loads", type=int, default=500)
+    parser.add_argument(
+        "--hits", type=int, default=get_switchboard_settings().MAX_HISTORY
+    )
+    main(parser.parse_args())
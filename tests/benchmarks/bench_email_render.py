@@ -0,0 +1,76 @@
+"""
+Benchmarks rendering alert emails (HTML and text) the way
+`EmailOutputChannel` used to, reading, compiling and minifying the template
+for every alert, and through the compiled template cache.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_email_render --alerts 10000
+"""
+
+import argparse
+import datetime
+import time
+from pathlib import Path
+
+import minify_html
+from jinja2 import Template
+
+from canarytokens.channel_output_email import EmailOutputChannel, EmailTemplates
+from canarytokens.models import TokenAlertDetails, TokenTypes
+from canarytokens.tokens import Canarytoken
+
+TEMPLATES_PATH = Path(__file__).parent.parent.parent / "templates"
+HTML_TEMPLATE = TEMPLATES_PATH / EmailTemplates.NOTIFICATION_HTML
+TXT_TEMPLATE = TEMPLATES_PATH / EmailTemplates.NOTIFICATION_TXT
+
+
+def uncached_alert_mail(details: TokenAlertDetails, template_path: Path) -> str:
+    rendered_text = Template(template_path.open().read(), trim_blocks=True).render(
+        Title=EmailOutputChannel.DESCRIPTION,
+        Intro=EmailOutputChannel.format_report_intro(details),
+        BasicDetails=EmailOutputChannel.extract_basic_details(details),
+        ManageLink=details.manage_url,
+        HistoryLink=details.history_url,
+    )
+    if template_path.suffix == ".html":
+        return minify_html.minify(rendered_text)
+    return rendered_text
+
+
+def run(format_alert_mail, alerts: list[TokenAlertDetails]) -> float:
+    start = time.perf_counter()
+    for details in alerts:
+        format_alert_mail(details, HTML_TEMPLATE)
+        format_alert_mail(details, TXT_TEMPLATE)
+    return time.perf_counter() - start
+
+
+def main(args):
+    alerts = [
+        TokenAlertDetails(
+            channel="HTTP",
+            token_type=TokenTypes.WEB,
+            token=Canarytoken().value(),
+            src_ip="127.0.0.1",
+            time=datetime.datetime.now(),
+            memo=f"Alert number {n}",
+            manage_url="https://example.com/manage",
+            additional_data={"useragent": "python-requests/2.31"},
+        )
+        for n in range(args.alerts)
+    ]
+    print(f"{args.alerts} alerts (HTML and text)")
+    for name, format_alert_mail in [
+        ("uncached", uncached_alert_mail),
+        ("cached", EmailOutputChannel.format_token_alert_mail),
+    ]:
+        elapsed = run(format_alert_mail, alerts)
+        print(
+            f"{name:<9} {elapsed:6.2f}s, {elapsed / args.alerts * 1e6:8.1f}us per alert"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--alerts", type=int, default=10000)
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Profiles `CanarytokenPage.render_GET` for web bug token hits, once building
+`SwitchboardSettings` per hit (how `_grab_http_general_info` used to) and
+once with the process's settings from `get_switchboard_settings`, as it does
+now. Reports the time per hit and how many settings objects were built.
+
+Needs the redis configured in the switchboard settings.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_http_hit_profile --hits 500
+"""
+
+import argparse
+import cProfile
+import pstats
+import time
+from unittest import mock
+
+from twisted.internet.address import IPv4Address
+from twisted.web.test.test_web import DummyRequest
+
+from canarytokens import queries, tokens
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.channel_http import ChannelHTTP
+from canarytokens.models import GeoIPBogonInfo, TokenTypes
+from canarytokens.redismanager import DB
+from canarytokens.settings import (
+    SwitchboardSettings,
+    get_frontend_settings,
+    get_switchboard_settings,
+)
+from canarytokens.switchboard import Switchboard
+from canarytokens.tokens import Canarytoken
+
+SRC_IP = "127.0.0.1"
+
+
+def make_request(canarydrop: Canarydrop) -> DummyRequest:
+    request = DummyRequest("/")
+    request.client = IPv4Address(type="TCP", host=SRC_IP, port=8686)
+    request.uri = canarydrop.generate_random_url(["http://127.0.0.1:8686"]).encode()
+    request.path = request.uri[request.uri.index(b"/", 8) :]  # noqa: E203
+    return request
+
+
+def settings_built(stats: pstats.Stats) -> int:
+    return sum(
+        calls
+        for (_, _, name), (calls, *_) in stats.stats.items()
+        if name == "_build_values"
+    )
+
+
+def run(channel: ChannelHTTP, canarydrop: Canarydrop, n_hits: int):
+    requests = [make_request(canarydrop) for _ in range(n_hits)]
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    for request in requests:
+        channel.canarytoken_page.render_GET(request)
+    profiler.disable()
+    elapsed = time.perf_counter() - start
+    return elapsed, pstats.Stats(profiler)
+
+
+def main(args):
+    switchboard_settings = get_switchboard_settings()
+    DB.set_db_details(
+        hostname=switchboard_settings.REDIS_HOST, port=switchboard_settings.REDIS_PORT
+    )
+    channel = ChannelHTTP(
+        frontend_settings=get_frontend_settings(),
+        switchboard_settings=switchboard_settings,
+        switchboard=Switchboard(switchboard_settings),
+    )
+    canarydrop = Canarydrop(
+        generate=True,
+        type=TokenTypes.WEB,
+        canarytoken=Canarytoken(),
+        memo="benchmark",
+        alert_email_enabled=False,
+        alert_webhook_enabled=False,
+        browser_scanner_enabled=False,
+    )
+    queries.save_canarydrop(canarydrop)
+    # Keep ipinfo.io out of the measurement.
+    queries.add_ip_to_cache(SRC_IP, GeoIPBogonInfo(ip=SRC_IP, bogon=True).dict())
+
+    print(f"{args.hits} HTTP hits")
+    try:
+        for name, get_settings in [
+            ("per hit", SwitchboardSettings),
+            ("per process", get_switchboard_settings),
+        ]:
+            with mock.patch.object(tokens, "get_switchboard_settings", get_settings):
+                elapsed, stats = run(channel, canarydrop, args.hits)
+            print(
+                f"{name:<12} {elapsed:6.2f}s, {elapsed / args.hits * 1e6:8.1f}us per hit, "
+                f"{settings_built(stats)} settings built"
+            )
+            if args.top:
+                stats.sort_stats("cumulative").print_stats(args.top)
+    finally:
+        queries.delete_canarydrop(canarydrop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hits", type=int, default=500)
+    parser.add_argument(
+        "--top", type=int, default=0, help="also print the N most expensive calls"
+    )
+    main(parser.parse_args())
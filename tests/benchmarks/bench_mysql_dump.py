@@ -0,0 +1,76 @@
+"""
+Benchmarks MySQL dump downloads per second, extracting and recompressing the
+chosen tables of `mysql_tables.zip` for every dump (how
+`make_canary_mysql_dump` used to) and joining the tables' precompressed gzip
+members around the token's statement, as it does now.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_mysql_dump --dumps 20
+"""
+
+import argparse
+import gzip
+import random
+import time
+from io import BytesIO
+from pathlib import Path
+from zipfile import ZipFile
+
+from canarytokens import mysql
+
+STATEMENT = (
+    "SET @bb = CONCAT(\"CHANGE REPLICATION SOURCE TO SOURCE_PASSWORD='my-secret-pw', "
+    "SOURCE_RETRY_COUNT=1, SOURCE_SSL=0, SOURCE_PORT=3306, "
+    "SOURCE_HOST='w9fxd0qkpilgaesjzgohkfsmc.example.com', "
+    'SOURCE_USER=\'w9fxd0qkpilgaesjzgohkfsmc", @@lc_time_names, @@hostname, "\';");'
+)
+
+
+def _recompressing_mysql_dump(mysql_usage: str, template: Path) -> bytes:
+    with open(template, "rb") as f:
+        template_buf = BytesIO(f.read())
+    output_buf = BytesIO()
+    output_zip = gzip.GzipFile(fileobj=output_buf, mode="wb")
+    with ZipFile(template_buf, "r") as doc:
+        table_list = [
+            f.filename
+            for f in doc.filelist
+            if f.filename.startswith("dw_") and f.filename.endswith(".sql")
+        ]
+        min_table_count = len(table_list) // 2
+        table_count = random.choice(list(range(min_table_count, len(table_list) + 1)))
+        output_zip.write(mysql.DUMP_HEADER)
+        for table_counter, table in enumerate(random.sample(table_list, table_count)):
+            if table_counter == min_table_count // 2:
+                output_zip.write(mysql_usage.encode())
+            output_zip.write(doc.read(table))
+    output_zip.write(mysql.DUMP_FOOTER)
+    output_zip.close()
+    return output_buf.getvalue()
+
+
+def run(make_dump, template: Path, n_dumps: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n_dumps):
+        make_dump(mysql_usage=STATEMENT, template=template)
+    return n_dumps / (time.perf_counter() - start)
+
+
+def main(args):
+    template = Path(args.templates) / "mysql_tables.zip"
+    print(f"{args.dumps} dumps")
+    start = time.perf_counter()
+    mysql.get_mysql_dump_template(template)
+    print(f"{'precompressing':<14} {time.perf_counter() - start:8.2f}s once")
+    for name, make_dump in [
+        ("recompressed", _recompressing_mysql_dump),
+        ("precompressed", mysql.make_canary_mysql_dump),
+    ]:
+        print(f"{name:<14} {run(make_dump, template, args.dumps):8.1f} dumps/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dumps", type=int, default=20)
+    parser.add_argument("--templates", default="../templates")
+    main(parser.parse_args())
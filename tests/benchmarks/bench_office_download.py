@@ -0,0 +1,49 @@
+"""
+Benchmarks generating the documents served by `/download` for MS Word and
+MS Excel tokens, parsing the template for every download and with the
+template parsed once, as `get_office_template` does.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_office_download --downloads 2000
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from canarytokens import ziplib
+from canarytokens.msexcel import make_canary_msexcel
+from canarytokens.msword import make_canary_msword
+
+URL = "http://example.com/tokens/abc123/post.jsp"
+
+
+def run(make_document, template: Path, n_downloads: int, preloaded: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(n_downloads):
+        if not preloaded:
+            ziplib._office_templates.clear()
+        make_document(URL, template=template, text_snippet="Quarterly figures")
+    return time.perf_counter() - start
+
+
+def main(args):
+    templates = Path(args.templates)
+    print(f"{args.downloads} downloads")
+    for name, make_document, template in [
+        ("docx", make_canary_msword, templates / "template.docx"),
+        ("xlsx", make_canary_msexcel, templates / "template.xlsx"),
+    ]:
+        for preloaded in [False, True]:
+            elapsed = run(make_document, template, args.downloads, preloaded)
+            label = f"{name} {'preloaded' if preloaded else 'per download'}"
+            print(
+                f"{label:<18} {elapsed:6.2f}s, {args.downloads / elapsed:8.1f} downloads/s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--downloads", type=int, default=2000)
+    parser.add_argument("--templates", default="../templates")
+    main(parser.parse_args())
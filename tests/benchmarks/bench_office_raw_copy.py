@@ -0,0 +1,87 @@
+"""
+Benchmarks rendering an Office template padded with a large image, like a
+custom template, compressing every member of the document again (how
+`OfficeTemplate.render` used to) and copying the members without
+placeholders as they're compressed in the template, as it does now.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_office_raw_copy --downloads 200 --padding-mb 5
+"""
+
+import argparse
+import datetime
+import os
+import time
+from io import BytesIO
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from canarytokens import ziplib
+from canarytokens.ziplib import (
+    OFFICE_CREATED_PLACEHOLDER,
+    OFFICE_MODIFIED_PLACEHOLDER,
+    OFFICE_URL_PLACEHOLDER,
+    OfficeTemplate,
+)
+
+REPLACEMENTS = {
+    OFFICE_URL_PLACEHOLDER: "http://example.com/tokens/abc123/post.jsp",
+    OFFICE_CREATED_PLACEHOLDER: "2013-04-05T16:57:58Z",
+    OFFICE_MODIFIED_PLACEHOLDER: "2013-04-06T16:57:58Z",
+}
+
+
+def _recompressing_render(office_template: OfficeTemplate, replacements) -> bytes:
+    output_buf = BytesIO()
+    with ZipFile(output_buf, "w") as output_zip:
+        for entry, parts, _ in office_template.members:
+            contents = b"".join(
+                replacements[part.decode()].encode() if index % 2 else part
+                for index, part in enumerate(parts)
+            )
+            output_zip.writestr(entry, contents)
+    return output_buf.getvalue()
+
+
+def make_template(template: Path, padding_mb: int) -> bytes:
+    template_buf = BytesIO()
+    with ZipFile(template) as source, ZipFile(template_buf, "w") as padded:
+        for entry in source.filelist:
+            padded.writestr(entry, source.read(entry))
+        # Image data is already compressed, so about as random as this.
+        padded.writestr(
+            ziplib.make_file_entry("word/media/image1.png", datetime.datetime.now()),
+            os.urandom(padding_mb << 20),
+            compress_type=ZIP_DEFLATED,
+        )
+    return template_buf.getvalue()
+
+
+def run(render, n_downloads: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n_downloads):
+        render(REPLACEMENTS)
+    return n_downloads / (time.perf_counter() - start)
+
+
+def main(args):
+    office_template = OfficeTemplate(
+        make_template(Path(args.templates) / "template.docx", args.padding_mb)
+    )
+    print(f"{args.downloads} downloads of a docx padded with {args.padding_mb}MB")
+    for name, render in [
+        (
+            "recompressed",
+            lambda replacements: _recompressing_render(office_template, replacements),
+        ),
+        ("raw copy", office_template.render),
+    ]:
+        print(f"{name:<14} {run(render, args.downloads):8.1f} downloads/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--downloads", type=int, default=200)
+    parser.add_argument("--padding-mb", type=int, default=5)
+    parser.add_argument("--templates", default="../templates")
+    main(parser.parse_args())
@@ -0,0 +1,89 @@
+"""
+Benchmarks the latency of `make_canary_pdf`, brute-forcing a padded URL that
+compresses to the template stream's length (how `_substitute_stream` used
+to) and padding the compressed stream itself, as it does now.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_pdf_generation --pdfs 1000
+"""
+
+import argparse
+import random
+import statistics
+import string
+import time
+import zlib
+from pathlib import Path
+from unittest import mock
+
+from canarytokens import pdfgen
+
+
+def _brute_force_substitute_stream(
+    header,
+    stream: bytes,
+    replace: bytes,
+    search: bytes = b"abcdefghijklmnopqrstuvwxyz.zyxwvutsrqponmlkjihgfedcba.aceegikmoqsuwy.bdfhjlnprtvxz",
+):
+    old_len = len(stream)
+    for _ in range(100):
+        candidate_stream = zlib.compress(
+            zlib.decompress(stream).replace(search, replace)
+        )
+        count = 1
+        while len(candidate_stream) < old_len and count < 10000:
+            padding = "".join(
+                [chr(random.randrange(65, 90)) for x in range(0, count)]
+            ).encode()
+            candidate_stream = zlib.compress(
+                zlib.decompress(stream).replace(search, replace + b"/" + padding)
+            )
+            count += 1
+        if old_len == len(candidate_stream):
+            return (header, candidate_stream)
+    raise Exception("new PDF is too big")
+
+
+def make_hostname(nxdomain: str) -> bytes:
+    token = "".join(random.choices(string.ascii_lowercase + string.digits, k=25))
+    return f"{token}.{nxdomain}".encode()
+
+
+def run(template: Path, nxdomain: str, n_pdfs: int) -> tuple[list[float], int]:
+    latencies = []
+    failures = 0
+    for _ in range(n_pdfs):
+        hostname = make_hostname(nxdomain)
+        start = time.perf_counter()
+        try:
+            pdfgen.make_canary_pdf(hostname=hostname, template=template)
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, failures
+
+
+def main(args):
+    template = Path(args.templates) / "template.pdf"
+    print(f"{args.pdfs} PDFs for hostnames under {args.nxdomain}")
+    for name, substitute_stream in [
+        ("brute force", _brute_force_substitute_stream),
+        ("padded", pdfgen._substitute_stream),
+    ]:
+        with mock.patch.object(pdfgen, "_substitute_stream", substitute_stream):
+            latencies, failures = run(template, args.nxdomain, args.pdfs)
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"{name:<12} p50 {percentiles[49] * 1e3:8.2f}ms, "
+            f"p90 {percentiles[89] * 1e3:8.2f}ms, "
+            f"p99 {percentiles[98] * 1e3:8.2f}ms, "
+            f"max {max(latencies) * 1e3:8.2f}ms, {failures} failed"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdfs", type=int, default=1000)
+    parser.add_argument("--nxdomain", default="nx.canarytokens.com")
+    parser.add_argument("--templates", default="../templates")
+    main(parser.parse_args())
@@ -0,0 +1,109 @@
+"""
+Benchmarks token generation throughput, saving each new drop with one redis
+command per write (how `save_canarydrop` used to) and with the script
+`save_canarydrop` now runs, checking that it makes one round trip per drop.
+
+Needs the redis configured in the switchboard settings, which should be a
+local one for the numbers to mean much.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_save_canarydrop --drops 5000
+"""
+
+import argparse
+import contextlib
+import datetime
+import time
+from typing import Iterator
+from unittest import mock
+
+from redis.connection import Connection
+
+from canarytokens import queries
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.models import TokenTypes
+from canarytokens.redismanager import (
+    DB,
+    KEY_AUTH_IDX,
+    KEY_CANARYDROP,
+    KEY_CANARYDROPS_TIMELINE,
+    KEY_EMAIL_IDX,
+    KEY_WEBHOOK_IDX,
+)
+from canarytokens.settings import get_switchboard_settings
+from canarytokens.tokens import Canarytoken
+
+
+def sequential_save(canarydrop: Canarydrop) -> None:
+    token = canarydrop.canarytoken.value()
+    db = DB.get_db()
+    db.hset(KEY_CANARYDROP + token, mapping=canarydrop.serialize())
+    if db.zscore(KEY_CANARYDROPS_TIMELINE, token) is None:
+        current_time = datetime.datetime.utcnow().strftime("%s.%f")
+        db.zadd(KEY_CANARYDROPS_TIMELINE, {token: current_time})
+    db.sadd(KEY_EMAIL_IDX + canarydrop.alert_email_recipient.lower(), token)
+    db.sadd(KEY_WEBHOOK_IDX + canarydrop.alert_webhook_url, token)
+    db.sadd(KEY_AUTH_IDX + canarydrop.auth, token)
+
+
+@contextlib.contextmanager
+def count_round_trips() -> Iterator[list[int]]:
+    """Counts the commands, or pipelines of commands, sent to redis."""
+    round_trips = [0]
+    send_packed_command = Connection.send_packed_command
+
+    def counting_send_packed_command(self, *args, **kwargs):
+        round_trips[0] += 1
+        return send_packed_command(self, *args, **kwargs)
+
+    with mock.patch.object(
+        Connection, "send_packed_command", counting_send_packed_command
+    ):
+        yield round_trips
+
+
+def run(save, n_drops: int) -> list[Canarydrop]:
+    canarydrops = [
+        Canarydrop(
+            generate=True,
+            type=TokenTypes.DNS,
+            canarytoken=Canarytoken(),
+            memo="benchmark",
+            alert_email_enabled=True,
+            alert_email_recipient="bench@example.com",
+            alert_webhook_enabled=True,
+            alert_webhook_url="https://example.com/hook",
+            browser_scanner_enabled=False,
+        )
+        for _ in range(n_drops)
+    ]
+    # Warm up, e.g. so the save script is loaded.
+    save(canarydrops[0])
+    with count_round_trips() as round_trips:
+        start = time.perf_counter()
+        for canarydrop in canarydrops[1:]:
+            save(canarydrop)
+        elapsed = time.perf_counter() - start
+    per_drop = round_trips[0] / (n_drops - 1)
+    print(
+        f"{save.__name__:<16} {(n_drops - 1) / elapsed:8.1f} drops/s"
+        f" {per_drop:4.1f} round trips/drop"
+    )
+    if save is queries.save_canarydrop:
+        assert per_drop == 1, f"save_canarydrop made {per_drop} round trips/drop"
+    return canarydrops
+
+
+def main(args):
+    settings = get_switchboard_settings()
+    DB.set_db_details(hostname=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    print(f"{args.drops} drops")
+    for save in [sequential_save, queries.save_canarydrop]:
+        for canarydrop in run(save, args.drops):
+            queries.delete_canarydrop(canarydrop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drops", type=int, default=5000)
+    main(parser.parse_args())
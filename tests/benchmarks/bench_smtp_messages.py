@@ -0,0 +1,173 @@
+"""
+Benchmarks concurrent large emails through `CanarySMTPFactory`, buffering up
+to 5 MB of each message's lines and parsing them at the end (how
+`CanaryMessage` used to) and parsing each line as it arrives, as it does now.
+Connections send their messages interleaved, in chunks, and peak memory is
+measured with tracemalloc in a separate, untimed run.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_smtp_messages --connections 20 --size 5
+"""
+
+import argparse
+import os
+import re
+import time
+import tracemalloc
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from unittest import mock
+
+from twisted.internet import defer
+from twisted.internet.testing import StringTransport
+from twisted.mail import smtp
+from zope.interface import implementer
+
+from canarytokens import channel_input_smtp
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.channel_input_smtp import CanarySMTPFactory
+from canarytokens.models import TokenTypes
+from canarytokens.settings import get_frontend_settings, get_switchboard_settings
+from canarytokens.tokens import Canarytoken
+
+
+@implementer(smtp.IMessage)
+class _BufferingMessage:
+    def __init__(self, esmtp=None):
+        self.esmtp = esmtp
+        self.headers = []
+        self.headers_finished = False
+        self.attachments = []
+        self.links_re = re.compile(rb"(http[s]?://[^\s'\"]+)", re.I)
+        self.mime_boundary = None
+        self.mime_boundary_re = re.compile(rb'.*boundary[ ]*=[" ]?([^" ]+)')
+        self.in_mime_header = True
+        self.lines = []
+        self.stored_byte_count = 0
+
+    def lineReceived(self, line: bytes):
+        if line == b"" and not self.headers_finished:
+            self.headers_finished = True
+
+        if not self.headers_finished:
+            self.headers.append(line)
+            m = self.mime_boundary_re.match(line)
+            if m:
+                self.mime_boundary = m.group(1)
+        else:
+            if self.mime_boundary:
+                if self.in_mime_header:
+                    if line == b"":
+                        self.in_mime_header = False
+                    else:
+                        self.attachments[-1].append(line)
+
+                if self.mime_boundary in line:
+                    self.in_mime_header = True
+                    self.attachments.append([])
+
+            if self.stored_byte_count < 5 * 2**20:
+                self.lines.append(line)
+                self.stored_byte_count = self.stored_byte_count + len(line)
+
+    def eomReceived(self):
+        self.links = self.links_re.findall(b"\r\n".join(self.lines))
+        self.attachments = [b"\n".join(x) for x in self.attachments]
+        self.lines = None
+        return defer.succeed("Success")
+
+    def connectionLost(self):
+        self.lines = None
+
+
+def make_message(size: int) -> bytes:
+    message = MIMEMultipart()
+    message["Subject"] = "Quarterly report"
+    message["From"] = "sender@example.com"
+    message["To"] = "recipient@example.com"
+    message.attach(
+        MIMEText("See https://example.com/report and http://example.org/x", "plain")
+    )
+    message.attach(MIMEApplication(os.urandom(size * 3 // 4), Name="report.bin"))
+    return message.as_bytes().replace(b"\n", b"\r\n")
+
+
+def make_conversation(message: bytes) -> bytes:
+    return (
+        b"HELO client.example.com\r\n"
+        b"MAIL FROM:<sender@example.com>\r\n"
+        + f"RCPT TO:<{Canarytoken().value()}@example.com>\r\n".encode()
+        + b"DATA\r\n"
+        + message
+        + b"\r\n.\r\n"
+    )
+
+
+def run(factory: CanarySMTPFactory, conversation: bytes, n_connections: int, chunk):
+    protocols = []
+    for i in range(n_connections):
+        protocol = factory.buildProtocol(addr=f"198.51.100.{i}")
+        protocol.makeConnection(StringTransport())
+        protocols.append(protocol)
+    start = time.perf_counter()
+    for offset in range(0, len(conversation), chunk):
+        data = conversation[offset : offset + chunk]  # noqa: E203
+        for protocol in protocols:
+            protocol.dataReceived(data)
+    elapsed = time.perf_counter() - start
+    for protocol in protocols:
+        assert b"250 Delivery in progress" in protocol.transport.value()
+    return n_connections / elapsed
+
+
+def main(args):
+    canarydrop = Canarydrop(
+        type=TokenTypes.SMTP,
+        generate=True,
+        canarytoken=Canarytoken(),
+        memo="memo",
+        alert_email_enabled=False,
+        alert_webhook_enabled=False,
+    )
+    factory = CanarySMTPFactory(
+        switchboard=mock.Mock(input_channels={}),
+        frontend_settings=get_frontend_settings(),
+        switchboard_settings=get_switchboard_settings(),
+    )
+    factory.dispatch = mock.Mock()
+    message = make_message(args.size * 2**20)
+    conversation = make_conversation(message)
+    print(
+        f"{args.connections} connections sending {len(message) / 2**20:.1f} MB "
+        f"messages in {args.chunk // 1024} KB chunks"
+    )
+    with (
+        mock.patch.object(
+            channel_input_smtp, "get_canarydrop", return_value=canarydrop
+        ),
+        mock.patch.object(Canarydrop, "add_canarydrop_hit"),
+        mock.patch.object(channel_input_smtp.queries, "get_geoinfo", return_value=""),
+        mock.patch.object(
+            channel_input_smtp.queries, "is_tor_relay", return_value=False
+        ),
+    ):
+        for name, message_class in [
+            ("buffered", _BufferingMessage),
+            ("streamed", channel_input_smtp.CanaryMessage),
+        ]:
+            with mock.patch.object(channel_input_smtp, "CanaryMessage", message_class):
+                rate = run(factory, conversation, args.connections, args.chunk)
+                tracemalloc.start()
+                run(factory, conversation, args.connections, args.chunk)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            print(f"{name:<9} {rate:8.1f} messages/s  peak {peak / 2**20:8.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--size", type=int, default=5, help="MB per message")
+    parser.add_argument("--chunk", type=int, default=64 * 1024)
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+"""
+Benchmarks building token URLs and hostnames, reading the path elements,
+pages and domains from redis each time (how `Canarydrop` used to) and with
+them cached in process by `start_url_components_cache`, as the frontend does
+now.
+
+Needs the redis configured in the switchboard settings.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_url_generation --urls 5000
+"""
+
+import argparse
+import time
+
+from canarytokens import queries
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.models import TokenTypes
+from canarytokens.redismanager import DB
+from canarytokens.settings import get_switchboard_settings
+from canarytokens.tokens import Canarytoken
+
+
+def run(canarydrop: Canarydrop, n_urls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n_urls):
+        canarydrop.generate_random_url(
+            queries.get_all_canary_domains(), skip_cache=True
+        )
+        canarydrop.generate_random_hostname()
+    return n_urls / (time.perf_counter() - start)
+
+
+def main(args):
+    switchboard_settings = get_switchboard_settings()
+    DB.set_db_details(
+        hostname=switchboard_settings.REDIS_HOST, port=switchboard_settings.REDIS_PORT
+    )
+    queries.add_canary_domain("example.com")
+    queries.add_canary_path_element("stuff")
+    queries.add_canary_page("payments.js")
+    canarydrop = Canarydrop(
+        generate=True,
+        type=TokenTypes.WEB,
+        canarytoken=Canarytoken(),
+        memo="benchmark",
+        alert_email_enabled=False,
+        alert_webhook_enabled=False,
+        browser_scanner_enabled=False,
+    )
+
+    print(f"{args.urls} URLs and hostnames")
+    uncached = run(canarydrop, args.urls)
+    queries.start_url_components_cache()
+    try:
+        cached = run(canarydrop, args.urls)
+    finally:
+        queries.stop_url_components_cache()
+    print(f"redis  {uncached:10.1f} URLs/s")
+    print(f"cached {cached:10.1f} URLs/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--urls", type=int, default=5000)
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+"""
+Benchmarks webhook alerts per second against a local HTTP sink, sending each
+alert with a one-off `advocate.post` (how alerts used to be sent) and through
+`WebhookOutputChannel.generic_webhook_send` with its pooled sessions.
+
+The sink is on loopback, which `WEBHOOK_ADDR_VALIDATOR` rightly refuses, so
+both use a validator that only differs in allowing 127.0.0.0/8.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_webhook_delivery --alerts 2000 --threads 8
+"""
+
+import argparse
+import ipaddress
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# queries has to be imported before the channels to avoid a circular import.
+from canarytokens import advocate, queries  # noqa: F401
+from canarytokens.channel_output_webhook import WebhookOutputChannel, WebhookSessions
+from canarytokens.switchboard import Switchboard
+
+VALIDATOR = advocate.AddrValidator(
+    ip_whitelist={ipaddress.ip_network("127.0.0.0/8")},
+    port_whitelist=set(range(0, 65535)),
+)
+PAYLOAD = {"text": "Canarytoken triggered", "memo": "benchmark"}
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def run(send, n_alerts: int, n_threads: int) -> float:
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        assert all(executor.map(lambda _: send(), range(n_alerts)))
+    return n_alerts / (time.perf_counter() - start)
+
+
+def main(args):
+    sink = ThreadingHTTPServer(("127.0.0.1", 0), SinkHandler)
+    sink.daemon_threads = True
+    sink.connections = set()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{sink.server_port}/hook"
+
+    def send_one_off():
+        response = advocate.post(url, json=PAYLOAD, timeout=(2, 2), validator=VALIDATOR)
+        return response.ok
+
+    channel = WebhookOutputChannel(
+        switchboard=Switchboard(),
+        switchboard_scheme="https",
+        frontend_domain="test.com",
+    )
+    channel.webhook_sessions = WebhookSessions(
+        max_per_host=args.threads, validator=VALIDATOR
+    )
+
+    def send_pooled():
+        return channel.generic_webhook_send(payload=PAYLOAD, alert_webhook_url=url)
+
+    print(f"{args.alerts} alerts, {args.threads} threads")
+    for name, send in [("advocate.post", send_one_off), ("pooled", send_pooled)]:
+        sink.connections.clear()
+        alerts_per_second = run(send, args.alerts, args.threads)
+        print(
+            f"{name:<14} {alerts_per_second:8.1f} alerts/s, {len(sink.connections)} connections"
+        )
+    sink.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--alerts", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""
+Benchmarks the WireGuard handshake initiations checked per second, finding
+the device a message was sent to by trying every device's MAC1 key (how
+`WireGuardProtocol` used to) and with `DeviceResolver`, as it does now. Peers
+send synthetic initiation messages from a fixed set of source addresses, junk
+messages have a MAC1 no device matches.
+
+Usage (from `tests/`):
+    uv run python -m benchmarks.bench_wireguard_handshakes --packets 2000
+"""
+
+import argparse
+import random
+import time
+from hashlib import blake2s
+from unittest import mock
+
+import nacl.public
+
+from canarytokens.channel_input_wireguard import WireGuardProtocol
+from canarytokens.settings import get_switchboard_settings
+from canarytokens.wireguard import BLAKE2S_128_SIZE, initiationMessage
+
+
+def _linear_resolve(devices):
+    def resolve(data, mac1, src_host):
+        for device in devices:
+            mac = blake2s(data, digest_size=BLAKE2S_128_SIZE, key=device.mac1_key)
+            if mac.digest() == mac1:
+                return device
+        return None
+
+    return resolve
+
+
+def make_packets(protocol: WireGuardProtocol, n_packets: int, n_peers: int, junk: bool):
+    peers = [
+        (
+            f"198.51.100.{i % 250}",
+            random.choice(protocol.devices),
+            nacl.public.PrivateKey.generate(),
+        )
+        for i in range(n_peers)
+    ]
+    packets = []
+    for i in range(n_packets):
+        src_host, device, private_key = peers[i % n_peers]
+        data = initiationMessage(device, private_key)
+        if junk:
+            data = data[:-32] + bytes(32)
+        packets.append((data, src_host))
+    return packets
+
+
+def run(protocol: WireGuardProtocol, packets) -> float:
+    start = time.perf_counter()
+    for data, src_host in packets:
+        protocol.open_initiation(data, src_host)
+    return len(packets) / (time.perf_counter() - start)
+
+
+def main(args):
+    protocol = WireGuardProtocol(
+        channel=mock.Mock(), switchboard_settings=get_switchboard_settings()
+    )
+    print(
+        f"{args.packets} initiations from {args.peers} peers, "
+        f"{len(protocol.devices)} devices"
+    )
+    for name, junk in [("peers", False), ("junk", True)]:
+        packets = make_packets(protocol, args.packets, args.peers, junk)
+        with mock.patch.object(
+            protocol.device_resolver, "resolve", _linear_resolve(protocol.devices)
+        ):
+            linear = run(protocol, packets)
+        resolved = run(protocol, packets)
+        print(
+            f"{name:<6} linear scan {linear:10.1f} packets/s, "
+            f"resolver {resolved:10.1f} packets/s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--packets", type=int, default=2000)
+    parser.add_argument("--peers", type=int, default=50)
+    main(parser.parse_args())
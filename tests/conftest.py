@@ -31,7 +31,12 @@ from canarytokens.queries import (
     save_kc_endpoint,
 )
 from canarytokens.redismanager import DB, KEY_KUBECONFIG_CERTS, KEY_KUBECONFIG_SERVEREP
-from canarytokens.settings import FrontendSettings, Port, SwitchboardSettings
+from canarytokens.settings import (
+    FrontendSettings,
+    Port,
+    SwitchboardSettings,
+    reload_settings,
+)
 from canarytokens.utils import strtobool
 
 # TODO: Once webhooker can handle more / faster traffic these will get upped
@@ -197,19 +202,29 @@ def settings_env_vars() -> Generator[None, None, None]:
     file and relative paths to `templates` differs. This ensures the
     `app` if launched by the testing harness has sensible defaults.
     """
-    with mock.patch.dict(
-        os.environ,
-        {
-            # "CANARY_STATIC_FILES_PATH": "templates/static",
-            # "CANARY_TEMPLATES_PATH": "templates",
-            "CANARY_TESTING_AWS_ACCESS_KEY_ID": "placeholder_key_id",
-            "CANARY_TESTING_AWS_SECRET_ACCESS_KEY": "placeholder_secret_key",
-            "CANARY_TESTING_AWS_REGION": "us-east-2",
-            "CANARY_TESTING_AWS_OUTPUT": "json",
-        },
-        clear=False,
+    with (
+        mock.patch.dict(
+            os.environ,
+            {
+                # "CANARY_STATIC_FILES_PATH": "templates/static",
+                # "CANARY_TEMPLATES_PATH": "templates",
+                "CANARY_TESTING_AWS_ACCESS_KEY_ID": "placeholder_key_id",
+                "CANARY_TESTING_AWS_SECRET_ACCESS_KEY": "placeholder_secret_key",
+                "CANARY_TESTING_AWS_REGION": "us-east-2",
+                "CANARY_TESTING_AWS_OUTPUT": "json",
+                # Keys are generated as needed rather than in the background.
+                "CANARY_KUBECONFIG_KEY_POOL_SIZE": "0",
+                "CANARY_AUTHENTICODE_SIGNING_PROCESSES": "0",
+            },
+            clear=False,
+        ),
+        mock.patch("canarytokens.settings._frontend_settings", None),
     ):
+        # Settings may have been loaded on import, before the patch. Frontend
+        # settings aren't reloaded, so they're read afresh instead.
+        reload_settings()
         yield
+    reload_settings()
 
 
 @pytest.fixture(scope="session")
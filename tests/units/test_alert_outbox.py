@@ -0,0 +1,275 @@
+import pytest
+
+from canarytokens import canarydrop, channel_output_email, queries
+from canarytokens.alert_outbox import CONSUMER_GROUP, AlertOutbox
+from canarytokens.channel import InputChannel, OutputChannel
+from canarytokens.channel_output_email import EmailOutputChannel, EmailResponseStatuses
+from canarytokens.channel_output_webhook import WebhookOutputChannel
+from canarytokens.constants import OUTPUT_CHANNEL_EMAIL
+from canarytokens.exceptions import AlertDeliveryError
+from canarytokens.models import TokenTypes
+from canarytokens.redismanager import DB, KEY_ALERT_OUTBOX, KEY_ALERT_OUTBOX_DEAD
+from canarytokens.switchboard import Switchboard
+from canarytokens.tokens import Canarytoken
+
+pytestmark = pytest.mark.usefixtures("setup_db")
+
+
+class RecordingOutputChannel(OutputChannel):
+    CHANNEL = OUTPUT_CHANNEL_EMAIL
+
+    def __init__(self, switchboard, failures=0):
+        self.failures = failures
+        self.sent = []
+        super().__init__(
+            switchboard=switchboard,
+            switchboard_scheme="https",
+            frontend_domain="test.com",
+        )
+
+    def do_send_alert(self, input_channel, canarydrop, token_hit, retry=False):
+        if self.failures:
+            self.failures -= 1
+            raise AlertDeliveryError("relay unavailable")
+        self.sent.append((canarydrop.canarytoken.value(), token_hit))
+
+
+@pytest.fixture
+def switchboard(settings):
+    switchboard = Switchboard(switchboard_settings=settings)
+    InputChannel(
+        switchboard=switchboard,
+        name="tester",
+        switchboard_hostname="",
+        switchboard_scheme="",
+    )
+    switchboard.alert_outbox = AlertOutbox(
+        switchboard, workers=1, max_attempts=3, retry_delay=0
+    )
+    switchboard.alert_outbox.create_consumer_group()
+    return switchboard
+
+
+def _dispatch(switchboard, **kwargs):
+    drop_args = dict(
+        type=TokenTypes.DNS,
+        generate=True,
+        alert_email_enabled=True,
+        alert_email_recipient="email@test.com",
+        alert_webhook_enabled=False,
+        alert_webhook_url=None,
+        canarytoken=Canarytoken(),
+        memo="memo",
+        browser_scanner_enabled=False,
+    )
+    cd = canarydrop.Canarydrop(**{**drop_args, **kwargs})
+    queries.save_canarydrop(cd)
+    token_hit = Canarytoken.create_token_hit(
+        token_type=cd.type,
+        input_channel="tester",
+        src_ip="127.0.0.1",
+        hit_info={"some": "data"},
+    )
+    cd.add_canarydrop_hit(token_hit=token_hit)
+    switchboard.dispatch(canarydrop=cd, token_hit=token_hit)
+    return cd, token_hit
+
+
+def test_dispatch_queues_alert(switchboard):
+    output_channel = RecordingOutputChannel(switchboard)
+    cd, token_hit = _dispatch(switchboard)
+
+    assert output_channel.sent == []
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX) == 1
+
+    assert switchboard.alert_outbox.process("worker") == 1
+    assert output_channel.sent == [(cd.canarytoken.value(), token_hit)]
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX) == 0
+    assert switchboard.alert_outbox.process("worker") == 0
+
+
+def test_failed_delivery_is_retried(switchboard):
+    output_channel = RecordingOutputChannel(switchboard, failures=1)
+    cd, token_hit = _dispatch(switchboard)
+
+    switchboard.alert_outbox.process("worker")
+    assert output_channel.sent == []
+    assert DB.get_db().xpending(KEY_ALERT_OUTBOX, CONSUMER_GROUP)["pending"] == 1
+
+    switchboard.alert_outbox.process("worker")
+    assert output_channel.sent == [(cd.canarytoken.value(), token_hit)]
+    assert DB.get_db().xpending(KEY_ALERT_OUTBOX, CONSUMER_GROUP)["pending"] == 0
+
+
+def test_retries_back_off(switchboard):
+    RecordingOutputChannel(switchboard, failures=1)
+    switchboard.alert_outbox.retry_delay = 60
+    _dispatch(switchboard)
+
+    switchboard.alert_outbox.process("worker")
+    assert switchboard.alert_outbox.process("worker") == 0
+    assert switchboard.alert_outbox.get_retry_delay(1) == 60
+    assert switchboard.alert_outbox.get_retry_delay(3) == 240
+    assert switchboard.alert_outbox.get_retry_delay(100) == 60 * 60
+
+
+def test_undeliverable_alert_is_dead_lettered(switchboard):
+    output_channel = RecordingOutputChannel(switchboard, failures=100)
+    cd, _ = _dispatch(switchboard)
+
+    for _ in range(4):
+        switchboard.alert_outbox.process("worker")
+
+    assert output_channel.failures == 100 - 3
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX) == 0
+    [(_, dead_letter)] = DB.get_db().xrange(KEY_ALERT_OUTBOX_DEAD)
+    assert dead_letter["canarytoken"] == cd.canarytoken.value()
+    assert dead_letter["output_channel"] == OUTPUT_CHANNEL_EMAIL
+    assert dead_letter["deliveries"] == "3"
+
+
+def test_alert_for_deleted_drop_is_dropped(switchboard):
+    output_channel = RecordingOutputChannel(switchboard)
+    cd, _ = _dispatch(switchboard)
+    queries.delete_canarydrop(cd)
+
+    assert switchboard.alert_outbox.process("worker") == 1
+
+    assert output_channel.sent == []
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX) == 0
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX_DEAD) == 0
+
+
+def test_alert_held_by_dead_worker_is_delivered(switchboard):
+    output_channel = RecordingOutputChannel(switchboard)
+    _dispatch(switchboard)
+    # A worker reads the alert and then dies before sending it.
+    DB.get_db().xreadgroup(
+        CONSUMER_GROUP, "dead-worker", {KEY_ALERT_OUTBOX: ">"}, count=1
+    )
+
+    switchboard.alert_outbox.process("worker")
+    assert len(output_channel.sent) == 1
+
+
+def test_due_alerts_behind_backed_off_alerts_are_retried(switchboard, monkeypatch):
+    monkeypatch.setattr("canarytokens.alert_outbox.PENDING_PAGE_SIZE", 2)
+    output_channel = RecordingOutputChannel(switchboard)
+    switchboard.alert_outbox.retry_delay = 60
+    for _ in range(3):
+        _dispatch(switchboard)
+    db = DB.get_db()
+    db.xreadgroup(CONSUMER_GROUP, "dead-worker", {KEY_ALERT_OUTBOX: ">"}, count=3)
+    # Only the newest alert has been idle long enough to be retried.
+    newest_id = db.xrange(KEY_ALERT_OUTBOX)[-1][0]
+    db.xclaim(
+        KEY_ALERT_OUTBOX,
+        CONSUMER_GROUP,
+        "dead-worker",
+        min_idle_time=0,
+        message_ids=[newest_id],
+        idle=60 * 60 * 1000,
+    )
+
+    assert switchboard.alert_outbox.process("worker") == 0
+    assert switchboard.alert_outbox.process("worker") == 1
+
+    assert len(output_channel.sent) == 1
+    assert db.xpending(KEY_ALERT_OUTBOX, CONSUMER_GROUP)["pending"] == 2
+
+
+def test_failed_email_is_retried(switchboard, settings, frontend_settings, monkeypatch):
+    EmailOutputChannel(
+        frontend_settings=frontend_settings,
+        switchboard_settings=settings,
+        switchboard=switchboard,
+    )
+    results = [EmailResponseStatuses.ERROR, EmailResponseStatuses.SENT]
+    monkeypatch.setattr(
+        channel_output_email,
+        "send_email",
+        lambda **kwargs: (results.pop(0), "message-id"),
+    )
+    cd, _ = _dispatch(switchboard)
+
+    switchboard.alert_outbox.process("worker")
+    assert DB.get_db().xpending(KEY_ALERT_OUTBOX, CONSUMER_GROUP)["pending"] == 1
+    switchboard.alert_outbox.process("worker")
+
+    assert results == []
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX) == 0
+    assert not queries.get_canarydrop(cd.canarytoken).alert_failure_count
+
+
+def test_failed_webhook_is_retried(switchboard, monkeypatch):
+    webhook_channel = WebhookOutputChannel(
+        switchboard=switchboard,
+        switchboard_scheme="https",
+        frontend_domain="test.com",
+    )
+    results = [False, True]
+    monkeypatch.setattr(
+        webhook_channel, "generic_webhook_send", lambda **kwargs: results.pop(0)
+    )
+    cd, _ = _dispatch(
+        switchboard,
+        alert_webhook_enabled=True,
+        alert_webhook_url="https://example.com/test",
+    )
+
+    switchboard.alert_outbox.process("worker")
+    switchboard.alert_outbox.process("worker")
+
+    assert results == []
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX) == 0
+    assert not queries.get_canarydrop(cd.canarytoken).alert_failure_count
+
+
+def test_retried_webhook_failure_is_counted_once(switchboard, monkeypatch):
+    switchboard.switchboard_settings = switchboard.switchboard_settings.copy(
+        update={"MAX_ALERT_FAILURES": 1}
+    )
+    webhook_channel = WebhookOutputChannel(
+        switchboard=switchboard,
+        switchboard_scheme="https",
+        frontend_domain="test.com",
+    )
+    monkeypatch.setattr(webhook_channel, "generic_webhook_send", lambda **kwargs: False)
+    cd, _ = _dispatch(
+        switchboard,
+        alert_webhook_enabled=True,
+        alert_webhook_url="https://example.com/test",
+    )
+
+    for _ in range(switchboard.alert_outbox.max_attempts + 1):
+        switchboard.alert_outbox.process("worker")
+
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX_DEAD) == 1
+    stored = queries.get_canarydrop(cd.canarytoken)
+    assert stored.alert_webhook_enabled
+    assert stored.alert_failure_count == 1
+
+
+def test_retried_email_failure_is_counted_once(
+    switchboard, settings, frontend_settings, monkeypatch
+):
+    settings = settings.copy(update={"MAX_ALERT_FAILURES": 1})
+    EmailOutputChannel(
+        frontend_settings=frontend_settings,
+        switchboard_settings=settings,
+        switchboard=switchboard,
+    )
+    monkeypatch.setattr(
+        channel_output_email,
+        "send_email",
+        lambda **kwargs: (EmailResponseStatuses.ERROR, ""),
+    )
+    cd, _ = _dispatch(switchboard)
+
+    for _ in range(switchboard.alert_outbox.max_attempts + 1):
+        switchboard.alert_outbox.process("worker")
+
+    assert DB.get_db().xlen(KEY_ALERT_OUTBOX_DEAD) == 1
+    stored = queries.get_canarydrop(cd.canarytoken)
+    assert stored.alert_email_enabled
+    assert stored.alert_failure_count == 1
@@ -0,0 +1,146 @@
+from unittest import mock
+
+import pytest
+import pytest_twisted
+from twisted.internet.address import IPv4Address
+from twisted.names import dns
+from twisted.python import threadable
+from twisted.web.server import NOT_DONE_YET
+from twisted.web.test.test_web import DummyRequest
+
+from canarytokens import async_queries, canarydrop, queries
+from canarytokens.channel_dns import ChannelDNS
+from canarytokens.channel_http import ChannelHTTP
+from canarytokens.exceptions import NoCanarydropFound
+from canarytokens.models import TokenTypes
+from canarytokens.switchboard import Switchboard
+from canarytokens.tokens import Canarytoken
+
+
+def _make_drop(token_type: TokenTypes = TokenTypes.DNS) -> canarydrop.Canarydrop:
+    cd = canarydrop.Canarydrop(
+        type=token_type,
+        generate=True,
+        alert_email_enabled=False,
+        alert_email_recipient="email@test.com",
+        alert_webhook_enabled=False,
+        alert_webhook_url=None,
+        canarytoken=Canarytoken(),
+        memo="memo",
+        browser_scanner_enabled=False,
+    )
+    queries.save_canarydrop(cd)
+    return cd
+
+
+@pytest.fixture
+def redis_threadpool():
+    yield async_queries.start_threadpool(2)
+    async_queries.stop_threadpool()
+
+
+def test_inline_get_canarydrop(setup_db):
+    cd = _make_drop()
+    d = async_queries.get_canarydrop(cd.canarytoken)
+    assert d.called
+    assert d.result.canarytoken.value() == cd.canarytoken.value()
+
+
+def test_inline_get_canarydrop_missing(setup_db):
+    d = async_queries.get_canarydrop(Canarytoken())
+    assert d.called
+    assert d.result.check(NoCanarydropFound)
+    d.addErrback(lambda failure: None)
+
+
+@pytest_twisted.inlineCallbacks
+def test_queries_run_off_reactor_thread(redis_threadpool):
+    in_io_thread = yield async_queries.run_query(threadable.isInIOThread)
+    assert not in_io_thread
+
+
+@pytest_twisted.inlineCallbacks
+def test_threadpool_add_canarydrop_hit(setup_db, redis_threadpool):
+    cd = _make_drop()
+    token_hit = Canarytoken.create_token_hit(
+        token_type=cd.type,
+        input_channel="DNS",
+        src_ip="127.0.0.1",
+        hit_info={},
+    )
+    yield async_queries.add_canarydrop_hit(cd, token_hit)
+    cd_updated = yield async_queries.get_canarydrop(cd.canarytoken)
+    assert len(cd_updated.triggered_details.hits) == 1
+
+
+@pytest_twisted.inlineCallbacks
+def test_channel_dns_query_threadpool(setup_db, redis_threadpool, frontend_settings):
+    resolver = ChannelDNS(
+        switchboard=Switchboard(),
+        switchboard_scheme="http",
+        switchboard_hostname="127.0.0.1",
+        frontend_settings=frontend_settings,
+    )
+    cd = _make_drop()
+    m = dns.Message()
+    m.addQuery(cd.get_hostname().encode(), type=dns.A)
+    d = resolver.query(query=m.queries[0], src_ip="1.2.1.1")
+    assert not d.called
+    answers, _, _ = yield d
+    assert answers[0].type == dns.A
+
+    cd_updated = queries.get_canarydrop(cd.canarytoken)
+    assert len(cd_updated.triggered_details.hits) == 1
+
+
+@pytest_twisted.inlineCallbacks
+def test_channel_http_GET_threadpool(
+    setup_db, redis_threadpool, settings, frontend_settings
+):
+    http_channel = ChannelHTTP(
+        switchboard=Switchboard(switchboard_settings=settings),
+        frontend_settings=frontend_settings,
+        switchboard_settings=settings,
+    )
+    cd = _make_drop(TokenTypes.WEB)
+    request = DummyRequest("/")
+    request.client = IPv4Address(type="TCP", host="127.0.0.1", port=8686)
+    request.uri = cd.generate_random_url(["http://127.0.0.1:8686"]).encode()
+    request.path = request.uri[request.uri.index(b"/", 8) :]  # noqa: E203
+
+    assert http_channel.canarytoken_page.render_GET(request) == NOT_DONE_YET
+    yield request.notifyFinish()
+    assert b"".join(request.written)
+
+    cd_updated = queries.get_canarydrop(cd.canarytoken)
+    assert len(cd_updated.triggered_details.hits) == 1
+
+
+@pytest_twisted.inlineCallbacks
+def test_channel_http_web_response_threadpool(
+    setup_db, redis_threadpool, settings, frontend_settings
+):
+    http_channel = ChannelHTTP(
+        switchboard=Switchboard(switchboard_settings=settings),
+        frontend_settings=frontend_settings,
+        switchboard_settings=settings,
+    )
+    cd = _make_drop(TokenTypes.WEB)
+    request = DummyRequest("/")
+    request.client = IPv4Address(type="TCP", host="127.0.0.1", port=8686)
+    request.requestHeaders.setRawHeaders("Accept", ["text/html"])
+    request.uri = cd.generate_random_url(["http://127.0.0.1:8686"]).encode()
+    request.path = request.uri[request.uri.index(b"/", 8) :]  # noqa: E203
+
+    in_io_thread = []
+
+    def get_return_for_token():
+        in_io_thread.append(threadable.isInIOThread())
+        return "fortune"
+
+    with mock.patch.object(queries, "get_return_for_token", get_return_for_token):
+        assert http_channel.canarytoken_page.render_GET(request) == NOT_DONE_YET
+        yield request.notifyFinish()
+
+    assert in_io_thread == [False]
+    assert request.responseHeaders.getRawHeaders("Content-Type") == ["text/html"]
@@ -0,0 +1,179 @@
+import hashlib
+import struct
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import pkcs7
+
+from canarytokens import authenticode
+from canarytokens.authenticode import SigningPool, make_canary_authenticode_binary
+from canarytokens.exceptions import InvalidPEFile, SigningPoolBusy
+from canarytokens.sign_file import _pe_checksum, _pe_layout
+
+HELLO_WORLD = Path(__file__).parent.parent / "data" / "helloWorld.exe"
+TOKEN_URL = "http://xyz123.nxdomain.tools"
+# DER encoding of the messageDigest attribute's OID, 1.2.840.113549.1.9.4
+OID_MESSAGE_DIGEST = bytes.fromhex("06092a864886f70d010904")
+
+
+def _certificate_table(pe: bytes) -> tuple[int, bytes]:
+    _, security_entry = _pe_layout(pe)
+    offset, size = struct.unpack_from("<II", pe, security_entry)
+    return offset, pe[offset : offset + size]  # noqa: E203
+
+
+def test_sign_binary():
+    filebody = HELLO_WORLD.read_bytes()
+
+    signed = make_canary_authenticode_binary(TOKEN_URL, filebody)
+
+    offset, cert_table = _certificate_table(signed)
+    assert offset >= len(filebody)
+    assert offset + len(cert_table) == len(signed)
+    length, revision, cert_type = struct.unpack_from("<IHH", cert_table)
+    assert (length, revision, cert_type) == (len(cert_table), 0x0200, 0x0002)
+    checksum_offset, _ = _pe_layout(signed)
+    assert struct.unpack_from("<I", signed, checksum_offset)[0] == _pe_checksum(
+        signed, checksum_offset
+    )
+
+    (cert,) = pkcs7.load_der_pkcs7_certificates(cert_table[8:].rstrip(b"\x00"))
+    crl = cert.extensions.get_extension_for_class(x509.CRLDistributionPoints)
+    assert crl.value[0].full_name[0].value.startswith(TOKEN_URL)
+
+
+class _DER(NamedTuple):
+    encoding: bytes
+    value: bytes
+
+
+def _der_element(data: bytes) -> _DER:
+    """Returns the DER element `data` starts with."""
+    length, header = data[1], 2
+    if length & 0x80:
+        header += length & 0x7F
+        length = int.from_bytes(data[2:header], "big")
+    end = header + length
+    return _DER(data[:end], data[header:end])
+
+
+def _der_elements(data: bytes) -> list[_DER]:
+    """Splits `data` into the DER elements it's made of."""
+    elements = []
+    while data:
+        elements.append(_der_element(data))
+        data = data[len(elements[-1].encoding) :]  # noqa: E203
+    return elements
+
+
+def test_signature_verifies():
+    signed = make_canary_authenticode_binary(TOKEN_URL, HELLO_WORLD.read_bytes())
+
+    offset, cert_table = _certificate_table(signed)
+    # The ContentInfo is padded to 8 bytes.
+    _, content = _der_elements(_der_element(cert_table[8:]).value)
+    (signed_data,) = _der_elements(content.value)
+    _, _, encap_content_info, certificates, signer_infos = _der_elements(
+        signed_data.value
+    )
+    _, encap_content = _der_elements(encap_content_info.value)
+    (indirect_data,) = _der_elements(encap_content.value)
+    (signer_info,) = _der_elements(signer_infos.value)
+    _, issuer_and_serial, _, attributes, _, signature = _der_elements(signer_info.value)
+
+    # The PE hash covers the file, except for its checksum, its certificate
+    # table entry and the certificate table itself.
+    checksum_offset, security_entry = _pe_layout(signed)
+    pe_hash = hashlib.sha256(
+        signed[:checksum_offset]
+        + signed[checksum_offset + 4 : security_entry]  # noqa: E203
+        + signed[security_entry + 8 : offset]  # noqa: E203
+    ).digest()
+    _, digest_info = _der_elements(indirect_data.value)
+    _, pe_digest = _der_elements(digest_info.value)
+    assert pe_digest.value == pe_hash
+
+    # The message digest covers the SpcIndirectDataContent's value.
+    (message_digest,) = [
+        _der_elements(values.value)[0]
+        for oid, values in (
+            _der_elements(attribute.value)
+            for attribute in _der_elements(attributes.value)
+        )
+        if oid.encoding == OID_MESSAGE_DIGEST
+    ]
+    assert message_digest.value == hashlib.sha256(indirect_data.value).digest()
+
+    (signer,) = [
+        x509.load_der_x509_certificate(cert.encoding)
+        for cert in _der_elements(certificates.value)
+    ]
+    _, serial = _der_elements(issuer_and_serial.value)
+    assert signer.serial_number == int.from_bytes(serial.value, "big", signed=True)
+    # The signed attributes are sent [0] IMPLICIT but signed as a SET.
+    signer.public_key().verify(
+        signature.value,
+        b"\x31" + attributes.encoding[1:],
+        padding.PKCS1v15(),
+        hashes.SHA256(),
+    )
+
+
+def test_resign_replaces_signature():
+    signed = make_canary_authenticode_binary(TOKEN_URL, HELLO_WORLD.read_bytes())
+
+    resigned = make_canary_authenticode_binary(TOKEN_URL, signed)
+
+    assert len(resigned) == len(signed)
+    assert _certificate_table(resigned)[0] == _certificate_table(signed)[0]
+
+
+def test_sign_invalid_binary():
+    with pytest.raises(InvalidPEFile):
+        make_canary_authenticode_binary(TOKEN_URL, b"not a binary" * 10)
+
+
+def test_sign_truncated_binary():
+    pe = bytearray(0x40)
+    pe[:2] = b"MZ"
+    struct.pack_into("<I", pe, 0x3C, 0x40)
+    pe += b"PE\x00\x00" + b"\x00" * 20 + struct.pack("<H", 0x10B)
+    pe += b"\x00" * (90 - len(pe))
+
+    with pytest.raises(InvalidPEFile, match="Truncated PE file"):
+        make_canary_authenticode_binary(TOKEN_URL, bytes(pe))
+
+
+def test_signing_pool_rejects_when_busy(monkeypatch):
+    pool = SigningPool(processes=1, max_pending=1, key_pool_size=0, wait_timeout=0)
+    signing = threading.Event()
+    release = threading.Event()
+
+    def _sign(*args):
+        signing.set()
+        release.wait(5)
+        return b"signed"
+
+    monkeypatch.setattr(authenticode, "_sign", _sign)
+    monkeypatch.setattr(authenticode, "_generate_private_key_pem", lambda: b"key")
+    monkeypatch.setattr(authenticode, "_generate_ca_pem", lambda: (b"ca", b"cert"))
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(pool.sign(TOKEN_URL, b"binary"))
+    )
+    thread.start()
+    try:
+        assert signing.wait(5)
+        with pytest.raises(SigningPoolBusy):
+            pool.sign(TOKEN_URL, b"binary")
+    finally:
+        release.set()
+        thread.join()
+
+    assert result == [b"signed"]
+    assert pool.stats() == {"signed": 1, "rejected": 1, "keys": 0, "key_misses": 1}
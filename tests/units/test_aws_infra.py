@@ -21,6 +21,7 @@ from canarytokens.aws_infra.plan_generation import (
     _get_event_pattern_length,
 )
 from canarytokens.aws_infra.state_management import (
+    AWSInfraCleanupTask,
     cleanup_inactive_aws_infra_canarydrops,
     is_aws_infra_canarydrop_active,
     update_state,
@@ -358,6 +359,47 @@ class TestStateManagement:
         )
         mock_queries.delete_canarydrop.assert_called_once_with(old_inactive_drop)
 
+    @patch("canarytokens.aws_infra.state_management.queries")
+    def test_cleanup_task_spreads_sweep_over_ticks(self, mock_queries):
+        old_inactive_drops = []
+        for _ in range(3):
+            drop = _mock_aws_infra_canarydrop()
+            drop.created_at = datetime.now(timezone.utc) - timedelta(days=8)
+            drop.aws_infra_state = AWSInfraState.SETUP_INGESTION
+            drop.aws_tf_module_prefix = None
+            drop.aws_saved_plan = None
+            old_inactive_drops.append(drop)
+        batches = {
+            None: ((1.0, "b"), old_inactive_drops[:2]),
+            (1.0, "b"): (None, old_inactive_drops[2:]),
+        }
+        mock_queries.scan_canarydrops_by_type.side_effect = (
+            lambda token_type, cursor, count: batches[cursor]
+        )
+        now = [0.0]
+
+        def clock():
+            # Each read of the clock takes the batch's whole time budget.
+            now[0] += 1
+            return now[0]
+
+        task = AWSInfraCleanupTask(
+            interval=100, batch_size=2, time_budget=1.5, clock=clock
+        )
+
+        task.tick()
+        assert mock_queries.delete_canarydrop.call_count == 2
+        task.tick()
+        assert mock_queries.delete_canarydrop.call_count == 3
+        assert task.deleted_count == 3
+        mock_queries.scan_canarydrops_by_type.assert_called_with(
+            TokenTypes.AWS_INFRA, cursor=(1.0, "b"), count=2
+        )
+
+        # The next sweep waits for the interval.
+        task.tick()
+        assert mock_queries.scan_canarydrops_by_type.call_count == 2
+
 
 VALID_PLAN = {
     "S3Bucket": [
@@ -1,4 +1,5 @@
 import datetime
+import os
 from pathlib import Path
 import uuid
 import pytest
@@ -19,6 +20,7 @@ from canarytokens.channel_output_email import (
     smtp_send,
     EmailResponseStatuses,
     EmailTemplates,
+    get_email_template,
 )
 from canarytokens.models import (
     DNSTokenHistory,
@@ -196,6 +198,24 @@ def test_aws_key_exposed_rendered_html(settings: SwitchboardSettings):
     assert "12:00" in email_template
 
 
+def test_email_template_compiled_once(settings: SwitchboardSettings):
+    template_path = Path(settings.TEMPLATES_PATH, f"{EmailTemplates.NOTIFICATION_HTML}")
+    template = get_email_template(template_path)
+    assert get_email_template(template_path) is template
+    assert get_email_template(template_path, trim_blocks=True) is not template
+
+
+def test_email_template_recompiled_when_changed(tmp_path: Path):
+    template_path = tmp_path / "notification.html"
+    template_path.write_text("<p>  Hello  {{ name }} </p>")
+    assert get_email_template(template_path).render(name="a") == "<p>Hello a</p>"
+
+    template_path.write_text("<p>Bye {{ name }}</p>")
+    stat = template_path.stat()
+    os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert get_email_template(template_path).render(name="a") == "<p>Bye a</p>"
+
+
 def _get_send_token_details() -> TokenAlertDetails:
     return TokenAlertDetails(
         channel="DNS",
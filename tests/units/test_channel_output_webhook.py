@@ -1,11 +1,18 @@
 # pytest caplog
+import ipaddress
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
 import pytest
 
 from twisted.logger import capturedLogs
 
+from canarytokens import advocate, channel_output_webhook, metrics
 from canarytokens.canarydrop import Canarydrop
 from canarytokens.channel_dns import ChannelDNS
-from canarytokens.channel_output_webhook import WebhookOutputChannel
+from canarytokens.channel_output_webhook import WebhookOutputChannel, WebhookSessions
+from canarytokens.exceptions import AlertDeliveryError
 from canarytokens.models import (
     TokenTypes,
 )
@@ -386,3 +393,155 @@ def test_ssrf_protection(
             ),
         )
     assert any(["Disallowed requests to" in log["log_format"] for log in captured])
+
+
+class _SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.cookies.append(self.headers.get("Cookie"))
+        self.server.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Set-Cookie", "session=secret")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook_sink():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SinkHandler)
+    server.cookies = []
+    server.connections = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+LOOPBACK_VALIDATOR = advocate.AddrValidator(
+    ip_whitelist={ipaddress.ip_network("127.0.0.0/8")},
+    port_whitelist=set(range(0, 65535)),
+)
+
+
+def test_webhook_sessions_reuse_connections(webhook_sink):
+    url = f"http://127.0.0.1:{webhook_sink.server_port}/hook"
+    sessions = WebhookSessions(max_per_host=2, validator=LOOPBACK_VALIDATOR)
+    for _ in range(3):
+        with sessions.session_for(url) as session:
+            session.post(url, json={"a": 1}, timeout=2).raise_for_status()
+
+    assert len(webhook_sink.connections) == 1
+    # Cookies set by one webhook aren't sent with the next alert.
+    assert webhook_sink.cookies == [None, None, None]
+
+
+def test_webhook_sessions_still_validate_addresses(webhook_sink):
+    url = f"http://127.0.0.1:{webhook_sink.server_port}/hook"
+    sessions = WebhookSessions(max_per_host=2)
+    with sessions.session_for(url) as session:
+        with pytest.raises(advocate.UnacceptableAddressException):
+            session.post(url, json={"a": 1}, timeout=2)
+    assert webhook_sink.connections == set()
+
+
+def test_webhook_sessions_per_host(monkeypatch):
+    monkeypatch.setattr(channel_output_webhook, "WEBHOOK_HOST_WAIT", 0.01)
+    sessions = WebhookSessions(max_per_host=1, max_hosts=2)
+
+    with sessions.session_for("https://hooks.slack.com/services/a") as first:
+        with sessions.session_for("https://hooks.slack.com/services/b") as second:
+            assert second is None
+        with sessions.session_for("https://example.com/hook") as other:
+            assert other is not None and other is not first
+    with sessions.session_for("https://HOOKS.slack.com/services/b") as second:
+        assert second is first
+
+    # example.com is now the least recently used host.
+    with sessions.session_for("https://example.org/hook"):
+        pass
+    with sessions.session_for("https://example.com/hook") as evicted:
+        assert evicted is not other
+
+
+@pytest.fixture
+def busy_webhook_alert(
+    setup_db,
+    frontend_settings: FrontendSettings,
+    settings: SwitchboardSettings,
+    monkeypatch,
+):
+    """Returns a webhook channel, a drop alerting a webhook whose host's only
+    slot is taken, and a function sending an alert for that drop."""
+    monkeypatch.setattr(channel_output_webhook, "WEBHOOK_HOST_WAIT", 0.01)
+    settings = settings.copy(update={"MAX_ALERT_FAILURES": 0})
+    switchboard = Switchboard(settings)
+    webhook_channel = WebhookOutputChannel(
+        switchboard=switchboard,
+        switchboard_scheme=settings.SWITCHBOARD_SCHEME,
+        frontend_domain="test.com",
+    )
+    webhook_channel.webhook_sessions = WebhookSessions(max_per_host=1)
+    cd = Canarydrop(
+        type=TokenTypes.DNS,
+        generate=True,
+        alert_email_enabled=False,
+        alert_email_recipient="email@test.com",
+        alert_webhook_enabled=True,
+        alert_webhook_url="https://hooks.slack.com/services/a",
+        canarytoken=Canarytoken(),
+        memo="memo",
+        browser_scanner_enabled=False,
+    )
+    token_hit = Canarytoken.create_token_hit(
+        token_type=TokenTypes.DNS,
+        input_channel="not_valid",
+        src_ip="127.0.0.1",
+        hit_info={"some": "data"},
+    )
+    cd.add_canarydrop_hit(token_hit=token_hit)
+
+    def send_alert():
+        with webhook_channel.webhook_sessions.session_for(cd.alert_webhook_url):
+            webhook_channel.send_alert(
+                canarydrop=cd,
+                token_hit=token_hit,
+                input_channel=ChannelDNS(
+                    switchboard=switchboard,
+                    frontend_settings=frontend_settings,
+                    switchboard_hostname="test.com",
+                    switchboard_scheme=settings.SWITCHBOARD_SCHEME,
+                ),
+            )
+
+    return webhook_channel, cd, send_alert
+
+
+def test_busy_webhook_host_is_not_a_failure(busy_webhook_alert):
+    webhook_channel, cd, send_alert = busy_webhook_alert
+    webhook_channel.switchboard.alert_outbox = mock.Mock()
+
+    with pytest.raises(AlertDeliveryError):
+        send_alert()
+
+    assert cd.alert_webhook_enabled
+    assert not cd.alert_failure_count
+
+
+def test_busy_webhook_host_without_outbox(busy_webhook_alert):
+    webhook_channel, cd, send_alert = busy_webhook_alert
+    labels = {"output_channel": "Webhook", "provider": WebhookType.SLACK}
+    failed_before = metrics.ALERT_SEND_FAILURES.get(**labels)
+
+    with capturedLogs() as captured:
+        send_alert()
+
+    assert any(["Dropped alert for token" in log["log_format"] for log in captured])
+    assert metrics.ALERT_SEND_FAILURES.get(**labels) == failed_before + 1
+    assert cd.alert_webhook_enabled
+    assert not cd.alert_failure_count
@@ -0,0 +1,139 @@
+import time
+from unittest import mock
+
+from canarytokens.canarydrop import Canarydrop
+from canarytokens.channel import InputChannel
+from canarytokens.dispatch_queue import DispatchQueue
+from canarytokens.models import TokenTypes
+from canarytokens.switchboard import Switchboard
+from canarytokens.tokens import Canarytoken
+
+
+def _canarydrop() -> Canarydrop:
+    return Canarydrop(
+        type=TokenTypes.DNS,
+        generate=True,
+        alert_email_enabled=False,
+        alert_webhook_enabled=False,
+        canarytoken=Canarytoken(),
+        memo="memo",
+        browser_scanner_enabled=False,
+    )
+
+
+def _queued_tokens(queue: DispatchQueue) -> list[str]:
+    return [entry.canarydrop.canarytoken.value() for entry in queue._queue]
+
+
+def _put(queue: DispatchQueue, canarydrop: Canarydrop) -> bool:
+    return queue.put(
+        input_channel=mock.Mock(), canarydrop=canarydrop, token_hit=mock.Mock()
+    )
+
+
+def test_coalesces_hits_for_queued_token():
+    queue = DispatchQueue(mock.Mock(), workers=1, max_size=10)
+    canarydrop = _canarydrop()
+
+    assert _put(queue, canarydrop)
+    assert _put(queue, canarydrop)
+
+    assert queue.stats()["depth"] == 1
+    assert queue.stats()["coalesced"] == 1
+    assert queue.get(timeout=0).canarydrop is canarydrop
+    # Once dispatched, hits are queued again.
+    assert _put(queue, canarydrop)
+    assert queue.stats()["depth"] == 1
+
+
+def test_drop_oldest_when_full():
+    queue = DispatchQueue(mock.Mock(), workers=1, max_size=2, shed_policy="drop-oldest")
+    canarydrops = [_canarydrop() for _ in range(3)]
+
+    assert all(_put(queue, canarydrop) for canarydrop in canarydrops)
+
+    assert _queued_tokens(queue) == [
+        canarydrop.canarytoken.value() for canarydrop in canarydrops[1:]
+    ]
+    assert queue.stats()["shed_full"] == 1
+    # The dropped hit's token is no longer coalesced into anything.
+    assert _put(queue, canarydrops[0])
+    assert queue.stats()["shed_full"] == 2
+
+
+def test_drop_newest_when_full():
+    queue = DispatchQueue(mock.Mock(), workers=1, max_size=2, shed_policy="drop-newest")
+    canarydrops = [_canarydrop() for _ in range(3)]
+
+    assert [_put(queue, canarydrop) for canarydrop in canarydrops] == [
+        True,
+        True,
+        False,
+    ]
+
+    assert _queued_tokens(queue) == [
+        canarydrop.canarytoken.value() for canarydrop in canarydrops[:2]
+    ]
+    assert queue.stats()["shed_full"] == 1
+
+
+def test_drop_duplicates_within_window():
+    queue = DispatchQueue(
+        mock.Mock(), workers=1, max_size=10, coalesce=False, duplicate_window=60
+    )
+    canarydrop = _canarydrop()
+
+    assert _put(queue, canarydrop)
+    assert _put(queue, canarydrop)
+    queue.get(timeout=0)
+    queue.get(timeout=0)
+    assert not _put(queue, canarydrop)
+    assert _put(queue, _canarydrop())
+
+    assert queue.stats()["shed_duplicate"] == 1
+
+
+def test_workers_dispatch_hits(settings):
+    switchboard = Switchboard(switchboard_settings=settings)
+    switchboard.dispatch = mock.Mock(return_value="dispatched")
+    input_channel = mock.Mock(spec=InputChannel)
+    queue = DispatchQueue(switchboard, workers=2, max_size=10)
+    canarydrop = _canarydrop()
+    token_hit = mock.Mock()
+
+    queue.start()
+    try:
+        queue.put(
+            input_channel=input_channel, canarydrop=canarydrop, token_hit=token_hit
+        )
+        deadline = time.monotonic() + 5
+        while not input_channel.dispatch_success.called:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        queue.stop()
+
+    switchboard.dispatch.assert_called_once_with(
+        canarydrop=canarydrop, token_hit=token_hit
+    )
+    input_channel.dispatch_success.assert_called_once_with("dispatched")
+    assert queue.stats()["dispatched"] == 1
+
+
+def test_input_channel_queues_hits(settings):
+    switchboard = Switchboard(switchboard_settings=settings)
+    switchboard.dispatch_queue = mock.Mock()
+    input_channel = InputChannel(
+        switchboard=switchboard,
+        name="tester",
+        switchboard_hostname="",
+        switchboard_scheme="",
+    )
+    canarydrop = _canarydrop()
+    token_hit = mock.Mock()
+
+    input_channel.dispatch(canarydrop=canarydrop, token_hit=token_hit)
+
+    switchboard.dispatch_queue.put.assert_called_once_with(
+        input_channel=input_channel, canarydrop=canarydrop, token_hit=token_hit
+    )
@@ -8,7 +8,14 @@ import pytest
 from fastapi.testclient import TestClient
 from pydantic import HttpUrl
 
-from canarytokens import canarydrop, models, queries, constants
+from canarytokens import (
+    authenticode,
+    canarydrop,
+    kubeconfig,
+    models,
+    queries,
+    constants,
+)
 from canarytokens.models import (
     AWSInfraTokenRequest,
     AWSInfraTokenResponse,
@@ -220,6 +227,12 @@ def test_creating_all_tokens(
         token_response_type(**resp.json())
 
 
+def test_test_app_has_no_background_pools(test_client: TestClient) -> None:
+    # Disabled by the test env, which is patched after the app is imported.
+    assert kubeconfig._key_pool is None
+    assert authenticode._signing_pool is None
+
+
 def test_get_commit_sha(test_client: TestClient) -> None:
     resp = test_client.get(api_path("/commitsha"))
     assert resp.status_code == 200
@@ -1039,3 +1052,108 @@ def test_add_ip_ignore_list(
         json=data,
     )
     assert resp.status_code == (200 if is_valid else 422)
+
+
+def test_history_pages_hits(test_client: TestClient, setup_db: None) -> None:
+    token_request = DNSTokenRequest(
+        token_type=TokenTypes.DNS,
+        email="test@test.com",
+        memo="test stuff break stuff fix stuff test stuff",
+    )
+    token_resp = test_client.post(
+        api_path("/generate"), data=token_request.json()
+    ).json()
+    canarytoken = Canarytoken(value=token_resp["token"])
+    drop = queries.get_canarydrop(canarytoken)
+    for _ in range(3):
+        drop.add_canarydrop_hit(
+            token_hit=Canarytoken.create_token_hit(
+                token_type=TokenTypes.DNS,
+                input_channel="DNS",
+                src_ip="127.0.0.1",
+                hit_info={"some": "data"},
+            )
+        )
+
+    resp = test_client.get(
+        api_path("/history"),
+        params={
+            "token": token_resp["token"],
+            "auth": token_resp["auth_token"],
+            "limit": 2,
+        },
+    )
+
+    assert resp.status_code == 200
+    assert resp.json()["total_hits"] == 3
+    assert len(resp.json()["history"]["hits"]) == 2
+    assert "triggered_details" not in resp.json()["canarydrop"]
+
+
+async def test_signing_binaries_does_not_block(
+    settings_env_vars: None, setup_db: None
+) -> None:
+    """
+    Binaries are signed off the event loop, so other requests are served
+    meanwhile and a full signing pool turns requests away.
+    """
+    import asyncio
+    import time
+
+    import httpx
+
+    from frontend.app import app
+
+    signing = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    sign = authenticode._sign
+
+    def slow_sign(*args):
+        loop.call_soon_threadsafe(signing.set)
+        time.sleep(0.5)
+        return sign(*args)
+
+    pool = authenticode.SigningPool(
+        processes=0, max_pending=1, key_pool_size=0, wait_timeout=0
+    )
+    with open("data/helloWorld.exe", "rb") as fp:
+        filebody = fp.read()
+    transport = httpx.ASGITransport(app=app)
+    with (
+        mock.patch.object(authenticode, "_signing_pool", pool),
+        mock.patch.object(authenticode, "_sign", slow_sign),
+    ):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+
+            async def generate():
+                return await client.post(
+                    api_path("/generate"),
+                    data={
+                        "token_type": "signed_exe",
+                        "email": "test@test.com",
+                        "memo": "signed exe memo",
+                    },
+                    files={
+                        "signed_exe": (
+                            "helloWorld.exe",
+                            filebody,
+                            "application/x-msdownload",
+                        )
+                    },
+                )
+
+            async def while_signing():
+                await asyncio.wait_for(signing.wait(), timeout=5)
+                start = time.perf_counter()
+                resp = await client.get("/robots.txt")
+                assert resp.status_code == 200
+                return time.perf_counter() - start
+
+            first, latency = await asyncio.gather(generate(), while_signing())
+            second, third = await asyncio.gather(generate(), generate())
+
+    assert first.status_code == 200
+    assert latency < 0.25
+    assert sorted([second.status_code, third.status_code]) == [200, 503]
@@ -0,0 +1,173 @@
+import threading
+
+import pytest
+import pytest_twisted
+from twisted.internet.address import IPv4Address
+from twisted.web.server import NOT_DONE_YET
+from twisted.web.test.test_web import DummyRequest
+
+from canarytokens import async_queries, canarydrop, geoip, queries
+from canarytokens.channel_http import ChannelHTTP
+from canarytokens.models import GeoIPInfo, TokenTypes
+from canarytokens.switchboard import Switchboard
+from canarytokens.tokens import Canarytoken
+
+GEO_INFO = {
+    "ip": "1.2.3.4",
+    "loc": "-33.9778,18.6167",
+    "city": "Cape Town",
+    "country": "ZA",
+}
+
+MMDB_RECORD = {
+    "city": {"geoname_id": 3369157, "names": {"en": "Cape Town", "de": "Kapstadt"}},
+    "country": {"iso_code": "ZA", "names": {"en": "South Africa"}},
+    "location": {
+        "latitude": -33.9778,
+        "longitude": 18.6167,
+        "time_zone": "Africa/Johannesburg",
+    },
+    "postal": {"code": "7100"},
+    "subdivisions": [{"iso_code": "WC", "names": {"en": "Western Cape"}}],
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_geoip_cache():
+    geoip.clear_cache()
+    yield
+    geoip.clear_cache()
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    looked_up = []
+
+    def get_geoinfo(ip):
+        looked_up.append(ip)
+        return {**GEO_INFO, "ip": ip}
+
+    monkeypatch.setattr(queries, "get_geoinfo", get_geoinfo)
+    return looked_up
+
+
+def test_cache_evicts_least_recently_used():
+    cache = geoip.GeoIPCache(max_size=2)
+    cache.set("1.1.1.1", {"ip": "1.1.1.1"})
+    cache.set("2.2.2.2", {"ip": "2.2.2.2"})
+    assert cache.get("1.1.1.1") == {"ip": "1.1.1.1"}
+    cache.set("3.3.3.3", {"ip": "3.3.3.3"})
+    assert cache.get("2.2.2.2") is None
+    assert cache.get("1.1.1.1") is not None
+    assert len(cache) == 2
+
+
+def test_cache_expires_entries():
+    cache = geoip.GeoIPCache(max_size=2, ttl=-1)
+    cache.set("1.1.1.1", {"ip": "1.1.1.1"})
+    assert cache.get("1.1.1.1") is None
+    assert len(cache) == 0
+
+
+def test_get_geoinfo_is_cached_in_process(lookups):
+    assert geoip.get_local_geoinfo("1.2.3.4") is None
+    assert geoip.get_geoinfo("1.2.3.4") == GEO_INFO
+    assert geoip.get_geoinfo("1.2.3.4") == GEO_INFO
+    assert geoip.get_local_geoinfo("1.2.3.4") == GEO_INFO
+    assert lookups == ["1.2.3.4"]
+
+
+def test_get_geoinfo_does_not_cache_failures(monkeypatch):
+    monkeypatch.setattr(queries, "get_geoinfo", lambda ip: "")
+    assert geoip.get_geoinfo("1.2.3.4") == ""
+    assert geoip.get_local_geoinfo("1.2.3.4") is None
+
+
+def test_geoinfo_from_mmdb_record():
+    geo_info = geoip.geoinfo_from_mmdb_record("1.2.3.4", MMDB_RECORD)
+    assert geo_info == {
+        "ip": "1.2.3.4",
+        "loc": "-33.9778,18.6167",
+        "timezone": "Africa/Johannesburg",
+        "city": "Cape Town",
+        "country": "ZA",
+        "postal": "7100",
+        "region": "Western Cape",
+    }
+    assert GeoIPInfo(**geo_info).loc == (-33.9778, 18.6167)
+
+
+def test_geoinfo_from_mmdb_record_without_location():
+    assert geoip.geoinfo_from_mmdb_record("1.2.3.4", {"country": {}}) is None
+
+
+def _make_request(settings, frontend_settings, src_ip):
+    http_channel = ChannelHTTP(
+        switchboard=Switchboard(switchboard_settings=settings),
+        frontend_settings=frontend_settings,
+        switchboard_settings=settings,
+    )
+    cd = canarydrop.Canarydrop(
+        type=TokenTypes.WEB,
+        generate=True,
+        alert_email_enabled=False,
+        alert_email_recipient="email@test.com",
+        alert_webhook_enabled=False,
+        alert_webhook_url=None,
+        canarytoken=Canarytoken(),
+        memo="memo",
+        browser_scanner_enabled=False,
+    )
+    queries.save_canarydrop(cd)
+    request = DummyRequest("/")
+    request.client = IPv4Address(type="TCP", host=src_ip, port=8686)
+    request.uri = cd.generate_random_url(["http://127.0.0.1:8686"]).encode()
+    request.path = request.uri[request.uri.index(b"/", 8) :]  # noqa: E203
+    return http_channel.canarytoken_page, cd, request
+
+
+def test_channel_http_GET_enriches_hit(setup_db, settings, frontend_settings, lookups):
+    page, cd, request = _make_request(settings, frontend_settings, "1.2.3.4")
+    page.render_GET(request)
+
+    hit = queries.get_canarydrop(cd.canarytoken).triggered_details.hits[0]
+    assert hit.geo_info.city == "Cape Town"
+    assert lookups == ["1.2.3.4"]
+
+
+@pytest_twisted.inlineCallbacks
+def test_channel_http_GET_responds_before_geo_lookup(
+    setup_db, settings, frontend_settings, monkeypatch
+):
+    lookup_done = threading.Event()
+
+    def slow_get_geoinfo(ip):
+        assert lookup_done.wait(timeout=5)
+        return {**GEO_INFO, "ip": ip}
+
+    monkeypatch.setattr(queries, "get_geoinfo", slow_get_geoinfo)
+    page, cd, request = _make_request(settings, frontend_settings, "1.2.3.4")
+    enrichments = []
+    enrich_and_dispatch = page._enrich_and_dispatch
+    monkeypatch.setattr(
+        page,
+        "_enrich_and_dispatch",
+        lambda *args: enrichments.append(enrich_and_dispatch(*args)),
+    )
+
+    async_queries.start_threadpool(2)
+    try:
+        assert page.render_GET(request) == NOT_DONE_YET
+        yield request.notifyFinish()
+        assert b"".join(request.written)
+        hit = queries.get_canarydrop(cd.canarytoken).triggered_details.hits[0]
+        assert hit.geo_info is None
+
+        lookup_done.set()
+        yield enrichments[0]
+    finally:
+        lookup_done.set()
+        async_queries.stop_threadpool()
+
+    hit = queries.get_canarydrop(cd.canarytoken).triggered_details.hits[0]
+    assert hit.geo_info.city == "Cape Town"
@@ -11,9 +11,10 @@ from twisted.web.http import Request
 from twisted.web.test.requesthelper import DummyChannel
 from twisted.web.test.test_web import DummyRequest
 
-from canarytokens import canarydrop, queries
+from canarytokens import canarydrop, metrics, queries
 from canarytokens.awskeys import get_aws_key
 from canarytokens.channel_http import ChannelHTTP
+from canarytokens.constants import INPUT_CHANNEL_HTTP
 from canarytokens.models import (
     AWSKeyTokenHistory,
     AlertStatus,
@@ -655,6 +656,7 @@ def test_channel_http_ignored_ip(setup_db, http_channel, method):
     cd.alert_ip_ignore_enabled = True
     cd.set_ignored_ip_addresses(ip_addresses=[ipaddress.IPv4Address("127.0.0.1")])
 
+    hits = metrics.HITS.get(input_channel=INPUT_CHANNEL_HTTP, token_type=cd.type)
     request = create_dummy_request(cd)
     render_method = getattr(http_channel.canarytoken_page, f"render_{method}")
     render_method(request)
@@ -662,6 +664,10 @@ def test_channel_http_ignored_ip(setup_db, http_channel, method):
     cd_updated = queries.get_canarydrop(canarytoken=cd.canarytoken)
     assert len(cd_updated.triggered_details.hits) == 1
     assert cd_updated.triggered_details.hits[0].alert_status == AlertStatus.IGNORED_IP
+    # Hits on ignored IPs aren't dispatched, so aren't counted.
+    assert (
+        metrics.HITS.get(input_channel=INPUT_CHANNEL_HTTP, token_type=cd.type) == hits
+    )
 
 
 @pytest.mark.parametrize("method", ["GET", "POST"])
@@ -3,13 +3,14 @@ import json
 from ipaddress import IPv4Address
 
 import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
 from OpenSSL.crypto import FILETYPE_PEM, load_certificate, load_privatekey
 from twisted.internet.ssl import CertificateOptions
 
 from canarytokens import canarydrop as cd
 from canarytokens import kubeconfig
 from canarytokens import kubeconfig as kc
-from canarytokens import queries, tokens
+from canarytokens import metrics, queries, tokens
 from canarytokens.channel_input_mtls import (
     ChannelKubeConfig,
     ChirpData,
@@ -151,3 +152,52 @@ def test_header_generation():
     headers = KubeConfig.kc_headers()
     assert isinstance(headers, bytes)
     assert len(headers.splitlines()) == 5
+
+
+@pytest.fixture
+def key_pool(setup_db, monkeypatch):
+    # Small keys keep the test fast.
+    monkeypatch.setattr(
+        kubeconfig,
+        "generate_private_key",
+        lambda: rsa.generate_private_key(public_exponent=65537, key_size=1024),
+    )
+    return kubeconfig.KeyPool(size=3, low_water=2)
+
+
+def test_key_pool_refills_below_low_water(key_pool):
+    assert key_pool.refill() == 3
+    assert isinstance(key_pool.take(), rsa.RSAPrivateKey)
+    # 2 keys left isn't below the low water mark.
+    assert key_pool.refill() == 0
+    key_pool.take()
+    assert key_pool.refill() == 2
+
+    stats = key_pool.stats()
+    assert stats["depth"] == 3
+    assert stats["keys_generated"] == 5
+    assert stats["refill_rate"] > 0
+    assert stats["misses"] == 0
+
+
+def test_key_pool_empty(key_pool):
+    assert isinstance(key_pool.take(), rsa.RSAPrivateKey)
+    assert key_pool.stats()["misses"] == 1
+
+
+def test_key_pool_depth_metric(key_pool):
+    key_pool.refill()
+
+    d = kubeconfig.update_key_pool_depth_metric()
+
+    assert d.called
+    assert metrics.KUBECONFIG_KEY_POOL_DEPTH.get() == 3
+
+
+def test_kubeconfig_uses_key_pool(setup_db, key_pool, monkeypatch):
+    key_pool.refill()
+    monkeypatch.setattr(kubeconfig, "_key_pool", key_pool)
+
+    get_kubeconfig()
+
+    assert queries.get_kubeconfig_key_pool_depth() == 2
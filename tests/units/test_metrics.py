@@ -0,0 +1,113 @@
+from unittest import mock
+
+import pytest
+from twisted.web.test.test_web import DummyRequest
+
+from canarytokens import async_queries, metrics
+from canarytokens.channel_output_email import EmailResponseStatuses, send_email
+from canarytokens.metrics import Counter, Histogram, MetricsResource, Registry
+
+
+def test_render_counter_and_histogram():
+    registry = Registry()
+    hits = registry.register(
+        Counter("hits_total", "Hits.", ("input_channel", "token_type"))
+    )
+    latency = registry.register(
+        Histogram("latency_seconds", "Latency.", ("query",), buckets=(0.1, 1.0))
+    )
+
+    hits.inc(input_channel="DNS", token_type="dns")
+    hits.inc(2, input_channel="HTTP", token_type='we"b')
+    latency.observe(0.05, query="get")
+    latency.observe(0.5, query="get")
+    latency.observe(5, query="get")
+
+    assert registry.render().splitlines() == [
+        "# HELP hits_total Hits.",
+        "# TYPE hits_total counter",
+        'hits_total{input_channel="DNS",token_type="dns"} 1',
+        'hits_total{input_channel="HTTP",token_type="we\\"b"} 2',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{query="get",le="0.1"} 1',
+        'latency_seconds_bucket{query="get",le="1"} 2',
+        'latency_seconds_bucket{query="get",le="+Inf"} 3',
+        'latency_seconds_sum{query="get"} 5.55',
+        'latency_seconds_count{query="get"} 3',
+    ]
+
+
+def test_labels_must_match():
+    hits = Counter("hits_total", "Hits.", ("input_channel",))
+    with pytest.raises(ValueError):
+        hits.inc(token_type="dns")
+
+
+def test_collectors_run_on_render():
+    registry = Registry()
+    depth = registry.register(metrics.Gauge("depth", "Depth."))
+    collector = mock.Mock(side_effect=lambda: depth.set(3))
+    registry.add_collector(collector)
+
+    assert "depth 3" in registry.render().splitlines()
+    registry.remove_collector(collector)
+    registry.render()
+    collector.assert_called_once()
+
+
+def test_metrics_resource():
+    request = DummyRequest([b"metrics"])
+
+    body = MetricsResource().render_GET(request)
+
+    assert b"# TYPE canarytokens_hits_total counter" in body
+    assert request.responseHeaders.getRawHeaders(b"Content-Type")[0].startswith(
+        b"text/plain; version=0.0.4"
+    )
+
+
+def test_redis_queries_are_timed():
+    def get_thing():
+        return "thing"
+
+    before = metrics.REDIS_QUERY_SECONDS.get_count(query="get_thing")
+    d = async_queries.run_query(get_thing)
+
+    assert d.result == "thing"
+    assert metrics.REDIS_QUERY_SECONDS.get_count(query="get_thing") == before + 1
+
+
+@pytest.mark.parametrize(
+    "provider, setting",
+    [
+        ("mailgun", "MAILGUN_API_KEY"),
+        ("sendgrid", "SENDGRID_API_KEY"),
+        ("smtp", "SMTP_SERVER"),
+    ],
+)
+def test_email_send_failures_are_counted(provider, setting):
+    switchboard_settings = mock.Mock(
+        MAILGUN_API_KEY=None, SENDGRID_API_KEY=None, SMTP_SERVER=None
+    )
+    setattr(switchboard_settings, setting, "configured")
+    labels = {"output_channel": "Email", "provider": provider}
+    sent_before = metrics.ALERT_SEND_SECONDS.get_count(**labels)
+    failed_before = metrics.ALERT_SEND_FAILURES.get(**labels)
+
+    with mock.patch(
+        f"canarytokens.channel_output_email.{provider}_send",
+        return_value=(EmailResponseStatuses.ERROR, ""),
+    ):
+        send_email(
+            switchboard_settings=switchboard_settings,
+            email_recipient="test@example.com",
+            email_subject="subject",
+            email_content_html="html",
+            email_content_text="text",
+            from_email="from@example.com",
+            from_display="from",
+        )
+
+    assert metrics.ALERT_SEND_SECONDS.get_count(**labels) == sent_before + 1
+    assert metrics.ALERT_SEND_FAILURES.get(**labels) == failed_before + 1
@@ -0,0 +1,41 @@
+import gzip
+from pathlib import Path
+from zipfile import ZipFile
+
+from canarytokens.mysql import (
+    DUMP_FOOTER,
+    DUMP_HEADER,
+    get_mysql_dump_template,
+    make_canary_mysql_dump,
+)
+
+TEMPLATE = Path(__file__).parent.parent.parent / "templates" / "mysql_tables.zip"
+STATEMENT = "SET @bb = CONCAT(\"CHANGE REPLICATION SOURCE TO SOURCE_HOST='x'\");"
+
+
+def test_make_canary_mysql_dump():
+    dump = gzip.decompress(
+        make_canary_mysql_dump(mysql_usage=STATEMENT, template=TEMPLATE)
+    )
+
+    assert dump.startswith(DUMP_HEADER)
+    assert dump.endswith(DUMP_FOOTER)
+    assert dump.count(STATEMENT.encode()) == 1
+    with ZipFile(TEMPLATE) as doc:
+        tables = [
+            doc.read(name)
+            for name in doc.namelist()
+            if name.startswith("dw_") and name.endswith(".sql")
+        ]
+    included = [table for table in tables if table in dump]
+    assert len(included) >= len(tables) // 2
+    assert len(dump) == (
+        len(DUMP_HEADER)
+        + len(STATEMENT)
+        + sum(len(table) for table in included)
+        + len(DUMP_FOOTER)
+    )
+
+
+def test_mysql_dump_template_is_loaded_once():
+    assert get_mysql_dump_template(TEMPLATE) is get_mysql_dump_template(TEMPLATE)
@@ -22,3 +22,23 @@ def test_make_canary_pdf(frontend_settings: FrontendSettings, _: int):
     assert pdf.pdf_header == "%PDF-1.6"
     assert pdf.get_num_pages() == 1
     assert pdf.get_object(16)["/URI"].startswith(f"http://{hostname.decode()}")
+
+
+def test_make_canary_pdf_keeps_template_layout(frontend_settings: FrontendSettings):
+    template = Path(frontend_settings.TEMPLATES_PATH) / "template.pdf"
+    hostname = b"abcdefghijklmnopqrstuvwxy.nx.canarytokens.com"
+
+    pdf_bytes = make_canary_pdf(hostname=hostname, template=template)
+
+    # The xref offsets are only right if the token stream's length is unchanged.
+    assert len(pdf_bytes) == template.stat().st_size
+    pdf = PdfReader(BytesIO(pdf_bytes))
+    assert pdf.get_object(16)["/URI"] == f"http://{hostname.decode()}"
+
+
+def test_make_canary_pdf_hostname_too_long(frontend_settings: FrontendSettings):
+    with pytest.raises(ValueError):
+        make_canary_pdf(
+            hostname=bytes(range(33, 127)),
+            template=Path(frontend_settings.TEMPLATES_PATH) / "template.pdf",
+        )
@@ -1,3 +1,5 @@
+import json
+import time
 from datetime import datetime, timezone
 from unittest import mock
 from twisted.logger import LogLevel, capturedLogs
@@ -7,33 +9,49 @@ from pydantic import EmailStr
 from redis import StrictRedis
 import requests
 
-from canarytokens import queries
+from canarytokens import canarydrop as cand, queries
 from canarytokens.canarydrop import Canarydrop
 from canarytokens.exceptions import CanarydropAuthFailure, NoCanarydropFound
 from canarytokens.models import (
     AdditionalInfo,
+    DNSTokenHistory,
     DNSTokenHit,
     GeoIPBogonInfo,
     KubeconfigTokenHit,
     Memo,
+    SMTPTokenHistory,
     TokenTypes,
 )
 from canarytokens.redismanager import (
     KEY_AUTH_IDX,
     KEY_CANARYDROP,
+    KEY_CANARYTOKEN_ALERT_COUNT,
+    KEY_CANARYDROP_HITS,
+    KEY_CANARYDROPS_BY_TYPE,
     KEY_CANARYDROPS_TIMELINE,
+    KEY_CANARY_PATH_ELEMENTS,
     KEY_EMAIL_IDX,
     KEY_WEBHOOK_IDX,
     KEY_TOR_EXIT_NODES,
 )
 from canarytokens.queries import (
+    add_canary_path_element,
     delete_canarydrop,
     delete_email_tokens,
     delete_webhook_tokens,
+    do_accounting,
     get_canarydrop,
     get_canarydrop_and_authenticate,
+    get_canarydrop_header,
+    get_all_canary_path_elements,
+    get_canarydrop_hits,
+    get_canarydrops_by_type,
     save_canarydrop,
+    scan_canarydrops_by_type,
+    start_url_components_cache,
+    stop_url_components_cache,
 )
+from canarytokens.settings import get_switchboard_settings
 from canarytokens.tokens import Canarytoken
 from tests.utils import make_token_alert_detail
 
@@ -153,6 +171,325 @@ def test_add_hit_get_canarytoken(setup_db):
     assert cd.triggered_details
 
 
+def _save_dns_drop() -> Canarydrop:
+    canarydrop = Canarydrop(
+        generate=True,
+        type=TokenTypes.DNS,
+        canarytoken=Canarytoken(),
+        memo="stuff happened",
+        browser_scanner_enabled=False,
+    )
+    save_canarydrop(canarydrop)
+    return canarydrop
+
+
+def _dns_hit(time_of_hit: float) -> DNSTokenHit:
+    return DNSTokenHit(
+        time_of_hit=time_of_hit,
+        src_ip="127.0.0.1",
+        geo_info=GeoIPBogonInfo(ip="127.0.0.1", bogon=True),
+        is_tor_relay=False,
+        input_channel="dns",
+    )
+
+
+def test_save_canarydrop_keeps_timeline_entry(setup_db):
+    canarydrop = _save_dns_drop()
+    token = canarydrop.canarytoken.value()
+    created = setup_db.zscore(KEY_CANARYDROPS_TIMELINE, token)
+
+    canarydrop.memo = Memo("updated")
+    save_canarydrop(canarydrop)
+
+    assert setup_db.zscore(KEY_CANARYDROPS_TIMELINE, token) == created
+    assert token in setup_db.smembers(KEY_AUTH_IDX + canarydrop.auth)
+    assert get_canarydrop(canarydrop.canarytoken).memo == "updated"
+
+
+def test_canarydrops_by_type_index(setup_db):
+    canarydrop = _save_dns_drop()
+    token = canarydrop.canarytoken.value()
+    key = KEY_CANARYDROPS_BY_TYPE + TokenTypes.DNS.value
+
+    assert setup_db.zscore(key, token) == setup_db.zscore(
+        KEY_CANARYDROPS_TIMELINE, token
+    )
+    assert [
+        drop.canarytoken.value() for drop in get_canarydrops_by_type(TokenTypes.DNS)
+    ] == [token]
+    assert get_canarydrops_by_type(TokenTypes.WEB) == []
+
+    delete_canarydrop(canarydrop)
+    assert not setup_db.exists(key)
+
+
+def test_scan_canarydrops_by_type(setup_db):
+    tokens = [_save_dns_drop().canarytoken.value() for _ in range(5)]
+
+    scanned = []
+    cursor, canarydrops = scan_canarydrops_by_type(TokenTypes.DNS, count=2)
+    scanned.extend(drop.canarytoken.value() for drop in canarydrops)
+    # Deleting a drop that was already scanned doesn't skip any others.
+    delete_canarydrop(canarydrops[0])
+    while cursor is not None:
+        cursor, canarydrops = scan_canarydrops_by_type(
+            TokenTypes.DNS, cursor=cursor, count=2
+        )
+        scanned.extend(drop.canarytoken.value() for drop in canarydrops)
+
+    assert scanned == tokens
+
+
+def test_scan_canarydrops_created_at_the_same_time(setup_db):
+    tokens = sorted(_save_dns_drop().canarytoken.value() for _ in range(5))
+    setup_db.zadd(
+        KEY_CANARYDROPS_BY_TYPE + TokenTypes.DNS.value,
+        {token: 1.0 for token in tokens},
+    )
+
+    scanned = []
+    cursor = None
+    while True:
+        cursor, canarydrops = scan_canarydrops_by_type(
+            TokenTypes.DNS, cursor=cursor, count=2
+        )
+        scanned.extend(drop.canarytoken.value() for drop in canarydrops)
+        if cursor is None:
+            break
+
+    assert scanned == tokens
+
+
+def test_save_canarydrop_moves_changed_type_in_index(setup_db):
+    canarydrop = _save_dns_drop()
+    token = canarydrop.canarytoken.value()
+
+    canarydrop.type = TokenTypes.SMTP
+    canarydrop.triggered_details = SMTPTokenHistory(hits=[])
+    save_canarydrop(canarydrop)
+
+    assert (
+        setup_db.zscore(KEY_CANARYDROPS_BY_TYPE + TokenTypes.DNS.value, token) is None
+    )
+    assert setup_db.zscore(KEY_CANARYDROPS_BY_TYPE + TokenTypes.SMTP.value, token)
+
+
+def test_scan_canarydrops_by_type_skips_other_types(setup_db):
+    token = _save_dns_drop().canarytoken.value()
+    # An index entry left behind by a type change.
+    setup_db.zadd(KEY_CANARYDROPS_BY_TYPE + TokenTypes.SMTP.value, {token: 1.0})
+
+    assert scan_canarydrops_by_type(TokenTypes.SMTP) == (None, [])
+
+
+def test_save_canarydrop_restores_hits(setup_db):
+    canarydrop = _save_dns_drop()
+    token = canarydrop.canarytoken.value()
+    setup_db.hset(
+        KEY_CANARYDROP + token,
+        "triggered_list",
+        json.dumps(DNSTokenHistory(hits=[_dns_hit(1.0)]).serialize_for_v2()),
+    )
+    canarydrop.triggered_details = DNSTokenHistory(hits=[_dns_hit(1.0), _dns_hit(2.0)])
+
+    save_canarydrop(canarydrop)
+    # Hits that are already stored aren't overwritten.
+    canarydrop.triggered_details.hits = [_dns_hit(5.0)]
+    save_canarydrop(canarydrop)
+
+    assert not setup_db.hexists(KEY_CANARYDROP + token, "triggered_list")
+    hits = get_canarydrop(canarydrop.canarytoken).triggered_details.hits
+    assert [hit.time_of_hit for hit in hits] == [1.0, 2.0]
+
+
+def test_add_hit_appends_to_hit_list(setup_db, monkeypatch):
+    settings = get_switchboard_settings().copy(update={"MAX_HISTORY": 2})
+    monkeypatch.setattr(queries, "get_switchboard_settings", lambda: settings)
+    monkeypatch.setattr(cand, "get_switchboard_settings", lambda: settings)
+    canarydrop = _save_dns_drop()
+    token = canarydrop.canarytoken.value()
+
+    for time_of_hit in [1.0, 2.0, 3.0]:
+        canarydrop.add_canarydrop_hit(token_hit=_dns_hit(time_of_hit))
+
+    assert not setup_db.hexists(KEY_CANARYDROP + token, "triggered_list")
+    assert setup_db.llen(KEY_CANARYDROP_HITS + token) == 2
+    hits = get_canarydrop(canarydrop.canarytoken).triggered_details.hits
+    assert [hit.time_of_hit for hit in hits] == [2.0, 3.0]
+    assert hits == canarydrop.triggered_details.hits
+
+
+def test_triggered_list_is_migrated(setup_db):
+    canarydrop = _save_dns_drop()
+    token = canarydrop.canarytoken.value()
+    # Hits as stored by v2 and before the hit list.
+    triggered_list = DNSTokenHistory(hits=[_dns_hit(2.0), _dns_hit(1.0)])
+    setup_db.hset(
+        KEY_CANARYDROP + token,
+        "triggered_list",
+        json.dumps(triggered_list.serialize_for_v2()),
+    )
+    canarydrop = get_canarydrop(canarydrop.canarytoken)
+    assert [hit.time_of_hit for hit in canarydrop.triggered_details.hits] == [1.0, 2.0]
+    assert not setup_db.hexists(KEY_CANARYDROP + token, "triggered_list")
+    assert not queries.migrate_triggered_list(canarydrop.canarytoken)
+
+    canarydrop.add_canarydrop_hit(token_hit=_dns_hit(3.0))
+
+    hits = get_canarydrop(canarydrop.canarytoken).triggered_details.hits
+    assert [hit.time_of_hit for hit in hits] == [1.0, 2.0, 3.0]
+
+
+def test_add_hit_leaves_triggered_list(setup_db):
+    canarydrop = _save_dns_drop()
+    token = canarydrop.canarytoken.value()
+    setup_db.hset(
+        KEY_CANARYDROP + token,
+        "triggered_list",
+        json.dumps(DNSTokenHistory(hits=[_dns_hit(1.0)]).serialize_for_v2()),
+    )
+
+    queries.add_canarydrop_hit(canarydrop, _dns_hit(2.0))
+    # Adding a hit doesn't look for hits to migrate, reading them does.
+    assert setup_db.hexists(KEY_CANARYDROP + token, "triggered_list")
+    history, total = get_canarydrop_hits(canarydrop.canarytoken, TokenTypes.DNS)
+
+    assert [hit.time_of_hit for hit in history.hits] == [1.0, 2.0]
+    assert total == 2
+    assert not setup_db.hexists(KEY_CANARYDROP + token, "triggered_list")
+
+
+def test_update_hit_in_triggered_list(setup_db):
+    canarydrop = _save_dns_drop()
+    setup_db.hset(
+        KEY_CANARYDROP + canarydrop.canarytoken.value(),
+        "triggered_list",
+        json.dumps(DNSTokenHistory(hits=[_dns_hit(1.0)]).serialize_for_v2()),
+    )
+
+    geo_info = {"ip": "1.2.3.4", "loc": "-33.9,18.6", "city": "Cape Town"}
+    queries.update_hit_geo_info(canarydrop.canarytoken, 1.0, geo_info)
+
+    [hit] = get_canarydrop(canarydrop.canarytoken).triggered_details.hits
+    assert hit.geo_info.city == "Cape Town"
+
+
+def test_get_canarydrop_hits_pages_from_most_recent(setup_db):
+    canarydrop = _save_dns_drop()
+    for time_of_hit in range(1, 6):
+        canarydrop.add_canarydrop_hit(token_hit=_dns_hit(float(time_of_hit)))
+
+    def page(**kwargs):
+        history, total = get_canarydrop_hits(
+            canarydrop.canarytoken, TokenTypes.DNS, **kwargs
+        )
+        assert total == 5
+        return [hit.time_of_hit for hit in history.hits]
+
+    assert page() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert page(limit=2) == [4.0, 5.0]
+    assert page(offset=2, limit=2) == [2.0, 3.0]
+    assert page(offset=4, limit=2) == [1.0]
+    assert page(offset=5, limit=2) == []
+
+
+def test_update_hit_geo_info(setup_db):
+    canarydrop = _save_dns_drop()
+    canarydrop.add_canarydrop_hit(token_hit=_dns_hit(1.0))
+    canarydrop.add_canarydrop_hit(token_hit=_dns_hit(2.0))
+
+    geo_info = {"ip": "1.2.3.4", "loc": "-33.9,18.6", "city": "Cape Town"}
+    queries.update_hit_geo_info(canarydrop.canarytoken, 1.0, geo_info)
+    queries.update_hit_geo_info(canarydrop.canarytoken, 5.0, {"ip": "1.2.3.4"})
+
+    first, second = get_canarydrop(canarydrop.canarytoken).triggered_details.hits
+    assert first.geo_info.city == "Cape Town"
+    assert second.geo_info.bogon
+
+
+def test_get_canarydrop_header_leaves_out_history(setup_db):
+    canarydrop = _save_dns_drop()
+    canarydrop.add_canarydrop_hit(token_hit=_dns_hit(1.0))
+
+    header = get_canarydrop_header(canarydrop.canarytoken)
+    assert header.triggered_details is None
+    header.add_canarydrop_hit(token_hit=_dns_hit(2.0))
+    assert header.get_latest_hit().time_of_hit == 2.0
+    assert not header.history_loaded
+
+    assert [hit.time_of_hit for hit in header.load_history().hits] == [1.0, 2.0]
+    assert header.history_loaded
+
+
+def test_get_canarydrop_header_equals_full_drop(setup_db):
+    canarydrop = _save_dns_drop()
+    canarydrop.add_canarydrop_hit(token_hit=_dns_hit(1.0))
+
+    header = get_canarydrop_header(canarydrop.canarytoken)
+    full_drop = get_canarydrop(canarydrop.canarytoken)
+
+    def header_fields(drop: Canarydrop) -> dict:
+        return {
+            field: value
+            for field, value in drop.dict(by_alias=True).items()
+            if field in queries.CANARYDROP_HEADER_FIELDS
+        }
+
+    assert header_fields(header) == header_fields(full_drop)
+    header.load_history()
+    assert header.triggered_details == full_drop.triggered_details
+
+
+def test_get_canarydrop_header_leaves_out_other_fields(setup_db):
+    kubeconfig = "kubeconfig" * 1000
+    canarydrop = Canarydrop(
+        type=TokenTypes.KUBECONFIG,
+        canarytoken=Canarytoken(),
+        memo="stuff happened",
+        kubeconfig=kubeconfig,
+    )
+    save_canarydrop(canarydrop)
+
+    header = get_canarydrop_header(canarydrop.canarytoken)
+    assert header.kubeconfig is None
+    assert header.memo == "stuff happened"
+
+    # Saving the header leaves the fields it was loaded without.
+    header.alert_failure_count = 1
+    save_canarydrop(header)
+    loaded = get_canarydrop(canarydrop.canarytoken)
+    assert loaded.kubeconfig == kubeconfig
+    assert loaded.alert_failure_count == 1
+
+
+def test_get_canarydrop_header_v2_triggered_list(setup_db):
+    canarydrop = _save_dns_drop()
+    token = canarydrop.canarytoken.value()
+    setup_db.hset(
+        KEY_CANARYDROP + token,
+        "triggered_list",
+        json.dumps(DNSTokenHistory(hits=[_dns_hit(1.0)]).serialize_for_v2()),
+    )
+
+    header = get_canarydrop_header(canarydrop.canarytoken)
+    assert header.triggered_details is None
+    assert [hit.time_of_hit for hit in header.load_history().hits] == [1.0]
+
+
+def test_saving_canarydrop_header_keeps_hits(setup_db):
+    canarydrop = _save_dns_drop()
+    canarydrop.add_canarydrop_hit(token_hit=_dns_hit(1.0))
+
+    header = get_canarydrop_header(canarydrop.canarytoken)
+    header.alert_failure_count = 1
+    save_canarydrop(header)
+
+    assert not header.history_loaded
+    loaded = get_canarydrop(canarydrop.canarytoken)
+    assert loaded.alert_failure_count == 1
+    assert [hit.time_of_hit for hit in loaded.triggered_details.hits] == [1.0]
+
+
 def test_add_hit_get_canarytoken_wrong_type(setup_db):
     canarytoken = Canarytoken()
 
@@ -312,7 +649,7 @@ def test_delete_aws_key_drop_enqueues_after_local_deletion():
 
     with (
         mock.patch("canarytokens.queries.DB.get_db", return_value=db),
-        mock.patch("canarytokens.settings.FrontendSettings", return_value=settings),
+        mock.patch("canarytokens.queries.get_frontend_settings", return_value=settings),
         mock.patch(
             "canarytokens.awskeys.enqueue_aws_id_token_deletion",
             side_effect=fail_after_local_deletion,
@@ -459,6 +796,20 @@ def test_get_canarydrop_from_auth(setup_db):
             token=canarydrop.canarytoken.value(), auth="wrongauthtoken"
         )
 
+    header = get_canarydrop_and_authenticate(
+        token=canarydrop.canarytoken.value(),
+        auth=canarydrop.auth,
+        with_history=False,
+    )
+    assert header.canarytoken.value() == canarydrop.canarytoken.value()
+    assert not header.history_loaded
+    with pytest.raises(CanarydropAuthFailure):
+        get_canarydrop_and_authenticate(
+            token=canarydrop.canarytoken.value(),
+            auth="wrongauthtoken",
+            with_history=False,
+        )
+
 
 def test_get_geoinfo_is_cached():
     """
@@ -712,3 +1063,37 @@ def test_block_domain(target: str, expect_block: list[str], setup_db: None):
     queries.block_domain(target)
     for test_target in expect_block:
         assert queries.is_email_blocked(test_target)
+
+
+def test_url_components_cache(setup_db):
+    start_url_components_cache()
+    try:
+        assert get_all_canary_path_elements() == ["tags"]
+        # Only changes made through queries are published.
+        setup_db.sadd(KEY_CANARY_PATH_ELEMENTS, "unpublished")
+        assert get_all_canary_path_elements() == ["tags"]
+
+        add_canary_path_element("stuff")
+        deadline = time.monotonic() + 5
+        while len(get_all_canary_path_elements()) == 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert sorted(get_all_canary_path_elements()) == [
+            "stuff",
+            "tags",
+            "unpublished",
+        ]
+    finally:
+        stop_url_components_cache()
+
+
+def test_do_accounting_counts_in_fixed_window(setup_db):
+    canarydrop = _save_dns_drop()
+    key = KEY_CANARYTOKEN_ALERT_COUNT + canarydrop.canarytoken.value()
+
+    assert do_accounting(canarydrop, alert_expiry=60) == 1
+    setup_db.expire(key, 30)
+    assert do_accounting(canarydrop, alert_expiry=60) == 2
+
+    # Later alerts don't push the window's expiry back.
+    assert 0 < setup_db.ttl(key) <= 30
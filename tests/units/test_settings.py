@@ -0,0 +1,43 @@
+import pytest
+from pydantic import ValidationError
+
+from canarytokens.settings import (
+    get_frontend_settings,
+    get_switchboard_settings,
+    reload_settings,
+)
+
+
+def test_settings_are_loaded_once():
+    assert get_switchboard_settings() is get_switchboard_settings()
+    assert get_frontend_settings() is get_frontend_settings()
+
+
+def test_reload_settings(monkeypatch):
+    max_history = get_switchboard_settings().MAX_HISTORY
+    monkeypatch.setenv("CANARY_MAX_HISTORY", str(max_history + 1))
+    try:
+        reload_settings()
+        assert get_switchboard_settings().MAX_HISTORY == max_history + 1
+    finally:
+        monkeypatch.undo()
+        reload_settings()
+    assert get_switchboard_settings().MAX_HISTORY == max_history
+
+
+def test_reload_invalid_settings_keeps_current(monkeypatch):
+    switchboard_settings = get_switchboard_settings()
+    monkeypatch.setenv("CANARY_MAX_HISTORY", "lots")
+
+    with pytest.raises(ValidationError):
+        reload_settings()
+
+    assert get_switchboard_settings() is switchboard_settings
+
+
+def test_reload_keeps_frontend_settings():
+    frontend_settings = get_frontend_settings()
+
+    reload_settings()
+
+    assert get_frontend_settings() is frontend_settings
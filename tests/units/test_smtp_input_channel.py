@@ -1,3 +1,4 @@
+import hashlib
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -6,6 +7,7 @@ from twisted.internet.testing import StringTransport
 from twisted.mail.smtp import Address, User
 
 from canarytokens.canarydrop import Canarydrop
+from canarytokens import channel_input_smtp
 from canarytokens.channel_input_smtp import (
     CanaryESMTP,
     CanaryMessage,
@@ -42,11 +44,9 @@ def test_canary_message(setup_db):
     cm = CanaryMessage(esmtp=None)
     for line in message.as_string().splitlines():
         cm.lineReceived(line=line.encode())
-    links_found = cm.links_re.findall(b"\r\n".join(cm.lines))
 
     assert len(cm.attachments) == 3
-    assert len(links_found) == 1
-    assert links_found[0] == link
+    assert cm.links == [link]
     assert all(
         o in cm.headers
         for o in [
@@ -57,6 +57,58 @@ def test_canary_message(setup_db):
     )
 
 
+def test_canary_message_summarises_attachments():
+    message = MIMEMultipart()
+    message["Subject"] = "Attached"
+    with open("data/canary_image.png", mode="rb") as fp:
+        image = fp.read()
+    message.attach(MIMEText("Some text", "plain"))
+    message.attach(MIMEImage(image))
+
+    cm = CanaryMessage(esmtp=None)
+    for line in message.as_bytes().splitlines():
+        cm.lineReceived(line=line)
+    text, attached_image, end = [o.summary().split(b"\n") for o in cm.attachments]
+
+    assert b'Content-Type: text/plain; charset="us-ascii"' in text
+    assert text[-2:] == [
+        b"Size: 9 bytes",
+        f"SHA-256: {hashlib.sha256(b'Some text').hexdigest()}".encode(),
+    ]
+    assert b"Content-Type: image/png" in attached_image
+    assert attached_image[-2:] == [
+        f"Size: {len(image)} bytes".encode(),
+        f"SHA-256: {hashlib.sha256(image).hexdigest()}".encode(),
+    ]
+    assert end == [b""]
+
+
+def test_canary_message_limits(monkeypatch):
+    monkeypatch.setattr(channel_input_smtp, "MAX_HEADER_BYTES", 100)
+    monkeypatch.setattr(channel_input_smtp, "MAX_LINKS", 3)
+    monkeypatch.setattr(channel_input_smtp, "MAX_ATTACHMENTS", 2)
+    cm = CanaryMessage(esmtp=None)
+
+    for i in range(20):
+        cm.lineReceived(f"X-Header-{i}: value".encode())
+    cm.lineReceived(b'Content-Type: multipart/mixed; boundary="b"')
+    cm.lineReceived(b"")
+    for i in range(5):
+        cm.lineReceived(b"--b")
+        cm.lineReceived(b"")
+        cm.lineReceived(f"http://link{i}.example.com http://other.example.com".encode())
+    cm.lineReceived(b"--b--")
+
+    assert sum(len(o) for o in cm.headers) <= 100
+    assert cm.mime_boundary == b"b"
+    assert cm.links == [
+        b"http://link0.example.com",
+        b"http://other.example.com",
+        b"http://link1.example.com",
+    ]
+    assert len(cm.attachments) == 2
+
+
 async def test_canary_esmtp(frontend_settings, settings, setup_db):
     """
     A shot-gun test that sets up an SMTP token, runs the
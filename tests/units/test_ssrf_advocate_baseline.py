@@ -14,6 +14,7 @@ whitelist, enabling internal addresses) will immediately break these tests.
 
 from __future__ import annotations
 
+import ipaddress
 import socket
 import threading
 from http.server import BaseHTTPRequestHandler, HTTPServer
@@ -23,6 +24,7 @@ import pytest
 import requests as vanilla_requests
 
 from canarytokens import advocate
+from canarytokens.advocate import addrvalidator
 from canarytokens.channel_output_webhook import WEBHOOK_ADDR_VALIDATOR
 
 
@@ -263,3 +265,64 @@ class TestDNSRebinding:
             # Round 2: DNS flipped to 127.0.0.1 — our validator raises.
             with pytest.raises(advocate.exceptions.UnacceptableAddressException):
                 _our_post(url)
+
+
+# ---------------------------------------------------------------------------
+# Validator caches
+# A snapshot of the local addresses and compiled hostname globs are reused
+# between checks. They mustn't let anything through that's otherwise blocked.
+# ---------------------------------------------------------------------------
+
+
+class TestValidatorCaches:
+    LOCAL_IP = "93.184.216.34"
+
+    @pytest.fixture
+    def local_addresses(self, monkeypatch):
+        local_addresses = []
+        monkeypatch.setattr(
+            addrvalidator,
+            "determine_local_addresses",
+            lambda: [ipaddress.ip_network(addr) for addr in local_addresses],
+        )
+        monkeypatch.setattr(addrvalidator, "_local_addresses_snapshot", (0.0, ()))
+        return local_addresses
+
+    def test_local_address_added_at_runtime_is_blocked_after_ttl(
+        self, local_addresses, monkeypatch
+    ):
+        validator = advocate.AddrValidator()
+        assert validator.is_ip_allowed(self.LOCAL_IP)
+
+        local_addresses.append(self.LOCAL_IP)
+        # Within the TTL the snapshot is reused.
+        assert validator.is_ip_allowed(self.LOCAL_IP)
+
+        _, addresses = addrvalidator._local_addresses_snapshot
+        # Expire the snapshot.
+        monkeypatch.setattr(
+            addrvalidator, "_local_addresses_snapshot", (0.0, addresses)
+        )
+        assert not validator.is_ip_allowed(self.LOCAL_IP)
+
+    def test_supplied_local_addresses_are_used(self, local_addresses):
+        validator = advocate.AddrValidator()
+        assert not validator.is_ip_allowed(
+            self.LOCAL_IP,
+            _local_addresses=[ipaddress.ip_network(self.LOCAL_IP)],
+        )
+
+    @pytest.mark.parametrize(
+        "hostname",
+        [
+            "internal.example.com",
+            "INTERNAL.Example.COM",
+            "internal.example.com.",
+            "internal.example.com\x00.allowed.org",
+        ],
+    )
+    def test_hostname_blacklist_glob(self, hostname):
+        validator = advocate.AddrValidator(hostname_blacklist={"*.example.com"})
+        for _ in range(2):
+            assert not validator.is_hostname_allowed(hostname)
+        assert validator.is_hostname_allowed("example.org")
@@ -1,11 +1,17 @@
+import threading
+import time
+
 import pytest
 
 from canarytokens import canarydrop, queries
-from canarytokens.channel import InputChannel
+from canarytokens.channel import InputChannel, OutputChannel
+from canarytokens.constants import OUTPUT_CHANNEL_EMAIL, OUTPUT_CHANNEL_WEBHOOK
 from canarytokens.channel_dns import ChannelDNS
+from canarytokens.channel_output_email import EmailOutputChannel
 from canarytokens.channel_output_webhook import WebhookOutputChannel
 from canarytokens.exceptions import DuplicateChannel, InvalidChannel
 from canarytokens.models import TokenTypes
+from canarytokens.redismanager import DB, KEY_CANARYTOKEN_ALERT_COUNT
 from canarytokens.switchboard import Switchboard
 from canarytokens.tokens import Canarytoken
 
@@ -114,3 +120,170 @@ def test_switchboard_duplicate_channel():
     switchboard.add_output_channel("test")
     with pytest.raises(DuplicateChannel):
         switchboard.add_output_channel("test")
+
+
+class SlowOutputChannel(OutputChannel):
+    def __init__(self, switchboard, name, delay=0.0, error=None):
+        self.CHANNEL = name
+        self.delay = delay
+        self.error = error
+        self.sent = threading.Event()
+        super().__init__(
+            switchboard=switchboard,
+            switchboard_scheme="https",
+            frontend_domain="test.com",
+        )
+
+    def do_send_alert(self, input_channel, canarydrop, token_hit, retry=False):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self.sent.set()
+
+
+def _drop_and_hit(switchboard):
+    switchboard.add_input_channel(
+        name="tester",
+        channel=InputChannel(
+            switchboard=switchboard,
+            name="tester",
+            switchboard_hostname="",
+            switchboard_scheme="",
+        ),
+    )
+    cd = canarydrop.Canarydrop(
+        type=TokenTypes.DNS,
+        generate=True,
+        alert_email_enabled=True,
+        alert_email_recipient="email@test.com",
+        alert_webhook_enabled=True,
+        alert_webhook_url="https://example.com/test",
+        canarytoken=Canarytoken(),
+        memo="memo",
+        browser_scanner_enabled=False,
+    )
+    queries.save_canarydrop(cd)
+    token_hit = Canarytoken.create_token_hit(
+        token_type=cd.type,
+        input_channel="tester",
+        src_ip="127.0.0.1",
+        hit_info={"some": "data"},
+    )
+    return cd, token_hit
+
+
+def _dispatch_to(switchboard):
+    cd, token_hit = _drop_and_hit(switchboard)
+    return switchboard.dispatch(canarydrop=cd, token_hit=token_hit)
+
+
+def test_switchboard_dispatch_sends_alerts_concurrently(settings):
+    switchboard = Switchboard(switchboard_settings=settings)
+    email = SlowOutputChannel(switchboard, OUTPUT_CHANNEL_EMAIL, delay=0.5)
+    webhook = SlowOutputChannel(switchboard, OUTPUT_CHANNEL_WEBHOOK, delay=0.5)
+
+    started = time.monotonic()
+    result = _dispatch_to(switchboard)
+
+    assert time.monotonic() - started < 0.9
+    assert email.sent.is_set() and webhook.sent.is_set()
+    assert f"{OUTPUT_CHANNEL_EMAIL}: sent" in result
+    assert f"{OUTPUT_CHANNEL_WEBHOOK}: sent" in result
+
+
+def test_switchboard_dispatch_reports_per_channel(settings):
+    switchboard = Switchboard(switchboard_settings=settings)
+    email = SlowOutputChannel(switchboard, OUTPUT_CHANNEL_EMAIL, delay=1)
+    email.ALERT_TIMEOUT = 0.1
+    webhook = SlowOutputChannel(
+        switchboard, OUTPUT_CHANNEL_WEBHOOK, error=ValueError("bad webhook")
+    )
+
+    result = _dispatch_to(switchboard)
+
+    assert f"{OUTPUT_CHANNEL_EMAIL}: timed out" in result
+    assert f"{OUTPUT_CHANNEL_WEBHOOK}: failed" in result
+    assert not webhook.sent.is_set()
+    # A timed out alert is still sent in the background.
+    assert email.sent.wait(timeout=5)
+
+
+class CountingOutputChannel(OutputChannel):
+    def __init__(self, switchboard, name):
+        self.CHANNEL = name
+        self.sent = 0
+        self.lock = threading.Lock()
+        super().__init__(
+            switchboard=switchboard,
+            switchboard_scheme="https",
+            frontend_domain="test.com",
+        )
+
+    def do_send_alert(self, input_channel, canarydrop, token_hit, retry=False):
+        with self.lock:
+            self.sent += 1
+
+
+def test_switchboard_dispatch_limits_concurrent_alerts(settings):
+    switchboard = Switchboard(
+        switchboard_settings=settings.copy(update={"MAX_ALERTS_PER_MINUTE": 3})
+    )
+    email = CountingOutputChannel(switchboard, OUTPUT_CHANNEL_EMAIL)
+    cd, token_hit = _drop_and_hit(switchboard)
+
+    threads = [
+        threading.Thread(
+            target=switchboard.dispatch,
+            kwargs={"canarydrop": cd, "token_hit": token_hit},
+        )
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert email.sent == 3
+    alert_count_key = KEY_CANARYTOKEN_ALERT_COUNT + cd.canarytoken.value()
+    # The count expires a minute after the first alert.
+    assert 0 < DB.get_db().ttl(alert_count_key) <= 60
+
+
+def test_switchboard_dispatch_limits_alerts_per_recipient(settings):
+    switchboard = Switchboard(
+        switchboard_settings=settings.copy(
+            update={
+                "MAX_ALERTS_PER_MINUTE_PER_RECIPIENT": 1,
+                "MAX_ALERTS_PER_MINUTE_PER_WEBHOOK_HOST": 0,
+            }
+        )
+    )
+    email = CountingOutputChannel(switchboard, OUTPUT_CHANNEL_EMAIL)
+    webhook = CountingOutputChannel(switchboard, OUTPUT_CHANNEL_WEBHOOK)
+
+    for _ in range(2):
+        # Different tokens alerting the same recipient.
+        cd, token_hit = _drop_and_hit(switchboard)
+        result = switchboard.dispatch(canarydrop=cd, token_hit=token_hit)
+
+    assert email.sent == 1
+    assert webhook.sent == 2
+    assert f"{OUTPUT_CHANNEL_EMAIL}: sent" not in result
+
+
+def test_switchboard_reload_settings(settings, frontend_settings):
+    switchboard = Switchboard(switchboard_settings=settings)
+    email = EmailOutputChannel(
+        switchboard=switchboard,
+        frontend_settings=frontend_settings,
+        switchboard_settings=settings,
+    )
+    reloaded = settings.copy(
+        update={"MAX_ALERT_FAILURES": 1, "ALERT_EMAIL_SUBJECT": "Reloaded"}
+    )
+
+    switchboard.reload_settings(reloaded)
+
+    assert switchboard.switchboard_settings is reloaded
+    assert email.switchboard_settings is reloaded
+    assert email.email_subject == "Reloaded"
@@ -6,7 +6,7 @@ from deepdiff import DeepDiff
 
 from canarytokens import queries
 from canarytokens.canarydrop import Canarydrop
-from canarytokens.redismanager import DB
+from canarytokens.redismanager import DB, KEY_CANARYDROP_HITS
 from canarytokens.tokens import Canarytoken
 
 allowed_attrs = [
@@ -130,8 +130,14 @@ def test_loading_drops(setup_db_connection_only, data_file):
     reloaded_data = DB.get_db().hgetall(f"{data_file.stem[:-3]}xxx")
     # Check data is unchanged
     if "triggered_list" in data:
-        # Compare triggered_list separately as order of keys
-        reloaded_list = json.loads(reloaded_data.pop("triggered_list"))
+        # Hits are now stored in their own list, compare them separately
+        # as order of keys
+        reloaded_list = json.loads(
+            queries._v2_compatibility_loading_triggered_details(
+                reloaded_drop.canarytoken
+            )
+        )
+        reloaded_list.pop("token_type")
         original_list = json.loads(data.pop("triggered_list"))
 
         assert (
@@ -145,7 +151,10 @@ def test_loading_drops(setup_db_connection_only, data_file):
     assert reloaded_data == data
     assert DeepDiff(reloaded_data, data) == {}
     # clean up
-    DB.get_db().delete(f"{data_file.stem[:-3]}xxx")
+    DB.get_db().delete(
+        f"{data_file.stem[:-3]}xxx",
+        KEY_CANARYDROP_HITS + reloaded_drop.canarytoken.value(),
+    )
 
 
 def test_dump_v2_drops(setup_db_connection_only):
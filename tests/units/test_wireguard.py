@@ -1,19 +1,23 @@
 from typing import Sequence, Tuple
 
+import nacl.public
 import pytest
 
 from canarytokens.tokens import Canarytoken
 from canarytokens.wireguard import (
     AEAD,
+    BLAKE2S_128_SIZE,
     HMAC1,
     HMAC2,
     KDF1,
     KDF2,
+    DeviceResolver,
     clientConfig,
     deleteCanarytokenPrivateKey,
     generateCanarytokenPrivateKey,
     getDevices,
     hash,
+    initiationMessage,
     mixhash,
     mixKey,
     sharedSecret,
@@ -221,3 +225,30 @@ def test_clientConfig(wg_private_key_seed: str, wg_private_key_n: str, setup_db)
     )
     assert config.startswith("[Interface]")
     deleteCanarytokenPrivateKey(wg_key)
+
+
+def test_device_resolver(monkeypatch):
+    devices = getDevices("vk/GD+frlhve/hDTTSUvqpQ/WsQtioKAri0Rt5mg7dw=", "10")
+    resolver = DeviceResolver(devices, cache_size=1)
+    message = initiationMessage(devices[7], nacl.public.PrivateKey.generate())
+    smac1 = len(message) - 2 * BLAKE2S_128_SIZE
+    data, mac1 = message[:smac1], message[smac1 : smac1 + BLAKE2S_128_SIZE]  # noqa: E203
+
+    assert resolver.resolve(data, mac1, "1.2.3.4") is devices[7]
+    assert resolver.resolve(data, b"\x00" * BLAKE2S_128_SIZE, "1.2.3.5") is None
+
+    # The device last matched for a source is tried first.
+    checked = []
+    mac1_matches = resolver._mac1_matches
+    monkeypatch.setattr(
+        resolver,
+        "_mac1_matches",
+        lambda device_idx, *args: (
+            checked.append(device_idx) or mac1_matches(device_idx, *args)
+        ),
+    )
+    assert resolver.resolve(data, mac1, "1.2.3.4") is devices[7]
+    assert checked == [7]
+
+    assert resolver.resolve(data, mac1, "1.2.3.6") is devices[7]
+    assert list(resolver._last_matched) == ["1.2.3.6"]
@@ -1,6 +1,16 @@
+from unittest import mock
+
+import nacl.encoding
+import nacl.public
+
+from canarytokens import queries
+from canarytokens.canarydrop import Canarydrop
 from canarytokens.channel_input_wireguard import ChannelWireGuard, WireGuardProtocol
+from canarytokens.models import TokenTypes
 from canarytokens.settings import FrontendSettings, SwitchboardSettings
 from canarytokens.switchboard import Switchboard
+from canarytokens.tokens import Canarytoken
+from canarytokens.wireguard import generateCanarytokenPrivateKey, initiationMessage
 
 switchboard = Switchboard()
 
@@ -24,3 +34,57 @@ def test_wireguard_channel(
     wireguard_protocol.datagramReceived(
         data=data, src=("172.20.0.1", settings.CHANNEL_WIREGUARD_PORT)
     )
+
+
+def test_wireguard_hit(settings: SwitchboardSettings, setup_db):
+    canarytoken = Canarytoken()
+    wg_key = generateCanarytokenPrivateKey(
+        canarytoken=canarytoken.value(),
+        wg_private_key_seed=settings.WG_PRIVATE_KEY_SEED,
+        wg_private_key_n=settings.WG_PRIVATE_KEY_N,
+    )
+    canarydrop = Canarydrop(
+        generate=True,
+        type=TokenTypes.WIREGUARD,
+        canarytoken=canarytoken,
+        memo="wireguard",
+        browser_scanner_enabled=False,
+        wg_key=wg_key,
+    )
+    queries.save_canarydrop(canarydrop)
+    channel = mock.Mock()
+    wireguard_protocol = WireGuardProtocol(
+        channel=channel, switchboard_settings=settings
+    )
+    device_idx, private_key = wg_key.split("|")
+    data = initiationMessage(
+        wireguard_protocol.devices[int(device_idx)],
+        nacl.public.PrivateKey(private_key, encoder=nacl.encoding.Base64Encoder),
+        sessionIndex=42,
+    )
+
+    wireguard_protocol.datagramReceived(data=data, src=("172.20.0.1", 51820))
+
+    channel.dispatch.assert_called_once()
+    token_hit = channel.dispatch.call_args.kwargs["token_hit"]
+    assert token_hit.src_data["session_index"] == 42
+    assert len(queries.get_canarydrop(canarytoken).triggered_details.hits) == 1
+
+
+def test_wireguard_drops_handshakes_when_overloaded(settings: SwitchboardSettings):
+    wireguard_protocol = WireGuardProtocol(
+        channel=mock.Mock(), switchboard_settings=settings
+    )
+    wireguard_protocol.max_pending_handshakes = 2
+    # A pool that never gets round to the handshakes.
+    wireguard_protocol.threadpool = mock.Mock()
+    data = initiationMessage(
+        wireguard_protocol.devices[0], nacl.public.PrivateKey.generate()
+    )
+
+    for _ in range(3):
+        wireguard_protocol.datagramReceived(data=data, src=("172.20.0.1", 51820))
+
+    assert wireguard_protocol.threadpool.callInThreadWithCallback.call_count == 2
+    assert wireguard_protocol.pending_handshakes == 2
+    assert wireguard_protocol.dropped_handshakes == 1
@@ -1,7 +1,16 @@
 import datetime
+from io import BytesIO
+from zipfile import ZipFile
 
 from canarytokens import ziplib
-from canarytokens.ziplib import format_time_for_doc, make_canary_zip, make_dir_entry
+from canarytokens.ziplib import (
+    OFFICE_CREATED_PLACEHOLDER,
+    OFFICE_URL_PLACEHOLDER,
+    OfficeTemplate,
+    format_time_for_doc,
+    make_canary_zip,
+    make_dir_entry,
+)
 
 
 def test_make_canary_zip():
@@ -28,3 +37,88 @@ def test_make_dir_entry():
 def test_format_time_for_doc():
     time = datetime.datetime(2013, 4, 5, 16, 57, 58)
     assert format_time_for_doc(time) == "2013-04-05T16:57:58Z"
+
+
+def test_office_template_render():
+    template_buf = BytesIO()
+    with ZipFile(template_buf, "w") as template_zip:
+        ziplib.write_dir(zip=template_zip, name="docProps/")
+        ziplib.write_file(
+            zip=template_zip,
+            name="docProps/core.xml",
+            contents=f"<created>{OFFICE_CREATED_PLACEHOLDER}</created>".encode(),
+        )
+        ziplib.write_file(
+            zip=template_zip,
+            name="footer.xml",
+            contents=f"<a>{OFFICE_URL_PLACEHOLDER}</a><b>{OFFICE_URL_PLACEHOLDER}</b>".encode(),
+        )
+    office_template = OfficeTemplate(template_buf.getvalue())
+
+    rendered = office_template.render(
+        {
+            OFFICE_URL_PLACEHOLDER: "http://example.com/" + OFFICE_CREATED_PLACEHOLDER,
+            OFFICE_CREATED_PLACEHOLDER: "2013-04-05T16:57:58Z",
+        },
+        {"footer.xml": str.upper},
+    )
+
+    with ZipFile(BytesIO(rendered)) as document:
+        assert document.namelist() == ["docProps/core.xml", "footer.xml"]
+        assert (
+            document.read("docProps/core.xml")
+            == b"<created>2013-04-05T16:57:58Z</created>"
+        )
+        # Placeholders in replacements are left alone.
+        url = ("http://example.com/" + OFFICE_CREATED_PLACEHOLDER).upper()
+        assert document.read("footer.xml") == f"<A>{url}</A><B>{url}</B>".encode()
+
+
+def test_office_template_copies_unchanged_members():
+    template_buf = BytesIO()
+    with ZipFile(template_buf, "w") as template_zip:
+        ziplib.write_file(
+            zip=template_zip,
+            name="word/media/image1.xml",
+            contents=b"<unchanged/>" * 1000,
+        )
+        ziplib.write_file(
+            zip=template_zip,
+            name="word/document.xml",
+            contents=f"<a>{OFFICE_URL_PLACEHOLDER}</a>".encode(),
+        )
+    office_template = OfficeTemplate(template_buf.getvalue())
+
+    rendered = office_template.render({OFFICE_URL_PLACEHOLDER: "http://example.com/"})
+
+    with ZipFile(template_buf) as template, ZipFile(BytesIO(rendered)) as document:
+        assert document.testzip() is None
+        assert document.read("word/document.xml") == b"<a>http://example.com/</a>"
+        unchanged = template.getinfo("word/media/image1.xml")
+        copied = document.getinfo("word/media/image1.xml")
+        assert (copied.CRC, copied.compress_size) == (
+            unchanged.CRC,
+            unchanged.compress_size,
+        )
+        assert document.read("word/media/image1.xml") == b"<unchanged/>" * 1000
+
+
+def test_office_template_with_binary_media():
+    image = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+    template_buf = BytesIO()
+    with ZipFile(template_buf, "w") as template_zip:
+        ziplib.write_file(
+            zip=template_zip, name="word/media/image1.png", contents=image
+        )
+        ziplib.write_file(
+            zip=template_zip,
+            name="word/document.xml",
+            contents=f"<a>{OFFICE_URL_PLACEHOLDER}</a>".encode(),
+        )
+    office_template = OfficeTemplate(template_buf.getvalue())
+
+    rendered = office_template.render({OFFICE_URL_PLACEHOLDER: "http://example.com/"})
+
+    with ZipFile(BytesIO(rendered)) as document:
+        assert document.read("word/media/image1.png") == image
+        assert document.read("word/document.xml") == b"<a>http://example.com/</a>"